@@ -28,6 +28,15 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_password: Optional[str] = None
 
+    # Очередь событий VK Callback: файл локальной очереди (если Redis не настроен)
+    # и количество потоков-обработчиков в каждом процессе
+    callback_queue_path: str = "vk_callback_queue.db"
+    callback_workers: int = 4
+
+    # Рендер картинок историй: процессы пула и каталог кэша исходных картинок
+    story_render_workers: int = 2
+    story_image_cache_dir: str = "story_image_cache"
+
 settings = Settings()
 if not settings.vk_user_token or not settings.gemini_api_key:
     import warnings
@@ -26,7 +26,7 @@ from .post_crud import (
     delete_post_from_cache,
     get_all_data_for_project_ids,
     get_project_update_status,
-    get_all_publication_times_for_project,
+    get_publication_times_in_range,
 )
 
 from .system_post_crud import (
@@ -96,11 +96,12 @@ from .market_crud import (
 )
 
 # Новые импорты для списков (ПРЯМЫЕ ИМПОРТЫ ИЗ МОДУЛЕЙ)
-from .lists.meta import get_list_meta, update_list_meta
+from .lists.meta import get_list_meta, update_list_meta, increment_list_meta_counters
 from .lists.stats import get_list_stats_data
 from .lists.retrieval import get_subscribers, get_subscribers_count
 from .lists.subscribers import (
     get_all_subscriber_vk_ids,
+    get_subscriber_vk_ids_sorted,
     bulk_add_subscribers,
     bulk_delete_subscribers,
     bulk_update_subscriber_details,
@@ -117,6 +118,7 @@ from .lists.history import (
 )
 from .lists.posts import (
     bulk_upsert_posts,
+    filter_changed_posts,
     get_stored_posts_count,
     delete_all_posts # New
 )
@@ -125,6 +127,7 @@ from .lists.interactions import (
     bulk_upsert_interactions,
     get_all_interaction_vk_ids,
     bulk_update_interaction_users,
+    attach_interaction_post_ids,
     delete_all_interactions # New
 )
 from .lists.mailing import (
@@ -147,3 +150,9 @@ from .system_accounts.account_crud import (
     delete_account,
     get_active_account_tokens
 )
+
+# Общий кеш профилей VK (users.get)
+from .vk_profile_crud import (
+    get_fresh_vk_profiles,
+    upsert_vk_profiles
+)
@@ -12,6 +12,13 @@ def create_log(db: Session, log_data: dict):
     db.commit()
     return db_log
 
+def bulk_create_logs(db: Session, logs_data: List[dict]):
+    """Создает пачку записей лога одним INSERT (используется BatchLogWriter)."""
+    if not logs_data:
+        return
+    db.bulk_insert_mappings(models.AiTokenLog, logs_data)
+    db.commit()
+
 def _apply_filters(query, token_ids: Optional[List[str]], search_query: Optional[str], status: Optional[str]):
     """Вспомогательная функция для применения фильтров."""
     if token_ids:
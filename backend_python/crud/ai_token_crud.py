@@ -1,6 +1,6 @@
 
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Tuple
 import uuid
 
 import models
@@ -9,9 +9,23 @@ import schemas
 def get_all_tokens(db: Session) -> List[models.AiToken]:
     return db.query(models.AiToken).all()
 
+def get_token_entries(db: Session) -> List[Tuple[str, str, bool]]:
+    """
+    Возвращает (id, token, is_active) для пула ключей (services/token_pool.py).
+    Все ключи из таблицы считаются активными - так же, как раньше в gemini_api.client.
+    """
+    results = db.query(models.AiToken.id, models.AiToken.token).all()
+    return [(r[0], r[1], True) for r in results if r[1]]
+
+def _invalidate_token_pool():
+    # Отложенный импорт во избежание циклических зависимостей
+    from services.token_pool import ai_token_pool
+    ai_token_pool.invalidate()
+
 def delete_token(db: Session, token_id: str) -> bool:
     deleted_count = db.query(models.AiToken).filter(models.AiToken.id == token_id).delete()
     db.commit()
+    _invalidate_token_pool()
     return deleted_count > 0
 
 def update_tokens(db: Session, tokens_data: List[schemas.AiToken]):
@@ -45,3 +59,4 @@ def update_tokens(db: Session, tokens_data: List[schemas.AiToken]):
                 db_token.token = token_data.token
     
     db.commit()
+    _invalidate_token_pool()
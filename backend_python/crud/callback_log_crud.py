@@ -0,0 +1,10 @@
+from sqlalchemy.orm import Session
+from typing import List
+import models
+
+def bulk_create_logs(db: Session, logs_data: List[dict]):
+    """Создает пачку записей лога Callback API одним INSERT (используется BatchLogWriter)."""
+    if not logs_data:
+        return
+    db.bulk_insert_mappings(models.VkCallbackLog, logs_data)
+    db.commit()
@@ -0,0 +1,196 @@
+import io
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Sequence
+
+from sqlalchemy import text, and_, bindparam, update
+from sqlalchemy.orm import Session
+
+# ===================================================================
+# МАССОВЫЙ UPSERT ДЛЯ СИСТЕМНЫХ СПИСКОВ
+# ===================================================================
+# Раньше каждый CRUD списков делал одно и то же вручную:
+# SELECT существующих ключей чанками по 500-1000, затем bulk_insert_mappings
+# и bulk_update_mappings чанками по 100 с коммитом на каждый чанк.
+# Для сообщества на 100k участников это тысячи раундтрипов и коммитов.
+#
+# Движок выбирает путь по диалекту:
+# - PostgreSQL: строки потоком идут через COPY во временную таблицу,
+#   затем один INSERT ... SELECT ... ON CONFLICT (project_id, vk_user_id)
+#   (или UPDATE ... FROM для режима "только обновить").
+# - SQLite: executemany с INSERT ... ON CONFLICT внутри одной транзакции.
+#
+# Уникальный индекс (project_id, vk_user_id) на таблицах списков создается
+# миграцией (db_migrations/lists.py), поэтому отдельная чистка дубликатов
+# больше не нужна. Дубликаты внутри пакета схлопываются здесь же
+# (последняя запись побеждает).
+# ===================================================================
+
+CONFLICT_COLUMNS = ('project_id', 'vk_user_id')
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def _dedupe(rows: Iterable[Dict], key_columns: Sequence[str]) -> List[Dict]:
+    """Схлопывает строки с одинаковым ключом (последняя побеждает), сохраняя порядок."""
+    unique = {}
+    for row in rows:
+        unique[tuple(row[c] for c in key_columns)] = row
+    return list(unique.values())
+
+
+def _group_by_columns(rows: List[Dict]) -> List[List[Dict]]:
+    """
+    executemany и COPY требуют одинаковый набор колонок у всех строк.
+    Обычно пакет однороден, но для частичных обновлений группируем по набору ключей.
+    """
+    groups: Dict[tuple, List[Dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+    return list(groups.values())
+
+
+def _copy_value(value: Any) -> str:
+    """Значение для COPY в формате CSV: NULL - пустое поле без кавычек."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_to_temp_table(db: Session, table_name: str, columns: List[str], rows: List[Dict]) -> str:
+    """Создает временную таблицу с колонками целевой и заливает в нее строки через COPY."""
+    temp_table = f"tmp_upsert_{table_name}"
+    column_list = ', '.join(columns)
+    db.execute(text(f"DROP TABLE IF EXISTS {temp_table}"))
+    # Только нужные колонки с типами целевой таблицы, без ограничений (NOT NULL у PK и т.п.)
+    db.execute(text(
+        f"CREATE TEMP TABLE {temp_table} ON COMMIT DROP AS "
+        f"SELECT {column_list} FROM {table_name} WITH NO DATA"
+    ))
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_copy_value(row[c]) for c in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {temp_table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+    return temp_table
+
+
+def bulk_upsert(
+    db: Session,
+    model,
+    rows: List[Dict],
+    preserve_columns: Iterable[str] = (),
+    conflict_columns: Sequence[str] = CONFLICT_COLUMNS,
+):
+    """
+    Вставляет строки, а при конфликте по conflict_columns обновляет существующие.
+    preserve_columns - колонки, которые задаются только при вставке
+    (дата добавления, источник, данные анализа). Первичный ключ не обновляется никогда.
+    Все выполняется в одной транзакции.
+    """
+    if not rows:
+        return
+
+    rows = _dedupe(rows, conflict_columns)
+    table = model.__table__
+    primary_keys = {c.name for c in table.primary_key.columns}
+    skip_on_update = set(preserve_columns) | primary_keys | set(conflict_columns)
+    dialect = _dialect(db)
+
+    try:
+        for group in _group_by_columns(rows):
+            columns = list(group[0].keys())
+            update_columns = [c for c in columns if c not in skip_on_update]
+
+            if dialect == 'postgresql':
+                temp_table = _copy_to_temp_table(db, table.name, columns, group)
+                column_list = ', '.join(columns)
+                if update_columns:
+                    set_clause = ', '.join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+                    on_conflict = f"DO UPDATE SET {set_clause}"
+                else:
+                    on_conflict = "DO NOTHING"
+                db.execute(text(
+                    f"INSERT INTO {table.name} ({column_list}) "
+                    f"SELECT {column_list} FROM {temp_table} "
+                    f"ON CONFLICT ({', '.join(conflict_columns)}) {on_conflict}"
+                ))
+            else:
+                from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+                stmt = sqlite_insert(table)
+                if update_columns:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=list(conflict_columns),
+                        set_={c: stmt.excluded[c] for c in update_columns}
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+                db.connection().execute(stmt, group)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def bulk_update_by_key(
+    db: Session,
+    model,
+    rows: List[Dict],
+    key_columns: Sequence[str] = CONFLICT_COLUMNS,
+):
+    """
+    Обновляет существующие строки по ключу (по умолчанию project_id + vk_user_id).
+    Отсутствующие в таблице ключи пропускаются - новых строк не создается.
+    Обновляются только колонки, переданные в строке.
+    """
+    if not rows:
+        return
+
+    rows = _dedupe(rows, key_columns)
+    table = model.__table__
+    dialect = _dialect(db)
+
+    try:
+        for group in _group_by_columns(rows):
+            columns = list(group[0].keys())
+            update_columns = [c for c in columns if c not in key_columns and c not in ('id',)]
+            if not update_columns:
+                continue
+
+            if dialect == 'postgresql':
+                temp_table = _copy_to_temp_table(db, table.name, columns, group)
+                set_clause = ', '.join(f"{c} = src.{c}" for c in update_columns)
+                match_clause = ' AND '.join(f"dst.{c} = src.{c}" for c in key_columns)
+                db.execute(text(
+                    f"UPDATE {table.name} AS dst SET {set_clause} "
+                    f"FROM {temp_table} AS src WHERE {match_clause}"
+                ))
+            else:
+                # Имена параметров с префиксом, чтобы не конфликтовать с колонками в SET
+                stmt = update(table).where(
+                    and_(*[table.c[c] == bindparam(f"key_{c}") for c in key_columns])
+                ).values({c: bindparam(f"val_{c}") for c in update_columns})
+                params = [
+                    {**{f"key_{c}": row[c] for c in key_columns},
+                     **{f"val_{c}": row[c] for c in update_columns}}
+                    for row in group
+                ]
+                db.connection().execute(stmt, params)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
@@ -1,9 +1,16 @@
 
+from sqlalchemy import String, and_, cast, func, literal, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List, Dict, Optional, Any
-import json
 import models
 from .retrieval import get_subscribers
+from .bulk_upsert import bulk_upsert, bulk_update_by_key
+
+# Ключ ребра взаимодействия = первичный ключ system_list_interaction_edges
+EDGE_KEY_COLUMNS = ('project_id', 'type', 'vk_user_id', 'vk_post_id')
+# Пользователей на один UPDATE пересчета счетчиков (лимит параметров SQLite)
+COUNTERS_CHUNK = 500
 
 def get_interactions(
     db: Session, 
@@ -37,104 +44,107 @@ def get_interactions(
         filter_age
     )
 
+def _interaction_model(list_type: str):
+    if list_type == 'likes': return models.SystemListLikes
+    if list_type == 'comments': return models.SystemListComments
+    if list_type == 'reposts': return models.SystemListReposts
+    return None
+
 def bulk_upsert_interactions(db: Session, project_id: str, list_type: str, items: List[Dict]):
     """
     Upsert логика для взаимодействий.
-    Если пользователь уже есть в списке - обновляем. Если нет - создаем.
+    items - профили пользователей, у каждого post_dates: {vk_post_id: дата поста}.
+    1. Взаимодействия пишутся ребрами (пользователь, пост) в system_list_interaction_edges:
+       повторная запись того же ребра ничего не меняет, объединять JSON-списки не нужно.
+    2. Профили - один upsert по (project_id, vk_user_id).
+    3. interaction_count, last_interaction_date и last_post_id затронутых пользователей
+       пересчитываются агрегатом по ребрам.
     """
     if not items: return
 
-    if list_type == 'likes': model = models.SystemListLikes
-    elif list_type == 'comments': model = models.SystemListComments
-    elif list_type == 'reposts': model = models.SystemListReposts
-    else: return
+    model = _interaction_model(list_type)
+    if model is None: return
 
-    # 1. Получаем существующих пользователей из этого пакета
-    vk_ids = [i['vk_user_id'] for i in items]
-    
-    # Разбиваем запрос на получение существующих записей
-    existing_records = []
-    FETCH_CHUNK = 500
-    for i in range(0, len(vk_ids), FETCH_CHUNK):
-        chunk_ids = vk_ids[i:i + FETCH_CHUNK]
-        chunk_records = db.query(model).filter(
-            model.project_id == project_id,
-            model.vk_user_id.in_(chunk_ids)
-        ).all()
-        existing_records.extend(chunk_records)
-    
-    existing_map = {r.vk_user_id: r for r in existing_records}
-    
-    new_records = []
-    updates = []
-    
+    edges = []
+    rows = []
     for item in items:
-        existing = existing_map.get(item['vk_user_id'])
-        
-        # Парсим новые post_ids
-        try:
-            new_post_ids = set(json.loads(item['post_ids']))
-        except Exception:
-            new_post_ids = set()
-        
-        # ВАЖНО: last_interaction_date приходит как объект datetime из сервиса
-        new_date = item['last_interaction_date']
-
-        if existing:
-            # Merge Logic
-            try:
-                current_post_ids = set(json.loads(existing.post_ids))
-            except:
-                current_post_ids = set()
-            
-            merged_post_ids = current_post_ids.union(new_post_ids)
-            
-            update_payload = {
-                "id": existing.id,
-                "last_interaction_date": max(existing.last_interaction_date, new_date),
-                "last_post_id": item['last_post_id'] if new_date >= existing.last_interaction_date else existing.last_post_id,
-                "interaction_count": len(merged_post_ids),
-                "post_ids": json.dumps(list(merged_post_ids)),
-                # Обновляем базовые поля
-                "first_name": item.get('first_name', existing.first_name),
-                "last_name": item.get('last_name', existing.last_name),
-                "photo_url": item.get('photo_url', existing.photo_url),
-                "sex": item.get('sex', existing.sex),
-            }
-            
-            # Обновляем расширенные поля, если они есть в новых данных
-            # Проверяем наличие ключа в словаре item.
-            # Если ключа нет, не трогаем существующее значение.
-            if 'city' in item: update_payload['city'] = item['city']
-            if 'country' in item: update_payload['country'] = item['country']
-            if 'bdate' in item: update_payload['bdate'] = item['bdate']
-            if 'domain' in item: update_payload['domain'] = item['domain']
-            if 'has_mobile' in item: update_payload['has_mobile'] = item['has_mobile']
-            if 'last_seen' in item: update_payload['last_seen'] = item['last_seen']
-            if 'platform' in item: update_payload['platform'] = item['platform']
-            if 'deactivated' in item: update_payload['deactivated'] = item['deactivated']
-            if 'is_closed' in item: update_payload['is_closed'] = item['is_closed']
-            if 'can_access_closed' in item: update_payload['can_access_closed'] = item['can_access_closed']
-
-            updates.append(update_payload)
-        else:
-            # New Record
-            item['interaction_count'] = len(new_post_ids)
-            new_records.append(item)
-
-    CHUNK_SIZE = 100
-
-    if updates:
-        for i in range(0, len(updates), CHUNK_SIZE):
-            chunk = updates[i:i + CHUNK_SIZE]
-            db.bulk_update_mappings(model, chunk)
-            db.commit()
-    
-    if new_records:
-        for i in range(0, len(new_records), CHUNK_SIZE):
-            chunk = new_records[i:i + CHUNK_SIZE]
-            db.bulk_insert_mappings(model, chunk)
-            db.commit()
+        row = item.copy()
+        post_dates = row.pop('post_dates', None) or {}
+        for vk_post_id, post_date in post_dates.items():
+            edges.append({
+                'project_id': project_id,
+                'type': list_type,
+                'vk_user_id': item['vk_user_id'],
+                'vk_post_id': vk_post_id,
+                'date': post_date
+            })
+        row['interaction_count'] = len(post_dates)
+        rows.append(row)
+
+    bulk_upsert(db, models.SystemListInteractionEdge, edges, conflict_columns=EDGE_KEY_COLUMNS)
+    # Поля активности задаются при вставке, для существующих строк их пересчитывает агрегат ниже
+    bulk_upsert(db, model, rows, preserve_columns=('interaction_count', 'last_interaction_date', 'last_post_id'))
+    refresh_interaction_counters(db, project_id, list_type, [r['vk_user_id'] for r in rows])
+
+def refresh_interaction_counters(db: Session, project_id: str, list_type: str, vk_user_ids: List[int]):
+    """
+    Пересчитывает interaction_count, last_interaction_date и last_post_id
+    пользователей списка одним UPDATE с коррелированными подзапросами по ребрам
+    (каждый подзапрос - поиск по первичному ключу ребер).
+    """
+    model = _interaction_model(list_type)
+    if model is None or not vk_user_ids: return
+
+    table = model.__table__
+    edge = models.SystemListInteractionEdge.__table__
+    user_edges = and_(
+        edge.c.project_id == project_id,
+        edge.c.type == list_type,
+        edge.c.vk_user_id == table.c.vk_user_id
+    )
+    # ID поста списка - "<project_id>_<vk_post_id>" (как в SystemListPost.id)
+    last_post_id = select(literal(f"{project_id}_") + cast(edge.c.vk_post_id, String))\
+        .where(user_edges)\
+        .order_by(edge.c.date.desc().nulls_last(), edge.c.vk_post_id.desc())\
+        .limit(1)\
+        .scalar_subquery()
+
+    try:
+        for i in range(0, len(vk_user_ids), COUNTERS_CHUNK):
+            chunk = vk_user_ids[i:i + COUNTERS_CHUNK]
+            db.execute(
+                update(table)
+                .where(table.c.project_id == project_id, table.c.vk_user_id.in_(chunk))
+                .values(
+                    interaction_count=select(func.count()).select_from(edge).where(user_edges).scalar_subquery(),
+                    last_interaction_date=select(func.max(edge.c.date)).where(user_edges).scalar_subquery(),
+                    last_post_id=last_post_id
+                )
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def attach_interaction_post_ids(db: Session, project_id: str, list_type: str, items: List[Any]):
+    """
+    Заполняет post_ids ("История активности" в UI) у страницы пользователей из ребер.
+    Значение выставляется без пометки объекта измененным - в БД ничего не пишется.
+    """
+    if not items or _interaction_model(list_type) is None: return
+
+    edge = models.SystemListInteractionEdge
+    post_ids_map = {item.vk_user_id: [] for item in items}
+    rows = db.query(edge.vk_user_id, edge.vk_post_id).filter(
+        edge.project_id == project_id,
+        edge.type == list_type,
+        edge.vk_user_id.in_(list(post_ids_map.keys()))
+    ).order_by(edge.date.desc().nulls_last()).all()
+    for vk_user_id, vk_post_id in rows:
+        post_ids_map[vk_user_id].append(vk_post_id)
+
+    for item in items:
+        set_committed_value(item, 'post_ids', post_ids_map.get(item.vk_user_id, []))
 
 def get_all_interaction_vk_ids(db: Session, project_id: str, list_type: str) -> List[int]:
     """Получает все VK ID пользователей из списка взаимодействий."""
@@ -155,52 +165,30 @@ def bulk_update_interaction_users(db: Session, project_id: str, list_type: str,
     elif list_type == 'reposts': model = models.SystemListReposts
     else: return
 
-    vk_ids = [u['vk_user_id'] for u in updates]
-    
-    # Чанкинг для SELECT
-    vk_to_pk_map = {}
-    FETCH_CHUNK = 1000
-    for i in range(0, len(vk_ids), FETCH_CHUNK):
-        chunk_ids = vk_ids[i:i + FETCH_CHUNK]
-        records = db.query(model.id, model.vk_user_id).filter(
-            model.project_id == project_id,
-            model.vk_user_id.in_(chunk_ids)
-        ).all()
-        for r in records:
-            vk_to_pk_map[r.vk_user_id] = r.id
-    
     final_updates = []
     for u in updates:
-        pk = vk_to_pk_map.get(u['vk_user_id'])
-        if pk:
-            payload = {"id": pk}
-            # Обновляем все поля, которые пришли
-            # Используем .get() для безопасности, но предполагаем, что ключи есть в словаре updates
-            if 'first_name' in u: payload['first_name'] = u['first_name']
-            if 'last_name' in u: payload['last_name'] = u['last_name']
-            if 'sex' in u: payload['sex'] = u['sex']
-            if 'photo_url' in u: payload['photo_url'] = u['photo_url']
-            if 'deactivated' in u: payload['deactivated'] = u['deactivated']
-            if 'last_seen' in u: payload['last_seen'] = u['last_seen']
-            if 'platform' in u: payload['platform'] = u['platform']
-            
-            # Новые поля
-            if 'city' in u: payload['city'] = u['city']
-            if 'country' in u: payload['country'] = u['country']
-            if 'bdate' in u: payload['bdate'] = u['bdate']
-            if 'domain' in u: payload['domain'] = u['domain']
-            if 'has_mobile' in u: payload['has_mobile'] = u['has_mobile']
-            if 'is_closed' in u: payload['is_closed'] = u['is_closed']
-            if 'can_access_closed' in u: payload['can_access_closed'] = u['can_access_closed']
-
-            final_updates.append(payload)
-
-    if final_updates:
-        CHUNK_SIZE = 100
-        for i in range(0, len(final_updates), CHUNK_SIZE):
-            chunk = final_updates[i:i + CHUNK_SIZE]
-            db.bulk_update_mappings(model, chunk)
-            db.commit()
+        payload = {"project_id": project_id, "vk_user_id": u['vk_user_id']}
+        # Обновляем все поля, которые пришли
+        if 'first_name' in u: payload['first_name'] = u['first_name']
+        if 'last_name' in u: payload['last_name'] = u['last_name']
+        if 'sex' in u: payload['sex'] = u['sex']
+        if 'photo_url' in u: payload['photo_url'] = u['photo_url']
+        if 'deactivated' in u: payload['deactivated'] = u['deactivated']
+        if 'last_seen' in u: payload['last_seen'] = u['last_seen']
+        if 'platform' in u: payload['platform'] = u['platform']
+
+        # Новые поля
+        if 'city' in u: payload['city'] = u['city']
+        if 'country' in u: payload['country'] = u['country']
+        if 'bdate' in u: payload['bdate'] = u['bdate']
+        if 'domain' in u: payload['domain'] = u['domain']
+        if 'has_mobile' in u: payload['has_mobile'] = u['has_mobile']
+        if 'is_closed' in u: payload['is_closed'] = u['is_closed']
+        if 'can_access_closed' in u: payload['can_access_closed'] = u['can_access_closed']
+
+        final_updates.append(payload)
+
+    bulk_update_by_key(db, model, final_updates)
 
 def delete_all_interactions(db: Session, project_id: str, list_type: str):
     """Полное удаление взаимодействий."""
@@ -210,4 +198,8 @@ def delete_all_interactions(db: Session, project_id: str, list_type: str):
     else: return
     
     db.query(model).filter(model.project_id == project_id).delete(synchronize_session=False)
+    db.query(models.SystemListInteractionEdge).filter(
+        models.SystemListInteractionEdge.project_id == project_id,
+        models.SystemListInteractionEdge.type == list_type
+    ).delete(synchronize_session=False)
     db.commit()
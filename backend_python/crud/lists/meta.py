@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from typing import Dict
 import models
 
@@ -26,4 +27,20 @@ def update_list_meta(db: Session, project_id: str, updates: Dict):
     meta = get_list_meta(db, project_id)
     for key, value in updates.items():
         setattr(meta, key, value)
-    db.commit()
\ No newline at end of file
+    db.commit()
+def increment_list_meta_counters(db: Session, project_id: str, increments: Dict[str, int], updates: Dict = None):
+    """
+    Атомарно изменяет счетчики (count = count + delta) одним UPDATE.
+    Используется для дельт из Callback API, которые могут приходить параллельно.
+    """
+    get_list_meta(db, project_id)  # гарантируем наличие записи
+    values = {
+        getattr(models.ProjectListMeta, key): func.coalesce(getattr(models.ProjectListMeta, key), 0) + delta
+        for key, delta in increments.items()
+    }
+    for key, value in (updates or {}).items():
+        values[getattr(models.ProjectListMeta, key)] = value
+    db.query(models.ProjectListMeta).filter(
+        models.ProjectListMeta.project_id == project_id
+    ).update(values, synchronize_session=False)
+    db.commit()
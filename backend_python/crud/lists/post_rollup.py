@@ -0,0 +1,119 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import Date, DateTime, Integer, cast, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+import models
+
+# ===================================================================
+# ДНЕВНЫЕ АГРЕГАТЫ ПОСТОВ (system_list_post_daily_stats)
+# ===================================================================
+# Статистика постов за широкий период (год, "все время") раньше читала
+# каждый пост периода. Теперь синхронизация постов после записи пачки
+# пересчитывает агрегаты затронутых дней одним INSERT ... SELECT ...
+# GROUP BY, а статистика суммирует дни (crud/lists/stats_posts.py).
+#
+# Дни считаются по UTC - так же, как ключи графика статистики.
+# ===================================================================
+
+METRIC_COLUMNS = ('likes_count', 'comments_count', 'reposts_count', 'views_count')
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def utc_day(value: Optional[datetime]) -> Optional[date]:
+    """День UTC для даты поста. Даты без пояса (SQLite) считаются UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.date()
+    return value.astimezone(timezone.utc).date()
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def bucket_start(dialect: str, column, unit: str):
+    """
+    SQL-выражение начала бакета (day/month/quarter/year) по UTC для GROUP BY.
+    PostgreSQL - date_trunc (datetime), SQLite - строка 'YYYY-MM-DD'.
+    """
+    is_date = isinstance(column.type, Date)
+    if dialect == 'postgresql':
+        value = cast(column, DateTime()) if is_date else func.timezone('UTC', column)
+        return func.date_trunc(unit, value)
+    if unit == 'day':
+        return func.date(column)
+    if unit == 'month':
+        return func.strftime('%Y-%m-01', column)
+    if unit == 'year':
+        return func.strftime('%Y-01-01', column)
+    quarter_month = (cast(func.strftime('%m', column), Integer) - 1) // 3 * 3 + 1
+    # date() возвращает NULL для поста без даты (printf дал бы '-00-01')
+    return func.date(func.printf('%s-%02d-01', func.strftime('%Y', column), quarter_month))
+
+
+def refresh_post_daily_stats(
+    db: Session,
+    project_id: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+):
+    """
+    Пересчитывает агрегаты проекта за дни с date_from по date_to (включительно).
+    Без границ - за все время. Дни, в которых не осталось постов, удаляются.
+    """
+    post = models.SystemListPost
+    daily = models.SystemListPostDailyStats
+    dialect = _dialect(db)
+    day_from, day_to = utc_day(date_from), utc_day(date_to)
+
+    delete_query = db.query(daily).filter(daily.project_id == project_id)
+    post_filters = [post.project_id == project_id, post.date.isnot(None)]
+    if day_from:
+        delete_query = delete_query.filter(daily.day >= day_from)
+        post_filters.append(post.date >= day_start(day_from))
+    if day_to:
+        delete_query = delete_query.filter(daily.day <= day_to)
+        post_filters.append(post.date < day_start(day_to + timedelta(days=1)))
+
+    if dialect == 'postgresql':
+        day_expr = cast(func.timezone('UTC', post.date), Date)
+    else:
+        day_expr = func.date(post.date)
+    aggregates = select(
+        literal(project_id),
+        day_expr,
+        func.count(),
+        *[func.coalesce(func.sum(getattr(post, c)), 0) for c in METRIC_COLUMNS]
+    ).where(*post_filters).group_by(day_expr)
+    target_columns = ['project_id', 'day', 'posts_count', *METRIC_COLUMNS]
+
+    try:
+        delete_query.delete(synchronize_session=False)
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+            stmt = pg_insert(daily.__table__).from_select(target_columns, aggregates)
+            # Параллельная синхронизация того же проекта могла уже вставить день
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['project_id', 'day'],
+                set_={c: stmt.excluded[c] for c in target_columns[2:]}
+            )
+        else:
+            stmt = insert(daily.__table__).from_select(target_columns, aggregates)
+        db.execute(stmt)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def delete_post_daily_stats(db: Session, project_id: str):
+    db.query(models.SystemListPostDailyStats).filter(
+        models.SystemListPostDailyStats.project_id == project_id
+    ).delete(synchronize_session=False)
+    db.commit()
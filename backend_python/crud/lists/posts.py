@@ -2,6 +2,7 @@
 from sqlalchemy.orm import Session
 from typing import List, Dict
 import models
+from .post_rollup import refresh_post_daily_stats, delete_post_daily_stats
 
 def bulk_upsert_posts(db: Session, posts: List[Dict]):
     if not posts: return
@@ -21,6 +22,41 @@ def bulk_upsert_posts(db: Session, posts: List[Dict]):
         db.bulk_insert_mappings(models.SystemListPost, chunk)
         db.commit()
 
+    # Дневные агрегаты для статистики: пересчитываем дни, которые покрывает пачка
+    dates_by_project = {}
+    for p in posts:
+        if p.get('date') and p.get('project_id'):
+            dates_by_project.setdefault(p['project_id'], []).append(p['date'])
+    for project_id, dates in dates_by_project.items():
+        refresh_post_daily_stats(db, project_id, min(dates), max(dates))
+
+def filter_changed_posts(db: Session, posts: List[Dict]) -> List[Dict]:
+    """
+    Оставляет только записи, которых нет в таблице или которые отличаются от сохраненных
+    (текст, статистика и т.д.). Позволяет не переписывать неизмененные посты при каждом обновлении.
+    """
+    if not posts: return []
+    columns = [models.SystemListPost.__table__.c[key] for key in posts[0].keys()]
+    stored = {}
+    CHUNK_SIZE_SELECT = 500
+    for i in range(0, len(posts), CHUNK_SIZE_SELECT):
+        chunk_ids = [p['id'] for p in posts[i:i + CHUNK_SIZE_SELECT]]
+        for row in db.query(*columns).filter(models.SystemListPost.id.in_(chunk_ids)):
+            stored[row.id] = row._asdict()
+
+    def _same(entry: Dict, row: Dict) -> bool:
+        for key, value in entry.items():
+            current = row.get(key)
+            # SQLite возвращает даты без часового пояса
+            if hasattr(value, 'tzinfo') and hasattr(current, 'tzinfo') and current is not None and value is not None:
+                if value.replace(tzinfo=None) != current.replace(tzinfo=None):
+                    return False
+            elif current != value:
+                return False
+        return True
+
+    return [p for p in posts if p['id'] not in stored or not _same(p, stored[p['id']])]
+
 def get_stored_posts_count(db: Session, project_id: str) -> int:
     return db.query(models.SystemListPost).filter(models.SystemListPost.project_id == project_id).count()
 
@@ -30,3 +66,4 @@ def delete_all_posts(db: Session, project_id: str):
         models.SystemListPost.project_id == project_id
     ).delete(synchronize_session=False)
     db.commit()
+    delete_post_daily_stats(db, project_id)
@@ -7,7 +7,8 @@ from typing import Dict
 def get_gender_stats(db: Session, model, project_id: str) -> Dict[str, int]:
     stats = {"male": 0, "female": 0, "unknown": 0}
     try:
-        gender_counts = db.query(model.sex, func.count(model.id)).filter(model.project_id == project_id).group_by(model.sex).all()
+        # count(*) вместо count(id): запрос покрывается индексом (project_id, sex) без чтения таблицы
+        gender_counts = db.query(model.sex, func.count()).filter(model.project_id == project_id).group_by(model.sex).all()
         for sex, count in gender_counts:
             if sex == 1: stats["female"] = count
             elif sex == 2: stats["male"] = count
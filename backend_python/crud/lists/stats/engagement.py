@@ -0,0 +1,83 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_
+from datetime import datetime
+from typing import Dict, Optional
+import models
+
+# Строк в топах активных пользователей и постов
+TOP_LIMIT = 10
+
+def _edges_query(db: Session, columns: list, project_id: str, list_type: str, start_date: Optional[datetime], end_date: Optional[datetime]):
+    """Запрос по ребрам взаимодействий одного типа за период (по дате поста)."""
+    edge = models.SystemListInteractionEdge
+    query = db.query(*columns).filter(edge.project_id == project_id, edge.type == list_type)
+    if start_date:
+        query = query.filter(edge.date >= start_date)
+    if end_date:
+        query = query.filter(edge.date <= end_date)
+    return query
+
+def get_interaction_stats(
+    db: Session,
+    model,
+    project_id: str,
+    list_type: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict:
+    """
+    Вовлеченность по спискам взаимодействий: тоталы, топ активных пользователей
+    и топ постов. Все считается агрегатами SQL по system_list_interaction_edges.
+    """
+    edge = models.SystemListInteractionEdge
+
+    total, engaged_users, engaged_posts = _edges_query(
+        db,
+        [func.count(), func.count(func.distinct(edge.vk_user_id)), func.count(func.distinct(edge.vk_post_id))],
+        project_id, list_type, start_date, end_date
+    ).one()
+
+    result = {
+        "total_interactions": total or 0,
+        "engaged_users": engaged_users or 0,
+        "engaged_posts": engaged_posts or 0,
+        "avg_per_user": round(total / engaged_users, 2) if engaged_users else 0,
+        "top_engagers": [],
+        "top_posts": []
+    }
+    if not total:
+        return result
+
+    # 1. Топ активных: GROUP BY vk_user_id по первичному ключу ребер, профиль - из таблицы списка
+    user_count = func.count().label('interactions')
+    top_users = _edges_query(db, [edge.vk_user_id, user_count], project_id, list_type, start_date, end_date)\
+        .group_by(edge.vk_user_id)\
+        .order_by(user_count.desc(), edge.vk_user_id)\
+        .limit(TOP_LIMIT)\
+        .subquery()
+    rows = db.query(top_users.c.vk_user_id, top_users.c.interactions, model.first_name, model.last_name, model.photo_url)\
+        .outerjoin(model, and_(model.project_id == project_id, model.vk_user_id == top_users.c.vk_user_id))\
+        .order_by(top_users.c.interactions.desc(), top_users.c.vk_user_id)\
+        .all()
+    result["top_engagers"] = [
+        {"vk_user_id": r.vk_user_id, "first_name": r.first_name, "last_name": r.last_name, "photo_url": r.photo_url, "count": r.interactions}
+        for r in rows
+    ]
+
+    # 2. Топ постов: GROUP BY vk_post_id по индексу (project_id, type, vk_post_id)
+    post_count = func.count().label('interactions')
+    top_posts = _edges_query(db, [edge.vk_post_id, post_count], project_id, list_type, start_date, end_date)\
+        .group_by(edge.vk_post_id)\
+        .order_by(post_count.desc(), edge.vk_post_id.desc())\
+        .limit(TOP_LIMIT)\
+        .subquery()
+    post = models.SystemListPost
+    rows = db.query(top_posts.c.vk_post_id, top_posts.c.interactions, post.vk_link)\
+        .outerjoin(post, and_(post.project_id == project_id, post.vk_post_id == top_posts.c.vk_post_id))\
+        .order_by(top_posts.c.interactions.desc(), top_posts.c.vk_post_id.desc())\
+        .all()
+    result["top_posts"] = [
+        {"vk_post_id": r.vk_post_id, "vk_link": r.vk_link, "count": r.interactions}
+        for r in rows
+    ]
+    return result
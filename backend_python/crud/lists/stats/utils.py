@@ -1,4 +1,6 @@
 
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 import models
 
 def get_model_by_list_type(list_type: str):
@@ -19,3 +21,19 @@ def get_model_by_list_type(list_type: str):
         return models.SystemListAuthor
     else:
         return models.SystemListSubscriber
+
+def resolve_period(period: str, date_from: Optional[str] = None, date_to: Optional[str] = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Границы периода статистики (week/month/quarter/year/custom). None - без ограничения."""
+    now = datetime.now(timezone.utc)
+    if period == 'custom' and date_from and date_to:
+        try:
+            # Принимаем YYYY-MM-DD, добавляем время для полного охвата
+            start_date = datetime.strptime(date_from, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            end_date = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)
+            return start_date, end_date
+        except ValueError:
+            return None, None
+    days = {'week': 7, 'month': 30, 'quarter': 90, 'year': 365}.get(period)
+    if days:
+        return now - timedelta(days=days), None
+    return None, None
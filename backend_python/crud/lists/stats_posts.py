@@ -1,13 +1,202 @@
-
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
-from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta, timezone
 import models
+from .stats.utils import resolve_period
+from .post_rollup import bucket_start, day_start, utc_day
+
+# Тоталы, средние и график считаются GROUP BY по бакетам периода в SQL,
+# топы - ORDER BY ... LIMIT 1. Посты в Python не загружаются.
+# Для широких периодов полные дни берутся из дневных агрегатов
+# (system_list_post_daily_stats), из постов - только неполные крайние дни.
+
+# Период от стольких дней читается из дневных агрегатов
+ROLLUP_MIN_DAYS = 60
+
+METRICS = ('likes', 'comments', 'reposts', 'views')
+
+# Бакет SQL для группировки графика: неделя собирается из дней,
+# т.к. ключ графика ('%Y-W%W') не совпадает с неделей date_trunc
+_SQL_UNIT = {'day': 'day', 'week': 'day', 'month': 'month', 'quarter': 'quarter', 'year': 'year'}
+
+
+def _get_chart_key(dt: datetime, g_by: str) -> str:
+    """Ключ графика для даты (группировка по X)."""
+    if g_by == 'day':
+        return dt.strftime('%Y-%m-%d')
+    elif g_by == 'week':
+        # ISO week
+        return dt.strftime('%Y-W%W')
+    elif g_by == 'month':
+        return dt.strftime('%Y-%m')
+    elif g_by == 'quarter':
+        # Custom quarter format YYYY-Qq
+        quarter = (dt.month - 1) // 3 + 1
+        return f"{dt.year}-Q{quarter}"
+    elif g_by == 'year':
+        return dt.strftime('%Y')
+    return dt.strftime('%Y-%m') # Default
+
+
+def _empty_point(key: str) -> Dict:
+    return {"date": key, "count": 0, "likes": 0, "comments": 0, "reposts": 0, "views": 0}
+
+
+def _bucket_datetime(value) -> Optional[datetime]:
+    """Начало бакета из SQL: datetime (PostgreSQL) или строка 'YYYY-MM-DD' (SQLite)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d')
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _post_buckets(db: Session, project_id: str, unit: str, *conditions) -> List[tuple]:
+    """Строки (начало бакета, число постов, лайки, комментарии, репосты, просмотры) из постов."""
+    post = models.SystemListPost
+    bucket = bucket_start(db.get_bind().dialect.name, post.date, unit)
+    return db.query(
+        bucket,
+        func.count(),
+        *[func.coalesce(func.sum(getattr(post, f"{m}_count")), 0) for m in METRICS]
+    ).filter(post.project_id == project_id, *conditions).group_by(bucket).all()
+
+
+def _rollup_buckets(db: Session, project_id: str, unit: str, day_from: Optional[date], day_before: Optional[date]) -> List[tuple]:
+    """То же из дневных агрегатов за дни [day_from, day_before)."""
+    daily = models.SystemListPostDailyStats
+    bucket = bucket_start(db.get_bind().dialect.name, daily.day, unit)
+    query = db.query(
+        bucket,
+        func.coalesce(func.sum(daily.posts_count), 0),
+        *[func.coalesce(func.sum(getattr(daily, f"{m}_count")), 0) for m in METRICS]
+    ).filter(daily.project_id == project_id)
+    if day_from:
+        query = query.filter(daily.day >= day_from)
+    if day_before:
+        query = query.filter(daily.day < day_before)
+    return query.group_by(bucket).all()
+
+
+def _collect_buckets(db: Session, project_id: str, unit: str, start_date: Optional[datetime], end_date: Optional[datetime]) -> List[tuple]:
+    post = models.SystemListPost
+    span = (end_date or datetime.now(timezone.utc)) - start_date if start_date else None
+    if span is not None and span < timedelta(days=ROLLUP_MIN_DAYS):
+        conditions = [post.date >= start_date]
+        if end_date:
+            conditions.append(post.date <= end_date)
+        return _post_buckets(db, project_id, unit, *conditions)
+
+    # Полные дни - из агрегатов, неполные первый и последний день - из постов
+    rows = []
+    full_from = None
+    if start_date:
+        full_from = utc_day(start_date)
+        if day_start(full_from) < start_date:
+            full_from += timedelta(days=1)
+            rows += _post_buckets(db, project_id, unit, post.date >= start_date, post.date < day_start(full_from))
+    else:
+        # Посты без даты агрегаты не учитывают, а в тоталы "за все время" они входят
+        rows += _post_buckets(db, project_id, unit, post.date.is_(None))
+    full_before = None
+    if end_date:
+        full_before = utc_day(end_date)
+        rows += _post_buckets(db, project_id, unit, post.date >= day_start(full_before), post.date <= end_date)
+    rows += _rollup_buckets(db, project_id, unit, full_from, full_before)
+    return rows
+
+
+def _get_top(db: Session, project_id: str, start_date: Optional[datetime], end_date: Optional[datetime], metric: str) -> Optional[Dict]:
+    post = models.SystemListPost
+    column = getattr(post, f"{metric}_count")
+    query = db.query(post.vk_post_id, post.vk_link, column).filter(post.project_id == project_id, column > 0)
+    if start_date:
+        query = query.filter(post.date >= start_date)
+    if end_date:
+        query = query.filter(post.date <= end_date)
+    # При равенстве - самый ранний пост
+    top = query.order_by(column.desc(), post.date.asc()).first()
+    if not top:
+        return None
+    return {"id": str(top[0]), "vk_link": top[1], "value": top[2]}
+
+
+def _fill_gaps(chart_map: Dict[str, Dict], group_by: str, start_date: Optional[datetime], end_date: Optional[datetime]) -> List[Dict]:
+    """Заполнение пропусков (gap filling) нулевыми точками для дней и месяцев."""
+    # Для custom range используем границы выбора, если они заданы, иначе границы данных
+    sorted_keys = sorted(chart_map.keys())
+
+    fill_start_dt = None
+    fill_end_dt = None
+
+    # Пытаемся определить границы заполнения
+    try:
+        if group_by == 'day':
+            # Если выбран custom диапазон, заполняем от него. Иначе от первого поста.
+            if start_date:
+                fill_start_dt = start_date
+            else:
+                fill_start_dt = datetime.strptime(sorted_keys[0], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+            if end_date:
+                fill_end_dt = end_date
+            else:
+                fill_end_dt = datetime.strptime(sorted_keys[-1], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+        elif group_by == 'month':
+            if start_date:
+                fill_start_dt = start_date.replace(day=1)
+            else:
+                fill_start_dt = datetime.strptime(sorted_keys[0], '%Y-%m').replace(tzinfo=timezone.utc)
+
+            if end_date:
+                fill_end_dt = end_date
+            else:
+                fill_end_dt = datetime.strptime(sorted_keys[-1], '%Y-%m').replace(tzinfo=timezone.utc)
+    except Exception as e:
+        print(f"Date parsing for gap filling error: {e}")
+
+    filled_chart_map = chart_map.copy()
+
+    try:
+        if fill_start_dt and fill_end_dt and fill_start_dt <= fill_end_dt:
+            curr = fill_start_dt
+
+            if group_by == 'day':
+                while curr <= fill_end_dt:
+                    k = curr.strftime('%Y-%m-%d')
+                    if k not in filled_chart_map:
+                        filled_chart_map[k] = _empty_point(k)
+                    curr += timedelta(days=1)
+
+            elif group_by == 'month':
+                # Нормализуем end_dt до начала месяца для корректного сравнения в цикле
+                end_norm = fill_end_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                curr_norm = curr.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+                while curr_norm <= end_norm:
+                    k = curr_norm.strftime('%Y-%m')
+                    if k not in filled_chart_map:
+                        filled_chart_map[k] = _empty_point(k)
+
+                    # Increment month
+                    if curr_norm.month == 12:
+                        curr_norm = curr_norm.replace(year=curr_norm.year + 1, month=1)
+                    else:
+                        curr_norm = curr_norm.replace(month=curr_norm.month + 1)
+    except Exception as e:
+        print(f"Gap filling loop error: {e}")
+
+    return sorted(list(filled_chart_map.values()), key=lambda x: x['date'])
+
 
 def get_post_stats(
-    db: Session, 
-    project_id: str, 
-    period: str = 'all', 
+    db: Session,
+    project_id: str,
+    period: str = 'all',
     group_by: str = 'month',
     date_from: Optional[str] = None,
     date_to: Optional[str] = None
@@ -15,40 +204,29 @@ def get_post_stats(
     """
     Агрегирует статистику по постам: тоталы, средние, топы и данные для графика.
     """
-    # Базовый запрос
-    query = db.query(models.SystemListPost).filter(models.SystemListPost.project_id == project_id)
-    
-    # Фильтрация по периоду
-    now = datetime.now(timezone.utc)
-    start_date = None
-    end_date = None
-    
-    if period == 'custom' and date_from and date_to:
-        try:
-            # Принимаем YYYY-MM-DD, добавляем время для полного охвата
-            start_date = datetime.strptime(date_from, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            end_date = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)
-        except ValueError:
-            pass
-    elif period != 'all':
-        if period == 'week':
-            start_date = now - timedelta(days=7)
-        elif period == 'month':
-            start_date = now - timedelta(days=30)
-        elif period == 'quarter':
-            start_date = now - timedelta(days=90)
-        elif period == 'year':
-            start_date = now - timedelta(days=365)
-    
-    if start_date:
-        query = query.filter(models.SystemListPost.date >= start_date)
-    if end_date:
-            query = query.filter(models.SystemListPost.date <= end_date)
-    
-    all_posts = query.order_by(models.SystemListPost.date.asc()).all()
-    
-    total_count = len(all_posts)
-    
+    start_date, end_date = resolve_period(period, date_from, date_to)
+    unit = _SQL_UNIT.get(group_by, 'month')
+
+    # 1. Бакеты графика; тоталы - их сумма (посты без даты - в бакете None)
+    totals = {"count": 0, **{m: 0 for m in METRICS}}
+    chart_map = {}
+    for bucket, count, *sums in _collect_buckets(db, project_id, unit, start_date, end_date):
+        if not count:
+            continue
+        totals["count"] += count
+        for m, value in zip(METRICS, sums):
+            totals[m] += int(value)
+
+        bucket_dt = _bucket_datetime(bucket)
+        if bucket_dt is None:
+            continue
+        key = _get_chart_key(bucket_dt, group_by)
+        entry = chart_map.setdefault(key, _empty_point(key))
+        entry["count"] += count
+        for m, value in zip(METRICS, sums):
+            entry[m] += int(value)
+
+    total_count = totals["count"]
     if total_count == 0:
         return {
             "post_stats": {
@@ -58,144 +236,26 @@ def get_post_stats(
             }
         }
 
-    # 1. Totals
-    t_likes = sum(p.likes_count for p in all_posts)
-    t_comments = sum(p.comments_count for p in all_posts)
-    t_reposts = sum(p.reposts_count for p in all_posts)
-    t_views = sum(p.views_count for p in all_posts)
-
-    # 2. Averages
-    avg_likes = t_likes / total_count
-    avg_comments = t_comments / total_count
-    avg_reposts = t_reposts / total_count
-    avg_views = t_views / total_count
-
-    # 3. Tops
-    def get_top(attr):
-        top_post = max(all_posts, key=lambda x: getattr(x, attr))
-        val = getattr(top_post, attr)
-        return {"id": str(top_post.vk_post_id), "vk_link": top_post.vk_link, "value": val} if val > 0 else None
-
-    # 4. Chart Data (Group by X)
-    chart_map = {} 
-
-    # Функция получения ключа для группировки
-    def get_chart_key(dt: datetime, g_by: str) -> str:
-        if g_by == 'day':
-            return dt.strftime('%Y-%m-%d')
-        elif g_by == 'week':
-            # ISO week
-            return dt.strftime('%Y-W%W')
-        elif g_by == 'month':
-            return dt.strftime('%Y-%m')
-        elif g_by == 'quarter':
-            # Custom quarter format YYYY-Qq
-            quarter = (dt.month - 1) // 3 + 1
-            return f"{dt.year}-Q{quarter}"
-        elif g_by == 'year':
-            return dt.strftime('%Y')
-        return dt.strftime('%Y-%m') # Default
-
-    for p in all_posts:
-        if not p.date: continue
-        
-        key = get_chart_key(p.date, group_by)
-        
-        if key not in chart_map:
-            chart_map[key] = {"date": key, "count": 0, "likes": 0, "comments": 0, "reposts": 0, "views": 0}
-        
-        entry = chart_map[key]
-        entry["count"] += 1
-        entry["likes"] += p.likes_count
-        entry["comments"] += p.comments_count
-        entry["reposts"] += p.reposts_count
-        entry["views"] += p.views_count
-
-    # --- ЗАПОЛНЕНИЕ ПРОПУСКОВ (GAP FILLING) ---
-    if chart_map:
-        # Для custom range используем границы выбора, если они заданы, иначе границы данных
-        sorted_keys = sorted(chart_map.keys())
-        
-        fill_start_dt = None
-        fill_end_dt = None
-
-        # Пытаемся определить границы заполнения
-        try:
-            if group_by == 'day':
-                # Если выбран custom диапазон, заполняем от него. Иначе от первого поста.
-                if start_date:
-                    fill_start_dt = start_date
-                else:
-                    fill_start_dt = datetime.strptime(sorted_keys[0], '%Y-%m-%d').replace(tzinfo=timezone.utc)
-                
-                if end_date:
-                        fill_end_dt = end_date
-                else:
-                        fill_end_dt = datetime.strptime(sorted_keys[-1], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    # 2. Tops
+    tops = {m: _get_top(db, project_id, start_date, end_date, m) for m in METRICS}
 
-            elif group_by == 'month':
-                if start_date:
-                        fill_start_dt = start_date.replace(day=1)
-                else:
-                    fill_start_dt = datetime.strptime(sorted_keys[0], '%Y-%m').replace(tzinfo=timezone.utc)
-                
-                if end_date:
-                    fill_end_dt = end_date
-                else:
-                    fill_end_dt = datetime.strptime(sorted_keys[-1], '%Y-%m').replace(tzinfo=timezone.utc)
-        except Exception as e:
-            print(f"Date parsing for gap filling error: {e}")
-
-        
-        filled_chart_map = chart_map.copy()
-
-        try:
-            if fill_start_dt and fill_end_dt and fill_start_dt <= fill_end_dt:
-                curr = fill_start_dt
-                
-                if group_by == 'day':
-                    while curr <= fill_end_dt:
-                        k = curr.strftime('%Y-%m-%d')
-                        if k not in filled_chart_map:
-                            filled_chart_map[k] = {"date": k, "count": 0, "likes": 0, "comments": 0, "reposts": 0, "views": 0}
-                        curr += timedelta(days=1)
-                        
-                elif group_by == 'month':
-                    # Нормализуем end_dt до начала месяца для корректного сравнения в цикле
-                    end_norm = fill_end_dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                    curr_norm = curr.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                    
-                    while curr_norm <= end_norm:
-                        k = curr_norm.strftime('%Y-%m')
-                        if k not in filled_chart_map:
-                            filled_chart_map[k] = {"date": k, "count": 0, "likes": 0, "comments": 0, "reposts": 0, "views": 0}
-                        
-                        # Increment month
-                        if curr_norm.month == 12:
-                            curr_norm = curr_norm.replace(year=curr_norm.year + 1, month=1)
-                        else:
-                            curr_norm = curr_norm.replace(month=curr_norm.month + 1)
-        except Exception as e:
-            print(f"Gap filling loop error: {e}")
-        
-        chart_data = sorted(list(filled_chart_map.values()), key=lambda x: x['date'])
-    else:
-        chart_data = []
+    # 3. Chart Data (с заполнением пропусков)
+    chart_data = _fill_gaps(chart_map, group_by, start_date, end_date) if chart_map else []
 
     return {
         "post_stats": {
-            "total_likes": t_likes,
-            "total_comments": t_comments,
-            "total_reposts": t_reposts,
-            "total_views": t_views,
-            "avg_likes": round(avg_likes, 1),
-            "avg_comments": round(avg_comments, 1),
-            "avg_reposts": round(avg_reposts, 1),
-            "avg_views": round(avg_views, 1),
-            "top_likes": get_top('likes_count'),
-            "top_comments": get_top('comments_count'),
-            "top_reposts": get_top('reposts_count'),
-            "top_views": get_top('views_count'),
+            "total_likes": totals["likes"],
+            "total_comments": totals["comments"],
+            "total_reposts": totals["reposts"],
+            "total_views": totals["views"],
+            "avg_likes": round(totals["likes"] / total_count, 1),
+            "avg_comments": round(totals["comments"] / total_count, 1),
+            "avg_reposts": round(totals["reposts"] / total_count, 1),
+            "avg_views": round(totals["views"] / total_count, 1),
+            "top_likes": tops["likes"],
+            "top_comments": tops["comments"],
+            "top_reposts": tops["reposts"],
+            "top_views": tops["views"],
             "chart_data": chart_data
         }
     }
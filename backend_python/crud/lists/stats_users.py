@@ -3,11 +3,12 @@ from sqlalchemy.orm import Session
 from typing import Dict, Optional
 
 # Импорт новых модулей
-from .stats.utils import get_model_by_list_type
+from .stats.utils import get_model_by_list_type, resolve_period
 from .stats.core import get_core_counts
 from .stats.demographics import get_gender_stats, get_geo_stats, get_age_and_bdate_stats
 from .stats.technical import get_platform_stats, get_online_stats
 from .stats.mailing import get_mailing_specific_stats
+from .stats.engagement import get_interaction_stats
 
 def get_user_stats(
     db: Session, 
@@ -48,7 +49,8 @@ def get_user_stats(
         "last_contact_stats": None,
         "lifetime_stats": None,
         "mailing_chart_data": [],
-        "mailing_stats": None
+        "mailing_stats": None,
+        "interaction_stats": None
     }
 
     if stats["total_users"] == 0:
@@ -74,4 +76,9 @@ def get_user_stats(
         )
         stats.update(mailing_data)
 
+    # 6. Вовлеченность (лайки/комментарии/репосты) - агрегаты по ребрам взаимодействий
+    if list_type in ('likes', 'comments', 'reposts'):
+        start_date, end_date = resolve_period(period, date_from, date_to)
+        stats["interaction_stats"] = get_interaction_stats(db, model, project_id, list_type, start_date, end_date)
+
     return stats
@@ -3,11 +3,12 @@
 # нескольких модулей из пакета `crud.lists`.
 # Это обеспечивает обратную совместимость для остальной части приложения.
 
-from .lists.meta import get_list_meta, update_list_meta
+from .lists.meta import get_list_meta, update_list_meta, increment_list_meta_counters
 from .lists.stats import get_list_stats_data
 from .lists.retrieval import get_subscribers, get_subscribers_count
 from .lists.subscribers import (
     get_all_subscriber_vk_ids,
+    get_subscriber_vk_ids_sorted,
     bulk_add_subscribers,
     bulk_delete_subscribers,
     bulk_update_subscriber_details,
@@ -24,6 +25,7 @@ from .lists.history import (
 )
 from .lists.posts import (
     bulk_upsert_posts,
+    filter_changed_posts,
     get_stored_posts_count,
     delete_all_posts # New
 )
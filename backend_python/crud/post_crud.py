@@ -1,10 +1,12 @@
 from sqlalchemy.orm import Session, subqueryload
 from sqlalchemy import func
 import json
+import hashlib
 from collections import defaultdict
 from datetime import datetime, timezone, timedelta
 
 import models
+from models_library.types import parse_iso_datetime
 from schemas import ScheduledPost, SystemPost, SuggestedPost, Note
 
 # ===============================================
@@ -30,38 +32,70 @@ def get_suggested_post_counts(db: Session) -> dict[str, int]:
     results = db.query(models.SuggestedPost.projectId, func.count(models.SuggestedPost.postId)).group_by(models.SuggestedPost.projectId).all()
     return {project_id: count for project_id, count in results}
     
-def replace_published_posts(db: Session, project_id: str, posts: list[dict], timestamp: str):
-    # 1. Очищаем связи тегов для старых постов этого проекта
-    posts_subquery = db.query(models.Post.id).filter(models.Post.projectId == project_id).subquery()
-    db.execute(
-        models.published_post_tags_association.delete().where(
-            models.published_post_tags_association.c.post_id.in_(posts_subquery)
-        )
-    )
-    
-    # 2. Удаляем старые посты текущего проекта
-    db.query(models.Post).filter(models.Post.projectId == project_id).delete(synchronize_session=False)
+def _post_row_fields(p: dict) -> dict:
+    """Колонки поста в том виде, в каком они хранятся в БД."""
+    return {
+        "date": p['date'],
+        "text": p['text'],
+        "images": json.dumps(p['images']),
+        "attachments": json.dumps(p.get('attachments', [])),
+        "vkPostUrl": p.get('vkPostUrl'),
+    }
 
-    if posts:
-        # 3. FIX: Агрессивная очистка конфликтов. 
+def _post_content_hash(fields: dict) -> str:
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+def _sync_posts(db: Session, model, association, project_id: str, posts: list[dict], timestamp: str) -> dict:
+    """
+    Приводит посты проекта к переданному списку, записывая только разницу:
+    новые вставляются, измененные (по хешу содержимого) обновляются, пропавшие удаляются.
+    Неизмененные строки не трогаются - сохраняются их теги и tags_hash.
+    Возвращает набор изменений {"added": [...], "changed": [...], "removed": [...]} (ID постов).
+    """
+    incoming = {p['id']: p for p in posts}
+    existing = {row.id: row for row in db.query(model).filter(model.projectId == project_id).all()}
+
+    added, changed = [], []
+    for post_id, p in incoming.items():
+        fields = _post_row_fields(p)
+        row = existing.get(post_id)
+        if row is None:
+            added.append(post_id)
+            continue
+        stored = {key: getattr(row, key) for key in fields}
+        if _post_content_hash(stored) != _post_content_hash(fields):
+            for key, value in fields.items():
+                setattr(row, key, value)
+            row._lastUpdated = timestamp
+            changed.append(post_id)
+
+    removed = [post_id for post_id in existing if post_id not in incoming]
+
+    if removed:
+        # 1. Связи тегов и сами пропавшие посты
+        db.execute(association.delete().where(association.c.post_id.in_(removed)))
+        db.query(model).filter(model.id.in_(removed)).delete(synchronize_session=False)
+
+    if added:
+        # 2. FIX: Агрессивная очистка конфликтов. 
         # Если в базе есть посты с такими же ID (от других проектов или мусор), удаляем их, 
         # чтобы избежать IntegrityError при вставке. Кэш "захватывается" текущим проектом.
-        new_ids = [p['id'] for p in posts]
-        db.query(models.Post).filter(models.Post.id.in_(new_ids)).delete(synchronize_session=False)
+        db.query(model).filter(model.id.in_(added)).delete(synchronize_session=False)
 
-        new_db_posts = [models.Post(
-            id=p['id'],
+        db.add_all([model(
+            id=post_id,
             projectId=project_id,
-            date=p['date'],
-            text=p['text'],
-            images=json.dumps(p['images']),
-            attachments=json.dumps(p.get('attachments', [])),
-            vkPostUrl=p.get('vkPostUrl'),
-            tags=p.get('tags', []),
-            _lastUpdated=timestamp
-        ) for p in posts]
-        db.add_all(new_db_posts)
+            tags=incoming[post_id].get('tags', []),
+            _lastUpdated=timestamp,
+            **_post_row_fields(incoming[post_id])
+        ) for post_id in added])
+
     db.commit()
+    return {"added": added, "changed": changed, "removed": removed}
+
+def replace_published_posts(db: Session, project_id: str, posts: list[dict], timestamp: str) -> dict:
+    """Синхронизирует опубликованные посты проекта (см. _sync_posts). Возвращает набор изменений."""
+    return _sync_posts(db, models.Post, models.published_post_tags_association, project_id, posts, timestamp)
 
 def upsert_published_posts(db: Session, project_id: str, posts: list[dict], timestamp: str) -> bool:
     """
@@ -133,36 +167,9 @@ def upsert_published_posts(db: Session, project_id: str, posts: list[dict], time
     db.commit()
     return has_changes
 
-def replace_scheduled_posts(db: Session, project_id: str, posts: list[dict], timestamp: str):
-    # 1. Очищаем связи тегов
-    posts_subquery = db.query(models.ScheduledPost.id).filter(models.ScheduledPost.projectId == project_id).subquery()
-    db.execute(
-        models.scheduled_post_tags_association.delete().where(
-            models.scheduled_post_tags_association.c.post_id.in_(posts_subquery)
-        )
-    )
-
-    # 2. Удаляем старые посты текущего проекта
-    db.query(models.ScheduledPost).filter(models.ScheduledPost.projectId == project_id).delete(synchronize_session=False)
-
-    if posts:
-        # 3. FIX: Агрессивная очистка конфликтов для отложенных постов
-        new_ids = [p['id'] for p in posts]
-        db.query(models.ScheduledPost).filter(models.ScheduledPost.id.in_(new_ids)).delete(synchronize_session=False)
-
-        new_db_posts = [models.ScheduledPost(
-            id=p['id'],
-            projectId=project_id,
-            date=p['date'],
-            text=p['text'],
-            images=json.dumps(p['images']),
-            attachments=json.dumps(p.get('attachments', [])),
-            vkPostUrl=p.get('vkPostUrl'),
-            tags=p.get('tags', []),
-            _lastUpdated=timestamp
-        ) for p in posts]
-        db.add_all(new_db_posts)
-    db.commit()
+def replace_scheduled_posts(db: Session, project_id: str, posts: list[dict], timestamp: str) -> dict:
+    """Синхронизирует отложенные посты проекта (см. _sync_posts). Возвращает набор изменений."""
+    return _sync_posts(db, models.ScheduledPost, models.scheduled_post_tags_association, project_id, posts, timestamp)
 
 def replace_suggested_posts(db: Session, project_id: str, posts: list[dict], timestamp: str):
     db.query(models.SuggestedPost).filter(models.SuggestedPost.projectId == project_id).delete()
@@ -239,15 +246,32 @@ def delete_post_from_cache(db: Session, post_id: str, is_published: bool):
 # BULK READ & UTILS
 # ===============================================
 
-def get_all_publication_times_for_project(db: Session, project_id: str) -> set[str]:
-    """Возвращает набор всех временных слотов (отложенных VK и системных) для проекта."""
-    scheduled_times = db.query(models.ScheduledPost.date).filter(models.ScheduledPost.projectId == project_id).all()
-    system_times = db.query(models.SystemPost.publication_date).filter(models.SystemPost.project_id == project_id).all()
-    
-    # all() возвращает список кортежей, например [('date1',), ('date2',)], поэтому извлекаем первый элемент
-    all_times = {time[0] for time in scheduled_times}
-    all_times.update({time[0] for time in system_times})
-    
+def get_publication_times_in_range(db: Session, project_id: str, start: datetime, end: datetime) -> set[datetime]:
+    """
+    Занятые временные слоты проекта (отложенные VK и системные) в диапазоне [start, end).
+    Запросы по индексам (project_id, дата) вместо выборки всех дат проекта.
+    """
+    system_times = db.query(models.SystemPost.publication_date).filter(
+        models.SystemPost.project_id == project_id,
+        models.SystemPost.publication_date >= start,
+        models.SystemPost.publication_date < end
+    ).all()
+
+    # ScheduledPost.date - строка 'YYYY-MM-DDTHH:MM:SS[.mmm]Z', границы сравниваются лексически
+    start_str = start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+    end_str = end.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+    scheduled_times = db.query(models.ScheduledPost.date).filter(
+        models.ScheduledPost.projectId == project_id,
+        models.ScheduledPost.date >= start_str,
+        models.ScheduledPost.date < end_str
+    ).all()
+
+    all_times = set()
+    for (value,) in list(system_times) + list(scheduled_times):
+        try:
+            all_times.add(parse_iso_datetime(value))
+        except (TypeError, ValueError):
+            continue
     return all_times
 
 def get_all_data_for_project_ids(db: Session, project_ids: list[str]) -> dict:
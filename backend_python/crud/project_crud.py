@@ -64,8 +64,11 @@ def update_project_settings(db: Session, project_data: Project) -> models.Projec
 
 import services.update_tracker as update_tracker
 
-def update_project_last_update_time(db: Session, project_id: str, update_type: str, timestamp: str):
-    """Обновляет время последнего обновления для проекта."""
+def update_project_last_update_time(db: Session, project_id: str, update_type: str, timestamp: str, notify: bool = True):
+    """
+    Обновляет время последнего обновления для проекта.
+    notify=False - не уведомлять фронтенд (данные не изменились).
+    """
     project = get_project_by_id(db, project_id)
     if project:
         if update_type == 'published':
@@ -76,6 +79,8 @@ def update_project_last_update_time(db: Session, project_id: str, update_type: s
             project.last_market_update = timestamp
         
         db.commit()
+        if not notify:
+            return
         # NOTIFY FRONTEND via Update Tracker
         try:
              update_tracker.add_updated_project(project_id)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Tuple
 import models
 
 def get_all_accounts(db: Session) -> List[models.SystemAccount]:
@@ -17,11 +17,29 @@ def get_active_account_tokens(db: Session) -> List[str]:
     ).all()
     return [r[0] for r in results if r[0]]
 
+def get_account_token_entries(db: Session) -> List[Tuple[str, str, bool]]:
+    """
+    Возвращает (id, token, is_active) для всех аккаунтов с токеном.
+    Используется пулом токенов (services/token_pool.py).
+    """
+    results = db.query(
+        models.SystemAccount.id,
+        models.SystemAccount.token,
+        models.SystemAccount.status
+    ).filter(models.SystemAccount.token.isnot(None)).all()
+    return [(r[0], r[1], r[2] == 'active') for r in results if r[1]]
+
+def _invalidate_token_pool():
+    # Отложенный импорт во избежание циклических зависимостей
+    from services.token_pool import system_token_pool
+    system_token_pool.invalidate()
+
 def create_accounts(db: Session, accounts: List[Dict]):
     if not accounts:
         return
     db.bulk_insert_mappings(models.SystemAccount, accounts)
     db.commit()
+    _invalidate_token_pool()
 
 def update_account(db: Session, account_id: str, updates: Dict) -> models.SystemAccount:
     account = db.query(models.SystemAccount).filter(models.SystemAccount.id == account_id).first()
@@ -30,9 +48,11 @@ def update_account(db: Session, account_id: str, updates: Dict) -> models.System
             setattr(account, key, value)
         db.commit()
         db.refresh(account)
+        _invalidate_token_pool()
     return account
 
 def delete_account(db: Session, account_id: str) -> bool:
     result = db.query(models.SystemAccount).filter(models.SystemAccount.id == account_id).delete()
     db.commit()
+    _invalidate_token_pool()
     return result > 0
\ No newline at end of file
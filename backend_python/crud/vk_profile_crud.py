@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from .lists.bulk_upsert import bulk_upsert
+
+# Размер IN (...) при чтении кеша профилей
+PROFILES_LOOKUP_CHUNK = 1000
+
+
+def get_fresh_vk_profiles(db: Session, vk_ids: List[int], min_fetched_at: datetime) -> Dict[int, Tuple[Dict, datetime]]:
+    """Профили из кеша, загруженные не раньше min_fetched_at: {vk_user_id: (профиль users.get, fetched_at)}."""
+    profiles = {}
+    for i in range(0, len(vk_ids), PROFILES_LOOKUP_CHUNK):
+        chunk = vk_ids[i:i + PROFILES_LOOKUP_CHUNK]
+        rows = db.query(
+            models.VkUserProfile.vk_user_id,
+            models.VkUserProfile.profile,
+            models.VkUserProfile.fetched_at
+        ).filter(
+            models.VkUserProfile.vk_user_id.in_(chunk),
+            models.VkUserProfile.fetched_at >= min_fetched_at
+        ).all()
+        for row in rows:
+            try:
+                profiles[row.vk_user_id] = (json.loads(row.profile), row.fetched_at)
+            except (TypeError, ValueError):
+                continue
+    return profiles
+
+
+def upsert_vk_profiles(db: Session, profiles: Iterable[Dict], fetched_at: datetime):
+    """Сохраняет свежезагруженные профили (последняя загрузка побеждает)."""
+    rows = [
+        {
+            'vk_user_id': p['id'],
+            'profile': json.dumps(p, ensure_ascii=False),
+            'fetched_at': fetched_at
+        }
+        for p in profiles if p.get('id')
+    ]
+    bulk_upsert(db, models.VkUserProfile, rows, conflict_columns=('vk_user_id',))
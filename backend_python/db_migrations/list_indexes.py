@@ -0,0 +1,100 @@
+from sqlalchemy import Engine
+from .utils import check_and_create_index
+
+# ===================================================================
+# СОСТАВНЫЕ И ЧАСТИЧНЫЕ ИНДЕКСЫ ДЛЯ СИСТЕМНЫХ СПИСКОВ
+# ===================================================================
+# Модели списков индексируют project_id и vk_user_id по отдельности, а все
+# горячие запросы фильтруют по project_id и дальше сортируют/фильтруют по
+# дате, last_seen, sex или deactivated:
+# - services/lists/retrieval/fetchers.py: WHERE project_id = ? [фильтры]
+#   ORDER BY <дата> DESC NULLS LAST LIMIT ... OFFSET ...
+# - services/lists/retrieval/filters.py: deactivated, sex, last_seen >= ?
+# - crud/lists/stats/*: COUNT/GROUP BY sex, deactivated в рамках проекта.
+#
+# Уникальный индекс (project_id, vk_user_id) создается миграцией 50
+# (db_migrations/lists.py) вместе с чисткой дубликатов.
+#
+# Проверка, что планировщик действительно использует индексы:
+#   python scripts/benchmark_list_indexes.py
+# ===================================================================
+
+# Таблица -> колонка даты, по которой сортируется список в UI
+LIST_DATE_COLUMNS = {
+    'system_list_subscribers': 'added_at',
+    'system_list_history_join': 'event_date',
+    'system_list_history_leave': 'event_date',
+    'system_list_mailing': 'last_message_date',
+    'system_list_authors': 'event_date',
+    'system_list_likes': 'last_interaction_date',
+    'system_list_comments': 'last_interaction_date',
+    'system_list_reposts': 'last_interaction_date',
+}
+
+# Короткие имена для индексов (ограничение длины имени в PostgreSQL - 63 символа)
+_SHORT_NAMES = {
+    'system_list_subscribers': 'subs',
+    'system_list_history_join': 'hjoin',
+    'system_list_history_leave': 'hleave',
+    'system_list_mailing': 'mailing',
+    'system_list_authors': 'authors',
+    'system_list_likes': 'likes',
+    'system_list_comments': 'comments',
+    'system_list_reposts': 'reposts',
+}
+
+
+def _desc(column: str, is_sqlite: bool) -> str:
+    # В SQLite NULL меньше любых значений, поэтому DESC уже означает NULLS LAST.
+    # В PostgreSQL для DESC по умолчанию NULLS FIRST - указываем явно, как в ORDER BY.
+    return f"{column} DESC" if is_sqlite else f"{column} DESC NULLS LAST"
+
+
+def get_list_index_definitions(is_sqlite: bool) -> list:
+    """
+    Описания индексов: (таблица, имя, колонки, условие частичного индекса).
+    Вынесено в функцию, чтобы бенчмарк проверял ровно то, что создает миграция.
+    """
+    definitions = []
+
+    for table, date_column in LIST_DATE_COLUMNS.items():
+        short = _SHORT_NAMES[table]
+        date_desc = _desc(date_column, is_sqlite)
+
+        # Основная страница списка: WHERE project_id = ? ORDER BY <дата> DESC
+        definitions.append((table, f"ix_{short}_project_date", ['project_id', date_desc], None))
+        # Фильтр "Активные" (самый частый) + та же сортировка
+        definitions.append((table, f"ix_{short}_project_date_active", ['project_id', date_desc], "deactivated IS NULL"))
+        # Фильтры/счетчики "Заблокированные" и "Удаленные" - малая доля строк
+        definitions.append((table, f"ix_{short}_project_deactivated", ['project_id', 'deactivated'], "deactivated IS NOT NULL"))
+        # Фильтр "Был в сети" (last_seen >= ?)
+        definitions.append((table, f"ix_{short}_project_last_seen", ['project_id', 'last_seen'], None))
+        # Фильтр и диаграмма по полу
+        definitions.append((table, f"ix_{short}_project_sex", ['project_id', 'sex'], None))
+
+    # Рассылка: фильтр "Можно писать" со стандартной сортировкой и график первых сообщений.
+    # Условие совпадает с тем, как SQLAlchemy рендерит .is_(True) - иначе SQLite не применит индекс.
+    allowed = "can_access_closed IS 1" if is_sqlite else "can_access_closed IS TRUE"
+    definitions.append((
+        'system_list_mailing', "ix_mailing_project_date_allowed",
+        ['project_id', _desc('last_message_date', is_sqlite)], allowed
+    ))
+    definitions.append((
+        'system_list_mailing', "ix_mailing_project_first_message",
+        ['project_id', 'first_message_date'], None
+    ))
+
+    # Посты списка: сортировка по дате публикации
+    definitions.append((
+        'system_list_posts', "ix_list_posts_project_date",
+        ['project_id', _desc('date', is_sqlite)], None
+    ))
+
+    return definitions
+
+
+def migrate(engine: Engine):
+    """Миграция 52: Составные и частичные индексы системных списков."""
+    is_sqlite = 'sqlite' in engine.url.drivername
+    for table, index_name, columns, where in get_list_index_definitions(is_sqlite):
+        check_and_create_index(engine, table, index_name, columns, where=where)
@@ -1,15 +1,18 @@
 
-from sqlalchemy import Engine, inspect
-from .utils import check_and_add_column
+import json
+from sqlalchemy import Engine, bindparam, inspect, text
+from .utils import check_and_add_column, check_and_create_index
 from models import (
     ProjectListMeta,
     SystemListSubscriber,
     SystemListHistoryJoin,
     SystemListHistoryLeave,
     SystemListPost,
+    SystemListPostDailyStats,
     SystemListLikes,
     SystemListComments,
     SystemListReposts,
+    SystemListInteractionEdge,
     SystemListMailing,
     SystemListAuthor # NEW
 )
@@ -159,3 +162,143 @@ def migrate(engine: Engine):
     # TIMESTAMP и BIGINT для Postgres
     check_and_add_column(engine, 'system_list_mailing', 'first_message_date', 'TIMESTAMP')
     check_and_add_column(engine, 'system_list_mailing', 'first_message_from_id', 'BIGINT')
+
+    # Миграция 50: Уникальный индекс (project_id, vk_user_id) на таблицах пользователей списков.
+    # Нужен как цель ON CONFLICT для массового upsert (crud/lists/bulk_upsert.py).
+    # Перед созданием индекса один раз удаляем накопившиеся дубликаты и пересчитываем счетчики.
+    user_list_tables = {
+        'system_list_subscribers': 'subscribers_count',
+        'system_list_history_join': 'history_join_count',
+        'system_list_history_leave': 'history_leave_count',
+        'system_list_mailing': 'mailing_count',
+        'system_list_authors': 'authors_count',
+        'system_list_likes': 'likes_count',
+        'system_list_comments': 'comments_count',
+        'system_list_reposts': 'reposts_count',
+    }
+    for table, meta_field in user_list_tables.items():
+        index_name = f"uq_{table}_project_user"
+        if not inspector.has_table(table):
+            continue
+        if index_name in {i['name'] for i in inspect(engine).get_indexes(table)}:
+            continue
+        _remove_duplicate_users(engine, table, meta_field)
+        check_and_create_index(engine, table, index_name, ['project_id', 'vk_user_id'], unique=True)
+
+    # Миграция 51: Время последней дельты подписчиков из Callback API
+    check_and_add_column(engine, 'project_list_meta', 'subscribers_delta_at', 'VARCHAR')
+
+    # Миграция 57: Таблица ребер взаимодействий (пользователь, пост, тип) вместо JSON post_ids.
+    # Существующие post_ids переносятся в ребра, после переноса колонка в строке обнуляется.
+    if not inspector.has_table("system_list_interaction_edges"):
+        print("Table 'system_list_interaction_edges' not found. Creating it...")
+        SystemListInteractionEdge.__table__.create(engine)
+        print("Table 'system_list_interaction_edges' created successfully.")
+    _backfill_interaction_edges(engine)
+
+    # Миграция 59: Дневные агрегаты постов для статистики по широким периодам.
+    # Пустая таблица при сохраненных постах заполняется по ним.
+    if not inspector.has_table("system_list_post_daily_stats"):
+        print("Table 'system_list_post_daily_stats' not found. Creating it...")
+        SystemListPostDailyStats.__table__.create(engine)
+        print("Table 'system_list_post_daily_stats' created successfully.")
+    _backfill_post_daily_stats(engine)
+
+
+def _remove_duplicate_users(engine: Engine, table: str, meta_field: str):
+    """Оставляет одну запись на (project_id, vk_user_id) и обновляет счетчик в project_list_meta."""
+    try:
+        with engine.connect() as connection:
+            result = connection.execute(text(
+                f"DELETE FROM {table} WHERE id NOT IN ("
+                f"SELECT MIN(id) FROM {table} GROUP BY project_id, vk_user_id)"
+            ))
+            deleted = result.rowcount or 0
+            if deleted:
+                connection.execute(text(
+                    f"UPDATE project_list_meta SET {meta_field} = ("
+                    f"SELECT COUNT(*) FROM {table} WHERE {table}.project_id = project_list_meta.project_id)"
+                ))
+            connection.commit()
+        if deleted:
+            print(f"Removed {deleted} duplicate entries from '{table}'.")
+    except Exception as e:
+        print(f"Error removing duplicates from '{table}': {e}")
+
+
+BACKFILL_CHUNK = 2000
+
+
+def _backfill_interaction_edges(engine: Engine):
+    """
+    Переносит JSON post_ids из system_list_likes/comments/reposts в system_list_interaction_edges.
+    Обрабатывает строки с непустым post_ids чанками и обнуляет их в той же транзакции,
+    поэтому прерванный перенос продолжится при следующем запуске.
+    Дата ребра (дата поста) берется из system_list_posts.
+    """
+    insert_edges = text(
+        "INSERT INTO system_list_interaction_edges (project_id, type, vk_user_id, vk_post_id) "
+        "VALUES (:project_id, :type, :vk_user_id, :vk_post_id) ON CONFLICT DO NOTHING"
+    )
+    moved = 0
+    try:
+        for list_type in ('likes', 'comments', 'reposts'):
+            table = f"system_list_{list_type}"
+            clear_rows = text(f"UPDATE {table} SET post_ids = NULL WHERE id IN :ids").bindparams(
+                bindparam('ids', expanding=True)
+            )
+            while True:
+                with engine.connect() as connection:
+                    rows = connection.execute(
+                        text(f"SELECT id, project_id, vk_user_id, post_ids FROM {table} WHERE post_ids IS NOT NULL LIMIT :limit"),
+                        {"limit": BACKFILL_CHUNK}
+                    ).fetchall()
+                    if not rows:
+                        break
+                    edges = []
+                    for row in rows:
+                        try:
+                            post_ids = set(json.loads(row.post_ids) or [])
+                        except (ValueError, TypeError):
+                            post_ids = set()
+                        edges.extend(
+                            {"project_id": row.project_id, "type": list_type, "vk_user_id": row.vk_user_id, "vk_post_id": post_id}
+                            for post_id in post_ids
+                        )
+                    if edges:
+                        connection.execute(insert_edges, edges)
+                    connection.execute(clear_rows, {"ids": [row.id for row in rows]})
+                    connection.commit()
+                    moved += len(edges)
+
+        if moved:
+            with engine.connect() as connection:
+                connection.execute(text(
+                    "UPDATE system_list_interaction_edges SET date = ("
+                    "SELECT p.date FROM system_list_posts p "
+                    "WHERE p.project_id = system_list_interaction_edges.project_id "
+                    "AND p.vk_post_id = system_list_interaction_edges.vk_post_id LIMIT 1) "
+                    "WHERE date IS NULL"
+                ))
+                connection.commit()
+            print(f"Moved {moved} interactions from post_ids into 'system_list_interaction_edges'.")
+    except Exception as e:
+        print(f"Error moving interactions into 'system_list_interaction_edges': {e}")
+
+
+def _backfill_post_daily_stats(engine: Engine):
+    """Считает дневные агрегаты для всех проектов с сохраненными постами, если таблица агрегатов пуста."""
+    from sqlalchemy.orm import Session
+    from crud.lists.post_rollup import refresh_post_daily_stats
+
+    try:
+        with Session(engine) as db:
+            if db.query(SystemListPostDailyStats.project_id).first() is not None:
+                return
+            project_ids = [row[0] for row in db.query(SystemListPost.project_id).distinct()]
+            for project_id in project_ids:
+                refresh_post_daily_stats(db, project_id)
+        if project_ids:
+            print(f"Filled 'system_list_post_daily_stats' for {len(project_ids)} projects.")
+    except Exception as e:
+        print(f"Error filling 'system_list_post_daily_stats': {e}")
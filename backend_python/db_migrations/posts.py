@@ -1,7 +1,123 @@
+import re
 
-from sqlalchemy import Engine, inspect
-from .utils import check_and_add_column
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.sql import sqltypes
+from .utils import check_and_add_column, check_and_create_index
 from models import SystemPost
+from models_library.types import parse_iso_date, parse_iso_datetime
+
+# recurrence_end_date - только дата, см. _convert_recurrence_end_date
+SYSTEM_POST_DATE_COLUMNS = ('publication_date',)
+# Значение уже в формате хранения DateTime SQLite
+SQLITE_DATETIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+# Значение уже в формате хранения Date SQLite
+SQLITE_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def _sqlite_datetime(raw):
+    """ISO-строка -> формат хранения DateTime в SQLite (UTC). Некорректное значение -> NULL."""
+    try:
+        return parse_iso_datetime(raw).replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f')
+    except Exception:
+        print(f"  -> Cannot parse date '{raw}', setting NULL")
+        return None
+
+
+def _convert_system_post_dates(engine: Engine):
+    """
+    Миграция 55: даты системных постов из ISO-строк в TIMESTAMP WITH TIME ZONE.
+    PostgreSQL - ALTER COLUMN ... TYPE, SQLite (тип колонки не меняется) -
+    перезапись значений в формат хранения DateTime.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table('system_posts'):
+        return
+    column_types = {c['name']: c['type'] for c in inspector.get_columns('system_posts')}
+
+    for column in SYSTEM_POST_DATE_COLUMNS:
+        if column not in column_types:
+            continue
+
+        if engine.dialect.name == 'postgresql':
+            if isinstance(column_types[column], sqltypes.DateTime):
+                continue
+            print(f"Converting 'system_posts.{column}' to TIMESTAMP WITH TIME ZONE...")
+            with engine.begin() as conn:
+                # Строки без смещения всегда означали UTC
+                conn.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+                conn.execute(text(
+                    f"ALTER TABLE system_posts ALTER COLUMN {column} TYPE TIMESTAMP WITH TIME ZONE "
+                    f"USING (CASE WHEN {column} ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}' "
+                    f"THEN CAST({column} AS TIMESTAMP WITH TIME ZONE) END)"
+                ))
+            print(f"Column 'system_posts.{column}' converted successfully.")
+        else:
+            with engine.begin() as conn:
+                rows = [
+                    (post_id, raw) for post_id, raw in conn.execute(text(
+                        f"SELECT id, {column} FROM system_posts WHERE {column} IS NOT NULL"
+                    )).fetchall()
+                    if not SQLITE_DATETIME_RE.match(str(raw))
+                ]
+                if not rows:
+                    continue
+                print(f"Rewriting {len(rows)} ISO values of 'system_posts.{column}'...")
+                for post_id, raw in rows:
+                    conn.execute(
+                        text(f"UPDATE system_posts SET {column} = :value WHERE id = :id"),
+                        {"value": _sqlite_datetime(raw), "id": post_id}
+                    )
+
+def _convert_recurrence_end_date(engine: Engine):
+    """
+    Миграция 60: recurrence_end_date - только дата (DATE), как ее хранит фронтенд.
+    Миграция 55 сделала колонку TIMESTAMP WITH TIME ZONE, и чтение возвращало
+    полный ISO вместо 'YYYY-MM-DD'. Строковая колонка (миграция 55 еще не
+    выполнялась) конвертируется сразу в DATE.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table('system_posts'):
+        return
+    column_types = {c['name']: c['type'] for c in inspector.get_columns('system_posts')}
+    column_type = column_types.get('recurrence_end_date')
+    if column_type is None:
+        return
+
+    if engine.dialect.name == 'postgresql':
+        if isinstance(column_type, sqltypes.Date) and not isinstance(column_type, sqltypes.DateTime):
+            return
+        if isinstance(column_type, sqltypes.DateTime):
+            using = "CAST(recurrence_end_date AT TIME ZONE 'UTC' AS DATE)"
+        else:
+            using = (
+                "CASE WHEN recurrence_end_date ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' "
+                "THEN CAST(substring(recurrence_end_date from 1 for 10) AS DATE) END"
+            )
+        print("Converting 'system_posts.recurrence_end_date' to DATE...")
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE system_posts ALTER COLUMN recurrence_end_date TYPE DATE USING ({using})"))
+        print("Column 'system_posts.recurrence_end_date' converted successfully.")
+    else:
+        with engine.begin() as conn:
+            rows = [
+                (post_id, raw) for post_id, raw in conn.execute(text(
+                    "SELECT id, recurrence_end_date FROM system_posts WHERE recurrence_end_date IS NOT NULL"
+                )).fetchall()
+                if not SQLITE_DATE_RE.match(str(raw))
+            ]
+            if not rows:
+                return
+            print(f"Rewriting {len(rows)} values of 'system_posts.recurrence_end_date' to dates...")
+            for post_id, raw in rows:
+                try:
+                    value = parse_iso_date(str(raw)).isoformat()
+                except Exception:
+                    print(f"  -> Cannot parse date '{raw}', setting NULL")
+                    value = None
+                conn.execute(
+                    text("UPDATE system_posts SET recurrence_end_date = :value WHERE id = :id"),
+                    {"value": value, "id": post_id}
+                )
 
 def migrate(engine: Engine):
     """Миграции для всех типов постов."""
@@ -57,3 +173,26 @@ def migrate(engine: Engine):
 
     # Миграция 49: Добавить поле related_id для связи с другими сущностями (например, конкурсами)
     check_and_add_column(engine, 'system_posts', 'related_id', 'VARCHAR')
+
+    # Миграция 53: Хеш текста для пропуска повторного тегирования неизмененных постов
+    check_and_add_column(engine, 'posts', 'tags_hash', 'VARCHAR')
+    check_and_add_column(engine, 'scheduled_posts', 'tags_hash', 'VARCHAR')
+
+    # Миграция 54: Аренда системных постов публикатором
+    check_and_add_column(engine, 'system_posts', 'lease_owner', 'VARCHAR')
+    check_and_add_column(engine, 'system_posts', 'lease_expires_at', 'TIMESTAMP WITH TIME ZONE')
+
+    # Миграция 55: Типизированные даты системных постов и индексы планировщика
+    _convert_system_post_dates(engine)
+    # Опрос трекера: только ожидающие публикации посты, по времени
+    check_and_create_index(
+        engine, 'system_posts', 'ix_system_posts_due',
+        ['status', 'is_active', 'publication_date'],
+        where="status = 'pending_publication'"
+    )
+    # Поиск свободного времени: диапазон дат внутри проекта
+    check_and_create_index(engine, 'system_posts', 'ix_system_posts_project_publication', ['project_id', 'publication_date'])
+    check_and_create_index(engine, 'scheduled_posts', 'ix_scheduled_posts_project_date', ['"projectId"', 'date'])
+
+    # Миграция 60: recurrence_end_date - DATE ('YYYY-MM-DD' для фронтенда)
+    _convert_recurrence_end_date(engine)
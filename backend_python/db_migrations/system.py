@@ -1,7 +1,7 @@
 
 from sqlalchemy import Engine, inspect
 from .utils import check_and_add_column
-from models import SystemAccount, TokenLog, SystemTask, AdministeredGroup
+from models import SystemAccount, TokenLog, SystemTask, AdministeredGroup, VkUserProfile
 
 def migrate(engine: Engine):
     """Миграции для системных аккаунтов, логов и задач."""
@@ -43,3 +43,13 @@ def migrate(engine: Engine):
     check_and_add_column(engine, 'administered_groups', 'creator_id', 'BIGINT')
     check_and_add_column(engine, 'administered_groups', 'creator_name', 'VARCHAR')
     check_and_add_column(engine, 'administered_groups', 'admins_data', 'TEXT')
+
+    # Миграция 56: Параметры запуска и чекпоинт задачи (возобновляемые синхронизации)
+    check_and_add_column(engine, 'system_tasks', 'params', 'TEXT')
+    check_and_add_column(engine, 'system_tasks', 'checkpoint', 'TEXT')
+
+    # Миграция 58: Общий кеш профилей VK (users.get) с окном свежести
+    if not inspector.has_table("vk_user_profiles"):
+        print("Table 'vk_user_profiles' not found. Creating it...")
+        VkUserProfile.__table__.create(engine)
+        print("Table 'vk_user_profiles' created successfully.")
@@ -27,3 +27,30 @@ def check_and_add_column(engine: Engine, table_name: str, column_name: str, colu
             print(f"Column '{column_name}' added successfully to '{table_name}'.")
         except Exception as e:
             print(f"Error adding column '{column_name}' to table '{table_name}': {e}")
+
+def check_and_create_index(engine: Engine, table_name: str, index_name: str, columns: list, unique: bool = False, where: str = None):
+    """
+    Проверяет наличие индекса и создает его, если он отсутствует.
+    columns - имена колонок или выражения ("added_at DESC"), where - условие частичного индекса.
+    """
+    inspector = inspect(engine)
+
+    if not inspector.has_table(table_name):
+        return
+
+    index_names = {i['name'] for i in inspector.get_indexes(table_name)}
+    if index_name in index_names:
+        return
+
+    print(f"Index '{index_name}' not found on table '{table_name}'. Creating it...")
+    try:
+        with engine.connect() as connection:
+            unique_sql = "UNIQUE " if unique else ""
+            where_sql = f" WHERE {where}" if where else ""
+            connection.execute(text(
+                f'CREATE {unique_sql}INDEX IF NOT EXISTS {index_name} ON {table_name} ({", ".join(columns)}){where_sql}'
+            ))
+            connection.commit()
+        print(f"Index '{index_name}' created successfully on '{table_name}'.")
+    except Exception as e:
+        print(f"Error creating index '{index_name}' on table '{table_name}': {e}")
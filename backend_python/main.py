@@ -285,13 +285,47 @@ def startup_event():
     # Шаг 4: Запускаем новый планировщик вместо старого трекера
     print("Starting APScheduler...")
     # scheduler_service.start()
-    
+
+    # Шаг 5: Воркеры очереди событий VK Callback
+    from services.vk_callback.ingest import callback_worker_pool
+    callback_worker_pool.start()
+
+    # Шаг 6: Продолжаем синхронизации взаимодействий, прерванные перезапуском.
+    # Задача считается прерванной, только когда ее heartbeat старше TASK_STALE_SECONDS,
+    # поэтому оборванные прямо перед рестартом подхватываем повторным проходом.
+    import threading
+    from services.task_monitor import TASK_STALE_SECONDS
+    from services.lists.system_list_service import resume_interrupted_interaction_syncs
+    resume_interrupted_interaction_syncs()
+    resume_timer = threading.Timer(TASK_STALE_SECONDS + 10, resume_interrupted_interaction_syncs)
+    resume_timer.daemon = True
+    resume_timer.start()
+
     # Старый запуск отключен:
     # post_tracker_service.start_post_tracker() 
     
     print("Startup complete.")
 
 
+# Событие при остановке: дописываем буферизированные логи в БД
+@app.on_event("shutdown")
+def shutdown_event():
+    from services.token_log_service import token_log_writer
+    from services.ai_log_service import ai_log_writer
+    from services.vk_callback.ingest import callback_worker_pool
+    from services.automations.stories.render import shutdown_render_pool
+
+    print("Stopping VK callback workers...")
+    callback_worker_pool.stop()
+
+    print("Stopping story render pool...")
+    shutdown_render_pool()
+
+    print("Flushing buffered logs...")
+    token_log_writer.shutdown()
+    ai_log_writer.shutdown()
+
+
 # Настройка CORS
 # Важно: для allow_credentials=True нельзя использовать ["*"], нужно указывать конкретные домены.
 origins = [
@@ -8,6 +8,7 @@ from db_migrations import (
     settings,
     market,
     lists,
+    list_indexes,
     system,
     ai_tokens,
     automations,
@@ -29,6 +30,7 @@ def run_migrations(engine: Engine):
     settings.migrate(engine)
     market.migrate(engine)
     lists.migrate(engine)
+    list_indexes.migrate(engine)
     system.migrate(engine)
     ai_tokens.migrate(engine)
     automations.migrate(engine)
@@ -24,14 +24,16 @@ from models_library.lists import (
     SystemListHistoryJoin,
     SystemListHistoryLeave,
     SystemListPost,
+    SystemListPostDailyStats,
     SystemListLikes,
     SystemListComments,
     SystemListReposts,
+    SystemListInteractionEdge,
     SystemListMailing,
     SystemListAuthor
 )
 # Обновленный импорт: SystemAccount и TokenLog теперь тоже живут в system.py вместе с SystemTask
-from models_library.system import SystemAccount, TokenLog, SystemTask
+from models_library.system import SystemAccount, TokenLog, SystemTask, VkUserProfile
 from models_library.logs import VkCallbackLog
 # Новая модель AI токенов
 from models_library.ai_tokens import AiToken, AiTokenLog
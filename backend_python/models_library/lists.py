@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, String, Integer, Boolean, BigInteger, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, BigInteger, Date, DateTime, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from database import Base
 
@@ -10,6 +10,9 @@ class ProjectListMeta(Base):
     
     subscribers_last_updated = Column(String, nullable=True)
     subscribers_count = Column(Integer, default=0)
+    # Время последней дельты из Callback API (group_join/group_leave).
+    # Если задано, список поддерживается событиями, а полный обход нужен только для сверки.
+    subscribers_delta_at = Column(String, nullable=True)
     
     history_join_last_updated = Column(String, nullable=True)
     history_join_count = Column(Integer, default=0)
@@ -47,6 +50,8 @@ class ProjectListMeta(Base):
 
 class SystemListSubscriber(Base):
     __tablename__ = "system_list_subscribers"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_subscribers_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) # project_id_userid
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     vk_user_id = Column(BigInteger, index=True)
@@ -74,6 +79,8 @@ class SystemListSubscriber(Base):
 # NEW: Модель для авторов постов (аналогична подписчикам и истории)
 class SystemListAuthor(Base):
     __tablename__ = "system_list_authors"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_authors_project_user', 'project_id', 'vk_user_id', unique=True),)
     # Используем составной ключ project_id_userid для уникальности
     id = Column(String, primary_key=True) 
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
@@ -102,6 +109,8 @@ class SystemListAuthor(Base):
 class SystemListMailing(Base):
     """Пользователи, у которых есть диалог с сообществом (В рассылке)"""
     __tablename__ = "system_list_mailing"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_mailing_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) # project_id_userid
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     vk_user_id = Column(BigInteger, index=True)
@@ -138,6 +147,8 @@ class SystemListMailing(Base):
 
 class SystemListHistoryJoin(Base):
     __tablename__ = "system_list_history_join"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_history_join_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) 
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     vk_user_id = Column(BigInteger, index=True)
@@ -164,6 +175,8 @@ class SystemListHistoryJoin(Base):
 
 class SystemListHistoryLeave(Base):
     __tablename__ = "system_list_history_leave"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_history_leave_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) 
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     vk_user_id = Column(BigInteger, index=True)
@@ -215,8 +228,26 @@ class SystemListPost(Base):
     
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class SystemListPostDailyStats(Base):
+    """
+    Дневные агрегаты постов списка (день - по UTC).
+    Поддерживается синхронизацией постов (crud/lists/post_rollup.py),
+    статистика постов читает его для широких периодов вместо всех постов.
+    """
+    __tablename__ = "system_list_post_daily_stats"
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    posts_count = Column(Integer, default=0)
+    likes_count = Column(BigInteger, default=0)
+    comments_count = Column(BigInteger, default=0)
+    reposts_count = Column(BigInteger, default=0)
+    views_count = Column(BigInteger, default=0)
+
 class SystemListLikes(Base):
     __tablename__ = "system_list_likes"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_likes_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) 
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     
@@ -245,6 +276,8 @@ class SystemListLikes(Base):
 
 class SystemListComments(Base):
     __tablename__ = "system_list_comments"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_comments_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) 
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     
@@ -273,6 +306,8 @@ class SystemListComments(Base):
 
 class SystemListReposts(Base):
     __tablename__ = "system_list_reposts"
+    # Один пользователь на проект: цель ON CONFLICT для массового upsert
+    __table_args__ = (Index('uq_system_list_reposts_project_user', 'project_id', 'vk_user_id', unique=True),)
     id = Column(String, primary_key=True) 
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
     
@@ -298,3 +333,25 @@ class SystemListReposts(Base):
     last_post_id = Column(String, nullable=True)
     interaction_count = Column(Integer, default=0)
     post_ids = Column(Text)
+
+class SystemListInteractionEdge(Base):
+    """
+    Одно взаимодействие пользователя с постом (лайк, комментарий, репост).
+    Заменяет JSON-список post_ids в строках system_list_likes/comments/reposts:
+    счетчики пользователей, топ активных и вовлеченность по постам считаются
+    агрегатами SQL по этой таблице (crud/lists/interactions.py, crud/lists/stats/engagement.py).
+    """
+    __tablename__ = "system_list_interaction_edges"
+    __table_args__ = (
+        # Вовлеченность по постам: WHERE project_id, type GROUP BY vk_post_id
+        Index('ix_interaction_edges_post', 'project_id', 'type', 'vk_post_id'),
+        # Выборки и графики за период
+        Index('ix_interaction_edges_date', 'project_id', 'type', 'date'),
+    )
+    # Первичный ключ (project_id, type, vk_user_id, vk_post_id) - цель ON CONFLICT для upsert
+    # и индекс для счетчиков пользователя: WHERE project_id, type GROUP BY vk_user_id
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    type = Column(String(8), primary_key=True) # likes, comments, reposts
+    vk_user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    vk_post_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    date = Column(DateTime(timezone=True), nullable=True) # дата поста
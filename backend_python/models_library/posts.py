@@ -4,6 +4,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 from .associations import published_post_tags_association, scheduled_post_tags_association
+from .types import IsoDate, IsoDateTime
 
 class Post(Base):
     __tablename__ = "posts"
@@ -15,6 +16,8 @@ class Post(Base):
     attachments = Column(Text, nullable=True)
     vkPostUrl = Column(String, nullable=True)
     _lastUpdated = Column(String)
+    # Хеш текста + набора тегов проекта на момент последнего тегирования (services/tag_matcher.py)
+    tags_hash = Column(String, nullable=True)
 
     tags = relationship("Tag", secondary=published_post_tags_association, back_populates="published_posts")
 
@@ -28,6 +31,7 @@ class ScheduledPost(Base):
     attachments = Column(Text, nullable=True)
     vkPostUrl = Column(String, nullable=True)
     _lastUpdated = Column(String)
+    tags_hash = Column(String, nullable=True)
 
     tags = relationship("Tag", secondary=scheduled_post_tags_association, back_populates="scheduled_posts")
 
@@ -35,7 +39,8 @@ class SystemPost(Base):
     __tablename__ = "system_posts"
     id = Column(String, primary_key=True, index=True)
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), index=True)
-    publication_date = Column(String, index=True)
+    # TIMESTAMP WITH TIME ZONE; в коде - ISO-строка (см. IsoDateTime)
+    publication_date = Column(IsoDateTime, index=True)
     text = Column(Text)
     images = Column(Text) # JSON array of PhotoAttachment
     attachments = Column(Text, nullable=True) # JSON array of Attachment
@@ -55,7 +60,7 @@ class SystemPost(Base):
     # Поля для расширенной настройки цикличности
     recurrence_end_type = Column(String, default='infinite') 
     recurrence_end_count = Column(Integer, nullable=True)
-    recurrence_end_date = Column(String, nullable=True)
+    recurrence_end_date = Column(IsoDate, nullable=True) # только дата, 'YYYY-MM-DD'
     recurrence_fixed_day = Column(Integer, nullable=True) 
     recurrence_is_last_day = Column(Boolean, default=False, nullable=False)
     
@@ -67,6 +72,12 @@ class SystemPost(Base):
     description = Column(Text, nullable=True) # Описание для себя
     is_active = Column(Boolean, default=True, nullable=False) # Вкл/Выкл
 
+    # Аренда поста публикатором (services/system_post_publisher.py): кто и до
+    # какого времени обрабатывает пост. Пока аренда активна, пост не берут
+    # другие воркеры и не трогает верификация.
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
 class SuggestedPost(Base):
     __tablename__ = "suggested_posts"
     postId = Column(String, primary_key=True, index=True) # owner_id + id
@@ -57,7 +57,23 @@ class SystemTask(Base):
     total = Column(Integer, default=0)
     message = Column(String, nullable=True)
     error = Column(Text, nullable=True)
+
+    # Возобновление после перезапуска: аргументы задачи и прогресс (JSON)
+    params = Column(Text, nullable=True)
+    checkpoint = Column(Text, nullable=True)
     
     # Время
     created_at = Column(Float) # timestamp
-    updated_at = Column(Float) # timestamp
\ No newline at end of file
+    updated_at = Column(Float) # timestamp
+
+
+class VkUserProfile(Base):
+    """
+    Общий кеш профилей VK (ответ users.get) для всех путей догрузки профилей.
+    Один профиль на пользователя для всех проектов, свежесть - по fetched_at.
+    """
+    __tablename__ = "vk_user_profiles"
+
+    vk_user_id = Column(BigInteger, primary_key=True)
+    profile = Column(Text, nullable=False) # JSON объекта users.get
+    fetched_at = Column(DateTime(timezone=True), nullable=False, index=True)
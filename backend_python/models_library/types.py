@@ -1,4 +1,5 @@
-from sqlalchemy import TypeDecorator, Text
+from datetime import date, datetime, timezone
+from sqlalchemy import TypeDecorator, Text, Date, DateTime
 from cryptography.fernet import Fernet
 from config import settings
 
@@ -60,4 +61,76 @@ class EncryptedString(TypeDecorator):
             # Если не удалось расшифровать (неверный ключ или данные не зашифрованы),
             # возвращаем сырые данные, чтобы не ломать приложение.
             print(f"Error decrypting data (returning raw): {e}")
-            return value
\ No newline at end of file
+            return value
+
+
+def parse_iso_datetime(value) -> datetime:
+    """ISO-строка (с 'Z', смещением или без него) или datetime -> aware datetime в UTC."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        # Строки без смещения исторически считались UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def format_iso_datetime(value: datetime) -> str:
+    """datetime -> 'YYYY-MM-DDTHH:MM:SS.mmmZ' (формат toISOString() фронтенда)."""
+    value = parse_iso_datetime(value)
+    return value.strftime('%Y-%m-%dT%H:%M:%S.') + f"{value.microsecond // 1000:03d}Z"
+
+
+class IsoDateTime(TypeDecorator):
+    """
+    Колонка TIMESTAMP WITH TIME ZONE, которая для кода выглядит как ISO-строка.
+
+    В БД - настоящая дата (сравнения и индексы по времени, а не по тексту),
+    а API и сервисы по-прежнему пишут и читают строки 'YYYY-MM-DDTHH:MM:SS.mmmZ'.
+    При записи принимает ISO-строку или datetime, пустая строка - NULL.
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or value == '':
+            return None
+        value = parse_iso_datetime(value)
+        # SQLite хранит дату без смещения - всегда пишем UTC
+        return value.replace(tzinfo=None) if dialect.name == 'sqlite' else value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return format_iso_datetime(value)
+
+
+def parse_iso_date(value) -> date:
+    """'YYYY-MM-DD', полная ISO-строка или date/datetime -> date (для datetime - день по UTC)."""
+    if isinstance(value, datetime):
+        return parse_iso_datetime(value).date()
+    if isinstance(value, date):
+        return value
+    value = value.strip()
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    return parse_iso_datetime(value).date()
+
+
+class IsoDate(TypeDecorator):
+    """
+    Колонка DATE, которая для кода выглядит как строка 'YYYY-MM-DD'.
+    Фронтенд хранит в таких полях только дату (CustomDatePicker), поэтому
+    формат чтения совпадает с форматом записи. Пустая строка - NULL.
+    """
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or value == '':
+            return None
+        return parse_iso_date(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value.isoformat()
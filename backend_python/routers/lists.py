@@ -10,6 +10,7 @@ import services.task_monitor as task_monitor
 import services.lists.system_list_service as system_list_service
 from database import SessionLocal
 from config import settings
+from services.lists.retrieval.keyset import InvalidCursorError
 
 router = APIRouter()
 
@@ -40,21 +41,28 @@ def get_list_stats(payload: schemas.SystemListPayload, db: Session = Depends(get
 
 @router.post("/lists/system/getSubscribers", response_model=Union[schemas.SystemListSubscribersResponse, schemas.SystemListPostsResponse, schemas.SystemListHistoryResponse, schemas.SystemListAuthorsResponse, schemas.SystemListMailingResponse])
 def get_subscribers(payload: schemas.SystemListPayload, db: Session = Depends(get_db)):
-    return system_list_service.get_subscribers(
-        db, 
-        payload.projectId, 
-        payload.listType, 
-        payload.page, 
-        50, # page_size - fixed value
-        payload.searchQuery,
-        filter_quality=payload.filterQuality or 'all',
-        filter_sex=payload.filterSex or 'all',
-        filter_online=payload.filterOnline or 'any',
-        filter_can_write=payload.filterCanWrite or 'all', # New parameter
-        filter_bdate_month=payload.filterBdateMonth or 'any', # NEW
-        filter_platform=payload.filterPlatform or 'any', # NEW
-        filter_age=payload.filterAge or 'any' # NEW
-    )
+    try:
+        return system_list_service.get_subscribers(
+            db, 
+            payload.projectId, 
+            payload.listType, 
+            payload.page, 
+            50, # page_size - fixed value
+            payload.searchQuery,
+            filter_quality=payload.filterQuality or 'all',
+            filter_sex=payload.filterSex or 'all',
+            filter_online=payload.filterOnline or 'any',
+            filter_can_write=payload.filterCanWrite or 'all', # New parameter
+            filter_bdate_month=payload.filterBdateMonth or 'any', # NEW
+            filter_platform=payload.filterPlatform or 'any', # NEW
+            filter_age=payload.filterAge or 'any', # NEW
+            pagination=payload.pagination or 'offset',
+            cursor=payload.cursor,
+            exact_count=bool(payload.exactCount)
+        )
+    except InvalidCursorError as e:
+        # Курсор поврежден или от другой версии - клиенту нужно начать с первой страницы
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/lists/system/getPosts", response_model=schemas.SystemListPostsResponse)
 def get_posts(payload: schemas.SystemListPayload, db: Session = Depends(get_db)):
@@ -147,15 +155,25 @@ def delete_all_tasks():
 
 # --- Фоновые задачи ---
 
-def _get_or_create_task(project_id: str, list_type: str, background_tasks: BackgroundTasks, task_func, *args, **kwargs):
-    """Вспомогательная функция: возвращает существующую задачу или создает новую."""
+def _get_or_create_task(project_id: str, list_type: str, background_tasks: BackgroundTasks, task_func, *args, task_params: dict = None, **kwargs):
+    """
+    Вспомогательная функция: возвращает существующую задачу или создает новую.
+    task_params - для возобновляемых задач: прерванная задача с теми же
+    параметрами продолжается со своего чекпоинта под тем же ID.
+    """
     existing_task_id = task_monitor.get_active_task_id(project_id, list_type)
     if existing_task_id:
         return existing_task_id
+
+    if task_params is not None:
+        interrupted = task_monitor.find_resumable_task(project_id, list_type, task_params)
+        if interrupted and task_monitor.claim_task(interrupted["task_id"], interrupted["updated_at"]):
+            background_tasks.add_task(task_func, interrupted["task_id"], *args, **kwargs)
+            return interrupted["task_id"]
     
     new_task_id = str(uuid.uuid4())
     # Регистрируем задачу с привязкой к проекту и типу
-    task_monitor.start_task(new_task_id, project_id, list_type)
+    task_monitor.start_task(new_task_id, project_id, list_type, params=task_params)
     
     background_tasks.add_task(task_func, new_task_id, *args, **kwargs)
     return new_task_id
@@ -227,7 +245,8 @@ def refresh_interactions(payload: schemas.RefreshInteractionsPayload, background
     task_id = _get_or_create_task(
         payload.projectId, task_key, background_tasks,
         system_list_service.refresh_interactions_task, 
-        payload.projectId, payload.dateFrom, payload.dateTo, settings.vk_user_token, interaction_type
+        payload.projectId, payload.dateFrom, payload.dateTo, settings.vk_user_token, interaction_type,
+        task_params=system_list_service.interactions_task_params(payload.dateFrom, payload.dateTo, interaction_type)
     )
     return {"taskId": task_id}
 
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 
 import schemas
 import services.system_post_service as system_post_service
+from services.system_post_publisher import system_post_publisher
 from database import SessionLocal
 
 router = APIRouter()
@@ -40,4 +41,9 @@ def confirm_publication(payload: schemas.SimplePostIdPayload, db: Session = Depe
 def publish_system_post_now(payload: schemas.SimplePostIdPayload, db: Session = Depends(get_db)):
     """Публикует системный пост немедленно."""
     system_post_service.publish_system_post_now(db, payload.postId)
-    return {"success": True}
\ No newline at end of file
+    return {"success": True}
+
+@router.post("/getSystemPostPublisherMetrics")
+def get_publisher_metrics(db: Session = Depends(get_db)):
+    """Отставание публикации системных постов от расписания (общие метрики в Redis + очередь и аренды в БД)."""
+    return system_post_publisher.get_metrics(db)
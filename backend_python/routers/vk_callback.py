@@ -4,11 +4,13 @@ from sqlalchemy.orm import Session
 from database import SessionLocal
 from models_library.projects import Project
 from models_library.logs import VkCallbackLog
+from starlette.concurrency import run_in_threadpool
 import logging
 import json
 
 # Импорт новой модульной системы обработки событий
 from services.vk_callback import dispatch_event
+from services.vk_callback.ingest import ingest_event, log_event
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -20,46 +22,13 @@ def get_db():
     finally:
         db.close()
 
-# Эндпоинт для VK Callback API
-@router.post("/callback", include_in_schema=False)
-@router.post("", include_in_schema=False)
-@router.post("/", include_in_schema=False)
-async def vk_callback_handler(request: Request, db: Session = Depends(get_db)):
-    try:
-        body = await request.json()
-    except:
-        # VK иногда шлет запросы, которые не совсем JSON или с пустым телом при проверке
-        print("VK Callback: Failed to parse JSON")
-        raise HTTPException(status_code=400, detail="Invalid JSON")
-        
-    print(f"VK Callback request: {body}")
-    
-    event_type = body.get("type")
+def _confirmation_response(body: dict) -> PlainTextResponse:
+    """Код подтверждения сервера. VK ждет его в ответе на этот же запрос."""
     group_id = body.get("group_id")
-    
-    if not event_type or not group_id:
-        # Если это не структура VK, то просто игнорируем
-        return PlainTextResponse("ok")
-
-    # --- ЛОГИРОВАНИЕ ЗАПРОСА В БД ---
+    db = SessionLocal()
     try:
-        # Пытаемся сохранить лог. Если база недоступна или что-то пошло не так,
-        # это не должно уронить основной процесс ответа VK.
-        log_entry = VkCallbackLog(
-            type=str(event_type),
-            group_id=int(group_id),
-            payload=json.dumps(body, ensure_ascii=False)
-        )
-        db.add(log_entry)
-        db.commit()
-    except Exception as e:
-        print(f"ERROR saving callback log: {e}")
-    # --------------------------------
-
-    # 1. Обработка подтверждения (confirmation)
-    if event_type == "confirmation":
         # Используем новый dispatcher для получения кода подтверждения
-        result, confirmation_code = dispatch_event(db, event_type, group_id, body)
+        result, confirmation_code = dispatch_event(db, "confirmation", group_id, body)
         if confirmation_code:
             print(f"Returning confirmation code: '{confirmation_code}'")
             return PlainTextResponse(content=confirmation_code)
@@ -87,15 +56,51 @@ async def vk_callback_handler(request: Request, db: Session = Depends(get_db)):
                     return PlainTextResponse(content=project_neg.vk_confirmation_code.strip())
 
         print(f"Confirmation code not found for group {group_id}")
-        return PlainTextResponse(content="code_not_found") 
+        return PlainTextResponse(content="code_not_found")
+    finally:
+        db.close()
 
-    # 2. Обработка всех остальных событий через dispatcher
-    # Dispatcher сам найдет нужный handler и выполнит действие
-    result, _ = dispatch_event(db, event_type, group_id, body)
-    
-    if result:
-        print(f"Event '{event_type}' processed: {result.message} (action: {result.action_taken})")
+# Эндпоинт для VK Callback API.
+# Событие только проверяется и ставится в очередь (services/vk_callback/ingest.py),
+# обработчики выполняет пул воркеров. Синхронная работа с БД и очередью
+# уходит в пул потоков, чтобы не блокировать event loop.
+@router.post("/callback", include_in_schema=False)
+@router.post("", include_in_schema=False)
+@router.post("/", include_in_schema=False)
+async def vk_callback_handler(request: Request):
+    try:
+        body = await request.json()
+    except:
+        # VK иногда шлет запросы, которые не совсем JSON или с пустым телом при проверке
+        print("VK Callback: Failed to parse JSON")
+        raise HTTPException(status_code=400, detail="Invalid JSON")
         
+    print(f"VK Callback request: {body}")
+    
+    if not isinstance(body, dict):
+        return PlainTextResponse("ok")
+
+    event_type = body.get("type")
+    group_id = body.get("group_id")
+    
+    if not event_type or not group_id:
+        # Если это не структура VK, то просто игнорируем
+        return PlainTextResponse("ok")
+
+    try:
+        int(group_id)
+    except (TypeError, ValueError):
+        print(f"VK Callback: Invalid group_id '{group_id}', ignored")
+        return PlainTextResponse("ok")
+
+    # 1. Обработка подтверждения (confirmation) - синхронно, код нужен в ответе
+    if event_type == "confirmation":
+        log_event(body)
+        return await run_in_threadpool(_confirmation_response, body)
+
+    # 2. Все остальные события - в очередь, обработает dispatcher в воркере
+    await run_in_threadpool(ingest_event, body)
+    
     # Возвращаем "ok" для всех типов событий, чтобы VK не слал повторы
     return PlainTextResponse(content="ok")
 
@@ -213,6 +213,10 @@ class SystemListPayload(BaseModel):
     filterBdateMonth: Optional[str] = 'any' # any, 1, 2, ... 12, unknown
     filterPlatform: Optional[str] = 'any' # any, 1 (mobile), 2 (iphone), 4 (android), 7 (web)
     filterAge: Optional[str] = 'any' # NEW
+    # Пагинация
+    pagination: Optional[str] = 'offset' # offset, cursor
+    cursor: Optional[str] = None # next_cursor из предыдущего ответа (только pagination=cursor)
+    exactCount: Optional[bool] = False # точный COUNT вместо приблизительного (только pagination=cursor)
     
     # Статистика
     statsPeriod: Optional[str] = 'all' # week, month, quarter, year, all, custom
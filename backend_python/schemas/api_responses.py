@@ -122,6 +122,8 @@ class SystemListSubscribersResponse(BaseModel):
     total_count: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None # только pagination=cursor
+    total_count_exact: bool = True
 
 class SystemListMailingResponse(BaseModel):
     meta: ProjectListMeta
@@ -129,6 +131,8 @@ class SystemListMailingResponse(BaseModel):
     total_count: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None # только pagination=cursor
+    total_count_exact: bool = True
 
 class SystemListHistoryResponse(BaseModel):
     meta: ProjectListMeta
@@ -136,6 +140,8 @@ class SystemListHistoryResponse(BaseModel):
     total_count: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None # только pagination=cursor
+    total_count_exact: bool = True
     
 class SystemListPostsResponse(BaseModel):
     meta: ProjectListMeta
@@ -143,6 +149,8 @@ class SystemListPostsResponse(BaseModel):
     total_count: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None # только pagination=cursor
+    total_count_exact: bool = True
     
 class SystemListInteractionsResponse(BaseModel):
     meta: ProjectListMeta
@@ -157,6 +165,8 @@ class SystemListAuthorsResponse(BaseModel):
     total_count: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None # только pagination=cursor
+    total_count_exact: bool = True
 
 class SystemListMetaResponse(BaseModel):
     meta: ProjectListMeta
@@ -201,6 +211,27 @@ class LifetimeStats(BaseModel):
     allowed_avg: float
     forbidden_avg: float
 
+# Helper models for Interaction Stats (likes / comments / reposts)
+class InteractionTopUser(BaseModel):
+    vk_user_id: int
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    photo_url: Optional[str] = None
+    count: int
+
+class InteractionTopPost(BaseModel):
+    vk_post_id: int
+    vk_link: Optional[str] = None
+    count: int
+
+class InteractionStats(BaseModel):
+    total_interactions: int = 0
+    engaged_users: int = 0
+    engaged_posts: int = 0
+    avg_per_user: float = 0
+    top_engagers: List[InteractionTopUser] = []
+    top_posts: List[InteractionTopPost] = []
+
 class ListStatsResponse(BaseModel):
     total_users: int = 0
     banned_count: int = 0
@@ -228,6 +259,8 @@ class ListStatsResponse(BaseModel):
     post_stats: Optional[PostStats] = None
     # Optional stats for mailing list
     mailing_stats: Optional[MailingStats] = None
+    # Optional stats for interaction lists
+    interaction_stats: Optional[InteractionStats] = None
 
 # --- Task Responses ---
 class TaskStartResponse(BaseModel):
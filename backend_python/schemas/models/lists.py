@@ -110,6 +110,7 @@ class SystemListInteraction(ListMemberBase):
 class ProjectListMeta(BaseModel):
     project_id: str
     subscribers_last_updated: Optional[str] = None
+    subscribers_delta_at: Optional[str] = None
     history_join_last_updated: Optional[str] = None
     history_leave_last_updated: Optional[str] = None
     posts_last_updated: Optional[str] = None
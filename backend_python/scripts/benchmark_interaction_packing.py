@@ -0,0 +1,223 @@
+import sys
+import os
+import re
+import json
+import math
+import random
+import argparse
+from types import SimpleNamespace
+
+# Добавляем путь к корню бэкенда для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.lists.interactions import workers
+from services.lists.interactions.config import EXECUTE_RESPONSE_BUDGET, ITEM_COST
+from services.lists.interactions.planner import PAGE_SIZE, plan_fast_calls, plan_deep_calls, new_deep_entry, pack_calls
+
+# ===================================================================
+# БЕНЧМАРК УПАКОВКИ EXECUTE ДЛЯ СИНХРОНИЗАЦИИ ВЗАИМОДЕЙСТВИЙ
+# ===================================================================
+# Считает, сколько запросов execute нужно, чтобы собрать лайки,
+# комментарии и репосты набора постов:
+# - legacy:  фиксированные пакеты (5 постов на execute в Fast Scan,
+#            execute на каждые 25 страниц одного поста в Deep Scan);
+# - planner: упаковка страниц planner.pack_calls до 25 подвызовов и
+#            бюджета ответа. Прогоняется через настоящие воркеры
+#            (workers._fetch_execute_pack), VK заменен проигрыванием записи.
+#
+#   python scripts/benchmark_interaction_packing.py                   # синтетическая запись
+#   python scripts/benchmark_interaction_packing.py --project-id <id> # счетчики постов из БД
+#   python scripts/benchmark_interaction_packing.py --recording posts.json --save-recording out.json
+#
+# Запись - JSON-список постов: [{"id": 123, "likes": 1500, "comments": 40,
+# "reposts": 3}, ...] - сколько взаимодействий VK вернул в count.
+# --staleness задает расхождение сохраненных счетчиков поста (по ним
+# планируется Fast Scan) с фактическими.
+# ===================================================================
+
+OWNER_ID = -1
+TYPES = ('likes', 'comments', 'reposts')
+_METHOD_TYPES = {'likes.getList': 'likes', 'wall.getComments': 'comments', 'wall.getReposts': 'reposts'}
+_CALL_RE = re.compile(r'API\.([\w.]+)\((\{.*?\})\)')
+
+# Параметры старой схемы (до planner.py)
+LEGACY_FAST_POSTS_PER_EXECUTE = 5
+LEGACY_DEEP_PAGES_PER_EXECUTE = 25
+
+
+def _synthetic_recording(rng: random.Random, posts: int) -> list:
+    """Тяжелый хвост: большинство постов с десятками лайков, единицы - вирусные."""
+    recording = []
+    for i in range(posts):
+        likes = int(rng.paretovariate(1.1) * 30)
+        recording.append({
+            "id": 100000 + i,
+            "likes": min(likes, 300000),
+            "comments": min(int(likes * rng.uniform(0.01, 0.15)), 30000),
+            "reposts": min(int(likes * rng.uniform(0.0, 0.05)), 5000),
+        })
+    return recording
+
+
+def _recording_from_db(project_id: str) -> list:
+    from database import SessionLocal
+    import models
+    db = SessionLocal()
+    try:
+        posts = db.query(models.SystemListPost).filter(models.SystemListPost.project_id == project_id).all()
+        return [
+            {"id": p.vk_post_id, "likes": p.likes_count or 0, "comments": p.comments_count or 0, "reposts": p.reposts_count or 0}
+            for p in posts
+        ]
+    finally:
+        db.close()
+
+
+class RecordedVk:
+    """Отвечает на execute по записи: count из записи, страница синтетических пользователей."""
+
+    def __init__(self, recording: list):
+        self.counts = {(p["id"], t): p[t] for p in recording for t in TYPES}
+        self.requests = 0
+        self.calls = 0
+        self.max_weight = 0
+        self.pages = set()
+
+    def __call__(self, method, params, project_id=None):
+        assert method == "execute"
+        self.requests += 1
+        responses = []
+        weight = 0
+        for api_method, raw_params in _CALL_RE.findall(params["code"]):
+            self.calls += 1
+            type_ = _METHOD_TYPES[api_method]
+            call_params = json.loads(raw_params)
+            post_id = call_params.get("item_id", call_params.get("post_id"))
+            offset, count = call_params["offset"], call_params["count"]
+            total = self.counts[(post_id, type_)]
+            user_ids = [post_id * 1000000 + i for i in range(offset, min(offset + count, total))]
+            if type_ == 'likes':
+                response = {"count": total, "items": [{"id": uid, "first_name": "U"} for uid in user_ids]}
+            else:
+                response = {
+                    "count": total,
+                    "items": [{"from_id": uid} for uid in user_ids],
+                    "profiles": [{"id": uid, "first_name": "U"} for uid in user_ids]
+                }
+            weight += len(user_ids) * ITEM_COST[type_]
+            self.pages.add((post_id, type_, offset))
+            responses.append(response)
+        self.max_weight = max(self.max_weight, weight)
+        return responses
+
+
+def _legacy_requests(recording: list) -> dict:
+    fast = len(TYPES) * math.ceil(len(recording) / LEGACY_FAST_POSTS_PER_EXECUTE)
+    deep = 0
+    for post in recording:
+        for type_ in TYPES:
+            page = PAGE_SIZE[type_]
+            remaining = post[type_] - page
+            if remaining > 0:
+                deep += math.ceil(remaining / (page * LEGACY_DEEP_PAGES_PER_EXECUTE))
+    return {"fast": fast, "deep": deep}
+
+
+def _expected_pages(recording: list) -> set:
+    pages = set()
+    for post in recording:
+        for type_ in TYPES:
+            page = PAGE_SIZE[type_]
+            pages.update((post["id"], type_, offset) for offset in range(0, max(post[type_], 1), page))
+    return pages
+
+
+def _run_planner(recording: list, rng: random.Random, staleness: float) -> dict:
+    vk = RecordedVk(recording)
+    workers.raw_vk_call = vk
+
+    # Сохраненные счетчики поста (оценка для Fast Scan) могут отставать от VK
+    posts = [
+        SimpleNamespace(
+            vk_post_id=p["id"],
+            **{f"{t}_count": int(p[t] * rng.uniform(1 - staleness, 1 + staleness)) for t in TYPES}
+        )
+        for p in recording
+    ]
+    posts_by_id = {p.vk_post_id: p for p in posts}
+
+    def execute(packs):
+        results = []
+        for i, pack in enumerate(packs):
+            results.extend(zip(pack, workers._fetch_execute_pack(["bench_token"], i, OWNER_ID, pack, "bench")))
+        return results
+
+    fast_calls = [call for type_ in TYPES for call in plan_fast_calls(posts, type_)]
+    fast_packs = pack_calls(fast_calls)
+    deep_entries = {}
+    for call, response in execute(fast_packs):
+        count = response["count"]
+        if count > PAGE_SIZE[call['type']]:
+            deep_entries[f"{call['post'].vk_post_id}:{call['type']}"] = new_deep_entry(call['type'], count)
+    fast_requests = vk.requests
+
+    deep_calls = [
+        call
+        for key, entry in deep_entries.items()
+        for call in plan_deep_calls(key, entry, posts_by_id[int(key.split(':')[0])])
+    ]
+    execute(pack_calls(deep_calls))
+
+    return {
+        "fast": fast_requests,
+        "deep": vk.requests - fast_requests,
+        "calls": vk.calls,
+        "max_weight": vk.max_weight,
+        "complete": vk.pages == _expected_pages(recording),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction execute packing benchmark")
+    parser.add_argument("--recording", help="JSON file with per-post counts")
+    parser.add_argument("--project-id", help="Use SystemListPost counters of this project as the recording")
+    parser.add_argument("--posts", type=int, default=300, help="Posts in the synthetic recording")
+    parser.add_argument("--staleness", type=float, default=0.2, help="Relative error of stored post counters")
+    parser.add_argument("--tokens", type=int, default=4, help="Tokens for the wall time estimate (3 req/s each)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save-recording", help="Write the recording used to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.recording:
+        with open(args.recording) as f:
+            recording = json.load(f)
+    elif args.project_id:
+        recording = _recording_from_db(args.project_id)
+    else:
+        recording = _synthetic_recording(rng, args.posts)
+    if args.save_recording:
+        with open(args.save_recording, "w") as f:
+            json.dump(recording, f)
+
+    totals = {t: sum(p[t] for p in recording) for t in TYPES}
+    print(f"Recording: {len(recording)} posts, likes {totals['likes']}, comments {totals['comments']}, reposts {totals['reposts']}")
+
+    legacy = _legacy_requests(recording)
+    planned = _run_planner(recording, rng, args.staleness)
+    legacy_total = legacy["fast"] + legacy["deep"]
+    planned_total = planned["fast"] + planned["deep"]
+    rps = args.tokens * 3.0
+
+    print(f"{'':<8} {'fast':>7} {'deep':>7} {'total':>7}  {'min time':>9}")
+    print(f"{'legacy':<8} {legacy['fast']:>7} {legacy['deep']:>7} {legacy_total:>7}  {legacy_total / rps:>8.1f}s")
+    print(f"{'planner':<8} {planned['fast']:>7} {planned['deep']:>7} {planned_total:>7}  {planned_total / rps:>8.1f}s")
+    print(f"\nPlanner: {planned['calls']} calls, {planned['calls'] / max(planned_total, 1):.1f} per execute, "
+          f"max response weight {planned['max_weight']} / {EXECUTE_RESPONSE_BUDGET}")
+    print(f"All pages fetched: {planned['complete']}")
+    print(f"Requests: x{legacy_total / max(planned_total, 1):.1f} fewer")
+    return 0 if planned["complete"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
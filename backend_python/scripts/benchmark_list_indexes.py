@@ -0,0 +1,279 @@
+import sys
+import os
+import re
+import time
+import random
+import argparse
+import statistics
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, text, func, insert
+from sqlalchemy.orm import sessionmaker
+
+# Добавляем путь к корню бэкенда для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+from db_migrations import list_indexes
+from services.lists.retrieval.filters import apply_filters
+from services.lists.retrieval.keyset import keyset_after
+
+# ===================================================================
+# БЕНЧМАРК ИНДЕКСОВ СИСТЕМНЫХ СПИСКОВ
+# ===================================================================
+# Создает фикстуру (по умолчанию 1M подписчиков + 200k рассылки) в отдельной
+# БД, выполняет горячие запросы списков до и после миграции индексов
+# (db_migrations/list_indexes.py) и проверяет по плану запроса, что
+# используется ожидаемый индекс.
+#
+#   python scripts/benchmark_list_indexes.py                      # SQLite во временном файле
+#   python scripts/benchmark_list_indexes.py --rows 200000
+#   python scripts/benchmark_list_indexes.py --database-url postgresql+psycopg2://.../bench_db
+#
+# ВНИМАНИЕ: для PostgreSQL укажите ПУСТУЮ тестовую базу - скрипт создает
+# в ней таблицы списков и заполняет их синтетическими данными.
+# Код возврата 1, если хотя бы один запрос не использует ожидаемый индекс.
+# ===================================================================
+
+FIXTURE_TABLES = [
+    models.Project.__table__,
+    models.SystemListSubscriber.__table__,
+    models.SystemListMailing.__table__,
+]
+
+BIG_PROJECT_ID = "bench_big"
+INSERT_BATCH = 50000
+PAGE_SIZE = 50
+REPEATS = 5
+
+
+def _random_row(rng: random.Random, project_id: str, vk_user_id: int, now: datetime) -> dict:
+    roll = rng.random()
+    deactivated = 'banned' if roll < 0.01 else ('deleted' if roll < 0.03 else None)
+    return {
+        "id": f"{project_id}_{vk_user_id}",
+        "project_id": project_id,
+        "vk_user_id": vk_user_id,
+        "first_name": f"User{vk_user_id}",
+        "last_name": "Bench",
+        "sex": rng.choice((0, 1, 2, 2, 1)),
+        "deactivated": deactivated,
+        "last_seen": int((now - timedelta(seconds=rng.randint(0, 180 * 86400))).timestamp()),
+        "platform": rng.randint(1, 7),
+    }
+
+
+def build_fixture(engine, total_rows: int, projects: int):
+    """Заполняет таблицы: половина строк - в одном большом проекте, остальное - по мелким."""
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    project_ids = [BIG_PROJECT_ID] + [f"bench_{i}" for i in range(1, projects)]
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.Project.__table__), [
+            {"id": pid, "vkProjectId": str(100000 + i), "name": pid} for i, pid in enumerate(project_ids)
+        ])
+
+    def project_for(index: int) -> str:
+        return BIG_PROJECT_ID if index % 2 == 0 else project_ids[1 + index % (len(project_ids) - 1)]
+
+    started = time.perf_counter()
+    batch = []
+    with engine.begin() as conn:
+        for i in range(total_rows):
+            row = _random_row(rng, project_for(i), i + 1, now)
+            # ~1% без даты добавления - проверяем сортировку NULLS LAST
+            row["added_at"] = None if rng.random() < 0.01 else now - timedelta(seconds=rng.randint(0, 730 * 86400))
+            row["source"] = "manual"
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                conn.execute(insert(models.SystemListSubscriber.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.SystemListSubscriber.__table__), batch)
+
+    mailing_rows = max(total_rows // 5, 1)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(mailing_rows):
+            row = _random_row(rng, project_for(i), i + 1, now)
+            row["last_message_date"] = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            row["first_message_date"] = row["last_message_date"] - timedelta(days=rng.randint(0, 365))
+            row["can_access_closed"] = rng.random() < 0.4
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH:
+                conn.execute(insert(models.SystemListMailing.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.SystemListMailing.__table__), batch)
+
+    print(f"Фикстура: {total_rows} подписчиков, {mailing_rows} в рассылке, "
+          f"{len(project_ids)} проектов ({time.perf_counter() - started:.1f} сек)")
+
+
+def _page_query(db, model, list_type, date_col, **filters):
+    query = db.query(model).filter(model.project_id == BIG_PROJECT_ID)
+    query = apply_filters(query, list_type, **filters)
+    return query.order_by(date_col.desc().nulls_last()).offset(PAGE_SIZE * 3).limit(PAGE_SIZE)
+
+
+def _count_query(db, model, list_type, **filters):
+    query = db.query(func.count(model.id)).filter(model.project_id == BIG_PROJECT_ID)
+    return apply_filters(query, list_type, **filters)
+
+
+def _keyset_query(db, model, date_col, depth: int):
+    """Страница курсорного режима глубоко в списке (курсор - строка на позиции depth)."""
+    total = db.query(func.count()).select_from(model).filter(model.project_id == BIG_PROJECT_ID).scalar()
+    depth = min(depth, total // 2)
+    anchor = db.query(date_col, model.id).filter(model.project_id == BIG_PROJECT_ID, date_col.isnot(None))\
+        .order_by(date_col.desc(), model.id.desc()).offset(depth).limit(1).one()
+    query = db.query(model).filter(model.project_id == BIG_PROJECT_ID)
+    return keyset_after(query, model, date_col, anchor[0], anchor[1]).limit(PAGE_SIZE + 1)
+
+
+def get_cases(db):
+    """(название, запрос, ожидаемый индекс) - повторяют запросы fetchers/filters/stats."""
+    subs = models.SystemListSubscriber
+    mailing = models.SystemListMailing
+    return [
+        ("subscribers: страница (added_at DESC)",
+         _page_query(db, subs, 'subscribers', subs.added_at), "ix_subs_project_date"),
+        ("subscribers: страница, активные",
+         _page_query(db, subs, 'subscribers', subs.added_at, filter_quality='active'), "ix_subs_project_date_active"),
+        ("subscribers: курсорная страница на глубине 100k",
+         _keyset_query(db, subs, subs.added_at, 100000), "ix_subs_project_date"),
+        ("subscribers: количество заблокированных",
+         _count_query(db, subs, 'subscribers', filter_quality='banned'), "ix_subs_project_deactivated"),
+        ("subscribers: количество 'был в сети за неделю'",
+         _count_query(db, subs, 'subscribers', filter_online='week'), "ix_subs_project_last_seen"),
+        ("subscribers: диаграмма по полу",
+         db.query(subs.sex, func.count()).filter(subs.project_id == BIG_PROJECT_ID).group_by(subs.sex),
+         "ix_subs_project_sex"),
+        ("mailing: страница (last_message_date DESC)",
+         _page_query(db, mailing, 'mailing', mailing.last_message_date), "ix_mailing_project_date"),
+        ("mailing: страница, можно писать",
+         _page_query(db, mailing, 'mailing', mailing.last_message_date, filter_can_write='allowed'),
+         "ix_mailing_project_date_allowed"),
+        ("mailing: график первых сообщений",
+         db.query(mailing.first_message_date).filter(
+             mailing.project_id == BIG_PROJECT_ID,
+             mailing.first_message_date >= datetime.now(timezone.utc) - timedelta(days=30)
+         ), "ix_mailing_project_first_message"),
+    ]
+
+
+def _compile(engine, query) -> str:
+    return str(query.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def explain(engine, sql: str) -> str:
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+            return "\n".join(str(r[-1]) for r in rows)
+        rows = conn.execute(text(f"EXPLAIN {sql}")).fetchall()
+        return "\n".join(str(r[0]) for r in rows)
+
+
+def time_query(engine, sql: str) -> float:
+    timings = []
+    with engine.connect() as conn:
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            conn.execute(text(sql)).fetchall()
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def analyze(engine):
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.execute(text("ANALYZE"))
+        else:
+            for table in FIXTURE_TABLES:
+                conn.execute(text(f"ANALYZE {table.name}"))
+
+
+def run_cases(engine, Session) -> dict:
+    db = Session()
+    try:
+        results = {}
+        for name, query, expected_index in get_cases(db):
+            sql = _compile(engine, query)
+            results[name] = (expected_index, explain(engine, sql), time_query(engine, sql))
+        return results
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индексов системных списков")
+    parser.add_argument("--database-url", help="URL тестовой БД (по умолчанию - временный SQLite файл)")
+    parser.add_argument("--rows", type=int, default=1000000, help="Количество подписчиков в фикстуре")
+    parser.add_argument("--projects", type=int, default=20, help="Количество проектов в фикстуре")
+    parser.add_argument("--verbose", action="store_true", help="Печатать планы запросов")
+    args = parser.parse_args()
+
+    temp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        temp_dir = tempfile.mkdtemp(prefix="list_indexes_bench_")
+        database_url = f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+
+    print("=" * 60)
+    print(f"📊 БЕНЧМАРК ИНДЕКСОВ СПИСКОВ ({engine.dialect.name})")
+    print("=" * 60)
+
+    with engine.connect() as conn:
+        existing = engine.dialect.has_table(conn, models.SystemListSubscriber.__table__.name)
+    if existing:
+        print("❌ Таблицы списков уже существуют. Укажите пустую тестовую базу.")
+        sys.exit(2)
+
+    # Таблицы без индексов из миграции: сравниваем "до" и "после"
+    models.Base.metadata.create_all(engine, tables=FIXTURE_TABLES)
+    build_fixture(engine, args.rows, args.projects)
+    analyze(engine)
+
+    before = run_cases(engine, Session)
+
+    started = time.perf_counter()
+    list_indexes.migrate(engine)
+    analyze(engine)
+    print(f"Миграция индексов: {time.perf_counter() - started:.1f} сек")
+
+    after = run_cases(engine, Session)
+
+    print("-" * 60)
+    failed = 0
+    for name, (expected_index, plan, after_ms) in after.items():
+        before_ms = before[name][2]
+        used = re.search(rf"\b{expected_index}\b", plan) is not None
+        failed += 0 if used else 1
+        status = "✅" if used else "❌"
+        print(f"{status} {name}")
+        print(f"     {before_ms:8.2f} ms -> {after_ms:8.2f} ms  (ожидается {expected_index})")
+        if args.verbose or not used:
+            for line in plan.splitlines():
+                print(f"       | {line}")
+
+    print("-" * 60)
+    if failed:
+        print(f"❌ {failed} запрос(ов) не используют ожидаемый индекс.")
+    else:
+        print("✅ Все запросы используют ожидаемые индексы.")
+
+    engine.dispose()
+    if temp_dir:
+        os.remove(os.path.join(temp_dir, 'bench.db'))
+        os.rmdir(temp_dir)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import sys
+import os
+import io
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+# Добавляем путь к корню бэкенда для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import image_utils
+
+# ===================================================================
+# БЕНЧМАРК РЕНДЕРА КАРТИНОК ИСТОРИЙ
+# ===================================================================
+# Меряет рендеры в секунду для create_story_image:
+# - legacy: кэши шрифтов и глифов эмодзи сбрасываются перед каждым
+#           рендером, фон размывается в полном разрешении (как было);
+# - inline: рендер в текущем потоке с прогретыми кэшами;
+# - pool:   render_story_image через пул процессов, запросы идут из
+#           нескольких потоков одновременно (как из планировщика и API).
+#
+#   python scripts/benchmark_story_render.py
+#   python scripts/benchmark_story_render.py --renders 40 --workers 4
+#
+# Входные картинки синтетические (шум + градиент), текст с эмодзи.
+# ===================================================================
+
+POST_TEXT = (
+    "Новая акция в нашем магазине! 🎉🔥\n"
+    "Скидки до 50% на весь ассортимент, подробности по ссылке 👇\n\n"
+    "Успейте до конца недели 😉"
+)
+
+
+def _synthetic_jpeg(rng: random.Random, width: int, height: int) -> bytes:
+    image = Image.effect_noise((width, height), 60).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 8):
+        draw.line([(0, y), (width, y)], fill=(rng.randint(0, 255), 80, 160), width=3)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def _run_serial(label: str, renders: int, render, legacy: bool = False) -> float:
+    blur_downscale = image_utils.BG_BLUR_DOWNSCALE
+    if legacy:
+        image_utils.BG_BLUR_DOWNSCALE = 1
+    started = time.perf_counter()
+    for _ in range(renders):
+        if legacy:
+            image_utils.get_story_fonts.cache_clear()
+            image_utils._emoji_glyph.cache_clear()
+        render()
+    elapsed = time.perf_counter() - started
+    image_utils.BG_BLUR_DOWNSCALE = blur_downscale
+    rate = renders / elapsed
+    print(f"{label:<8} {renders:>4} renders  {elapsed:7.2f} s  {rate:7.2f} renders/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Story image render benchmark")
+    parser.add_argument("--renders", type=int, default=20, help="Renders per mode")
+    parser.add_argument("--workers", type=int, default=None, help="Render pool processes (default: settings.story_render_workers)")
+    parser.add_argument("--skip-pool", action="store_true", help="Only measure in-process rendering")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    post_image = _synthetic_jpeg(rng, 1280, 960)
+    avatar = _synthetic_jpeg(rng, 200, 200)
+
+    def render():
+        image_bytes, metrics = image_utils.create_story_image(post_image, "Тестовое сообщество", avatar, POST_TEXT)
+        assert metrics is not None, "render failed"
+
+    print(f"Source: post image 1280x960 ({len(post_image) // 1024} KB), avatar 200x200")
+    legacy_rate = _run_serial("legacy", args.renders, render, legacy=True)
+    inline_rate = _run_serial("inline", args.renders, render)
+
+    if not args.skip_pool:
+        if args.workers:
+            from config import settings
+            settings.story_render_workers = args.workers
+        from services.automations.stories import render as story_render
+
+        # Прогрев: запуск процессов и загрузка шрифтов не входят в замер
+        workers = max(story_render.settings.story_render_workers, 1)
+        with ThreadPoolExecutor(max_workers=workers) as warm:
+            list(warm.map(lambda _: story_render.render_story_image(post_image, "w", avatar, POST_TEXT), range(workers)))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers * 2) as callers:
+            results = list(callers.map(
+                lambda _: story_render.render_story_image(post_image, "Тестовое сообщество", avatar, POST_TEXT),
+                range(args.renders)
+            ))
+        elapsed = time.perf_counter() - started
+        story_render.shutdown_render_pool()
+        assert all(metrics is not None for _, metrics in results), "pool render failed"
+        pool_rate = args.renders / elapsed
+        print(f"{'pool':<8} {args.renders:>4} renders  {elapsed:7.2f} s  {pool_rate:7.2f} renders/s  ({workers} processes)")
+
+    print(f"\nInline speedup vs legacy: x{inline_rate / legacy_rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ from config import settings
 from services.vk_api.api_client import call_vk_api as raw_vk_call
 from database import SessionLocal
 import services.task_monitor as task_monitor
+from services.token_pool import system_token_pool
 
 def get_all_administered_groups(db: Session) -> List[models.AdministeredGroup]:
     """Retrieves all administered groups from the database."""
@@ -147,8 +148,7 @@ def sync_group_admins(db: Session, group_id: int) -> models.AdministeredGroup:
     if settings.vk_user_token:
         tokens.append(settings.vk_user_token)
     
-    system_tokens = crud.get_active_account_tokens(db)
-    tokens.extend(system_tokens)
+    tokens.extend(system_token_pool.get_tokens())
     
     unique_tokens = list(set([t for t in tokens if t]))
     
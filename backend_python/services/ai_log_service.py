@@ -3,19 +3,18 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 import crud.ai_log_crud as log_crud
-import crud.ai_token_crud as token_crud
 from config import settings
-from database import SessionLocal
+from services.token_pool import ai_token_pool
+from services.log_writer import BatchLogWriter
 
-# Кеш токенов для быстрой проверки (token -> id)
-_AI_TOKEN_CACHE = {}
+# Фоновая пакетная запись логов (тот же механизм, что и для логов VK токенов)
+ai_log_writer = BatchLogWriter("ai_token_logs", log_crud.bulk_create_logs)
 
 def log_ai_request(token: str, model_name: str, success: bool = True, error_details: str = None):
     """
     Основная функция логирования AI запросов.
-    Определяет ID токена и пишет лог в БД в отдельной сессии.
+    Определяет ID токена через пул ключей и ставит запись в очередь BatchLogWriter.
     """
-    db = SessionLocal()
     try:
         token_id = None
         is_env_token = False
@@ -24,19 +23,9 @@ def log_ai_request(token: str, model_name: str, success: bool = True, error_deta
         if token == settings.gemini_api_key:
             is_env_token = True
         
-        # 2. Если не ENV, ищем в таблице токенов
+        # 2. Если не ENV, ищем ID в пуле ключей
         if not is_env_token:
-            # Проверяем кеш
-            if token in _AI_TOKEN_CACHE:
-                token_id = _AI_TOKEN_CACHE[token]
-            else:
-                # Ищем в БД
-                db_tokens = token_crud.get_all_tokens(db)
-                for t in db_tokens:
-                    if t.token == token:
-                        token_id = t.id
-                        _AI_TOKEN_CACHE[token] = token_id
-                        break
+            token_id = ai_token_pool.get_owner_id(token)
         
         log_data = {
             "token_id": token_id,
@@ -48,12 +37,10 @@ def log_ai_request(token: str, model_name: str, success: bool = True, error_deta
             "timestamp": datetime.now()
         }
         
-        log_crud.create_log(db, log_data)
+        ai_log_writer.write(log_data)
         
     except Exception as e:
         print(f"AI LOGGING ERROR: Failed to write log: {e}")
-    finally:
-        db.close()
 
 def get_logs(
     db: Session, 
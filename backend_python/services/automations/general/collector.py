@@ -3,6 +3,9 @@ from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from services.automations.general import crud
 from services.vk_service import call_vk_api
+from services.lists.list_sync_utils import get_all_project_tokens
+from services.vk_profile_cache import vk_profile_cache
+from config import settings
 from models_library.general_contests import GeneralContest
 from models_library.general_contests import GeneralContestCycle, GeneralContestEntry
 from models_library.lists import SystemListMailing
@@ -142,13 +145,22 @@ def collect_participants(db: Session, contest_id: str):
     
     # Clear old entries for this cycle (if re-running collection)
     db.query(GeneralContestEntry).filter(GeneralContestEntry.cycle_id == cycle.id).delete()
+
+    # User info (name, photo) in bulk via the shared profile cache
+    profiles = {}
+    if final_candidates_map:
+        tokens = get_all_project_tokens(db, settings.vk_user_token)
+        for p in vk_profile_cache.get_profiles(list(final_candidates_map.keys()), tokens, contest.project_id):
+            profiles[p['id']] = p
     
     for uid, data in final_candidates_map.items():
-        # TODO: Ideally fetch user info (name, photo) from VK 'users.get' in bulk
+        profile = profiles.get(uid)
         entry = GeneralContestEntry(
             id=str(uuid.uuid4()),
             cycle_id=cycle.id, # Link to Cycle!
             user_vk_id=uid,
+            user_name=f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip() if profile else None,
+            user_photo=profile.get('photo_100') if profile else None,
             validation_data=json.dumps(data)
         )
         entries.append(entry)
@@ -7,6 +7,8 @@ import crud
 import models
 import services.automations.reviews.crud as crud_automations
 from services import vk_service
+from services.lists.list_sync_utils import get_all_project_tokens
+from services.vk_profile_cache import vk_profile_cache
 from config import settings
 
 def collect_participants(db: Session, project_id: str) -> dict:
@@ -167,20 +169,10 @@ def collect_participants(db: Session, project_id: str) -> dict:
     # 6. Получаем имена пользователей
     users_map = {}
     if user_ids_to_fetch:
-        user_ids_list = list(user_ids_to_fetch)
-        chunk_size_users = 1000
-        for i in range(0, len(user_ids_list), chunk_size_users):
-            chunk_users = user_ids_list[i:i + chunk_size_users]
-            try:
-                users_resp = vk_service.call_vk_api('users.get', {
-                    'user_ids': ",".join(map(str, chunk_users)),
-                    'fields': 'photo_100',
-                    'access_token': settings.vk_user_token
-                })
-                for u in users_resp:
-                    users_map[u['id']] = u
-            except Exception as e:
-                print(f"CONTEST: Error fetching users: {e}")
+        # Общий кеш профилей: авторов, уже загруженных синхронизациями списков, не запрашиваем
+        tokens = get_all_project_tokens(db, settings.vk_user_token)
+        for u in vk_profile_cache.get_profiles(user_ids_to_fetch, tokens, project_id):
+            users_map[u['id']] = u
 
     # 7. Создаем записи
     added_count = 0
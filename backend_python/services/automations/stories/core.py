@@ -1,10 +1,55 @@
 from sqlalchemy.orm import Session
-from models_library.automations import StoriesAutomation
+from models_library.automations import StoriesAutomation, StoriesAutomationLog
 from models_library.projects import Project
 from services import vk_service
 from .logic import process_single_story_for_post
 from datetime import datetime, timedelta
 
+def parse_keywords(raw_keywords: str | None) -> tuple[bool, list[str]]:
+    """Returns (is_all_mode, keywords) for the automation keywords setting."""
+    if raw_keywords and raw_keywords.strip() == '*':
+        return True, []
+    if raw_keywords:
+        return False, [k.strip().lower() for k in raw_keywords.split(',')]
+    return False, []
+
+
+def post_matches(post: dict, is_all_mode: bool, keywords: list[str]) -> bool:
+    """Fresh (last 24h) post that matches the keywords (any post in "All Mode")."""
+    text = post.get('text', '').lower()
+    date_ts = post.get('date', 0)
+
+    # Check age (only last 24h to avoid spamming old posts on first run)
+    # Assuming automation is for "fresh" content.
+    if datetime.fromtimestamp(date_ts) < datetime.now() - timedelta(hours=24):
+        return False
+
+    # Check keywords (Skip check if "All Mode" is active)
+    return is_all_mode or any(k in text for k in keywords)
+
+
+def get_unprocessed_post_ids(db: Session, project_id: str, posts_from_vk: list[dict]) -> list[int]:
+    """
+    IDs of matching posts that still have no StoriesAutomationLog
+    (not published to stories yet, e.g. the previous attempt failed).
+    """
+    settings = db.query(StoriesAutomation).filter(StoriesAutomation.project_id == project_id, StoriesAutomation.is_active == True).first()
+    if not settings:
+        return []
+    is_all_mode, keywords = parse_keywords(settings.keywords)
+    if not is_all_mode and not keywords:
+        return []
+
+    post_ids = [post.get('id') for post in posts_from_vk if post_matches(post, is_all_mode, keywords)]
+    if not post_ids:
+        return []
+    logged_ids = {row[0] for row in db.query(StoriesAutomationLog.vk_post_id).filter(
+        StoriesAutomationLog.project_id == project_id,
+        StoriesAutomationLog.vk_post_id.in_(post_ids)
+    ).all()}
+    return [post_id for post_id in post_ids if post_id not in logged_ids]
+
+
 def process_stories_automation(db: Session, project_id: str, posts_from_vk: list[dict], user_token: str):
     """
     Checks posts against Stories Automation rules and posts to stories if matched.
@@ -15,13 +60,7 @@ def process_stories_automation(db: Session, project_id: str, posts_from_vk: list
         return
 
     # Check for "All Posts" mode (*) or specific keywords
-    is_all_mode = False
-    keywords = []
-
-    if settings.keywords and settings.keywords.strip() == '*':
-        is_all_mode = True
-    elif settings.keywords:
-        keywords = [k.strip().lower() for k in settings.keywords.split(',')]
+    is_all_mode, keywords = parse_keywords(settings.keywords)
     
     # If not in "All Mode" and no valid keywords found, stop.
     if not is_all_mode and not keywords:
@@ -41,16 +80,8 @@ def process_stories_automation(db: Session, project_id: str, posts_from_vk: list
     # 2. Iterate posts
     for post in posts_from_vk:
         post_id = post.get('id')
-        text = post.get('text', '').lower()
-        date_ts = post.get('date', 0)
-        
-        # Check age (only last 24h to avoid spamming old posts on first run)
-        # Assuming automation is for "fresh" content.
-        if datetime.fromtimestamp(date_ts) < datetime.now() - timedelta(hours=24):
-            continue
 
-        # Check keywords (Skip check if "All Mode" is active)
-        if not is_all_mode and not any(k in text for k in keywords):
+        if not post_matches(post, is_all_mode, keywords):
             continue
 
         # Check if already processed
@@ -58,7 +89,6 @@ def process_stories_automation(db: Session, project_id: str, posts_from_vk: list
         # but we check here to avoid overhead of function call loop.
         # But wait, logic moved to 'logic.py' has to handle DB import, so we can duplicate check here strictly for performance OR check inside.
         # Let's check here as it was in original.
-        from models_library.automations import StoriesAutomationLog
         existing_log = db.query(StoriesAutomationLog).filter(
             StoriesAutomationLog.project_id == project_id,
             StoriesAutomationLog.vk_post_id == post_id
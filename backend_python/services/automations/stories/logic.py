@@ -2,7 +2,7 @@ from sqlalchemy.orm import Session
 from models_library.automations import StoriesAutomationLog
 from models_library.projects import Project
 from services import vk_service
-from utils import image_utils
+from . import render
 import requests
 import uuid
 import json
@@ -67,10 +67,7 @@ def process_single_story_for_post(db: Session, project_id: str, post: dict, grou
         # Download image
         img_data = None
         if image_url:
-            try:
-                img_data = requests.get(image_url).content
-            except:
-                pass
+            img_data = render.fetch_source_image(image_url)
         
         # If no image data, but we have text -> proceed with text-only mode
         if not img_data and not text:
@@ -96,12 +93,12 @@ def process_single_story_for_post(db: Session, project_id: str, post: dict, grou
                     group_name = g_data.get('name')
                     photo_url = g_data.get('photo_200') or g_data.get('photo_100')
                     if photo_url:
-                        group_photo_bytes = requests.get(photo_url).content
+                        group_photo_bytes = render.fetch_source_image(photo_url)
         except Exception as e:
             print(f"STORIES_AUTO: Failed to fetch group info for card: {e}")
 
         # Generate Story Image (Blurred background + Card)
-        story_image_bytes, render_metrics = image_utils.create_story_image(
+        story_image_bytes, render_metrics = render.render_story_image(
             post_image_bytes=img_data,
             group_name=group_name,
             group_photo_bytes=group_photo_bytes,
@@ -0,0 +1,202 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import requests
+
+from config import settings
+from utils import image_utils
+
+# ===================================================================
+# STORY RENDERING: PROCESS POOL + SOURCE IMAGE CACHE
+# ===================================================================
+# create_story_image is CPU-bound (decode, blur, text, JPEG encode) and
+# used to run on the request / scheduler thread. Renders now go to a
+# bounded ProcessPoolExecutor (settings.story_render_workers processes,
+# at most RENDER_QUEUE_PER_WORKER waiting renders per process; callers
+# beyond that block). Worker processes keep their own font and emoji
+# caches (image_utils) for their whole lifetime.
+# If the pool is unavailable the render runs inline, as before.
+#
+# Source images (post photos, group avatars) are fetched through a
+# content-addressed disk cache: blobs are stored by sha256 of their bytes
+# in settings.story_image_cache_dir, a bounded in-memory index maps URL ->
+# digest. The same avatar is downloaded once per process lifetime, not
+# once per story. The cache is pruned by mtime down to MAX_CACHE_BYTES.
+# ===================================================================
+
+RENDER_TIMEOUT_SEC = 60
+RENDER_QUEUE_PER_WORKER = 2
+
+FETCH_TIMEOUT_SEC = 15
+URL_INDEX_SIZE = 4096
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# Prune check after this many new blobs
+PRUNE_EVERY_WRITES = 100
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(max(settings.story_render_workers, 1) * RENDER_QUEUE_PER_WORKER)
+
+_http = requests.Session()
+_url_index: "OrderedDict[str, str]" = OrderedDict()
+_index_lock = threading.Lock()
+# Renders fetch images from several threads
+_writes_since_prune = 0
+_prune_counter_lock = threading.Lock()
+
+
+def _warm_up_worker():
+    # Fonts are loaded once per worker process, before the first render
+    image_utils.get_story_fonts()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the parent process runs threads (scheduler, workers), fork is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(settings.story_render_workers, 1),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_up_worker
+                )
+    return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def render_story_image(post_image_bytes, group_name=None, group_photo_bytes=None, post_text=None):
+    """Same contract as image_utils.create_story_image, rendered in the process pool."""
+    args = (post_image_bytes, group_name, group_photo_bytes, post_text)
+    with _pool_slots:
+        pool = None
+        try:
+            pool = _get_pool()
+            return pool.submit(image_utils.create_story_image, *args).result(timeout=RENDER_TIMEOUT_SEC)
+        except BrokenProcessPool as e:
+            print(f"STORIES_RENDER: Render pool broken ({e}), restarting. Rendering inline.")
+            if pool is not None:
+                _reset_pool(pool)
+        except Exception as e:
+            print(f"STORIES_RENDER: Pool render failed ({e}). Rendering inline.")
+    return image_utils.create_story_image(*args)
+
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# --- Source image cache ---
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(settings.story_image_cache_dir, digest[:2], digest)
+
+
+def _read_blob(digest: str) -> bytes | None:
+    path = _blob_path(digest)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path, None) # mtime = last use, for pruning
+        return data
+    except OSError:
+        return None
+
+
+def _write_blob(data: bytes) -> str:
+    global _writes_since_prune
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with _prune_counter_lock:
+            _writes_since_prune += 1
+            prune_due = _writes_since_prune >= PRUNE_EVERY_WRITES
+            if prune_due:
+                _writes_since_prune = 0
+        # The walk runs outside the lock; only one thread gets prune_due
+        if prune_due:
+            _prune_cache()
+    return digest
+
+
+def _prune_cache():
+    """Removes least recently used blobs above MAX_CACHE_BYTES."""
+    entries = []
+    total = 0
+    for root, _, files in os.walk(settings.story_image_cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= MAX_CACHE_BYTES:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= MAX_CACHE_BYTES:
+            break
+
+
+def fetch_source_image(url: str | None) -> bytes | None:
+    """Image bytes by URL through the content-addressed cache. None on failure."""
+    if not url:
+        return None
+
+    with _index_lock:
+        digest = _url_index.get(url)
+        if digest:
+            _url_index.move_to_end(url)
+    if digest:
+        data = _read_blob(digest)
+        if data is not None:
+            return data
+
+    try:
+        response = _http.get(url, timeout=FETCH_TIMEOUT_SEC)
+        response.raise_for_status()
+        data = response.content
+    except Exception as e:
+        print(f"STORIES_RENDER: Failed to fetch image {url[:80]}: {e}")
+        return None
+
+    try:
+        digest = _write_blob(data)
+    except OSError as e:
+        print(f"STORIES_RENDER: Image cache write failed: {e}")
+        return data
+
+    with _index_lock:
+        _url_index[url] = digest
+        _url_index.move_to_end(url)
+        while len(_url_index) > URL_INDEX_SIZE:
+            _url_index.popitem(last=False)
+    return data
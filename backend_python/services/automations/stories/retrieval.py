@@ -16,19 +16,21 @@ def get_story_preview(story):
          return story['video'].get('first_frame_800')
     return None
 
-def get_community_stories(db: Session, project_id: str, user_token: str, refresh: bool = False):
+def get_community_stories(db: Session, project_id: str, user_token: str, refresh: bool = False, prefetched=None):
     """
     Deprecated alias for get_unified_stories really, but keeping signature for compatibility if needed.
     """
-    return get_unified_stories(db, project_id, refresh=refresh)
+    return get_unified_stories(db, project_id, refresh=refresh, prefetched=prefetched)
 
-def get_unified_stories(db: Session, project_id: str, refresh: bool = False):
+def get_unified_stories(db: Session, project_id: str, refresh: bool = False, prefetched=None):
     """
     Returns a unified list of stories from DB logs.
     Combines with active stories from VK to update status and date if refresh=True.
     
     Args:
         refresh (bool): If True, fetches live data from VK. If False, returns DB cache only.
+        prefetched: (group_id, active_stories) already fetched by the caller
+            (batched background cycle). Implies refresh=True without VK calls.
     
     Returns:
         { "items": [ ... ] } dict
@@ -42,7 +44,13 @@ def get_unified_stories(db: Session, project_id: str, refresh: bool = False):
     group_id = None
     
     # --- SYNC LOGIC ---
-    if refresh:
+    if prefetched is not None:
+        refresh = True
+        group_id, active_stories = prefetched
+        for s in active_stories or []:
+            if s.get('id'):
+                active_stories_map[int(s.get('id'))] = s
+    elif refresh:
         # Get project and settings (token)
         from config import settings as app_settings
         user_token = app_settings.vk_user_token
@@ -1,6 +1,10 @@
 from sqlalchemy.orm import Session
+import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 from models_library.automations import StoriesAutomation
 from models_library.projects import Project
@@ -8,6 +12,8 @@ from services import vk_service
 from services.automations import stories_service
 from services.post_helpers import get_rounded_timestamp
 from services.post_retrieval.helpers import _apply_tags_to_db_posts
+from services.vk_api.async_client import call_vk_api_async, gather_limited, run_async
+from services.vk_api.token_scheduler import token_scheduler
 import crud
 import models
 from config import settings
@@ -15,120 +21,282 @@ from config import settings
 # Setup logger
 logger = logging.getLogger(__name__)
 
+# ===================================================================
+# BATCHED STORIES AUTOMATION CYCLE
+# ===================================================================
+# The cycle used to walk every active automation sequentially on one DB
+# session: resolve group, wall.get, upsert, tag ALL project posts, sync
+# stories, sleep 2 s. With many projects it overran the 590 s lock TTL.
+#
+# Now:
+# 1. wall.get + stories.get for GROUPS_PER_EXECUTE groups go into one
+#    execute (2 calls per group, VK limit is 25 per execute). Batches run
+#    with the project user token, as the single-project path does: a system
+#    token that is not a member of a closed group gets a partial or empty
+#    wall and story list, which would be taken as the head and mark manual
+#    stories inactive. Rate limiting is done by token_scheduler.
+# 2. A project whose wall head (top post id, latest edit time), active
+#    stories and automation config (keywords) are the same as in the
+#    previous cycle is skipped. The head is saved only when every matching
+#    post of the last 24 h has a StoriesAutomationLog, so a failed story
+#    publication is retried on the next cycle.
+#    Heads live in Redis (shared by whichever process holds the lock),
+#    falling back to process memory.
+# 3. Remaining projects are processed by STORIES_WORKERS threads, each
+#    with its own session. Tags are applied only to the fetched posts.
+#
+# Groups whose call failed inside execute fall back to single requests.
+# ===================================================================
+
+GROUPS_PER_EXECUTE = 12
+LATEST_POSTS_COUNT = 10
+# How many execute requests are in flight at once
+STORIES_BATCH_MAX_IN_FLIGHT = 4
+STORIES_WORKERS = 4
+
+WALL_HEADS_KEY = "vk_planner:stories_bg:wall_heads"
+
+_memory_wall_heads: Dict[str, str] = {}
+_memory_wall_heads_lock = threading.Lock()
+
+
+def _build_stories_execute_code(numeric_ids: List[int]) -> str:
+    """VK Script: per group {wall, stories} (false in place of a failed call)."""
+    calls = []
+    for numeric_id in numeric_ids:
+        wall_params = json.dumps({"owner_id": -numeric_id, "count": LATEST_POSTS_COUNT})
+        stories_params = json.dumps({"owner_id": -numeric_id, "extended": 0})
+        calls.append(f'{{"wall": API.wall.get({wall_params}), "stories": API.stories.get({stories_params})}}')
+    return "return [" + ", ".join(calls) + "];"
+
+
+async def _fetch_stories_batch_async(tokens: List[str], batch_index: int, numeric_ids: List[int]) -> List:
+    code = _build_stories_execute_code(numeric_ids)
+
+    for token in token_scheduler.rotation(tokens, batch_index):
+        try:
+            result = await call_vk_api_async("execute", {"code": code, "access_token": token})
+            if not isinstance(result, list) or len(result) != len(numeric_ids):
+                raise Exception(f"Unexpected execute response for {len(numeric_ids)} groups")
+            return result
+        except Exception as e:
+            print(f"STORIES_BG: Batch {batch_index} failed with token ...{token[-4:]}: {e}. Trying next...")
+
+    raise Exception(f"All tokens failed for stories batch {batch_index}")
+
+
+def _extract_stories(response) -> List[Dict]:
+    """Flattens a stories.get response: { count, items: [ { type, stories: [...] } ] }."""
+    stories = []
+    for item in (response or {}).get('items', []) if isinstance(response, dict) else []:
+        if 'stories' in item:
+            stories.extend(item['stories'])
+    return stories
+
+
+def fetch_latest_batched(owners: Dict[str, int], tokens: List[str]) -> Dict[str, Tuple[Optional[List[Dict]], Optional[List[Dict]]]]:
+    """
+    owners: project_id -> numeric group id.
+    Returns project_id -> (posts, stories). None in place of a call that failed.
+    """
+    project_ids = list(owners.keys())
+    batches = [project_ids[i:i + GROUPS_PER_EXECUTE] for i in range(0, len(project_ids), GROUPS_PER_EXECUTE)]
+    if not batches or not tokens:
+        return {}
+
+    results = run_async(gather_limited(
+        [
+            (lambda i=i, batch=batch: _fetch_stories_batch_async(tokens, i, [owners[pid] for pid in batch]))
+            for i, batch in enumerate(batches)
+        ],
+        limit=STORIES_BATCH_MAX_IN_FLIGHT,
+    ))
+
+    fetched = {}
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            print(f"STORIES_BG: {result}")
+            continue
+        for project_id, response in zip(batch, result):
+            if not isinstance(response, dict):
+                continue
+            wall = response.get('wall')
+            stories = response.get('stories')
+            fetched[project_id] = (
+                wall.get('items', []) if isinstance(wall, dict) else None,
+                _extract_stories(stories) if isinstance(stories, dict) else None,
+            )
+    return fetched
+
+
+def _head_signature(posts: List[Dict], stories: List[Dict], is_active: bool, keywords: str) -> str:
+    """Top post id + latest edit time on the wall + active story ids + automation config."""
+    top_post_id = max((p.get('id', 0) for p in posts), default=0)
+    last_edit = max((p.get('edited') or p.get('date', 0) for p in posts), default=0)
+    story_ids = sorted(s.get('id', 0) for s in stories)
+    config = json.dumps([bool(is_active), (keywords or '').strip()], ensure_ascii=False)
+    return f"{top_post_id}:{last_edit}:{','.join(map(str, story_ids))}:{config}"
+
+
+def _load_wall_heads() -> Dict[str, str]:
+    from database import redis_client
+    if redis_client:
+        try:
+            return redis_client.hgetall(WALL_HEADS_KEY) or {}
+        except Exception as e:
+            print(f"STORIES_BG: Redis wall heads read failed: {e}")
+    with _memory_wall_heads_lock:
+        return dict(_memory_wall_heads)
+
+
+def _save_wall_head(project_id: str, signature: str):
+    from database import redis_client
+    if redis_client:
+        try:
+            redis_client.hset(WALL_HEADS_KEY, project_id, signature)
+            return
+        except Exception as e:
+            print(f"STORIES_BG: Redis wall heads write failed: {e}")
+    with _memory_wall_heads_lock:
+        _memory_wall_heads[project_id] = signature
+
+
+def _process_project(project_id: str, group_id: int, posts: List[Dict], stories: List[Dict]) -> bool:
+    """Sync posts, create stories and sync manual stories for one project (own session)."""
+    from database import SessionLocal # Lazy import to avoid circular dependency
+
+    db: Session = SessionLocal()
+    try:
+        if posts:
+            print(f"STORIES_BG: > {project_id}: {len(posts)} posts. Syncing to DB and processing stories...")
+            # --- SYNC TO DB (Auto-Refresh) ---
+            try:
+                timestamp = get_rounded_timestamp()
+                # We assume these are published since they come from Wall
+                formatted_posts = [vk_service.format_vk_post(item, is_published=True) for item in posts]
+                has_changes = crud.upsert_published_posts(db, project_id, formatted_posts, timestamp)
+
+                # Only the fetched posts can have changed
+                _apply_tags_to_db_posts(db, project_id, models.Post, post_ids=[p['id'] for p in formatted_posts])
+
+                if has_changes:
+                    crud.update_project_last_update_time(db, project_id, 'published', timestamp)
+            except Exception as sync_e:
+                db.rollback()
+                print(f"STORIES_BG: Error syncing posts to DB for {project_id}: {sync_e}")
+
+        # Process Stories Automation (new posts -> stories if rules match)
+        try:
+            stories_service.process_stories_automation(db, project_id, posts, settings.vk_user_token)
+        except Exception as auto_e:
+            db.rollback()
+            print(f"STORIES_BG: Error calling process_stories_automation for {project_id}: {auto_e}")
+            return False
+
+        # Sync Manual Stories with the active stories fetched in the batch
+        try:
+            stories_service.get_community_stories(
+                db, project_id, settings.vk_user_token, prefetched=(group_id, stories)
+            )
+        except Exception as manual_e:
+            db.rollback()
+            print(f"STORIES_BG: Error syncing manual stories for {project_id}: {manual_e}")
+
+        # process_single_story_for_post swallows its errors: the wall head is
+        # "done" only when every matching post got its story
+        pending_ids = stories_service.get_unprocessed_post_ids(db, project_id, posts)
+        if pending_ids:
+            print(f"STORIES_BG: {project_id}: posts {pending_ids} still have no story. Will retry next cycle.")
+            return False
+        return True
+    finally:
+        db.close()
+
+
+def _fetch_single(group_id: int) -> Tuple[List[Dict], List[Dict]]:
+    """Fallback for a group whose calls failed inside execute."""
+    owner_id_str = vk_service.vk_owner_id_string(group_id)
+    posts = vk_service.get_latest_wall_posts(owner_id_str, settings.vk_user_token, count=LATEST_POSTS_COUNT)
+    stories = vk_service.get_active_stories(group_id, settings.vk_user_token)
+    return posts, stories
+
+
 def run_stories_automation_cycle():
     """
     Background task:
     1. Finds all projects with Active Stories Automation.
-    2. Fetches their latest posts.
-    3. Runs the matching logic to create stories.
-    
+    2. Fetches their latest posts and active stories in execute batches.
+    3. Runs the matching logic to create stories for projects whose wall changed.
+
     This ensures that stories are generated even if the user is not online.
     """
     from database import SessionLocal # Lazy import to avoid circular dependency
-    from datetime import datetime
-    import time
-    
-    # print(f"STORIES_BG: Cycle STARTED at {datetime.now()}")
-    
+
     db = SessionLocal()
     try:
-        # 1. Find active automations
-        active_configs = db.query(StoriesAutomation).filter(StoriesAutomation.is_active == True).all()
-        
-        if not active_configs:
-            # print("STORIES_BG: No active automations found.")
-            return
+        # 1. Find active automations (with keywords) of enabled projects
+        rows = db.query(
+            StoriesAutomation.project_id, Project.vkProjectId,
+            StoriesAutomation.is_active, StoriesAutomation.keywords
+        ).join(
+            Project, Project.id == StoriesAutomation.project_id
+        ).filter(
+            StoriesAutomation.is_active == True,
+            StoriesAutomation.keywords.isnot(None),
+            StoriesAutomation.keywords != '',
+            Project.disabled.isnot(True)
+        ).all()
+    finally:
+        db.close()
 
-        total_projects = len(active_configs)
-        print(f"STORIES_BG: Found {total_projects} active automation(s). Starting SEQUENTIAL check at {datetime.now()}...")
+    if not rows:
+        return
 
-        for index, config in enumerate(active_configs):
-            project_id = config.project_id
-            
-            # Simple validity check
-            if not config.keywords:
-                continue
+    print(f"STORIES_BG: Found {len(rows)} active automation(s). Starting BATCHED check at {datetime.now()}...")
+
+    # Resolve group ids (numeric vkProjectId needs no requests)
+    owners: Dict[str, int] = {}
+    configs: Dict[str, Tuple[bool, str]] = {}
+    for project_id, vk_project_id, is_active, keywords in rows:
+        configs[project_id] = (is_active, keywords)
+        try:
+            owners[project_id] = vk_service.resolve_vk_group_id(vk_project_id, settings.vk_user_token)
+        except Exception as e:
+            print(f"STORIES_BG: Failed to resolve group for {project_id}: {e}")
 
-            print(f"STORIES_BG: [{index+1}/{total_projects}] > Checking project {project_id}...")
+    # 2. Batched fetch
+    fetched = fetch_latest_batched(owners, [settings.vk_user_token] if settings.vk_user_token else [])
+    heads = _load_wall_heads()
 
+    jobs = []
+    skipped = 0
+    for project_id, group_id in owners.items():
+        posts, stories = fetched.get(project_id, (None, None))
+        if posts is None or stories is None:
             try:
-                project = db.query(Project).filter(Project.id == project_id).first()
-                if not project or project.disabled:
-                    continue
-                
-                # Resolve Group ID
-                try:
-                    group_id = vk_service.resolve_vk_group_id(project.vkProjectId, settings.vk_user_token)
-                    owner_id_str = vk_service.vk_owner_id_string(group_id)
-                except Exception as e:
-                    print(f"STORIES_BG: Failed to resolve group for {project_id}: {e}")
-                    continue
-                
-                # 2. Fetch latest posts (fetching last 10 is usually enough for 10 min interval)
-                # Note: stories_service handles logic to avoid duplicates (checks DB logs)
-                # and checks age (last 24h).
-                posts = vk_service.get_latest_wall_posts(owner_id_str, settings.vk_user_token, count=10)
-                
-                if not posts:
-                    print(f"STORIES_BG: > No posts returned for {project_id}")
-                    # Even if no posts, we might want to sync manual stories?
-                    # But if no posts, unlikely much happened. Let's still try syncing stories just in case.
-                else:
-                    print(f"STORIES_BG: > Found {len(posts)} posts. Syncing to DB and processing stories...")
-                
-                # --- SYNC TO DB (Auto-Refresh) ---
-                if posts:
-                    try:
-                        timestamp = get_rounded_timestamp()
-                        # Format for internal DB
-                        # We assume these are published since they come from Wall
-                        formatted_posts = [
-                            vk_service.format_vk_post(item, is_published=True) 
-                            for item in posts
-                        ]
-                        
-                        # Upsert (Insert or Update)
-                        has_changes = crud.upsert_published_posts(db, project_id, formatted_posts, timestamp)
-                        
-                        # Apply Tags to these posts (or all)
-                        # _apply_tags_to_db_posts iterates ALL posts of project, which is fine but maybe slow if many?
-                        # But for now it's robust.
-                        _apply_tags_to_db_posts(db, project_id, models.Post)
-                        
-                        # Update status
-                        if has_changes:
-                            crud.update_project_last_update_time(db, project_id, 'published', timestamp)
-                        else:
-                            print(f"STORIES_BG: No content changes detected for {project_id}. Skipping tracker update.")
-                        
-                    except Exception as sync_e:
-                        print(f"STORIES_BG: Error syncing posts to DB: {sync_e}")
-
-                # 3. Process Stories Automation
-                # This will find new posts and convert them to stories if rules match
-                try:
-                    stories_service.process_stories_automation(db, project_id, posts, settings.vk_user_token)
-                except Exception as auto_e:
-                    print(f"STORIES_BG: Error calling process_stories_automation: {auto_e}")
-
-                # 4. Sync Manual Stories (New Feature)
-                # We reuse get_community_stories which fetches everything and saves manual ones to logs
-                # This ensures manual stories appear in history/archive
-                try:
-                    # print(f"STORIES_BG: > Syncing manual stories for {project_id}...")
-                    stories_service.get_community_stories(db, project_id, settings.vk_user_token)
-                except Exception as manual_e:
-                    print(f"STORIES_BG: Error syncing manual stories: {manual_e}")
-                
-                # --- RATE LIMIT PROTECTION ---
-                # Add delay between projects to prevent "burst" requests and give VK API a breath
-                # Even if calls are sequential, rapid sequential calls might look suspicious or hit ~3-5 RPS limits.
-                time.sleep(2) 
-
-            except Exception as proj_e:
-                print(f"STORIES_BG: Project level error for {project_id}: {proj_e}")
-
-    except Exception as e:
-        print(f"STORIES_BG: Fatal error in cycle: {e}")
-    finally:
-        db.close()
+                posts, stories = _fetch_single(group_id)
+            except Exception as e:
+                print(f"STORIES_BG: Fetch failed for {project_id}: {e}")
+                continue
+
+        signature = _head_signature(posts, stories, *configs[project_id])
+        if heads.get(project_id) == signature:
+            skipped += 1
+            continue
+        jobs.append((project_id, group_id, posts, stories, signature))
+
+    print(f"STORIES_BG: {len(jobs)} project(s) changed, {skipped} unchanged (skipped).")
+    if not jobs:
+        return
+
+    # 3. Concurrent per-project processing
+    def run(job):
+        project_id, group_id, posts, stories, signature = job
+        try:
+            if _process_project(project_id, group_id, posts, stories):
+                _save_wall_head(project_id, signature)
+        except Exception as proj_e:
+            print(f"STORIES_BG: Project level error for {project_id}: {proj_e}")
+
+    with ThreadPoolExecutor(max_workers=STORIES_WORKERS, thread_name_prefix="stories-bg") as executor:
+        list(executor.map(run, jobs))
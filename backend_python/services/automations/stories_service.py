@@ -2,7 +2,7 @@
 # This file re-exports functions from the `stories` sub-package.
 # It acts as a facade, so existing code doesn't break.
 
-from .stories.core import process_stories_automation
+from .stories.core import process_stories_automation, get_unprocessed_post_ids
 from .stories.logic import process_single_story_for_post
 from .stories.stats import batch_update_stats
 from .stories.retrieval import get_community_stories, get_story_preview, get_unified_stories
@@ -3,8 +3,7 @@ import requests
 import time
 from typing import Optional, List, Set
 from config import settings
-from database import SessionLocal
-import crud.ai_token_crud as ai_token_crud
+from services.token_pool import ai_token_pool
 # Отложенный импорт во избежание циклических зависимостей
 import services.ai_log_service as ai_log_service
 
@@ -56,17 +55,8 @@ def _get_candidate_keys() -> List[str]:
     if settings.gemini_api_key:
         keys.append(settings.gemini_api_key)
     
-    # 2. Ключи из базы данных
-    db = SessionLocal()
-    try:
-        db_tokens = ai_token_crud.get_all_tokens(db)
-        for t in db_tokens:
-            if t.token and t.token.strip():
-                keys.append(t.token.strip())
-    except Exception as e:
-        print(f"⚠️ Error fetching AI tokens from DB: {e}")
-    finally:
-        db.close()
+    # 2. Ключи из базы данных (кешируются в пуле процесса)
+    keys.extend(ai_token_pool.get_tokens())
         
     # Убираем дубликаты, сохраняя порядок
     unique_keys = list(dict.fromkeys(keys))
@@ -1,16 +1,27 @@
-
-# Фаза 1: Сколько постов обрабатываем за 1 запрос execute (Fast Scan)
-MULTI_POST_BATCH_SIZE = 5 
-
-# Фаза 2: Настройки глубокого сканирования (Deep Scan)
+# Размер страницы одного подвызова (максимум VK для метода).
+# Fast Scan берет первую страницу каждого поста, Deep Scan - остальные.
 LIKES_INNER_COUNT = 1000
-LIKES_ITERATIONS = 25 
-
 COMMENTS_INNER_COUNT = 100
-COMMENTS_ITERATIONS = 25
-
 REPOSTS_INNER_COUNT = 1000
-REPOSTS_ITERATIONS = 25
 
-# Ограничение количества потоков для взаимодействий, чтобы избежать ошибки 'Too many requests' (Code 6)
+# Упаковка подвызовов в execute (planner.py)
+# Лимит VK: не более 25 обращений к API внутри одного execute
+EXECUTE_MAX_CALLS = 25
+# Бюджет размера ответа execute в единицах веса элементов (ITEM_COST).
+# 25000 - объем, который Deep Scan уже запрашивал за один execute:
+# 1000 лайков x 25 итераций или 100 комментариев x 25 итераций.
+EXECUTE_RESPONSE_BUDGET = 25000
+# Вес одного элемента ответа: комментарий и репост - объект записи вместе с профилем автора
+ITEM_COST = {'likes': 1, 'comments': 10, 'reposts': 10}
+
+# Параллельность execute подстраивается под троттлинг токенов (AdaptiveConcurrency):
+# старт - INTERACTIONS_MAX_WORKERS потоков (но не больше числа токенов),
+# рост до INTERACTIONS_WORKERS_PER_TOKEN на токен и не выше INTERACTIONS_WORKERS_CEILING,
+# при ошибке 'Too many requests' (Code 6) лимит делится пополам.
 INTERACTIONS_MAX_WORKERS = 4
+INTERACTIONS_WORKERS_PER_TOKEN = 2
+INTERACTIONS_WORKERS_CEILING = 12
+
+# Сколько пользователей накапливать перед догрузкой профилей (users.get).
+# Очередь хранится в чекпоинте задачи, поэтому ограничена.
+ENRICH_BATCH_SIZE = 5000
@@ -87,7 +87,7 @@ def process_interaction_items(
             'is_closed': user_data.get('is_closed'),
             'can_access_closed': user_data.get('can_access_closed'),
             # Поля активности
-            'post_ids': set(),
+            'post_dates': {}, # vk_post_id -> дата поста (ребра взаимодействий)
             'last_interaction_date': post_obj.date,
             'last_post_id': post_obj.id
         }
@@ -115,5 +115,5 @@ def process_interaction_items(
                  if entry_data['platform']: existing['platform'] = entry_data['platform']
                  if entry_data['last_seen']: existing['last_seen'] = entry_data['last_seen']
 
-        # Добавляем ID поста в сет
-        target_acc[uid]['post_ids'].add(post_obj.vk_post_id)
+        # Добавляем пост в ребра пользователя
+        target_acc[uid]['post_dates'][post_obj.vk_post_id] = post_obj.date
@@ -0,0 +1,139 @@
+from typing import Dict, Iterable, List, Optional
+
+import models
+from .config import (
+    LIKES_INNER_COUNT, COMMENTS_INNER_COUNT, REPOSTS_INNER_COUNT,
+    EXECUTE_MAX_CALLS, EXECUTE_RESPONSE_BUDGET, ITEM_COST
+)
+
+# ===================================================================
+# ПЛАНИРОВЩИК УПАКОВКИ ПОДВЫЗОВОВ В EXECUTE
+# ===================================================================
+# Раньше размеры пакетов были фиксированными: Fast Scan - 5 постов на
+# execute (5 подвызовов из 25 возможных), Deep Scan - отдельный execute
+# на каждый пост и каждые 25 страниц. Пост с 1500 лайками занимал целый
+# execute ради одной страницы, а несколько вирусных постов растягивали
+# Deep Scan.
+#
+# Теперь работа описывается подвызовами "одна страница одного поста"
+# (likes.getList / wall.getComments / wall.getReposts), которые
+# упаковываются в execute методом First Fit Decreasing (поиск execute по
+# дереву свободного бюджета, O(n log n)) с двумя
+# ограничениями: не больше EXECUTE_MAX_CALLS подвызовов и не больше
+# EXECUTE_RESPONSE_BUDGET по ожидаемому размеру ответа.
+# - Fast Scan: размер первой страницы оценивается по счетчикам поста
+#   (SystemListPost.likes_count и т.п.).
+# - Deep Scan: точные счетчики известны из ответа Fast Scan.
+#
+# Подвызов - dict: {type, post, offset, count, cost[, key]},
+# key - ключ записи Deep Scan в чекпоинте ("<vk_post_id>:<type>").
+# ===================================================================
+
+PAGE_SIZE = {'likes': LIKES_INNER_COUNT, 'comments': COMMENTS_INNER_COUNT, 'reposts': REPOSTS_INNER_COUNT}
+
+# Счетчики поста, по которым оценивается первая страница
+_POST_COUNTERS = {'likes': 'likes_count', 'comments': 'comments_count', 'reposts': 'reposts_count'}
+
+# Шаг Deep Scan до планировщика (страница x 25 итераций): так записаны
+# выполненные offset в чекпоинтах задач, прерванных старой версией
+LEGACY_DEEP_STEP = {'likes': LIKES_INNER_COUNT * 25, 'comments': COMMENTS_INNER_COUNT * 25, 'reposts': REPOSTS_INNER_COUNT * 25}
+
+
+def call_cost(type_: str, expected_items: int) -> int:
+    """Ожидаемый вес ответа подвызова. Пустая страница тоже что-то весит."""
+    return max(1, expected_items) * ITEM_COST[type_]
+
+
+def plan_fast_calls(posts: Iterable[models.SystemListPost], type_: str, done_ids: Optional[set] = None) -> List[Dict]:
+    """Подвызовы первой страницы для постов, еще не просканированных этим типом."""
+    page = PAGE_SIZE[type_]
+    counter = _POST_COUNTERS[type_]
+    calls = []
+    for post in posts:
+        if done_ids and post.vk_post_id in done_ids:
+            continue
+        expected = getattr(post, counter, None) or 0
+        calls.append({
+            'type': type_,
+            'post': post,
+            'offset': 0,
+            'count': page,
+            'cost': call_cost(type_, min(expected, page))
+        })
+    return calls
+
+
+def new_deep_entry(type_: str, total: int) -> Dict:
+    """Запись Deep Scan в чекпоинте: страницы после первой, done - выполненные offset."""
+    page = PAGE_SIZE[type_]
+    return {"start": page, "total": total, "page": page, "done": []}
+
+
+def plan_deep_calls(key: str, entry: Dict, post: models.SystemListPost) -> List[Dict]:
+    """Подвызовы оставшихся страниц поста по записи Deep Scan из чекпоинта."""
+    type_ = key.split(':')[1]
+    page = PAGE_SIZE[type_]
+    done_step = entry.get("page") or LEGACY_DEEP_STEP[type_]
+    done = entry.get("done", [])
+    done_set = set(done) if done_step == page else None
+
+    calls = []
+    for offset in range(entry["start"], entry["total"], page):
+        if done_set is not None:
+            if offset in done_set:
+                continue
+        elif any(d <= offset < d + done_step for d in done):
+            continue
+        count = min(page, entry["total"] - offset)
+        calls.append({
+            'type': type_,
+            'post': post,
+            'offset': offset,
+            'count': count,
+            'cost': call_cost(type_, count),
+            'key': key
+        })
+    return calls
+
+
+def pack_calls(calls: List[Dict], max_calls: int = EXECUTE_MAX_CALLS, budget: int = EXECUTE_RESPONSE_BUDGET) -> List[List[Dict]]:
+    """
+    First Fit Decreasing: самые тяжелые подвызовы раскладываются первыми,
+    каждый - в первый execute, где есть место по числу вызовов и бюджету ответа.
+    Подвызов тяжелее бюджета получает отдельный execute.
+
+    Первый подходящий execute ищется по дереву максимумов свободного бюджета
+    (O(log n) на подвызов), а не перебором всех открытых execute.
+    """
+    ordered = sorted(calls, key=lambda c: c['cost'], reverse=True)
+    # execute не больше, чем подвызовов
+    size = 1
+    while size < len(ordered):
+        size *= 2
+    # Листья - свободный бюджет execute; -1 - execute заполнен или не открыт
+    tree = [-1] * (2 * size)
+
+    packs: List[List[Dict]] = []
+    loads: List[int] = []
+    for call in ordered:
+        cost = call['cost']
+        if tree[1] >= cost:
+            # Спуск к самому левому execute, где хватает бюджета
+            node = 1
+            while node < size:
+                node = 2 * node if tree[2 * node] >= cost else 2 * node + 1
+            i = node - size
+            packs[i].append(call)
+            loads[i] += cost
+        else:
+            i = len(packs)
+            packs.append([call])
+            loads.append(cost)
+
+        node = size + i
+        tree[node] = budget - loads[i] if len(packs[i]) < max_calls else -1
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+    return packs
@@ -1,31 +1,150 @@
 
-import json
+import threading
 import concurrent.futures
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import crud
 import models
+from config import settings
 from services import vk_service, task_monitor
-from services.lists.list_sync_utils import get_all_project_tokens, filter_admin_tokens, fetch_users_smart_parallel
+from services.lists.list_sync_utils import get_all_project_tokens, filter_admin_tokens
+from services.vk_profile_cache import vk_profile_cache
 from services.post_helpers import get_rounded_timestamp
 from database import SessionLocal
 
-from .config import MULTI_POST_BATCH_SIZE, LIKES_INNER_COUNT, LIKES_ITERATIONS, COMMENTS_INNER_COUNT, COMMENTS_ITERATIONS, INTERACTIONS_MAX_WORKERS
-from .workers import _fetch_multi_post_batch, _fetch_deep_scan_batch
+from services.vk_api.adaptive_concurrency import AdaptiveConcurrency
+
+from .config import INTERACTIONS_MAX_WORKERS, INTERACTIONS_WORKERS_PER_TOKEN, INTERACTIONS_WORKERS_CEILING, ENRICH_BATCH_SIZE
+from .planner import PAGE_SIZE, plan_fast_calls, plan_deep_calls, new_deep_entry, pack_calls
+from .workers import _fetch_execute_pack
 from .data_processor import process_interaction_items
 
+# ===================================================================
+# ВОЗОБНОВЛЯЕМАЯ СИНХРОНИЗАЦИЯ ВЗАИМОДЕЙСТВИЙ
+# ===================================================================
+# Раньше лайки/комментарии/репосты за весь период копились в памяти
+# (likes_acc и т.п. с set post_ids на пользователя) и писались в БД только
+# в конце. Падение или редеплой через час синхронизации за год терял все.
+#
+# Теперь каждый execute-пакет (planner.py: страницы постов, упакованные
+# до лимитов VK) сразу пишется в БД, после чего прогресс сохраняется
+# в SystemTask.checkpoint:
+#   fast:   {type: [vk_post_id, ...]}          - просканированные посты
+#   deep:   {"<vk_post_id>:<type>": {start, total, page, done: [offset, ...]}}
+#   enrich: [vk_user_id, ...]                  - ждут догрузки профилей
+# Запись идемпотентна (upsert ребер пользователь-пост), поэтому пакет,
+# записанный, но не отмеченный в чекпоинте до падения, просто
+# перезапишется при повторе.
+#
+# Прерванная задача продолжается с чекпоинта под тем же ID: при повторном
+# запуске с теми же параметрами (routers/lists.py) или при старте
+# приложения (resume_interrupted_interaction_syncs).
+# ===================================================================
+
+INTERACTION_TYPES = ('likes', 'comments', 'reposts')
+
+
+def interactions_task_params(date_from_iso: str, date_to_iso: str, interaction_type: str) -> Dict:
+    """Параметры задачи, по которым прерванная синхронизация находится для возобновления."""
+    return {"date_from": date_from_iso, "date_to": date_to_iso, "interaction_type": interaction_type}
+
+
+def _empty_checkpoint() -> Dict:
+    return {"fast": {t: [] for t in INTERACTION_TYPES}, "deep": {}, "enrich": []}
+
+
+def _prepare_for_db(data_map: Dict[int, Dict], project_id: str) -> List[Dict]:
+    result = []
+    for uid, data in data_map.items():
+        data['id'] = f"{project_id}_{uid}"
+        data['project_id'] = project_id
+        result.append(data)
+    return result
+
+
+def _flush_batch(project_id: str, likes_acc: Dict, comments_acc: Dict, reposts_acc: Dict) -> List[int]:
+    """Пишет пакет в БД. Возвращает ID затронутых пользователей (для догрузки профилей)."""
+    involved = set(likes_acc) | set(comments_acc) | set(reposts_acc)
+    if not involved:
+        return []
+    db = SessionLocal()
+    try:
+        if likes_acc:
+            crud.bulk_upsert_interactions(db, project_id, 'likes', _prepare_for_db(likes_acc, project_id))
+        if comments_acc:
+            crud.bulk_upsert_interactions(db, project_id, 'comments', _prepare_for_db(comments_acc, project_id))
+        if reposts_acc:
+            crud.bulk_upsert_interactions(db, project_id, 'reposts', _prepare_for_db(reposts_acc, project_id))
+    finally:
+        db.close()
+    return list(involved)
+
+
+def _enrich_profiles(project_id: str, user_ids: List[int], tokens: List[str], types_to_process: List[str]):
+    """
+    Догрузка профилей через users.get (общий кеш профилей).
+    VK API (особенно wall.getReposts) часто возвращает "урезанные" объекты пользователей
+    без city/bdate/platform. Чтобы статистика работала, обновляем их принудительно.
+    """
+    if not user_ids:
+        return
+    print(f"SERVICE: Enriching profiles for {len(user_ids)} interaction users...")
+    # Профили, которые недавно скачала другая синхронизация, берутся из кеша
+    enriched_profiles = vk_profile_cache.get_profiles(user_ids, tokens, project_id)
+
+    updates = []
+    for u in enriched_profiles:
+        updates.append({
+            'vk_user_id': u['id'],
+            'first_name': u.get('first_name'),
+            'last_name': u.get('last_name'),
+            'sex': u.get('sex'),
+            'photo_url': u.get('photo_100'),
+            'domain': u.get('domain'),
+            'bdate': u.get('bdate'),
+            'city': u.get('city', {}).get('title') if u.get('city') else None,
+            'country': u.get('country', {}).get('title') if u.get('country') else None,
+            'has_mobile': bool(u.get('has_mobile')),
+            'deactivated': u.get('deactivated'),
+            'last_seen': u.get('last_seen', {}).get('time') if u.get('last_seen') else None,
+            'platform': u.get('last_seen', {}).get('platform') if u.get('last_seen') else None,
+            'is_closed': u.get('is_closed'),
+            'can_access_closed': u.get('can_access_closed')
+        })
+
+    if updates:
+        # Применяем обновления ко всем таблицам синхронизации (для отсутствующих пользователей - no-op)
+        db = SessionLocal()
+        try:
+            for type_ in types_to_process:
+                crud.bulk_update_interaction_users(db, project_id, type_, updates)
+            db.commit()
+        finally:
+            db.close()
+
+
 def refresh_interactions_task(task_id: str, project_id: str, date_from_iso: str, date_to_iso: str, user_token: str, interaction_type: str = 'all'):
     """
     Фоновая задача сбора взаимодействий с Split Session.
+    Продолжает с чекпоинта задачи, если он есть.
     """
-    
+    try:
+        _run_interactions_sync(task_id, project_id, date_from_iso, date_to_iso, user_token, interaction_type)
+    except Exception as e:
+        # Задача со статусом error не возобновляется при каждом перезапуске
+        print(f"SERVICE: Interaction sync {task_id} crashed: {e}")
+        task_monitor.update_task(task_id, "error", error=str(e))
+
+
+def _run_interactions_sync(task_id: str, project_id: str, date_from_iso: str, date_to_iso: str, user_token: str, interaction_type: str):
+
     # --- PHASE 1: READ & PREPARE ---
     posts = []
     unique_tokens = []
     project_name = "Unknown"
     project_vk_id = ""
-    
+
     db = SessionLocal()
     try:
         project = crud.get_project_by_id(db, project_id)
@@ -58,14 +177,17 @@ def refresh_interactions_task(task_id: str, project_id: str, date_from_iso: str,
     if not posts:
         task_monitor.update_task(task_id, "done", message="Нет постов за период")
         return
-    
-    print(f"SERVICE: Interaction Sync for '{project_name}'. Found {len(posts)} posts.")
 
-    # --- PHASE 2: FETCHING (No DB Connection) ---
-    
+    checkpoint = task_monitor.get_checkpoint(task_id) or _empty_checkpoint()
+    resumed = any(checkpoint["fast"].values()) or bool(checkpoint["deep"])
+    print(f"SERVICE: Interaction Sync for '{project_name}'. Found {len(posts)} posts."
+          f"{' Resuming from checkpoint.' if resumed else ''}")
+
+    # --- PHASE 2: FETCHING (запись в БД - по пакетам) ---
+
     numeric_group_id = vk_service.resolve_vk_group_id(project_vk_id, unique_tokens[0])
     owner_id = -numeric_group_id
-    
+
     # Специальная логика для репостов: фильтруем только админские токены
     admin_tokens: List[str] = []
     if interaction_type == 'all' or interaction_type == 'reposts':
@@ -75,233 +197,197 @@ def refresh_interactions_task(task_id: str, project_id: str, date_from_iso: str,
              task_monitor.update_task(task_id, "error", error="Нет токенов с правами администратора для сбора репостов.")
              return
 
-    likes_acc: Dict[int, Dict] = {}
-    comments_acc: Dict[int, Dict] = {}
-    reposts_acc: Dict[int, Dict] = {}
-
     types_to_process = []
     if interaction_type in ['all', 'likes']: types_to_process.append('likes')
     if interaction_type in ['all', 'comments']: types_to_process.append('comments')
     if interaction_type in ['all', 'reposts']: types_to_process.append('reposts')
 
-    post_chunks = [posts[i:i + MULTI_POST_BATCH_SIZE] for i in range(0, len(posts), MULTI_POST_BATCH_SIZE)]
-    
-    # Ограничиваем количество одновременных потоков для execute, чтобы не ловить Code 6
-    max_workers = min(len(unique_tokens), INTERACTIONS_MAX_WORKERS)
-    
-    total_steps = len(post_chunks) * len(types_to_process)
-    current_step = 0
-    deep_scan_queue = []
+    posts_by_vk_id = {p.vk_post_id: p for p in posts}
+    enrich_pending = set(checkpoint["enrich"])
 
-    # === PHASE 2.1: FAST SCAN ===
-    task_monitor.update_task(task_id, "fetching", message="Фаза 1: Быстрое сканирование...", loaded=0, total=total_steps)
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = []
-        for chunk_idx, chunk in enumerate(post_chunks):
-            for type_ in types_to_process:
-                # Выбираем пул токенов в зависимости от типа
-                tokens_for_task = admin_tokens if type_ == 'reposts' else unique_tokens
-                
-                # Если токенов для репостов нет, пропускаем этот тип
-                if type_ == 'reposts' and not tokens_for_task:
-                    print(f"Skipping reposts for chunk {chunk_idx} due to lack of admin tokens.")
-                    current_step += 1
-                    continue
-
-                future = executor.submit(
-                    _fetch_multi_post_batch, tokens_for_task, chunk_idx, chunk, type_, owner_id, project_id
-                )
-                futures.append((future, chunk, type_))
-
-        for future, chunk, type_ in futures:
+    def commit_progress(involved: List[int]):
+        """Чекпоинт после записи пакета; профили догружаются пачками по ENRICH_BATCH_SIZE."""
+        enrich_pending.update(involved)
+        if len(enrich_pending) >= ENRICH_BATCH_SIZE:
             try:
-                results = future.result() 
-                for res in results:
-                    pid = res.get('post_id')
-                    
-                    raw_count = res.get('count')
-                    try:
-                        count = int(raw_count) if raw_count is not None else 0
-                    except (TypeError, ValueError):
-                        count = 0
-                        
-                    items = res.get('items') or []
-                    
-                    post_obj = next((p for p in chunk if p.vk_post_id == pid), None)
-                    if not post_obj: continue
-
-                    profiles_raw = res.get('profiles') or []
-                    profiles_map = {p['id']: p for p in profiles_raw}
-                    
-                    process_interaction_items(items, profiles_map, type_, post_obj, likes_acc, comments_acc, reposts_acc)
-                    
-                    limit = 1000 if type_ in ['likes', 'reposts'] else 100
-                    if count > limit:
-                        deep_scan_queue.append((post_obj, type_, limit, count))
+                _enrich_profiles(project_id, list(enrich_pending), unique_tokens, types_to_process)
+                enrich_pending.clear()
             except Exception as e:
-                print(f"Batch processing error: {e}")
-            
-            current_step += 1
-            task_monitor.update_task(task_id, "fetching", loaded=current_step, total=total_steps)
+                print(f"Error enriching interaction profiles: {e}")
+        checkpoint["enrich"] = list(enrich_pending)
+        task_monitor.save_checkpoint(task_id, checkpoint)
 
-    # === PHASE 2.2: DEEP SCAN ===
-    if deep_scan_queue:
-        task_monitor.update_task(task_id, "fetching", message=f"Фаза 2: Докачка ({len(deep_scan_queue)} постов)...")
-        
-        jobs = []
-        for post_obj, type_, start_offset, total_count in deep_scan_queue:
-            step = LIKES_INNER_COUNT * LIKES_ITERATIONS 
-            if type_ == 'comments': step = COMMENTS_INNER_COUNT * COMMENTS_ITERATIONS
-            
-            current_offset = start_offset
-            while current_offset < total_count:
-                count_to_fetch = min(step, total_count - current_offset)
-                jobs.append({
-                    'post': post_obj,
-                    'type': type_,
-                    'offset': current_offset,
-                    'count': count_to_fetch
-                })
-                current_offset += step
-
-        completed_jobs = 0
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_job = {}
-            for i, job in enumerate(jobs):
-                type_ = job['type']
-                tokens_for_task = admin_tokens if type_ == 'reposts' else unique_tokens
-                
-                if type_ == 'reposts' and not tokens_for_task:
-                     completed_jobs += 1
-                     continue
-
-                future = executor.submit(
-                    _fetch_deep_scan_batch,
-                    tokens_for_task, i, owner_id, job['post'].vk_post_id,
-                    type_, job['offset'], job['count'], project_id
-                )
-                future_to_job[future] = job
-            
-            for future in concurrent.futures.as_completed(future_to_job):
-                job = future_to_job[future]
+    # Репосты собираются только админскими токенами
+    token_pools = {'user': unique_tokens, 'admin': admin_tokens}
+    pool_of = lambda type_: 'admin' if type_ == 'reposts' else 'user'
+
+    # Параллельность execute подстраивается под троттлинг токенов (Code 6)
+    limiter = AdaptiveConcurrency(
+        unique_tokens,
+        initial=min(len(unique_tokens), INTERACTIONS_MAX_WORKERS),
+        maximum=min(len(unique_tokens) * INTERACTIONS_WORKERS_PER_TOKEN, INTERACTIONS_WORKERS_CEILING),
+        name="SERVICE: Interactions"
+    )
+    failed_calls = 0
+
+    def make_packs(calls_by_pool: Dict[str, List[Dict]]) -> List:
+        return [(token_pools[pool], pack) for pool, calls in calls_by_pool.items() for pack in pack_calls(calls)]
+
+    def on_pack_done(pack: List[Dict], results: List[Optional[Dict]]):
+        """Пишет ответы пакета в БД и отмечает выполненные подвызовы в чекпоинте."""
+        nonlocal failed_calls
+        likes_acc: Dict[int, Dict] = {}
+        comments_acc: Dict[int, Dict] = {}
+        reposts_acc: Dict[int, Dict] = {}
+        completed = []
+        for call, res in zip(pack, results):
+            if res is None:
+                failed_calls += 1
+                continue
+            type_ = call['type']
+            post_obj = call['post']
+
+            items = res.get('items') or []
+            profiles_raw = res.get('profiles') or []
+            profiles_map = {p['id']: p for p in profiles_raw}
+            process_interaction_items(items, profiles_map, type_, post_obj, likes_acc, comments_acc, reposts_acc)
+
+            # Первая страница: по точному счетчику планируем Deep Scan
+            if 'key' not in call:
+                raw_count = res.get('count')
+                try:
+                    count = int(raw_count) if raw_count is not None else 0
+                except (TypeError, ValueError):
+                    count = 0
+                if count > PAGE_SIZE[type_]:
+                    checkpoint["deep"].setdefault(f"{post_obj.vk_post_id}:{type_}", new_deep_entry(type_, count))
+            completed.append(call)
+
+        involved = _flush_batch(project_id, likes_acc, comments_acc, reposts_acc)
+        for call in completed:
+            if 'key' in call:
+                checkpoint["deep"][call['key']]["done"].append(call['offset'])
+            else:
+                checkpoint["fast"].setdefault(call['type'], []).append(call['post'].vk_post_id)
+        commit_progress(involved)
+
+    def run_packs(packs: List):
+        """Выполняет execute-пакеты параллельно, результаты обрабатываются в этом потоке по мере готовности."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=limiter.maximum) as executor:
+            future_to_pack = {
+                executor.submit(_fetch_execute_pack, tokens, i, owner_id, pack, project_id, limiter): pack
+                for i, (tokens, pack) in enumerate(packs)
+            }
+            for done_count, future in enumerate(concurrent.futures.as_completed(future_to_pack), start=1):
+                pack = future_to_pack[future]
                 try:
-                    res = future.result() or {}
-                    items = res.get('items') or []
-                    profiles_raw = res.get('profiles') or []
-                    profiles_map = {p['id']: p for p in profiles_raw}
-                    
-                    process_interaction_items(items, profiles_map, job['type'], job['post'], likes_acc, comments_acc, reposts_acc)
+                    on_pack_done(pack, future.result())
                 except Exception as e:
-                    print(f"Deep scan job failed: {e}")
-                
-                completed_jobs += 1
-                task_monitor.update_task(task_id, "fetching", loaded=completed_jobs, total=len(jobs))
+                    print(f"Batch processing error: {e}")
+                task_monitor.update_task(task_id, "fetching", loaded=done_count, total=len(packs))
 
-    # --- PHASE 3: WRITE BASIC DATA ---
-    db = SessionLocal()
-    try:
-        task_monitor.update_task(task_id, "processing", message="Сохранение в БД...")
-        
-        def prepare_for_db(data_map, project_id):
-            result = []
-            for uid, data in data_map.items():
-                data['id'] = f"{project_id}_{uid}"
-                data['project_id'] = project_id
-                data['post_ids'] = json.dumps(list(data['post_ids']))
-                result.append(data)
-            return result
+    # === PHASE 2.1: FAST SCAN ===
+    # Первая страница каждого поста, которого нет в чекпоинте
+    fast_calls: Dict[str, List[Dict]] = {'user': [], 'admin': []}
+    for type_ in types_to_process:
+        # Если токенов для репостов нет, пропускаем этот тип
+        if type_ == 'reposts' and not admin_tokens:
+            print("Skipping reposts due to lack of admin tokens.")
+            continue
+        done_ids = set(checkpoint["fast"].get(type_, []))
+        fast_calls[pool_of(type_)].extend(plan_fast_calls(posts, type_, done_ids))
 
-        if likes_acc:
-            crud.bulk_upsert_interactions(db, project_id, 'likes', prepare_for_db(likes_acc, project_id))
-        if comments_acc:
-            crud.bulk_upsert_interactions(db, project_id, 'comments', prepare_for_db(comments_acc, project_id))
-        if reposts_acc:
-            crud.bulk_upsert_interactions(db, project_id, 'reposts', prepare_for_db(reposts_acc, project_id))
-            
-    except Exception as e:
-        print(f"Error saving basic interaction data: {e}")
-        task_monitor.update_task(task_id, "error", error=str(e))
-        return # Выходим, если базовое сохранение не удалось
-    finally:
-        db.close()
+    fast_packs = make_packs(fast_calls)
+    task_monitor.update_task(task_id, "fetching", message="Фаза 1: Быстрое сканирование...", loaded=0, total=len(fast_packs))
+    print(f"SERVICE: Fast scan: {sum(len(c) for c in fast_calls.values())} calls in {len(fast_packs)} execute requests.")
+    run_packs(fast_packs)
 
-    # --- PHASE 4: PROFILE ENRICHMENT (Докачка данных) ---
-    # VK API (особенно wall.getReposts) часто возвращает "урезанные" объекты пользователей без city/bdate/platform.
-    # Чтобы статистика работала, нам нужно принудительно обновить их через users.get.
-    
-    all_involved_ids = set()
-    if likes_acc: all_involved_ids.update(likes_acc.keys())
-    if comments_acc: all_involved_ids.update(comments_acc.keys())
-    if reposts_acc: all_involved_ids.update(reposts_acc.keys())
-    
-    if all_involved_ids:
-        task_monitor.update_task(task_id, "processing", message=f"Догрузка профилей ({len(all_involved_ids)})...")
-        print(f"SERVICE: Enriching profiles for {len(all_involved_ids)} interaction users...")
-        
-        try:
-            fields = 'sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,deactivated,is_closed,can_access_closed,platform'
-            # Используем fetch_users_smart_parallel для быстрого сбора
-            enriched_profiles = fetch_users_smart_parallel(list(all_involved_ids), unique_tokens, fields, project_id)
-            
-            updates = []
-            for u in enriched_profiles:
-                updates.append({
-                    'vk_user_id': u['id'],
-                    'first_name': u.get('first_name'),
-                    'last_name': u.get('last_name'),
-                    'sex': u.get('sex'),
-                    'photo_url': u.get('photo_100'),
-                    'domain': u.get('domain'),
-                    'bdate': u.get('bdate'),
-                    'city': u.get('city', {}).get('title') if u.get('city') else None,
-                    'country': u.get('country', {}).get('title') if u.get('country') else None,
-                    'has_mobile': bool(u.get('has_mobile')),
-                    'deactivated': u.get('deactivated'),
-                    'last_seen': u.get('last_seen', {}).get('time') if u.get('last_seen') else None,
-                    'platform': u.get('last_seen', {}).get('platform') if u.get('last_seen') else None,
-                    'is_closed': u.get('is_closed'),
-                    'can_access_closed': u.get('can_access_closed')
-                })
-            
-            # Применяем обновления ко всем таблицам, где есть эти пользователи
-            if updates:
-                db_enrich = SessionLocal()
-                try:
-                    if likes_acc: crud.bulk_update_interaction_users(db_enrich, project_id, 'likes', updates)
-                    if comments_acc: crud.bulk_update_interaction_users(db_enrich, project_id, 'comments', updates)
-                    if reposts_acc: crud.bulk_update_interaction_users(db_enrich, project_id, 'reposts', updates)
-                    db_enrich.commit()
-                finally:
-                    db_enrich.close()
+    # === PHASE 2.2: DEEP SCAN ===
+    # Остальные страницы постов, счетчик которых больше первой страницы
+    deep_calls: Dict[str, List[Dict]] = {'user': [], 'admin': []}
+    for key, entry in checkpoint["deep"].items():
+        vk_post_id, type_ = key.split(':')
+        post_obj = posts_by_vk_id.get(int(vk_post_id))
+        if not post_obj or type_ not in types_to_process:
+            continue
+        if type_ == 'reposts' and not admin_tokens:
+            continue
+        deep_calls[pool_of(type_)].extend(plan_deep_calls(key, entry, post_obj))
+
+    deep_packs = make_packs(deep_calls)
+    if deep_packs:
+        task_monitor.update_task(task_id, "fetching", message=f"Фаза 2: Докачка ({len(deep_packs)} заданий)...", loaded=0, total=len(deep_packs))
+        print(f"SERVICE: Deep scan: {sum(len(c) for c in deep_calls.values())} calls in {len(deep_packs)} execute requests.")
+        run_packs(deep_packs)
 
+    if failed_calls:
+        print(f"SERVICE: {failed_calls} interaction page(s) failed to load for '{project_name}'.")
+
+    # --- PHASE 3: PROFILE ENRICHMENT (остаток) ---
+    if enrich_pending:
+        task_monitor.update_task(task_id, "processing", message=f"Догрузка профилей ({len(enrich_pending)})...")
+        try:
+            _enrich_profiles(project_id, list(enrich_pending), unique_tokens, types_to_process)
+            enrich_pending.clear()
+            checkpoint["enrich"] = []
+            task_monitor.save_checkpoint(task_id, checkpoint)
         except Exception as e:
             print(f"Error enriching interaction profiles: {e}")
             # Не фейлим задачу целиком, так как базовые данные уже есть
-    
-    # --- PHASE 5: META UPDATE ---
+
+    # --- PHASE 4: META UPDATE ---
     db = SessionLocal()
     try:
         count_likes = db.query(models.SystemListLikes).filter(models.SystemListLikes.project_id == project_id).count()
         count_comments = db.query(models.SystemListComments).filter(models.SystemListComments.project_id == project_id).count()
         count_reposts = db.query(models.SystemListReposts).filter(models.SystemListReposts.project_id == project_id).count()
-        
+
         timestamp = get_rounded_timestamp()
-        
+
         meta_updates = {
             "likes_count": count_likes,
             "comments_count": count_comments,
             "reposts_count": count_reposts,
         }
-        
+
         if interaction_type in ['all', 'likes']: meta_updates["likes_last_updated"] = timestamp
         if interaction_type in ['all', 'comments']: meta_updates["comments_last_updated"] = timestamp
         if interaction_type in ['all', 'reposts']: meta_updates["reposts_last_updated"] = timestamp
-        
+
         crud.update_list_meta(db, project_id, meta_updates)
-        task_monitor.update_task(task_id, "done", message=f"Готово")
+        task_monitor.save_checkpoint(task_id, None)
+        task_monitor.update_task(task_id, "done", message="Готово")
 
     except Exception as e:
         task_monitor.update_task(task_id, "error", error=str(e))
     finally:
         db.close()
+
+
+def resume_interrupted_interaction_syncs() -> int:
+    """
+    Вызывается при старте приложения: продолжает синхронизации взаимодействий,
+    прерванные перезапуском (без обновлений дольше TASK_STALE_SECONDS - живые
+    задачи других воркеров не трогаем). Каждую задачу забирает только один процесс.
+    """
+    resumed = 0
+    try:
+        interrupted = task_monitor.get_interrupted_tasks('interactions')
+    except Exception as e:
+        print(f"SERVICE: Cannot load interrupted interaction syncs: {e}")
+        return 0
+
+    for task in interrupted:
+        if not task_monitor.claim_task(task["task_id"], task["updated_at"]):
+            continue
+        params = task["params"]
+        threading.Thread(
+            target=refresh_interactions_task,
+            args=(task["task_id"], task["project_id"], params["date_from"], params["date_to"],
+                  settings.vk_user_token, params["interaction_type"]),
+            name=f"interactions-resume-{task['task_id'][:8]}",
+            daemon=True
+        ).start()
+        resumed += 1
+        print(f"SERVICE: Resuming interaction sync {task['task_id']} for project {task['project_id']}")
+    return resumed
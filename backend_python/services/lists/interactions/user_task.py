@@ -2,8 +2,8 @@
 import crud
 import models
 from services import task_monitor
-from services.lists.list_sync_utils import get_all_project_tokens, fetch_users_smart_parallel
-from crud.lists.utils import deduplicate_users
+from services.lists.list_sync_utils import get_all_project_tokens
+from services.vk_profile_cache import vk_profile_cache
 from database import SessionLocal
 
 def refresh_interaction_users_task(task_id: str, project_id: str, list_type: str, user_token: str):
@@ -25,9 +25,6 @@ def refresh_interaction_users_task(task_id: str, project_id: str, list_type: str
             task_monitor.update_task(task_id, "error", error="Invalid list type")
             return
 
-        # Удаляем дубликаты перед обработкой
-        deduplicate_users(db, model, project_id)
-
         all_vk_ids = crud.get_all_interaction_vk_ids(db, project_id, list_type)
         unique_tokens = get_all_project_tokens(db, user_token)
     finally:
@@ -47,8 +44,7 @@ def refresh_interaction_users_task(task_id: str, project_id: str, list_type: str
     def on_progress(loaded, total):
         task_monitor.update_task(task_id, "fetching", loaded=loaded, total=total)
 
-    fields = 'last_seen,first_name,last_name,sex,photo_100,bdate,city,country,domain,has_mobile'
-    fetched_users = fetch_users_smart_parallel(all_vk_ids, unique_tokens, fields, project_id, on_progress)
+    fetched_users = vk_profile_cache.get_profiles(all_vk_ids, unique_tokens, project_id, on_progress)
     
     # --- Phase 3: Write ---
     db = SessionLocal()
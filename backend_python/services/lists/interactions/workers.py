@@ -1,232 +1,93 @@
-
 import json
-import time
-from typing import List, Dict, Any
+from contextlib import nullcontext
+from typing import List, Dict, Optional
 
-import models
-from services.vk_api.api_client import call_vk_api as raw_vk_call
-from .config import (
-    LIKES_INNER_COUNT, LIKES_ITERATIONS,
-    COMMENTS_INNER_COUNT, COMMENTS_ITERATIONS,
-    REPOSTS_INNER_COUNT, REPOSTS_ITERATIONS
-)
+from services.vk_api.api_client import call_vk_api as raw_vk_call, VkApiError
+from services.vk_api.token_scheduler import token_scheduler
 
-def _fetch_multi_post_batch(
-    tokens: List[str], 
-    chunk_index: int, 
-    posts_chunk: List[models.SystemListPost], 
-    interaction_type: str, 
-    owner_id: int,
-    project_id: str
-) -> List[Dict]:
-    """
-    Воркер ФАЗЫ 1: Запрашивает первые 1000 активностей сразу для НЕСКОЛЬКИХ постов.
-    Возвращает список результатов: [{post_id, count, items, profiles, groups}, ...]
-    """
-    if not tokens or not posts_chunk:
-        return []
+# ВАЖНО: Полный список полей для профиля
+PROFILE_FIELDS = "sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,is_closed,can_access_closed"
 
-    # Подготовка параметров для скрипта
-    post_ids = [p.vk_post_id for p in posts_chunk]
-    
-    # ВАЖНО: Полный список полей для профиля
-    common_fields = "sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,is_closed,can_access_closed"
-    
-    # Формируем VK Script
-    if interaction_type == 'likes':
-        code = f"""
-        var post_ids = {json.dumps(post_ids)};
-        var owner_id = {owner_id};
-        var result = [];
-        var i = 0;
-        
-        while (i < post_ids.length) {{
-            var pid = post_ids[i];
-            var resp = API.likes.getList({{
-                "type": "post", "owner_id": owner_id, "item_id": pid,
-                "filter": "likes", "extended": 1, "fields": "{common_fields}",
-                "count": 1000, "offset": 0
-            }});
-            result.push({{
-                "post_id": pid,
-                "count": resp.count ? resp.count : 0,
-                "items": resp.items ? resp.items : []
-            }});
-            i = i + 1;
-        }}
-        return result;
-        """
-    elif interaction_type == 'comments':
-        code = f"""
-        var post_ids = {json.dumps(post_ids)};
-        var owner_id = {owner_id};
-        var result = [];
-        var i = 0;
-        
-        while (i < post_ids.length) {{
-            var pid = post_ids[i];
-            var resp = API.wall.getComments({{
-                "owner_id": owner_id, "post_id": pid,
-                "extended": 1, "fields": "{common_fields}",
-                "count": 100, "offset": 0
-            }});
-            result.push({{
-                "post_id": pid,
-                "count": resp.count ? resp.count : 0,
-                "items": resp.items ? resp.items : [],
-                "profiles": resp.profiles ? resp.profiles : [],
-                "groups": resp.groups ? resp.groups : []
-            }});
-            i = i + 1;
-        }}
-        return result;
-        """
-    elif interaction_type == 'reposts':
-        code = f"""
-        var post_ids = {json.dumps(post_ids)};
-        var owner_id = {owner_id};
-        var result = [];
-        var i = 0;
-        
-        while (i < post_ids.length) {{
-            var pid = post_ids[i];
-            var resp = API.wall.getReposts({{
-                "owner_id": owner_id, "post_id": pid,
-                "extended": 1, "fields": "{common_fields}",
-                "count": 1000, "offset": 0
-            }});
-            result.push({{
-                "post_id": pid,
-                "count": resp.count ? resp.count : 0,
-                "items": resp.items ? resp.items : [],
-                "profiles": resp.profiles ? resp.profiles : [],
-                "groups": resp.groups ? resp.groups : []
-            }});
-            i = i + 1;
-        }}
-        return result;
-        """
-    else:
-        return []
+# Code 13: Runtime error внутри execute (в т.ч. слишком большой ответ) - от токена не зависит
+EXECUTE_RUNTIME_ERROR = 13
 
-    # Ротация токенов
-    num_tokens = len(tokens)
-    primary_index = chunk_index % num_tokens
-    rotation_order = tokens[primary_index:] + tokens[:primary_index]
 
-    for token in rotation_order:
-        masked_token = f"...{token[-6:]}" if len(token) > 6 else "???"
-        try:
-            result = raw_vk_call("execute", {"code": code, "access_token": token}, project_id=project_id)
-            
-            # Проверка на пустой результат (если посты были, а ответ пустой/null)
-            if result is None and post_ids:
-                 raise Exception("Empty response from execute (Token might be restricted).")
-            
-            # Легкий троттлинг после успешного запроса для снижения нагрузки на API
-            time.sleep(0.1)
-                 
-            return result if isinstance(result, list) else []
+class ExecutePackTooHeavy(Exception):
+    """execute упал с runtime error: пакет нужно разбить."""
 
-        except Exception as e:
-            print(f"   [MultiWorker {interaction_type} {masked_token}] !! ERROR: {e}. Trying next...")
-            time.sleep(0.2)
 
-    print(f"   [MultiWorker] !! ALL TOKENS FAILED for chunk {chunk_index}")
-    return []
+def _sub_call_code(call: Dict, owner_id: int) -> str:
+    """VK Script одного подвызова: страница лайков, комментариев или репостов поста."""
+    type_ = call['type']
+    post_id = call['post'].vk_post_id
+    if type_ == 'likes':
+        params = {
+            "type": "post", "owner_id": owner_id, "item_id": post_id,
+            "filter": "likes", "extended": 1, "fields": PROFILE_FIELDS,
+            "count": call['count'], "offset": call['offset']
+        }
+        return f"API.likes.getList({json.dumps(params)})"
+    params = {
+        "owner_id": owner_id, "post_id": post_id,
+        "extended": 1, "fields": PROFILE_FIELDS,
+        "count": call['count'], "offset": call['offset']
+    }
+    method = 'wall.getComments' if type_ == 'comments' else 'wall.getReposts'
+    return f"API.{method}({json.dumps(params)})"
 
-def _fetch_deep_scan_batch(
-    tokens: List[str], 
-    chunk_index: int, 
-    owner_id: int, 
-    post_vk_id: int, 
-    interaction_type: str, 
-    offset: int, 
-    count_to_fetch: int, 
-    project_id: str
-) -> Dict[str, List]:
-    """
-    Воркер ФАЗЫ 2: Глубокое сканирование одного поста (для > 1000 активностей).
-    Использует execute для пагинации внутри одного поста.
-    """
-    if not tokens:
-        return {"items": [], "profiles": [], "groups": []}
-
-    # Поля, которые мы хотим получить
-    fields_param = "sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,is_closed,can_access_closed"
 
-    if interaction_type == 'likes':
-        api_method = 'likes.getList'
-        inner_count = LIKES_INNER_COUNT
-        base_params = f'"type": "post", "owner_id": {owner_id}, "item_id": {post_vk_id}, "filter": "likes", "extended": 1, "fields": "{fields_param}"'
-    elif interaction_type == 'comments':
-        api_method = 'wall.getComments'
-        inner_count = COMMENTS_INNER_COUNT
-        base_params = f'"owner_id": {owner_id}, "post_id": {post_vk_id}, "extended": 1, "fields": "{fields_param}"'
-    elif interaction_type == 'reposts':
-        api_method = 'wall.getReposts'
-        inner_count = REPOSTS_INNER_COUNT
-        base_params = f'"owner_id": {owner_id}, "post_id": {post_vk_id}, "extended": 1, "fields": "{fields_param}"'
-    else:
-        return {"items": [], "profiles": [], "groups": []}
+def build_pack_code(calls: List[Dict], owner_id: int) -> str:
+    """Один execute на пакет: массив ответов в порядке подвызовов (false - подвызов упал)."""
+    return "return [" + ", ".join(_sub_call_code(c, owner_id) for c in calls) + "];"
 
-    iterations = (count_to_fetch + inner_count - 1) // inner_count
-    
-    # VK Script для пагинации
-    if interaction_type == 'likes':
-        code = f"""
-        var offset = {offset};
-        var count = {inner_count};
-        var iterations = {iterations};
-        var items = [];
-        var i = 0;
-        while (i < iterations) {{
-            var resp = API.{api_method}({{ {base_params}, "offset": offset + (i * count), "count": count }});
-            if (resp.items) {{ items = items + resp.items; }}
-            i = i + 1;
-        }}
-        return {{"items": items}};
-        """
-    else:
-        code = f"""
-        var offset = {offset};
-        var count = {inner_count};
-        var iterations = {iterations};
-        var items = [];
-        var profiles = [];
-        var groups = [];
-        var i = 0;
-        while (i < iterations) {{
-            var resp = API.{api_method}({{ {base_params}, "offset": offset + (i * count), "count": count }});
-            if (resp.items) {{ items = items + resp.items; }}
-            if (resp.profiles) {{ profiles = profiles + resp.profiles; }}
-            if (resp.groups) {{ groups = groups + resp.groups; }}
-            i = i + 1;
-        }}
-        return {{"items": items, "profiles": profiles, "groups": groups}};
-        """
 
-    # Ротация
-    num_tokens = len(tokens)
-    primary_index = chunk_index % num_tokens
-    rotation_order = tokens[primary_index:] + tokens[:primary_index]
+def _execute_pack(tokens: List[str], pack_index: int, owner_id: int, calls: List[Dict], project_id: str) -> List[Optional[Dict]]:
+    code = build_pack_code(calls, owner_id)
 
-    for token in rotation_order:
+    # Ротация токенов
+    for token in token_scheduler.rotation(tokens, pack_index):
         masked_token = f"...{token[-6:]}" if len(token) > 6 else "???"
         try:
             result = raw_vk_call("execute", {"code": code, "access_token": token}, project_id=project_id)
-            
-            # Легкий троттлинг
-            time.sleep(0.1)
-
-            items = result.get('items', [])
-            if not items and count_to_fetch > 0:
-                 # pass or raise exception based on strictness
-                 pass
-            return result
+            if not isinstance(result, list) or len(result) != len(calls):
+                raise Exception(f"Unexpected execute response for {len(calls)} calls (Token might be restricted).")
+            return [r if isinstance(r, dict) else None for r in result]
+        except VkApiError as e:
+            if e.code == EXECUTE_RUNTIME_ERROR:
+                raise ExecutePackTooHeavy(str(e))
+            print(f"   [PackWorker {masked_token}] !! ERROR: {e}. Trying next...")
         except Exception as e:
-            print(f"   [DeepWorker {interaction_type} {masked_token}] !! ERROR post={post_vk_id}: {e}. Trying next...")
-            time.sleep(0.2)
+            print(f"   [PackWorker {masked_token}] !! ERROR: {e}. Trying next...")
+
+    print(f"   [PackWorker] !! ALL TOKENS FAILED for pack {pack_index} ({len(calls)} calls)")
+    return [None] * len(calls)
 
-    print(f"   [DeepWorker] !! ALL TOKENS FAILED for post={post_vk_id}")
-    return {"items": [], "profiles": [], "groups": []}
+
+def _fetch_execute_pack(
+    tokens: List[str],
+    pack_index: int,
+    owner_id: int,
+    calls: List[Dict],
+    project_id: str,
+    limiter=None
+) -> List[Optional[Dict]]:
+    """
+    Воркер: выполняет пакет подвызовов (planner.pack_calls) одним execute.
+    Возвращает ответы в порядке подвызовов, None - подвызов не выполнен.
+    Если execute не укладывается в лимиты VK, пакет делится пополам.
+    """
+    if not tokens or not calls:
+        return [None] * len(calls)
+    try:
+        with limiter or nullcontext():
+            return _execute_pack(tokens, pack_index, owner_id, calls, project_id)
+    except ExecutePackTooHeavy as e:
+        if len(calls) == 1:
+            print(f"   [PackWorker] !! Single call failed post={calls[0]['post'].vk_post_id}: {e}")
+            return [None]
+        middle = len(calls) // 2
+        print(f"   [PackWorker] Pack {pack_index} too heavy ({len(calls)} calls), splitting.")
+        return (
+            _fetch_execute_pack(tokens, pack_index, owner_id, calls[:middle], project_id, limiter)
+            + _fetch_execute_pack(tokens, pack_index + 1, owner_id, calls[middle:], project_id, limiter)
+        )
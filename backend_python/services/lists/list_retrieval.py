@@ -2,7 +2,8 @@
 from sqlalchemy.orm import Session
 from typing import Optional
 import crud
-from .retrieval.fetchers import fetch_list_items, fetch_list_count
+from .retrieval.fetchers import fetch_list_items, fetch_list_count, REVIEW_LIST_TYPES
+from .retrieval.keyset import fetch_list_items_keyset, count_list_items
 
 # Этот файл теперь является Фасадом (Hub), который объединяет
 # логику из подмодулей пакета `retrieval`.
@@ -26,9 +27,26 @@ def get_subscribers(
     filter_can_write: str = 'all',
     filter_bdate_month: str = 'any', # NEW
     filter_platform: str = 'any', # NEW
-    filter_age: str = 'any' # NEW
+    filter_age: str = 'any', # NEW
+    pagination: str = 'offset',
+    cursor: Optional[str] = None,
+    exact_count: bool = False
 ):
+    # Курсорный режим: без OFFSET и, по умолчанию, без точного COUNT.
+    # Списки конкурса отзывов маленькие и собираются из другой таблицы - для них всегда offset.
+    if pagination == 'cursor' and list_type not in REVIEW_LIST_TYPES:
+        filters = (search_query, filter_quality, filter_sex, filter_online, filter_can_write, filter_bdate_month, filter_platform, filter_age)
+        meta = crud.get_list_meta(db, project_id)
+        items, next_cursor = fetch_list_items_keyset(db, project_id, list_type, page_size, cursor, *filters)
+        crud.attach_interaction_post_ids(db, project_id, list_type, items)
+        total, total_exact = count_list_items(db, project_id, list_type, meta, exact_count, *filters)
+        return {
+            "meta": meta, "items": items, "total_count": total, "page": page, "page_size": page_size,
+            "next_cursor": next_cursor, "total_count_exact": total_exact
+        }
+
     items = fetch_list_items(db, project_id, list_type, page, page_size, search_query, filter_quality, filter_sex, filter_online, filter_can_write, filter_bdate_month, filter_platform, filter_age)
+    crud.attach_interaction_post_ids(db, project_id, list_type, items)
     total = fetch_list_count(db, project_id, list_type, search_query, filter_quality, filter_sex, filter_online, filter_can_write, filter_bdate_month, filter_platform, filter_age)
     meta = crud.get_list_meta(db, project_id)
     return {"meta": meta, "items": items, "total_count": total, "page": page, "page_size": page_size}
@@ -53,6 +71,8 @@ def get_interactions(
     filter_age: str = 'any' # NEW
 ):
     items = fetch_list_items(db, project_id, list_type, page, 50, search_query, filter_quality, filter_sex, filter_online, 'all', filter_bdate_month, filter_platform, filter_age)
+    # post_ids больше не хранится в строке пользователя - собираем из ребер для страницы
+    crud.attach_interaction_post_ids(db, project_id, list_type, items)
     total = fetch_list_count(db, project_id, list_type, search_query, filter_quality, filter_sex, filter_online, 'all', filter_bdate_month, filter_platform, filter_age)
     meta = crud.get_list_meta(db, project_id)
     return {"meta": meta, "items": items, "total_count": total, "page": page, "page_size": 50}
@@ -2,8 +2,8 @@
 import crud
 import models
 from services import task_monitor
-from services.lists.list_sync_utils import get_all_project_tokens, fetch_users_smart_parallel
-from crud.lists.utils import deduplicate_users
+from services.lists.list_sync_utils import get_all_project_tokens
+from services.vk_profile_cache import vk_profile_cache
 from database import SessionLocal
 from services.post_helpers import get_rounded_timestamp
 
@@ -22,10 +22,7 @@ def refresh_author_details_task(task_id: str, project_id: str, user_token: str):
             task_monitor.update_task(task_id, "error", error="Project not found")
             return
             
-        # 1. Удаляем дубликаты
-        deduplicate_users(db, models.SystemListAuthor, project_id)
-        
-        # 2. Получаем ID всех авторов
+        # 1. Получаем ID всех авторов
         results = db.query(models.SystemListAuthor.vk_user_id).filter(models.SystemListAuthor.project_id == project_id).all()
         all_vk_ids = [r[0] for r in results]
         
@@ -43,12 +40,11 @@ def refresh_author_details_task(task_id: str, project_id: str, user_token: str):
 
     # --- Phase 2: Network ---
     task_monitor.update_task(task_id, "fetching", loaded=0, total=len(all_vk_ids))
-    fields = 'sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,deactivated,is_closed,can_access_closed'
     
     def on_progress(loaded, total):
         task_monitor.update_task(task_id, "fetching", loaded=loaded, total=total)
 
-    fetched_users = fetch_users_smart_parallel(all_vk_ids, unique_tokens, fields, project_id, on_progress)
+    fetched_users = vk_profile_cache.get_profiles(all_vk_ids, unique_tokens, project_id, on_progress)
 
     # --- Phase 3: Write ---
     db = SessionLocal()
@@ -82,7 +78,7 @@ def refresh_author_details_task(task_id: str, project_id: str, user_token: str):
         if updates:
             crud.bulk_upsert_authors(db, updates)
 
-        # Пересчитываем реальное количество авторов (на случай, если дубликаты были удалены)
+        # Пересчитываем реальное количество авторов
         real_count = db.query(models.SystemListAuthor).filter(models.SystemListAuthor.project_id == project_id).count()
             
         timestamp = get_rounded_timestamp()
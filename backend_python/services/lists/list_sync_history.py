@@ -7,8 +7,8 @@ import models
 from services import vk_service, task_monitor
 from services.post_helpers import get_rounded_timestamp
 from database import SessionLocal
-from .list_sync_utils import get_all_project_tokens, fetch_users_smart_parallel
-from crud.lists.utils import deduplicate_users
+from services.vk_profile_cache import vk_profile_cache
+from .list_sync_utils import get_all_project_tokens
 
 def refresh_history_details_task(task_id: str, project_id: str, list_type: str, user_token: str):
     """
@@ -30,9 +30,6 @@ def refresh_history_details_task(task_id: str, project_id: str, list_type: str,
             task_monitor.update_task(task_id, "error", error="Invalid list type")
             return
 
-        # 1. Удаляем дубликаты перед получением списка ID
-        deduplicate_users(db, model, project_id)
-
         all_vk_ids = crud.get_all_history_vk_ids(db, project_id, list_type)
         unique_tokens = get_all_project_tokens(db, user_token)
     finally:
@@ -48,12 +45,11 @@ def refresh_history_details_task(task_id: str, project_id: str, list_type: str,
 
     # --- Phase 2: Network ---
     task_monitor.update_task(task_id, "fetching", loaded=0, total=len(all_vk_ids))
-    fields = 'last_seen,first_name,last_name,sex,photo_100,bdate,city,country,domain,has_mobile'
     
     def on_progress(loaded, total):
         task_monitor.update_task(task_id, "fetching", loaded=loaded, total=total)
 
-    fetched_users = fetch_users_smart_parallel(all_vk_ids, unique_tokens, fields, project_id, on_progress)
+    fetched_users = vk_profile_cache.get_profiles(all_vk_ids, unique_tokens, project_id, on_progress)
     
     # --- Phase 3: Write ---
     db = SessionLocal()
@@ -2,10 +2,12 @@
 # Этот файл теперь выступает в роли хаба (Facade), объединяя функциональность
 # из подпакета `interactions`. Это обеспечивает обратную совместимость.
 
-from .interactions.sync_task import refresh_interactions_task
+from .interactions.sync_task import refresh_interactions_task, interactions_task_params, resume_interrupted_interaction_syncs
 from .interactions.user_task import refresh_interaction_users_task
 
 __all__ = [
     'refresh_interactions_task',
-    'refresh_interaction_users_task'
+    'refresh_interaction_users_task',
+    'interactions_task_params',
+    'resume_interrupted_interaction_syncs'
 ]
@@ -1,6 +1,5 @@
 
 import json
-import time
 import concurrent.futures
 from datetime import datetime, timezone
 from typing import List, Dict, Any
@@ -10,9 +9,11 @@ import models
 from services import vk_service, task_monitor
 from services.post_helpers import get_rounded_timestamp
 from services.vk_api.api_client import call_vk_api as raw_vk_call
+from services.vk_api.token_scheduler import token_scheduler
 from database import SessionLocal
 # Импортируем утилиты для получения токенов и скачивания юзеров
-from .list_sync_utils import get_all_project_tokens, fetch_users_smart_parallel
+from services.vk_profile_cache import vk_profile_cache
+from .list_sync_utils import get_all_project_tokens
 
 EXECUTE_BATCH_SIZE = 200
 
@@ -23,9 +24,7 @@ def _fetch_batch_execute(tokens: List[str], chunk_index: int, owner_id: str, off
     if not tokens:
         return []
 
-    num_tokens = len(tokens)
-    primary_index = chunk_index % num_tokens
-    rotation_order = tokens[primary_index:] + tokens[:primary_index]
+    rotation_order = token_scheduler.rotation(tokens, chunk_index)
 
     iterations = (count_to_fetch + 99) // 100
     
@@ -62,7 +61,7 @@ def _fetch_batch_execute(tokens: List[str], chunk_index: int, owner_id: str, off
 
             return result_items
         except Exception as e:
-            time.sleep(0.5) 
+            print(f"   [Posts Worker] Chunk offset {offset} failed with token ...{token[-4:]}: {e}. Trying next...")
 
     # Если все токены упали
     raise Exception(f"All tokens failed for post chunk offset {offset}")
@@ -233,7 +232,6 @@ def refresh_posts_task(task_id: str, project_id: str, user_token: str, limit: st
             
             for i, params in enumerate(failed_chunks):
                 try:
-                    time.sleep(1.0) # Пауза
                     items = _fetch_batch_execute(tokens, i, owner_id, params['offset'], params['count'], project_id)
                     
                     saved_count, new_authors = save_posts_chunk(items)
@@ -251,14 +249,10 @@ def refresh_posts_task(task_id: str, project_id: str, user_token: str, limit: st
             print(f"SERVICE: Collected {len(collected_author_ids)} unique author IDs. Fetching profiles...")
             task_monitor.update_task(task_id, "processing", message=f"Обновление авторов ({len(collected_author_ids)})...")
             try:
-                # Скачиваем данные профилей авторов
-                fields = 'sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,is_closed,can_access_closed,deactivated'
-                
-                # Используем вспомогательную функцию для скачивания (она уже умеет чанкинг и ротацию)
-                authors_profiles = fetch_users_smart_parallel(
+                # Профили авторов через общий кеш: в VK уходят только отсутствующие и устаревшие
+                authors_profiles = vk_profile_cache.get_profiles(
                     list(collected_author_ids), 
                     tokens, 
-                    fields, 
                     project_id
                 )
                 
@@ -1,24 +1,24 @@
 
-import time
 import concurrent.futures
 from typing import List, Dict, Optional
 from services.vk_api.api_client import call_vk_api as raw_vk_call
-import crud
-from database import SessionLocal
+from services.vk_api.token_scheduler import token_scheduler
+from services.token_pool import system_token_pool
 
 def get_all_project_tokens(db, user_token: str = None) -> List[str]:
     """
     Собирает "Армию токенов": ENV токен + Системные аккаунты.
+    Системные токены берутся из пула процесса (services/token_pool.py),
+    аргумент db сохранен для совместимости вызовов.
     """
     tokens = []
     if user_token:
         tokens.append(user_token)
     
-    system_tokens = crud.get_active_account_tokens(db)
-    tokens.extend(system_tokens)
+    tokens.extend(system_token_pool.get_tokens())
     
-    # Убираем дубликаты и пустые, сохраняя порядок (хотя для set порядок не гарантирован)
-    unique_tokens = list(set([t for t in tokens if t]))
+    # Убираем дубликаты и пустые, сохраняя порядок
+    unique_tokens = list(dict.fromkeys([t for t in tokens if t]))
     return unique_tokens
 
 def _check_token_admin_rights(token: str, group_id: int) -> Optional[str]:
@@ -106,13 +106,9 @@ def _fetch_chunk_smart(
     if not tokens:
         return []
 
-    # Round-Robin выбор "основного" токена для этого чанка
-    num_tokens = len(tokens)
-    primary_index = chunk_index % num_tokens
-    
-    # Формируем порядок перебора: [Primary, Next, Next, ..., Previous]
-    # Это гарантирует, что нагрузка распределена, но при сбое есть резерв
-    rotation_order = tokens[primary_index:] + tokens[:primary_index]
+    # Порядок перебора от планировщика: здоровые токены со свободным бюджетом первыми,
+    # при равенстве - Round-Robin от индекса чанка, чтобы нагрузка распределялась
+    rotation_order = token_scheduler.rotation(tokens, chunk_index)
     
     ids_str = ",".join(map(str, user_ids_chunk))
     last_error = None
@@ -134,7 +130,6 @@ def _fetch_chunk_smart(
         except Exception as e:
             print(f"   [Smart Worker] Chunk {chunk_index} FAILED with token {masked}: {e}. Trying next...")
             last_error = e
-            time.sleep(0.2) # Небольшая пауза перед ретраем с другим токеном
 
     print(f"   [Smart Worker] !! ALL TOKENS FAILED for Chunk {chunk_index}. Data skipped.")
     return []
@@ -1,10 +1,34 @@
 
 from sqlalchemy.orm import Session
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Tuple
 import models
 import services.automations.reviews.crud as crud_automations
 from .filters import apply_filters
 
+REVIEW_LIST_TYPES = ('reviews_participants', 'reviews_winners', 'reviews_posts')
+
+def resolve_list_model(list_type: str) -> Tuple[Any, Any]:
+    """
+    Модель таблицы списка и колонка даты, по которой список сортируется в UI.
+    """
+    if list_type == 'history_join':
+        return models.SystemListHistoryJoin, models.SystemListHistoryJoin.event_date
+    if list_type == 'history_leave':
+        return models.SystemListHistoryLeave, models.SystemListHistoryLeave.event_date
+    if list_type == 'posts':
+        return models.SystemListPost, models.SystemListPost.date
+    if list_type == 'likes':
+        return models.SystemListLikes, models.SystemListLikes.last_interaction_date
+    if list_type == 'comments':
+        return models.SystemListComments, models.SystemListComments.last_interaction_date
+    if list_type == 'reposts':
+        return models.SystemListReposts, models.SystemListReposts.last_interaction_date
+    if list_type == 'mailing':
+        return models.SystemListMailing, models.SystemListMailing.last_message_date
+    if list_type == 'authors': # NEW
+        return models.SystemListAuthor, models.SystemListAuthor.event_date
+    return models.SystemListSubscriber, models.SystemListSubscriber.added_at
+
 def fetch_list_items(
     db: Session, 
     project_id: str, 
@@ -22,7 +46,7 @@ def fetch_list_items(
 ) -> List[Any]:
     
     # 1. SPECIAL CASE: Automation lists (mapped from ReviewContestEntry)
-    if list_type in ['reviews_participants', 'reviews_winners', 'reviews_posts']:
+    if list_type in REVIEW_LIST_TYPES:
         contest = crud_automations.get_contest_settings(db, project_id)
         if not contest:
             return []
@@ -111,33 +135,7 @@ def fetch_list_items(
         return mapped_items
 
     # 2. STANDARD CASE
-    if list_type == 'history_join':
-        model = models.SystemListHistoryJoin
-        date_col = models.SystemListHistoryJoin.event_date
-    elif list_type == 'history_leave':
-        model = models.SystemListHistoryLeave
-        date_col = models.SystemListHistoryLeave.event_date
-    elif list_type == 'posts':
-        model = models.SystemListPost
-        date_col = models.SystemListPost.date
-    elif list_type == 'likes':
-        model = models.SystemListLikes
-        date_col = models.SystemListLikes.last_interaction_date
-    elif list_type == 'comments':
-        model = models.SystemListComments
-        date_col = models.SystemListComments.last_interaction_date
-    elif list_type == 'reposts':
-        model = models.SystemListReposts
-        date_col = models.SystemListReposts.last_interaction_date
-    elif list_type == 'mailing':
-        model = models.SystemListMailing
-        date_col = models.SystemListMailing.last_message_date
-    elif list_type == 'authors': # NEW
-        model = models.SystemListAuthor
-        date_col = models.SystemListAuthor.event_date
-    else:
-        model = models.SystemListSubscriber
-        date_col = models.SystemListSubscriber.added_at
+    model, date_col = resolve_list_model(list_type)
 
     query = db.query(model).filter(model.project_id == project_id)
     
@@ -167,7 +165,7 @@ def fetch_list_count(
     Возвращает количество записей, соответствующих фильтрам.
     """
     # 1. SPECIAL CASE: Automation lists
-    if list_type in ['reviews_participants', 'reviews_winners', 'reviews_posts']:
+    if list_type in REVIEW_LIST_TYPES:
         contest = crud_automations.get_contest_settings(db, project_id)
         if not contest: return 0
         
@@ -182,24 +180,7 @@ def fetch_list_count(
         return query.count()
 
     # 2. STANDARD CASE
-    if list_type == 'history_join':
-        model = models.SystemListHistoryJoin
-    elif list_type == 'history_leave':
-        model = models.SystemListHistoryLeave
-    elif list_type == 'posts':
-        model = models.SystemListPost
-    elif list_type == 'likes':
-        model = models.SystemListLikes
-    elif list_type == 'comments':
-        model = models.SystemListComments
-    elif list_type == 'reposts':
-        model = models.SystemListReposts
-    elif list_type == 'mailing':
-        model = models.SystemListMailing
-    elif list_type == 'authors': # NEW
-        model = models.SystemListAuthor
-    else:
-        model = models.SystemListSubscriber
+    model, _ = resolve_list_model(list_type)
 
     query = db.query(model).filter(model.project_id == project_id)
     
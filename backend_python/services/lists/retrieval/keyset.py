@@ -0,0 +1,197 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from .fetchers import resolve_list_model
+from .filters import apply_filters
+
+# ===================================================================
+# KEYSET (CURSOR) ПАГИНАЦИЯ СИСТЕМНЫХ СПИСКОВ
+# ===================================================================
+# Постраничный режим (OFFSET (page-1)*page_size) на глубоких страницах
+# списка в 500k строк заставляет базу пройти и выбросить все предыдущие
+# строки, а отдельный COUNT(*) с теми же фильтрами сканирует весь проект.
+#
+# Курсорный режим:
+# - Порядок тот же, что в UI: <дата> DESC NULLS LAST, плюс id DESC для
+#   однозначности при одинаковых датах.
+# - Курсор - последняя строка страницы (дата, id). Следующая страница
+#   начинается поиском по индексу (project_id, <дата> DESC) из миграции 52,
+#   а не пропуском строк. Строки без даты идут хвостом, его дочитываем
+#   отдельным запросом.
+# - Общее количество - приблизительное: счетчик из ProjectListMeta для
+#   списка без фильтров или оценка планировщика PostgreSQL. Точный COUNT
+#   выполняется только по запросу (exact_count=True).
+# ===================================================================
+
+# Тип списка -> счетчик в ProjectListMeta
+META_COUNT_FIELDS = {
+    'subscribers': 'subscribers_count',
+    'history_join': 'history_join_count',
+    'history_leave': 'history_leave_count',
+    'mailing': 'mailing_count',
+    'authors': 'authors_count',
+    'likes': 'likes_count',
+    'comments': 'comments_count',
+    'reposts': 'reposts_count',
+    'posts': 'stored_posts_count',
+}
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(date_value: Optional[datetime], item_id: str) -> str:
+    payload = json.dumps([date_value.isoformat() if date_value else None, item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_raw, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        date_value = datetime.fromisoformat(date_raw) if date_raw else None
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+    if not isinstance(item_id, str):
+        raise InvalidCursorError("Invalid cursor")
+    return date_value, item_id
+
+
+def keyset_after(query: Any, model, date_col, cursor_date: Optional[datetime], cursor_id: str) -> Any:
+    """
+    Строки строго после курсора среди строк С датой (или среди строк без даты,
+    если курсор уже в хвосте NULL). Условие date <= :d дает поиск по индексу.
+    """
+    if cursor_date is None:
+        return query.filter(date_col.is_(None), model.id < cursor_id).order_by(model.id.desc())
+    return query.filter(
+        date_col <= cursor_date,
+        or_(date_col < cursor_date, and_(date_col == cursor_date, model.id < cursor_id))
+    ).order_by(date_col.desc(), model.id.desc())
+
+
+def fetch_list_items_keyset(
+    db: Session,
+    project_id: str,
+    list_type: str,
+    page_size: int,
+    cursor: Optional[str] = None,
+    search_query: Optional[str] = None,
+    filter_quality: str = 'all',
+    filter_sex: str = 'all',
+    filter_online: str = 'any',
+    filter_can_write: str = 'all',
+    filter_bdate_month: str = 'any',
+    filter_platform: str = 'any',
+    filter_age: str = 'any'
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Возвращает (элементы страницы, курсор следующей страницы или None).
+    """
+    model, date_col = resolve_list_model(list_type)
+    query = db.query(model).filter(model.project_id == project_id)
+    query = apply_filters(query, list_type, search_query, filter_quality, filter_sex, filter_online, filter_can_write, filter_bdate_month, filter_platform, filter_age)
+
+    # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+    limit = page_size + 1
+
+    if not cursor:
+        items = query.order_by(date_col.desc().nulls_last(), model.id.desc()).limit(limit).all()
+    else:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        items = keyset_after(query, model, date_col, cursor_date, cursor_id).limit(limit).all()
+        if cursor_date is not None and len(items) < limit:
+            # Строки с датой закончились - продолжаем хвостом без даты
+            items += query.filter(date_col.is_(None)).order_by(model.id.desc()).limit(limit - len(items)).all()
+
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, date_col.key), last.id)
+
+
+def _has_filters(
+    search_query: Optional[str],
+    filter_quality: str,
+    filter_sex: str,
+    filter_online: str,
+    filter_can_write: str,
+    filter_bdate_month: str,
+    filter_platform: str,
+    filter_age: str
+) -> bool:
+    return bool(search_query and search_query.strip()) or any([
+        filter_quality != 'all',
+        filter_sex != 'all',
+        filter_online != 'any',
+        filter_can_write != 'all',
+        filter_bdate_month != 'any',
+        filter_platform != 'any',
+        filter_age != 'any',
+    ])
+
+
+def _planner_estimate(db: Session, query: Any) -> Optional[int]:
+    """Оценка количества строк из EXPLAIN (только PostgreSQL)."""
+    dialect = db.get_bind().dialect
+    if dialect.name != 'postgresql':
+        return None
+    try:
+        compiled = query.order_by(None).statement.compile(dialect=dialect)
+        # SAVEPOINT: упавший EXPLAIN иначе оставил бы транзакцию сессии в состоянии
+        # "aborted", и следующий запрос (COUNT) тоже упал бы
+        with db.begin_nested():
+            plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    except Exception as e:
+        print(f"SERVICE: Planner estimate failed, falling back to COUNT: {e}")
+        return None
+
+
+def count_list_items(
+    db: Session,
+    project_id: str,
+    list_type: str,
+    meta,
+    exact: bool = False,
+    search_query: Optional[str] = None,
+    filter_quality: str = 'all',
+    filter_sex: str = 'all',
+    filter_online: str = 'any',
+    filter_can_write: str = 'all',
+    filter_bdate_month: str = 'any',
+    filter_platform: str = 'any',
+    filter_age: str = 'any'
+) -> Tuple[int, bool]:
+    """
+    Возвращает (количество, точное ли оно).
+    Без exact: счетчик из meta для списка без фильтров, иначе оценка планировщика.
+    Если оценить нельзя (SQLite) - честный COUNT.
+    """
+    filtered = _has_filters(search_query, filter_quality, filter_sex, filter_online, filter_can_write, filter_bdate_month, filter_platform, filter_age)
+
+    if not exact and not filtered:
+        cached = getattr(meta, META_COUNT_FIELDS.get(list_type, ''), None)
+        if cached is not None:
+            return cached, False
+
+    model, _ = resolve_list_model(list_type)
+    query = db.query(model).filter(model.project_id == project_id)
+    query = apply_filters(query, list_type, search_query, filter_quality, filter_sex, filter_online, filter_can_write, filter_bdate_month, filter_platform, filter_age)
+
+    if not exact:
+        estimate = _planner_estimate(db, query)
+        if estimate is not None:
+            return estimate, False
+
+    return query.count(), True
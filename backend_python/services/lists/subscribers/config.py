@@ -2,3 +2,13 @@
 # Настройки пакетирования для синхронизации подписчиков
 EXECUTE_BATCH_SIZE = 2000
 INNER_REQ_COUNT = 1000
+
+# Потоковая синхронизация: с какого размера сообщества переключаемся на нее
+STREAMING_SYNC_MIN_MEMBERS = 100000
+# Сколько чанков одновременно "в полете" в потоковом режиме.
+# Пиковая память ~ STREAMING_MAX_IN_FLIGHT * EXECUTE_BATCH_SIZE участников.
+STREAMING_MAX_IN_FLIGHT = 8
+
+# Сверка (reconcile) для проектов, где список ведется событиями group_join/group_leave:
+# полный обход не чаще, чем раз в RECONCILE_INTERVAL_HOURS
+RECONCILE_INTERVAL_HOURS = 24
@@ -0,0 +1,90 @@
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+import crud
+from services.post_helpers import get_rounded_timestamp
+
+from .rows import build_member_base_data, build_subscriber_row, build_history_row, build_leave_history_row
+
+# ===================================================================
+# ДЕЛЬТЫ ПОДПИСЧИКОВ ИЗ CALLBACK API
+# ===================================================================
+# События group_join / group_leave применяются к списку подписчиков и
+# истории сразу, без полного обхода groups.getMembers.
+#
+# Обработка идемпотентна: VK может повторить событие, поэтому счетчики
+# меняются только если событие действительно изменило список
+# (вступивший еще не был подписчиком, вышедший еще был).
+# Накопившийся дрейф исправляет периодическая сверка (reconcile) -
+# полный обход в sync_task.
+# ===================================================================
+
+# Колонки строки без профиля: ключ, членство и источник
+_MEMBERSHIP_COLUMNS = ('id', 'project_id', 'vk_user_id', 'added_at', 'event_date', 'source')
+
+
+def _membership_only(row: Dict) -> Dict:
+    """Строка без полей профиля: upsert не затрет сохраненный профиль NULL-ами."""
+    return {k: v for k, v in row.items() if k in _MEMBERSHIP_COLUMNS}
+
+
+def apply_member_join(db: Session, project_id: str, vk_user_id: int, profile: Optional[Dict] = None) -> bool:
+    """
+    Добавляет вступившего пользователя в подписчики и историю вступлений.
+    profile - объект users.get (если удалось получить), иначе сохраняется только ID,
+    а профиль уже известного подписчика остается прежним.
+    Возвращает True, если список изменился.
+    """
+    vk_data = dict(profile or {})
+    vk_data['id'] = vk_user_id
+    base_data = build_member_base_data(project_id, vk_data)
+    base_data['source'] = 'callback'
+
+    is_new = not crud.get_subscribers_by_vk_ids(db, project_id, [vk_user_id])
+
+    # Upsert: повторное событие лишь обновит профиль
+    subscriber_row = build_subscriber_row(base_data)
+    history_row = build_history_row(base_data)
+    if not profile:
+        subscriber_row = _membership_only(subscriber_row)
+        history_row = _membership_only(history_row)
+    crud.bulk_add_subscribers(db, [subscriber_row])
+    crud.bulk_add_history_join(db, [history_row])
+
+    timestamp = get_rounded_timestamp()
+    if is_new:
+        crud.increment_list_meta_counters(
+            db, project_id,
+            {"subscribers_count": 1, "history_join_count": 1},
+            {"history_join_last_updated": timestamp, "subscribers_delta_at": timestamp}
+        )
+    else:
+        crud.update_list_meta(db, project_id, {"subscribers_delta_at": timestamp})
+    return is_new
+
+
+def apply_member_leave(db: Session, project_id: str, vk_user_id: int) -> bool:
+    """
+    Переносит вышедшего пользователя в историю выходов и удаляет из подписчиков.
+    Возвращает True, если список изменился.
+    """
+    leavers = crud.get_subscribers_by_vk_ids(db, project_id, [vk_user_id])
+    timestamp = get_rounded_timestamp()
+
+    if not leavers:
+        # Повтор события или пользователь, которого не было в базе - сверка разберется
+        crud.update_list_meta(db, project_id, {"subscribers_delta_at": timestamp})
+        return False
+
+    history_row = build_leave_history_row(leavers[0])
+    history_row['source'] = 'callback'
+    crud.bulk_add_history_leave(db, [history_row])
+    crud.bulk_delete_subscribers(db, project_id, [vk_user_id])
+
+    crud.increment_list_meta_counters(
+        db, project_id,
+        {"subscribers_count": -1, "history_leave_count": 1},
+        {"history_leave_last_updated": timestamp, "subscribers_delta_at": timestamp}
+    )
+    return True
@@ -4,8 +4,8 @@ import models
 from services import task_monitor
 from services.post_helpers import get_rounded_timestamp
 from database import SessionLocal
-from services.lists.list_sync_utils import get_all_project_tokens, fetch_users_smart_parallel
-from crud.lists.utils import deduplicate_users
+from services.lists.list_sync_utils import get_all_project_tokens
+from services.vk_profile_cache import vk_profile_cache
 
 def refresh_subscriber_details_task(task_id: str, project_id: str, user_token: str):
     """
@@ -23,9 +23,6 @@ def refresh_subscriber_details_task(task_id: str, project_id: str, user_token: s
             return
 
         # 1. Получаем список ID всех текущих подписчиков
-        # Перед этим можно сделать дедупликацию, на всякий случай
-        deduplicate_users(db, models.SystemListSubscriber, project_id)
-        
         all_vk_ids = list(crud.get_all_subscriber_vk_ids(db, project_id))
         unique_tokens = get_all_project_tokens(db, user_token)
     finally:
@@ -42,13 +39,10 @@ def refresh_subscriber_details_task(task_id: str, project_id: str, user_token: s
     # --- Phase 2: Network ---
     task_monitor.update_task(task_id, "fetching", loaded=0, total=len(all_vk_ids))
     
-    # Запрашиваем те же поля, что и при основной синхронизации
-    fields = 'sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,deactivated,is_closed,can_access_closed'
-    
     def on_progress(loaded, total):
         task_monitor.update_task(task_id, "fetching", loaded=loaded, total=total)
 
-    fetched_users = fetch_users_smart_parallel(all_vk_ids, unique_tokens, fields, project_id, on_progress)
+    fetched_users = vk_profile_cache.get_profiles(all_vk_ids, unique_tokens, project_id, on_progress)
     
     # --- Phase 3: Write ---
     db = SessionLocal()
@@ -82,7 +76,7 @@ def refresh_subscriber_details_task(task_id: str, project_id: str, user_token: s
         # Мы не меняли количество, но обновили дату актуальности
         timestamp = get_rounded_timestamp()
         
-        # Пересчитываем кол-во на всякий случай (после дедупликации)
+        # Пересчитываем кол-во на всякий случай
         real_count = db.query(models.SystemListSubscriber).filter(models.SystemListSubscriber.project_id == project_id).count()
         
         crud.update_list_meta(db, project_id, {
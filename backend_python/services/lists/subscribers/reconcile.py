@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import models
+from services import task_monitor
+from database import SessionLocal
+from config import settings
+
+from .config import RECONCILE_INTERVAL_HOURS
+from .sync_task import refresh_subscribers_task
+
+# Периодическая сверка списков подписчиков, которые ведутся дельтами из
+# Callback API (group_join/group_leave). Полный обход groups.getMembers
+# запускается только если последняя синхронизация старше RECONCILE_INTERVAL_HOURS.
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.000Z'
+
+
+def _is_stale(last_updated: str, now: datetime) -> bool:
+    if not last_updated:
+        return True
+    try:
+        updated_at = datetime.strptime(last_updated, TIMESTAMP_FORMAT)
+    except ValueError:
+        return True
+    return now - updated_at >= timedelta(hours=RECONCILE_INTERVAL_HOURS)
+
+
+def get_projects_due_for_reconcile() -> List[str]:
+    """Проекты с дельтами из Callback API, у которых пора делать сверку."""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        metas = db.query(
+            models.ProjectListMeta.project_id, models.ProjectListMeta.subscribers_last_updated
+        ).filter(models.ProjectListMeta.subscribers_delta_at.isnot(None)).all()
+        return [m.project_id for m in metas if _is_stale(m.subscribers_last_updated, now)]
+    finally:
+        db.close()
+
+
+def run_due_reconciles():
+    """Последовательно запускает сверку для всех проектов, у которых она просрочена."""
+    for project_id in get_projects_due_for_reconcile():
+        if task_monitor.get_active_task_id(project_id, 'subscribers'):
+            continue
+        task_id = str(uuid.uuid4())
+        task_monitor.start_task(task_id, project_id, 'subscribers')
+        print(f"SERVICE: Starting subscribers reconcile for project {project_id}...")
+        refresh_subscribers_task(task_id, project_id, settings.vk_user_token, reconcile=True)
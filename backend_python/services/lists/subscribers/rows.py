@@ -0,0 +1,70 @@
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+
+# Построение строк для таблиц подписчиков и истории из ответов VK.
+# Общие для полной и потоковой синхронизации.
+
+def build_member_base_data(project_id: str, vk_data: Dict) -> Dict:
+    """Поля подписчика из объекта groups.getMembers (с fields)."""
+    last_seen = vk_data.get('last_seen')
+    return {
+        "project_id": project_id,
+        "vk_user_id": vk_data['id'],
+        "first_name": vk_data.get('first_name'),
+        "last_name": vk_data.get('last_name'),
+        "sex": vk_data.get('sex'),
+        "photo_url": vk_data.get('photo_100'),
+        "domain": vk_data.get('domain'),
+        "bdate": vk_data.get('bdate'),
+        "city": vk_data.get('city', {}).get('title') if vk_data.get('city') else None,
+        "country": vk_data.get('country', {}).get('title') if vk_data.get('country') else None,
+        "has_mobile": bool(vk_data.get('has_mobile')),
+        "deactivated": vk_data.get('deactivated'),
+        "last_seen": last_seen.get('time') if last_seen else None,
+        "platform": last_seen.get('platform') if last_seen else None,
+        "source": "manual"
+    }
+
+def build_subscriber_row(base_data: Dict) -> Dict:
+    """Строка system_list_subscribers для нового подписчика."""
+    entry = base_data.copy()
+    entry["id"] = f"{base_data['project_id']}_{base_data['vk_user_id']}"
+    entry["added_at"] = datetime.now(timezone.utc)
+    return entry
+
+def build_history_row(base_data: Dict) -> Dict:
+    """Строка истории вступлений/выходов."""
+    entry = base_data.copy()
+    entry["id"] = str(uuid.uuid4())
+    entry["event_date"] = datetime.now(timezone.utc)
+    return entry
+
+def build_detail_update(base_data: Dict) -> Dict:
+    """Payload для bulk_update_subscriber_details (без project_id и source)."""
+    update = base_data.copy()
+    update.pop("project_id", None)
+    update.pop("source", None)
+    return update
+
+def build_leave_history_row(leaver) -> Dict:
+    """Строка истории выходов из ORM-объекта подписчика перед удалением."""
+    return {
+        "id": str(uuid.uuid4()),
+        "project_id": leaver.project_id,
+        "vk_user_id": leaver.vk_user_id,
+        "first_name": leaver.first_name,
+        "last_name": leaver.last_name,
+        "sex": leaver.sex,
+        "photo_url": leaver.photo_url,
+        "domain": leaver.domain,
+        "bdate": leaver.bdate,
+        "city": leaver.city,
+        "country": leaver.country,
+        "has_mobile": leaver.has_mobile,
+        "deactivated": leaver.deactivated,
+        "last_seen": leaver.last_seen,
+        "platform": leaver.platform,
+        "event_date": datetime.now(timezone.utc),
+        "source": "manual"
+    }
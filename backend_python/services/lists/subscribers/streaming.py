@@ -0,0 +1,275 @@
+import asyncio
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Set
+
+import crud
+from services import task_monitor
+from services.post_helpers import get_rounded_timestamp
+from services.vk_api.async_client import run_async, gather_limited, in_flight_limit
+from database import SessionLocal
+
+from .config import EXECUTE_BATCH_SIZE, STREAMING_MAX_IN_FLIGHT
+from .workers import _fetch_batch_execute_members, _fetch_batch_execute_members_async
+from .rows import (
+    build_member_base_data, build_subscriber_row, build_history_row,
+    build_detail_update, build_leave_history_row
+)
+
+# ===================================================================
+# ПОТОКОВАЯ СИНХРОНИЗАЦИЯ ПОДПИСЧИКОВ
+# ===================================================================
+# Полная синхронизация держит в памяти всех участников сообщества, карту
+# vk_id -> данные и три множества ID. Для сообщества на 1M участников это
+# несколько гигабайт и риск OOM воркера.
+#
+# Потоковый режим:
+# 1. Существующие ID загружаются в отсортированный array('q') (8 байт на ID)
+#    и битовую карту "встречен в VK" (1 байт на ID).
+# 2. Каждый скачанный чанк сразу сравнивается с массивом (бинарный поиск):
+#    новые -> JOIN (подписчики + история), существующие -> UPDATE деталей.
+#    Чанк записывается в БД и отпускается.
+# 3. После полного обхода невстреченные ID - это вышедшие (LEAVE). Выходы
+#    обрабатываются только если скачано >= 95% участников, иначе частичный
+#    обход записал бы ложные выходы.
+#
+# Пиковая память ~ STREAMING_MAX_IN_FLIGHT * EXECUTE_BATCH_SIZE участников
+# плюс компактный массив ID.
+# ===================================================================
+
+LEAVE_BATCH_SIZE = 3000
+COMPLETENESS_THRESHOLD = 0.95
+
+
+class _KnownIds:
+    """Отсортированный массив существующих ID с отметками "встречен в VK"."""
+
+    def __init__(self, ids: array):
+        self.ids = ids
+        self.seen = bytearray(len(ids))
+
+    def find(self, vk_id: int) -> int:
+        """Индекс ID в массиве или -1, если ID нет в базе."""
+        index = bisect_left(self.ids, vk_id)
+        if index < len(self.ids) and self.ids[index] == vk_id:
+            return index
+        return -1
+
+    def mark_seen(self, indexes: List[int]):
+        for index in indexes:
+            self.seen[index] = 1
+
+    def seen_count(self) -> int:
+        return self.seen.count(1)
+
+    def iter_unseen(self) -> Iterator[int]:
+        for index, flag in enumerate(self.seen):
+            if not flag:
+                yield self.ids[index]
+
+
+class _StreamingState:
+    def __init__(self, project_id: str, known: _KnownIds):
+        self.project_id = project_id
+        self.known = known
+        # Новые ID текущего обхода: VK может отдать участника в двух соседних
+        # чанках (сдвиг offset), повторная вставка нарушила бы первичный ключ.
+        # Размер множества ограничен числом вступивших, а не размером сообщества.
+        self.joined_ids: Set[int] = set()
+        self.total_fetched = 0
+        self.failed_chunks: List[Dict] = []
+        # Записи в БД выполняем последовательно (SQLite не любит параллельных писателей)
+        self.write_lock = threading.Lock()
+
+    def process_chunk(self, items: List[Dict]):
+        """
+        Сравнивает чанк с базой и сразу пишет JOIN/UPDATE.
+        Отметки "встречен" и новые ID применяются только после успешной записи:
+        если запись упала, чанк уйдет на повтор, а не встреченные из-за этого
+        подписчики не будут записаны в вышедшие.
+        """
+        new_subscribers = []
+        new_history_join = []
+        updates = []
+        seen_indexes = []
+        chunk_joined: Set[int] = set()
+
+        with self.write_lock:
+            for vk_data in items:
+                vk_id = vk_data.get('id')
+                if vk_id is None:
+                    continue
+                base_data = build_member_base_data(self.project_id, vk_data)
+
+                index = self.known.find(vk_id)
+                if index >= 0:
+                    seen_indexes.append(index)
+                    updates.append(build_detail_update(base_data))
+                elif vk_id not in self.joined_ids and vk_id not in chunk_joined:
+                    chunk_joined.add(vk_id)
+                    new_subscribers.append(build_subscriber_row(base_data))
+                    new_history_join.append(build_history_row(base_data))
+
+            db = SessionLocal()
+            try:
+                if new_subscribers:
+                    crud.bulk_add_subscribers(db, new_subscribers)
+                    crud.bulk_add_history_join(db, new_history_join)
+                if updates:
+                    crud.bulk_update_subscriber_details(db, self.project_id, updates)
+            finally:
+                db.close()
+
+            self.known.mark_seen(seen_indexes)
+            self.joined_ids.update(chunk_joined)
+            self.total_fetched += len(items)
+
+
+def _process_leavers(task_id: str, project_id: str, known: _KnownIds) -> int:
+    """Переносит невстреченных подписчиков в историю выходов и удаляет их."""
+    total_left = len(known.ids) - known.seen_count()
+    if not total_left:
+        return 0
+
+    processed = 0
+    batch_ids: List[int] = []
+
+    def flush(batch: List[int]):
+        db_batch = SessionLocal()
+        try:
+            leavers_data = crud.get_subscribers_by_vk_ids(db_batch, project_id, batch)
+            history_rows = [build_leave_history_row(leaver) for leaver in leavers_data]
+            if history_rows:
+                crud.bulk_add_history_leave(db_batch, history_rows)
+            crud.bulk_delete_subscribers(db_batch, project_id, batch)
+        finally:
+            db_batch.close()
+
+    for vk_id in known.iter_unseen():
+        batch_ids.append(vk_id)
+        if len(batch_ids) >= LEAVE_BATCH_SIZE:
+            flush(batch_ids)
+            processed += len(batch_ids)
+            batch_ids = []
+            task_monitor.update_task(task_id, "processing", message=f"Обработка вышедших: {processed}/{total_left}")
+
+    if batch_ids:
+        flush(batch_ids)
+        processed += len(batch_ids)
+
+    return processed
+
+
+def run_streaming_subscribers_sync(task_id: str, project_id: str, numeric_id: int, tokens: List[str], total_vk_count: int, fields: str, reconcile: bool = False):
+    """
+    Потоковая синхронизация подписчиков. Вызывается из refresh_subscribers_task
+    после разведки количества участников.
+    """
+    print(f"SERVICE: Streaming subscribers sync for project {project_id} ({total_vk_count} members)...")
+
+    # 1. Компактный снимок существующих ID (до скачивания новых)
+    db = SessionLocal()
+    try:
+        known = _KnownIds(crud.get_subscriber_vk_ids_sorted(db, project_id))
+    finally:
+        db.close()
+
+    state = _StreamingState(project_id, known)
+
+    # 2. Чанкинг
+    tasks_params = []
+    current_offset = 0
+    while current_offset < total_vk_count:
+        chunk_size = min(total_vk_count - current_offset, EXECUTE_BATCH_SIZE)
+        tasks_params.append({"offset": current_offset, "count": chunk_size})
+        current_offset += chunk_size
+
+    # 3. Скачивание и запись по мере прихода чанков
+    async def fetch_and_process(index: int, params: Dict):
+        items = await _fetch_batch_execute_members_async(
+            tokens, index, numeric_id, params['offset'], params['count'], fields, project_id
+        )
+        # Запись в БД - блокирующая, выносим из event loop
+        await asyncio.to_thread(state.process_chunk, items)
+
+    def on_chunk_done(index, result):
+        if isinstance(result, Exception):
+            params = tasks_params[index]
+            print(f"Chunk failed (offset {params['offset']}): {result}. Adding to retry queue.")
+            state.failed_chunks.append(params)
+            return
+        task_monitor.update_task(task_id, "fetching", loaded=state.total_fetched, total=total_vk_count)
+
+    try:
+        run_async(gather_limited(
+            [
+                (lambda i=i, params=params: fetch_and_process(i, params))
+                for i, params in enumerate(tasks_params)
+            ],
+            limit=min(STREAMING_MAX_IN_FLIGHT, in_flight_limit(len(tokens))),
+            on_result=on_chunk_done,
+            keep_results=False,
+        ))
+
+        # 3.1 Последовательная докачка упавших чанков
+        if state.failed_chunks:
+            print(f"SERVICE: Starting RETRY for {len(state.failed_chunks)} failed chunks...")
+            for i, params in enumerate(state.failed_chunks):
+                try:
+                    items = _fetch_batch_execute_members(
+                        tokens, i, numeric_id, params['offset'], params['count'], fields, project_id
+                    )
+                    state.process_chunk(items)
+                    task_monitor.update_task(task_id, "fetching", loaded=state.total_fetched, total=total_vk_count)
+                except Exception as e:
+                    print(f"   -> Retry FAILED for offset {params['offset']}: {e}")
+    except Exception as e:
+        print(f"SERVICE ERROR (Streaming download): {e}")
+        task_monitor.update_task(task_id, "error", error=f"Download failed: {e}")
+        return
+
+    # 4. Выходы считаем только при полном обходе
+    if state.total_fetched < int(total_vk_count * COMPLETENESS_THRESHOLD):
+        task_monitor.update_task(
+            task_id, "error",
+            error=f"Критическая потеря данных. Скачано {state.total_fetched} из {total_vk_count}. "
+                  f"Новые подписчики сохранены, выходы не обработаны."
+        )
+        return
+
+    try:
+        task_monitor.update_task(task_id, "processing", message="Обработка вышедших...")
+        left_count = _process_leavers(task_id, project_id, known)
+        joined_count = len(state.joined_ids)
+
+        # 5. Метаданные
+        timestamp = get_rounded_timestamp()
+        db_meta = SessionLocal()
+        try:
+            meta_updates = {
+                "subscribers_last_updated": timestamp,
+                "subscribers_count": known.seen_count() + joined_count
+            }
+            current_meta = crud.get_list_meta(db_meta, project_id)
+
+            if joined_count:
+                meta_updates["history_join_last_updated"] = timestamp
+                meta_updates["history_join_count"] = (current_meta.history_join_count or 0) + joined_count
+
+            if left_count:
+                meta_updates["history_leave_last_updated"] = timestamp
+                meta_updates["history_leave_count"] = (current_meta.history_leave_count or 0) + left_count
+
+            crud.update_list_meta(db_meta, project_id, meta_updates)
+        finally:
+            db_meta.close()
+
+        if reconcile:
+            print(f"SERVICE: Reconcile for {project_id}: drift +{joined_count} / -{left_count} missed by callback deltas.")
+        print(f"SERVICE: Streaming sync done for {project_id}: +{joined_count} / -{left_count}.")
+        task_monitor.update_task(task_id, "done")
+
+    except Exception as e:
+        print(f"SERVICE ERROR (Streaming finalize): {e}")
+        task_monitor.update_task(task_id, "error", error=str(e))
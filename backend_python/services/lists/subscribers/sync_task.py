@@ -1,24 +1,29 @@
 
-import uuid
-import time
-import concurrent.futures
-from datetime import datetime, timezone
-
 import crud
-import models
 from services import vk_service, task_monitor
 from services.post_helpers import get_rounded_timestamp
 from services.vk_api.api_client import call_vk_api as raw_vk_call
 from database import SessionLocal
 from services.lists.list_sync_utils import get_all_project_tokens
 
-from .config import EXECUTE_BATCH_SIZE
-from .workers import _fetch_batch_execute_members
+from services.vk_api.async_client import run_async, gather_limited, in_flight_limit
+
+from .config import EXECUTE_BATCH_SIZE, STREAMING_SYNC_MIN_MEMBERS
+from .workers import _fetch_batch_execute_members, _fetch_batch_execute_members_async
+from .rows import (
+    build_member_base_data, build_subscriber_row, build_history_row,
+    build_detail_update, build_leave_history_row
+)
+from .streaming import run_streaming_subscribers_sync
 
-def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
+def refresh_subscribers_task(task_id: str, project_id: str, user_token: str, reconcile: bool = False):
     """
     Фоновая задача для полной синхронизации списка подписчиков.
     Использует Split Session для предотвращения SSL SYSCALL error.
+    Для больших сообществ (>= STREAMING_SYNC_MIN_MEMBERS) переключается
+    на потоковый режим с памятью, ограниченной размером чанка.
+    reconcile=True - периодическая сверка для проектов, где список ведется
+    событиями Callback API: обход тот же, найденные изменения - это дрейф.
     """
     
     # --- ЭТАП 1: ПОДГОТОВКА (Чтение) ---
@@ -41,10 +46,6 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
         # 1. Сбор токенов
         unique_tokens = get_all_project_tokens(db, user_token)
 
-        # 2. Загрузка существующих ID для сравнения (ВАЖНО: делаем это до скачивания новых)
-        # Это фиксит баг с историей - мы точно знаем, кто был в базе ДО начала обновления
-        db_ids_set = crud.get_all_subscriber_vk_ids(db, project_id)
-
         if not unique_tokens:
             task_monitor.update_task(task_id, "error", error="Нет доступных токенов для работы")
             return
@@ -84,6 +85,19 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
              task_monitor.update_task(task_id, "error", error="Не удалось получить кол-во подписчиков.")
              return
 
+        # Большие сообщества синхронизируем потоково (diff по мере прихода чанков)
+        if total_vk_count >= STREAMING_SYNC_MIN_MEMBERS:
+            run_streaming_subscribers_sync(task_id, project_id, numeric_id, unique_tokens, total_vk_count, fields, reconcile)
+            return
+
+        # Загрузка существующих ID для сравнения (ВАЖНО: делаем это до скачивания новых)
+        # Это фиксит баг с историей - мы точно знаем, кто был в базе ДО начала обновления
+        db_ids_read = SessionLocal()
+        try:
+            db_ids_set = crud.get_all_subscriber_vk_ids(db_ids_read, project_id)
+        finally:
+            db_ids_read.close()
+
         # Чанкинг
         tasks_params = []
         current_offset = 0
@@ -94,28 +108,31 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
             current_offset += chunk_size
 
         total_fetched = 0
-        max_workers = min(len(unique_tokens), 15)
         
-        # --- ФАЗА 2.1: ПАРАЛЛЕЛЬНАЯ ЗАГРУЗКА ---
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_params = {}
-            for i, params in enumerate(tasks_params):
-                future = executor.submit(
-                    _fetch_batch_execute_members,
-                    unique_tokens, i, numeric_id, params['offset'], params['count'], fields, project_id
-                )
-                future_to_params[future] = params
+        # --- ФАЗА 2.1: ПАРАЛЛЕЛЬНАЯ ЗАГРУЗКА (asyncio) ---
+        # Все чанки качаются в одном event loop; скорость ограничивают бюджеты токенов,
+        # а число запросов "в полете" - пропускная способность пула (in_flight_limit)
+        def on_chunk_done(index, result):
+            nonlocal total_fetched
+            params = tasks_params[index]
+            if isinstance(result, Exception):
+                print(f"Chunk failed (offset {params['offset']}): {result}. Adding to retry queue.")
+                failed_chunks.append(params)
+                return
+            all_members.extend(result)
+            total_fetched += len(result)
+            task_monitor.update_task(task_id, "fetching", loaded=total_fetched, total=total_vk_count)
 
-            for future in concurrent.futures.as_completed(future_to_params):
-                params = future_to_params[future]
-                try:
-                    items = future.result()
-                    all_members.extend(items)
-                    total_fetched += len(items)
-                    task_monitor.update_task(task_id, "fetching", loaded=total_fetched, total=total_vk_count)
-                except Exception as e:
-                    print(f"Chunk failed (offset {params['offset']}): {e}. Adding to retry queue.")
-                    failed_chunks.append(params)
+        run_async(gather_limited(
+            [
+                (lambda i=i, params=params: _fetch_batch_execute_members_async(
+                    unique_tokens, i, numeric_id, params['offset'], params['count'], fields, project_id
+                ))
+                for i, params in enumerate(tasks_params)
+            ],
+            limit=in_flight_limit(len(unique_tokens)),
+            on_result=on_chunk_done,
+        ))
 
         # --- ФАЗА 2.2: ПОСЛЕДОВАТЕЛЬНАЯ ПОВТОРНАЯ ОБРАБОТКА (RETRY) ---
         if failed_chunks:
@@ -124,9 +141,6 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
             
             for i, params in enumerate(failed_chunks):
                 try:
-                    # Ждем немного перед запросом, чтобы дать API отдохнуть
-                    time.sleep(1.0)
-                    
                     # Выполняем в том же потоке (последовательно) для надежности
                     items = _fetch_batch_execute_members(
                         unique_tokens, i, numeric_id, params['offset'], params['count'], fields, project_id
@@ -174,6 +188,9 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
         # ID, которые есть и в базе, и в VK. Их нужно обновить.
         existing_ids = list(vk_ids_set.intersection(db_ids_set))
         
+        if reconcile:
+            print(f"SERVICE: Reconcile for '{project_name}': drift +{len(new_ids)} / -{len(left_ids)} missed by callback deltas.")
+
         timestamp = get_rounded_timestamp() 
         
         SUPER_BATCH_SIZE = 3000
@@ -190,35 +207,9 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
                 
                 # Подготовка данных в памяти (CPU)
                 for vk_id in batch_ids:
-                    vk_data = vk_members_map[vk_id]
-                    
-                    base_data = {
-                        "project_id": project_id,
-                        "vk_user_id": vk_id,
-                        "first_name": vk_data.get('first_name'),
-                        "last_name": vk_data.get('last_name'),
-                        "sex": vk_data.get('sex'),
-                        "photo_url": vk_data.get('photo_100'),
-                        "domain": vk_data.get('domain'),
-                        "bdate": vk_data.get('bdate'),
-                        "city": vk_data.get('city', {}).get('title') if vk_data.get('city') else None,
-                        "country": vk_data.get('country', {}).get('title') if vk_data.get('country') else None,
-                        "has_mobile": bool(vk_data.get('has_mobile')),
-                        "deactivated": vk_data.get('deactivated'),
-                        "last_seen": vk_data.get('last_seen', {}).get('time') if vk_data.get('last_seen') else None,
-                        "platform": vk_data.get('last_seen', {}).get('platform') if vk_data.get('last_seen') else None,
-                        "source": "manual"
-                    }
-
-                    subscriber_entry = base_data.copy()
-                    subscriber_entry["id"] = f"{project_id}_{vk_id}"
-                    subscriber_entry["added_at"] = datetime.now(timezone.utc)
-                    new_subscribers_data.append(subscriber_entry)
-                    
-                    history_join_entry = base_data.copy()
-                    history_join_entry["id"] = str(uuid.uuid4())
-                    history_join_entry["event_date"] = datetime.now(timezone.utc)
-                    new_history_join_data.append(history_join_entry)
+                    base_data = build_member_base_data(project_id, vk_members_map[vk_id])
+                    new_subscribers_data.append(build_subscriber_row(base_data))
+                    new_history_join_data.append(build_history_row(base_data))
                 
                 # Запись в БД с новой сессией
                 db_batch = SessionLocal()
@@ -239,27 +230,7 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
                 try:
                     leavers_data = crud.get_subscribers_by_vk_ids(db_batch, project_id, batch_ids)
                     
-                    new_history_leave_data = []
-                    for leaver in leavers_data:
-                         new_history_leave_data.append({
-                            "id": str(uuid.uuid4()),
-                            "project_id": project_id,
-                            "vk_user_id": leaver.vk_user_id,
-                            "first_name": leaver.first_name,
-                            "last_name": leaver.last_name,
-                            "sex": leaver.sex,
-                            "photo_url": leaver.photo_url,
-                            "domain": leaver.domain,
-                            "bdate": leaver.bdate,
-                            "city": leaver.city,
-                            "country": leaver.country,
-                            "has_mobile": leaver.has_mobile,
-                            "deactivated": leaver.deactivated,
-                            "last_seen": leaver.last_seen,
-                            "platform": leaver.platform,
-                            "event_date": datetime.now(timezone.utc),
-                            "source": "manual"
-                        })
+                    new_history_leave_data = [build_leave_history_row(leaver) for leaver in leavers_data]
                     
                     if new_history_leave_data:
                         crud.bulk_add_history_leave(db_batch, new_history_leave_data)
@@ -276,24 +247,10 @@ def refresh_subscribers_task(task_id: str, project_id: str, user_token: str):
                 batch_ids = existing_ids[i:i + SUPER_BATCH_SIZE]
                 task_monitor.update_task(task_id, "processing", message=f"Обновление существующих: {min(i + SUPER_BATCH_SIZE, total_existing)}/{total_existing}")
                 
-                updates = []
-                for vk_id in batch_ids:
-                    vk_data = vk_members_map[vk_id]
-                    updates.append({
-                        'vk_user_id': vk_id,
-                        'first_name': vk_data.get('first_name'),
-                        'last_name': vk_data.get('last_name'),
-                        'sex': vk_data.get('sex'),
-                        'photo_url': vk_data.get('photo_100'),
-                        'domain': vk_data.get('domain'),
-                        'bdate': vk_data.get('bdate'),
-                        'city': vk_data.get('city', {}).get('title') if vk_data.get('city') else None,
-                        'country': vk_data.get('country', {}).get('title') if vk_data.get('country') else None,
-                        'has_mobile': bool(vk_data.get('has_mobile')),
-                        'deactivated': vk_data.get('deactivated'),
-                        'last_seen': vk_data.get('last_seen', {}).get('time') if vk_data.get('last_seen') else None,
-                        'platform': vk_data.get('last_seen', {}).get('platform') if vk_data.get('last_seen') else None,
-                    })
+                updates = [
+                    build_detail_update(build_member_base_data(project_id, vk_members_map[vk_id]))
+                    for vk_id in batch_ids
+                ]
                 
                 db_batch = SessionLocal()
                 try:
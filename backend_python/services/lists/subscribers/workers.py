@@ -1,21 +1,12 @@
 
-import time
 from typing import List, Dict
 from services.vk_api.api_client import call_vk_api as raw_vk_call
+from services.vk_api.async_client import call_vk_api_async
+from services.vk_api.token_scheduler import token_scheduler
 from .config import INNER_REQ_COUNT
 
-def _fetch_batch_execute_members(tokens: List[str], chunk_index: int, group_id: int, offset: int, count_to_fetch: int, fields: str, project_id: str) -> List[Dict]:
-    """
-    Вспомогательная функция (воркер).
-    Загружает пачку участников, используя VK Script (execute).
-    """
-    if not tokens:
-        return []
-
-    num_tokens = len(tokens)
-    primary_index = chunk_index % num_tokens
-    rotation_order = tokens[primary_index:] + tokens[:primary_index]
-    
+def _build_members_execute_code(group_id: int, offset: int, count_to_fetch: int, fields: str) -> str:
+    """Формирует VK Script для загрузки пачки участников через groups.getMembers."""
     iterations = (count_to_fetch + INNER_REQ_COUNT - 1) // INNER_REQ_COUNT
     
     code = f"""
@@ -41,6 +32,22 @@ def _fetch_batch_execute_members(tokens: List[str], chunk_index: int, group_id:
     }}
     return items;
     """
+    return code
+
+def _fetch_batch_execute_members(tokens: List[str], chunk_index: int, group_id: int, offset: int, count_to_fetch: int, fields: str, project_id: str) -> List[Dict]:
+    """
+    Вспомогательная функция (воркер).
+    Загружает пачку участников, используя VK Script (execute).
+    """
+    if not tokens:
+        return []
+
+    # Порядок перебора: сначала здоровые токены со свободным бюджетом
+    rotation_order = token_scheduler.rotation(tokens, chunk_index)
+    code = _build_members_execute_code(group_id, offset, count_to_fetch, fields)
+    # execute без кода VK отклонит на каждом токене - это ошибка сборки, а не токена
+    if not code or not code.strip():
+        raise Exception(f"Empty execute code for chunk offset {offset}")
     
     for token in rotation_order:
         try:
@@ -54,7 +61,37 @@ def _fetch_batch_execute_members(tokens: List[str], chunk_index: int, group_id:
             return items
 
         except Exception as e:
-            time.sleep(1.5)
+            # Пауза не нужна: скорость каждого токена регулирует token_scheduler
+            print(f"   [Members Worker] Chunk offset {offset} failed with token ...{token[-4:]}: {e}. Trying next...")
 
     # Если все токены упали - выбрасываем исключение, чтобы батч попал в retry queue
     raise Exception(f"All tokens failed for chunk offset {offset}")
+
+async def _fetch_batch_execute_members_async(tokens: List[str], chunk_index: int, group_id: int, offset: int, count_to_fetch: int, fields: str, project_id: str) -> List[Dict]:
+    """
+    Асинхронный вариант _fetch_batch_execute_members.
+    Позволяет держать сотни запросов execute в одном event loop вместо пула потоков.
+    """
+    if not tokens:
+        return []
+
+    rotation_order = token_scheduler.rotation(tokens, chunk_index)
+    code = _build_members_execute_code(group_id, offset, count_to_fetch, fields)
+    # execute без кода VK отклонит на каждом токене - это ошибка сборки, а не токена
+    if not code or not code.strip():
+        raise Exception(f"Empty execute code for chunk offset {offset}")
+
+    for token in rotation_order:
+        try:
+            result = await call_vk_api_async("execute", {"code": code, "access_token": token}, project_id=project_id)
+            items = result if isinstance(result, list) else []
+
+            if not items and count_to_fetch > 0:
+                raise Exception(f"Empty response from execute. Expected ~{count_to_fetch} items.")
+
+            return items
+
+        except Exception as e:
+            print(f"   [Members Worker async] Chunk offset {offset} failed with token ...{token[-4:]}: {e}. Trying next...")
+
+    raise Exception(f"All tokens failed for chunk offset {offset}")
@@ -18,7 +18,7 @@ from .list_retrieval import (
 from .list_sync_subscribers import refresh_subscribers_task, refresh_subscriber_details_task
 from .list_sync_history import refresh_history_details_task
 from .list_sync_posts import refresh_posts_task
-from .list_sync_interactions import refresh_interactions_task, refresh_interaction_users_task
+from .list_sync_interactions import refresh_interactions_task, refresh_interaction_users_task, interactions_task_params, resume_interrupted_interaction_syncs
 from .list_sync_mailing import refresh_mailing_task
 from .list_sync_mailing_analysis import refresh_mailing_analysis_task
 from .list_sync_authors import refresh_author_details_task
@@ -0,0 +1,127 @@
+import queue
+import threading
+import atexit
+from typing import Callable, Dict, List
+
+from database import SessionLocal
+
+# ===================================================================
+# БУФЕРИЗИРОВАННАЯ ЗАПИСЬ ЛОГОВ
+# ===================================================================
+# Логи вызовов VK API и AI пишутся на каждый запрос. Раньше каждая запись
+# открывала свою сессию и делала отдельный INSERT + COMMIT прямо на пути
+# запроса, что при синхронизации списков давало тысячи мелких транзакций.
+#
+# BatchLogWriter складывает записи в ограниченную очередь, а фоновый поток
+# сбрасывает их в БД пачками: каждые BATCH_SIZE записей или раз в
+# FLUSH_INTERVAL_MS миллисекунд. При остановке процесса остаток дописывается.
+#
+# Политика переполнения очереди:
+# - 'drop'  - новая запись отбрасывается (логи не должны тормозить работу).
+# - 'block' - вызывающий поток ждет освобождения места.
+# ===================================================================
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+DEFAULT_MAX_QUEUE_SIZE = 10000
+
+OVERFLOW_DROP = 'drop'
+OVERFLOW_BLOCK = 'block'
+
+
+class BatchLogWriter:
+    def __init__(
+        self,
+        name: str,
+        bulk_insert: Callable,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        overflow_policy: str = OVERFLOW_DROP,
+    ):
+        """
+        bulk_insert(db, rows) - функция CRUD, которая вставляет пачку записей одним запросом.
+        """
+        self.name = name
+        self._bulk_insert = bulk_insert
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval_ms / 1000
+        self._overflow_policy = overflow_policy
+
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.dropped_count = 0
+
+    def write(self, row: Dict):
+        """Ставит запись в очередь. Не выполняет запросов к БД."""
+        self._ensure_started()
+        try:
+            if self._overflow_policy == OVERFLOW_BLOCK:
+                self._queue.put(row)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped_count += 1
+            if self.dropped_count % 1000 == 1:
+                print(f"LOG_WRITER [{self.name}]: Queue is full, dropped {self.dropped_count} records so far.")
+
+    def flush(self):
+        """Синхронно записывает все, что накопилось в очереди."""
+        while True:
+            batch = self._drain(self._batch_size)
+            if not batch:
+                return
+            self._write_batch(batch)
+
+    def shutdown(self):
+        """Останавливает фоновый поток и дописывает остаток очереди."""
+        self._stopped.set()
+        thread = self._thread
+        if thread and thread.is_alive():
+            thread.join(timeout=self._flush_interval * 5)
+        self.flush()
+
+    # --- Внутренняя логика ---
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"log-writer-{self.name}", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _drain(self, limit: int, timeout: float = 0) -> List[Dict]:
+        batch = []
+        try:
+            if timeout:
+                batch.append(self._queue.get(timeout=timeout))
+            while len(batch) < limit:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # Ждем первую запись не дольше интервала, затем добираем пачку
+            batch = self._drain(self._batch_size, timeout=self._flush_interval)
+            if not batch:
+                continue
+            if len(batch) < self._batch_size:
+                self._stopped.wait(self._flush_interval)
+                batch.extend(self._drain(self._batch_size - len(batch)))
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict]):
+        db = SessionLocal()
+        try:
+            self._bulk_insert(db, batch)
+        except Exception as e:
+            print(f"LOG_WRITER [{self.name}] ERROR: Failed to write {len(batch)} records: {e}")
+        finally:
+            db.close()
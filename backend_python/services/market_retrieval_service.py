@@ -10,6 +10,7 @@ import schemas
 import models
 from . import vk_service
 from .post_helpers import get_rounded_timestamp
+from .vk_api.response_cache import vk_response_cache
 from config import settings
 
 def get_market_data(db: Session, project_id: str, user_token: str) -> dict:
@@ -223,6 +224,8 @@ def get_market_categories(db: Session, user_token: str) -> List[Dict]:
 def force_refresh_market_categories(db: Session, user_token: str):
     """Принудительно обновляет категории товаров из VK."""
     print("SERVICE: Force refreshing market categories from VK...")
+    # Сбрасываем кеш ответов VK, иначе получим закешированное дерево категорий
+    vk_response_cache.invalidate_method('market.getCategories')
     try:
         # Используем дефолтную версию (5.199)
         vk_categories_response = vk_service.call_vk_api('market.getCategories', {
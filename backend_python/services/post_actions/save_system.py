@@ -5,6 +5,7 @@ import json
 import crud
 import schemas
 from services.post_helpers import find_conflict_free_time
+from services.publication_wakeup import publication_wakeup
 
 def save_as_system_post(db: Session, payload: schemas.SavePostPayload) -> schemas.ScheduledPost:
     """Внутренняя функция для сохранения поста в системную базу данных."""
@@ -48,6 +49,8 @@ def save_as_system_post(db: Session, payload: schemas.SavePostPayload) -> schema
     )
     
     saved_db_post = crud.create_or_update_system_post(db, payload.projectId, system_post_data)
+    # Будим публикатор к новому времени поста
+    publication_wakeup.notify(saved_db_post.publication_date)
     
     # Возвращаем в формате ScheduledPost для совместимости с ответом API
     return_post = schemas.ScheduledPost(
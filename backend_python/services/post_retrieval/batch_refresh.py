@@ -0,0 +1,158 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from services import vk_service
+from services.post_helpers import get_rounded_timestamp
+from services.vk_api.async_client import call_vk_api_async, gather_limited, run_async
+from services.vk_api.token_scheduler import token_scheduler
+import services.automations.reviews.scheduler as contest_scheduler
+from .helpers import _deduplicate_vk_items
+from .published import apply_published_posts, refresh_published_posts
+from .scheduled import apply_scheduled_posts, refresh_scheduled_posts
+
+# ===================================================================
+# ПАКЕТНОЕ ОБНОВЛЕНИЕ СТЕН ДЛЯ "ОБНОВИТЬ ВСЕ"
+# ===================================================================
+# Раньше refresh_all_projects_task обновлял проекты по одному: два wall.get
+# (отложка и опубликованные) и пауза 0.5 сек на проект. 200 проектов -
+# несколько минут.
+#
+# Теперь:
+# 1. wall.get до WALL_OWNERS_PER_EXECUTE сообществ упаковываются в один
+#    execute (лимит VK - 25 вызовов API на execute).
+# 2. Пакеты выполняются параллельно с основным токеном - тем же, что и при
+#    одиночном обновлении. Отложку видит только администратор, а стена
+#    закрытого сообщества для постороннего токена неполна или недоступна:
+#    ответ такого токена стер бы посты проекта. Пул системных аккаунтов
+#    здесь не используется - не известно, какие из них админы сообществ.
+# 3. Запись в БД и теги выполняются по проектам, как раньше.
+#
+# Если вызов для конкретного сообщества внутри execute упал (execute вернет
+# false на его месте), проект обновляется старым одиночным путем.
+# Время "Обновить все" растет с числом пакетов, а не проектов.
+# ===================================================================
+
+WALL_OWNERS_PER_EXECUTE = 25
+WALL_POSTS_COUNT = 100
+# Сколько execute одновременно "в полете"
+WALL_BATCH_MAX_IN_FLIGHT = 8
+
+
+def _build_wall_execute_code(numeric_ids: List[int], filter_type: Optional[str]) -> str:
+    """VK Script: массив ответов wall.get по каждому сообществу (false - ошибка вызова)."""
+    calls = []
+    for numeric_id in numeric_ids:
+        params = {"owner_id": -numeric_id, "count": WALL_POSTS_COUNT}
+        if filter_type:
+            params["filter"] = filter_type
+        calls.append(f"API.wall.get({json.dumps(params)})")
+    return "return [" + ", ".join(calls) + "];"
+
+
+async def _fetch_wall_batch_async(tokens: List[str], batch_index: int, numeric_ids: List[int], filter_type: Optional[str]) -> List:
+    code = _build_wall_execute_code(numeric_ids, filter_type)
+
+    for token in token_scheduler.rotation(tokens, batch_index):
+        try:
+            result = await call_vk_api_async("execute", {"code": code, "access_token": token})
+            if not isinstance(result, list) or len(result) != len(numeric_ids):
+                raise Exception(f"Unexpected execute response for {len(numeric_ids)} walls")
+            return result
+        except Exception as e:
+            print(f"   [Wall Batch] Batch {batch_index} ({filter_type or 'published'}) failed with token ...{token[-4:]}: {e}. Trying next...")
+
+    raise Exception(f"All tokens failed for wall batch {batch_index}")
+
+
+def fetch_walls_batched(owners: Dict[str, int], tokens: List[str], filter_type: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Скачивает стены нескольких сообществ пакетами execute.
+    owners: project_id -> numeric group id.
+    Возвращает project_id -> ответ wall.get. Проекты, для которых вызов упал, отсутствуют.
+    """
+    project_ids = list(owners.keys())
+    batches = [
+        project_ids[i:i + WALL_OWNERS_PER_EXECUTE]
+        for i in range(0, len(project_ids), WALL_OWNERS_PER_EXECUTE)
+    ]
+    if not batches or not tokens:
+        return {}
+
+    results = run_async(gather_limited(
+        [
+            (lambda i=i, batch=batch: _fetch_wall_batch_async(tokens, i, [owners[pid] for pid in batch], filter_type))
+            for i, batch in enumerate(batches)
+        ],
+        limit=WALL_BATCH_MAX_IN_FLIGHT,
+    ))
+
+    walls = {}
+    for batch, result in zip(batches, results):
+        if isinstance(result, Exception):
+            print(f"SERVICE: Wall batch failed: {result}")
+            continue
+        for project_id, response in zip(batch, result):
+            if isinstance(response, dict):
+                walls[project_id] = response
+    return walls
+
+
+def refresh_schedule_batched(
+    db: Session,
+    projects: list,
+    user_token: str,
+    on_project: Optional[Callable[[int, object], None]] = None
+) -> Tuple[int, int]:
+    """
+    Обновляет отложенные и опубликованные посты всех проектов.
+    on_project(index, project) вызывается перед записью каждого проекта (для прогресса).
+    Возвращает (успешно, ошибок).
+    """
+    # 1. Числовые ID сообществ (для числовых vkProjectId - без запросов к VK)
+    owners = {}
+    for project in projects:
+        try:
+            owners[project.id] = vk_service.resolve_vk_group_id(project.vkProjectId, user_token)
+        except Exception as e:
+            print(f"SERVICE: Cannot resolve group for project {project.id}: {e}")
+
+    # 2. Скачивание пакетами
+    scheduled_walls = fetch_walls_batched(owners, [user_token], filter_type='postponed')
+    published_walls = fetch_walls_batched(owners, [user_token])
+    print(f"SERVICE: Batched wall fetch: {len(published_walls)}/{len(owners)} published, "
+          f"{len(scheduled_walls)}/{len(owners)} scheduled.")
+
+    # 3. Запись по проектам. Чего нет в пакетных ответах - одиночным путем.
+    success_count = 0
+    error_count = 0
+    for i, project in enumerate(projects):
+        if on_project:
+            on_project(i, project)
+        timestamp = get_rounded_timestamp()
+        try:
+            scheduled = scheduled_walls.get(project.id)
+            if scheduled is not None:
+                contest_scheduler.ensure_future_contest_posts(db, project.id)
+                apply_scheduled_posts(db, project.id, _deduplicate_vk_items(scheduled.get('items', [])), timestamp)
+            else:
+                refresh_scheduled_posts(db, project.id, user_token)
+
+            published = published_walls.get(project.id)
+            if published is not None:
+                apply_published_posts(
+                    db, project.id, _deduplicate_vk_items(published.get('items', [])), published,
+                    user_token, timestamp, numeric_id=owners[project.id]
+                )
+            else:
+                refresh_published_posts(db, project.id, user_token)
+
+            success_count += 1
+        except Exception as e:
+            print(f"SERVICE: Error refreshing project {project.name}: {e}")
+            db.rollback()
+            error_count += 1
+            # Не прерываем цикл, идем к следующему проекту
+
+    return success_count, error_count
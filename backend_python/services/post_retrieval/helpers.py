@@ -4,14 +4,20 @@ from fastapi import HTTPException
 import crud
 from services import vk_service
 import models
-from services.post_helpers import assign_tags_to_db_post
+from services import tag_matcher
 
-def _apply_tags_to_db_posts(db: Session, project_id: str, model_class):
+def _apply_tags_to_db_posts(db: Session, project_id: str, model_class, post_ids: list[str] = None):
     """
     Применяет теги к постам, которые уже находятся в базе данных.
     Это гарантирует, что мы работаем с персистентными объектами.
+    post_ids - только эти посты (например, добавленные/измененные при синхронизации).
     """
-    posts = db.query(model_class).filter(model_class.projectId == project_id).all()
+    if post_ids is not None and not post_ids:
+        return
+    query = db.query(model_class).filter(model_class.projectId == project_id)
+    if post_ids is not None:
+        query = query.filter(model_class.id.in_(post_ids))
+    posts = query.all()
     project_tags = crud.get_tags_by_project_id(db, project_id)
     
     print(f"SERVICE: Applying tags for project {project_id}. Found {len(posts)} posts and {len(project_tags)} tags.")
@@ -20,11 +26,29 @@ def _apply_tags_to_db_posts(db: Session, project_id: str, model_class):
         print("SERVICE: No tags defined for this project. Skipping tagging.")
         return
 
-    for post in posts:
-        assign_tags_to_db_post(db, post, project_id, project_tags)
+    # Посты с прежним текстом и прежним набором тегов пропускаются по tags_hash
+    changed = tag_matcher.retag_posts(db, project_id, posts, project_tags)
     
     db.commit()
-    print("SERVICE: Tagging complete and committed.")
+    print(f"SERVICE: Tagging complete and committed ({changed} posts changed).")
+
+def _deduplicate_vk_items(raw_items: list[dict]) -> list[dict]:
+    """Убирает повторы постов (owner_id + id), сохраняя порядок ответа VK."""
+    unique_items_map = {}
+    
+    for item in raw_items:
+        post_id = f"{item['owner_id']}_{item['id']}"
+        if post_id not in unique_items_map:
+            unique_items_map[post_id] = item
+            
+    return list(unique_items_map.values())
+
+def _changed_post_ids(changes: dict) -> list[str]:
+    """ID добавленных и измененных постов из набора изменений replace_*_posts."""
+    return changes["added"] + changes["changed"]
+
+def _has_changes(changes: dict) -> bool:
+    return bool(changes["added"] or changes["changed"] or changes["removed"])
 
 def _fetch_vk_posts(db: Session, project_id: str, user_token: str, filter_type: str = None) -> tuple[list[dict], dict]:
     """
@@ -50,13 +74,6 @@ def _fetch_vk_posts(db: Session, project_id: str, user_token: str, filter_type:
     vk_response = vk_service.call_vk_api('wall.get', params, project_id=project_id)
     
     raw_items = vk_response.get('items', [])
-    unique_items_map = {}
-    
-    for item in raw_items:
-        post_id = f"{item['owner_id']}_{item['id']}"
-        if post_id not in unique_items_map:
-            unique_items_map[post_id] = item
-            
-    deduplicated_items = list(unique_items_map.values())
+    deduplicated_items = _deduplicate_vk_items(raw_items)
     print(f"SERVICE: VK API returned {len(raw_items)} items. After deduplication: {len(deduplicated_items)}.")
     return deduplicated_items, vk_response
@@ -9,124 +9,147 @@ from services import vk_service
 from services.vk_service import VkApiError
 from services.post_helpers import get_rounded_timestamp
 import models
-from .helpers import _fetch_vk_posts, _apply_tags_to_db_posts
+from .helpers import _fetch_vk_posts, _apply_tags_to_db_posts, _changed_post_ids, _has_changes
 import services.automations.stories_service as stories_service
 
 def get_published_posts(db: Session, project_id: str) -> list[ScheduledPost]:
     posts = crud.get_posts_by_project_id(db, project_id)
     return [ScheduledPost.model_validate(p, from_attributes=True) for p in posts]
 
-def refresh_published_posts(db: Session, project_id: str, user_token: str) -> list[ScheduledPost]:
-    print(f"SERVICE: Refreshing published posts for project {project_id}...")
-    timestamp = get_rounded_timestamp()
-    try:
-        print(f"SERVICE: Fetching published posts from VK...")
-        deduplicated_items, vk_response = _fetch_vk_posts(db, project_id, user_token)
-        now_ts = datetime.utcnow().timestamp()
-        
-        posts_from_vk = [vk_service.format_vk_post(item, is_published=int(item.get('date', 0)) <= now_ts) for item in deduplicated_items]
-        print(f"SERVICE: Fetched {len(posts_from_vk)} published posts.")
-        
-        # --- STORIES AUTOMATION ---
+def apply_published_posts(
+    db: Session,
+    project_id: str,
+    deduplicated_items: list[dict],
+    vk_response: dict,
+    user_token: str,
+    timestamp: str,
+    numeric_id: int = None
+):
+    """
+    Сохраняет уже скачанные опубликованные посты: БД, теги, автоматизация историй,
+    системный список постов. Используется и одиночным обновлением, и пакетным
+    (services/post_retrieval/batch_refresh.py), которое скачивает стены сразу
+    нескольких проектов одним execute.
+    """
+    now_ts = datetime.utcnow().timestamp()
+    posts_from_vk = [vk_service.format_vk_post(item, is_published=int(item.get('date', 0)) <= now_ts) for item in deduplicated_items]
+    print(f"SERVICE: Fetched {len(posts_from_vk)} published posts.")
+
+    # 1. Сохраняем в базу только разницу (без тегов или со старыми тегами, мы их пересчитаем)
+    print(f"SERVICE: Saving published posts to DB...")
+    changes = crud.replace_published_posts(db, project_id, posts_from_vk, timestamp)
+    changed_ids = set(_changed_post_ids(changes))
+    print(f"SERVICE: Published posts diff: +{len(changes['added'])} ~{len(changes['changed'])} -{len(changes['removed'])}.")
+
+    # --- STORIES AUTOMATION (только новые и измененные посты) ---
+    changed_items = [item for item in deduplicated_items if f"{item['owner_id']}_{item['id']}" in changed_ids]
+    if changed_items:
         try:
-             stories_service.process_stories_automation(db, project_id, deduplicated_items, user_token)
+             stories_service.process_stories_automation(db, project_id, changed_items, user_token)
         except Exception as auto_e:
              print(f"WARNING: Stories automation failed: {auto_e}")
-        # --------------------------
-
-        # 1. Сохраняем посты в базу (без тегов или со старыми тегами, если они пришли, но мы их пересчитаем)
-        print(f"SERVICE: Saving published posts to DB...")
-        crud.replace_published_posts(db, project_id, posts_from_vk, timestamp)
-        
-        # LINKING GENERAL CONTESTS POSTS
-        # New logic: Check if any of these published posts correspond to an active General Contest Cycle
-        # that is missing its VK ID or needs visual tagging.
-        try:
-             # Lazy import to avoid circular dependency
-             from models_library.general_contests import GeneralContestCycle
-             # Find cycles for this project that are ACTIVE but maybe missing clear linkage or just to tag the post?
-             # Actually, we need to inject 'post_type' = 'general_contest_start' into the Published Post model if it matches?
-             # No, 'ScheduledPost' schema has no 'post_type' field usually designated for system types.
-             # But 'PostCard' checks 'post_type' in 'SystemPost'. For published posts it renders them as 'ScheduledPost' (Post model).
-             
-             # The user wants the PUBLISHED post to look like the contest post.
-             # PostCard.tsx: const isGeneralContestStart = isSystemPost && ...
-             # It explicitly checks `isSystemPost`. If it's a published post, `isSystemPost` is false.
-             # We need to adapt the frontend to recognize Linked Published Posts OR
-             # make the backend return them with a special flag.
-             
-             # Current approach: The frontend likely doesn't support "Published Post acting as System Post" visual yet.
-             # But let's at least clear the System Post from the schedule (done in post_tracker_service)
-             # and ensure the Cycle is updated (done in general_contest_service.on_start_post_published).
-             
-             # If the user wants the published post to clearly SAY "Contest", we might need to update the text or tags?
-             pass
-        except Exception as e:
-            print(f"WARNING: General Contest linking failed: {e}")
+    # --------------------------
+    
+    # LINKING GENERAL CONTESTS POSTS
+    # New logic: Check if any of these published posts correspond to an active General Contest Cycle
+    # that is missing its VK ID or needs visual tagging.
+    try:
+         # Lazy import to avoid circular dependency
+         from models_library.general_contests import GeneralContestCycle
+         # Find cycles for this project that are ACTIVE but maybe missing clear linkage or just to tag the post?
+         # Actually, we need to inject 'post_type' = 'general_contest_start' into the Published Post model if it matches?
+         # No, 'ScheduledPost' schema has no 'post_type' field usually designated for system types.
+         # But 'PostCard' checks 'post_type' in 'SystemPost'. For published posts it renders them as 'ScheduledPost' (Post model).
+         
+         # The user wants the PUBLISHED post to look like the contest post.
+         # PostCard.tsx: const isGeneralContestStart = isSystemPost && ...
+         # It explicitly checks `isSystemPost`. If it's a published post, `isSystemPost` is false.
+         # We need to adapt the frontend to recognize Linked Published Posts OR
+         # make the backend return them with a special flag.
+         
+         # Current approach: The frontend likely doesn't support "Published Post acting as System Post" visual yet.
+         # But let's at least clear the System Post from the schedule (done in post_tracker_service)
+         # and ensure the Cycle is updated (done in general_contest_service.on_start_post_published).
+         
+         # If the user wants the published post to clearly SAY "Contest", we might need to update the text or tags?
+         pass
+    except Exception as e:
+        print(f"WARNING: General Contest linking failed: {e}")
 
-        # 2. Применяем теги к постам уже в базе данных
-        print(f"SERVICE: Applying tags to published posts...")
-        _apply_tags_to_db_posts(db, project_id, models.Post)
-        
-        crud.update_project_last_update_time(db, project_id, 'published', timestamp)
-        
-        # --- SYNC WITH SYSTEM LISTS ---
-        print(f"SERVICE: Syncing with System Lists...")
-        try:
-            system_list_entries = []
-            total_count_vk = vk_response.get('count', 0)
+    # 2. Применяем теги к постам уже в базе данных
+    print(f"SERVICE: Applying tags to published posts...")
+    _apply_tags_to_db_posts(db, project_id, models.Post, post_ids=list(changed_ids))
+    
+    crud.update_project_last_update_time(db, project_id, 'published', timestamp, notify=_has_changes(changes))
+    
+    # --- SYNC WITH SYSTEM LISTS ---
+    print(f"SERVICE: Syncing with System Lists...")
+    try:
+        system_list_entries = []
+        total_count_vk = vk_response.get('count', 0)
+        if numeric_id is None:
             numeric_id = vk_service.resolve_vk_group_id(crud.get_project_by_id(db, project_id).vkProjectId, user_token)
-            owner_id = vk_service.vk_owner_id_string(numeric_id)
-            
-            for post in deduplicated_items:
-                image_url = None
-                attachments = post.get('attachments', [])
-                if attachments:
-                    for att in attachments:
-                        if att['type'] == 'photo' and 'sizes' in att.get('photo', {}):
-                            sizes = att['photo']['sizes']
-                            best_size = next((s for s in sizes if s.get('type') == 'x'), sizes[-1])
-                            image_url = best_size.get('url')
-                            break
-                
-                # Извлечение post_author_data.author (приоритет)
-                post_author_id = None
-                if 'post_author_data' in post and 'author' in post['post_author_data']:
-                    post_author_id = post['post_author_data']['author']
-                
-                entry = {
-                    "id": f"{project_id}_{post['id']}",
-                    "project_id": project_id,
-                    "vk_post_id": post['id'],
-                    "date": datetime.fromtimestamp(post['date'], timezone.utc),
-                    "text": post.get('text', ''),
-                    "image_url": image_url,
-                    "vk_link": f"https://vk.com/wall{owner_id}_{post['id']}",
-                    "likes_count": post.get('likes', {}).get('count', 0),
-                    "comments_count": post.get('comments', {}).get('count', 0),
-                    "reposts_count": post.get('reposts', {}).get('count', 0),
-                    "views_count": post.get('views', {}).get('count', 0),
-                    "can_post_comment": bool(post.get('comments', {}).get('can_post', 0)),
-                    "can_like": bool(post.get('likes', {}).get('can_like', 0)),
-                    "user_likes": bool(post.get('likes', {}).get('user_likes', 0)),
-                    # Сохраняем signer_id
-                    "signer_id": post.get('signer_id'),
-                    # NEW: Сохраняем post_author_id
-                    "post_author_id": post_author_id
-                }
-                system_list_entries.append(entry)
-                
-            if system_list_entries:
-                crud.bulk_upsert_posts(db, system_list_entries)
-                crud.update_list_meta(db, project_id, {
-                    "posts_last_updated": timestamp,
-                    "posts_count": total_count_vk
-                })
-                
-        except Exception as sync_e:
-            print(f"WARNING: Failed to auto-sync published posts to System Lists: {sync_e}")
-        # -----------------------------
+        owner_id = vk_service.vk_owner_id_string(numeric_id)
         
+        for post in deduplicated_items:
+            image_url = None
+            attachments = post.get('attachments', [])
+            if attachments:
+                for att in attachments:
+                    if att['type'] == 'photo' and 'sizes' in att.get('photo', {}):
+                        sizes = att['photo']['sizes']
+                        best_size = next((s for s in sizes if s.get('type') == 'x'), sizes[-1])
+                        image_url = best_size.get('url')
+                        break
+            
+            # Извлечение post_author_data.author (приоритет)
+            post_author_id = None
+            if 'post_author_data' in post and 'author' in post['post_author_data']:
+                post_author_id = post['post_author_data']['author']
+            
+            entry = {
+                "id": f"{project_id}_{post['id']}",
+                "project_id": project_id,
+                "vk_post_id": post['id'],
+                "date": datetime.fromtimestamp(post['date'], timezone.utc),
+                "text": post.get('text', ''),
+                "image_url": image_url,
+                "vk_link": f"https://vk.com/wall{owner_id}_{post['id']}",
+                "likes_count": post.get('likes', {}).get('count', 0),
+                "comments_count": post.get('comments', {}).get('count', 0),
+                "reposts_count": post.get('reposts', {}).get('count', 0),
+                "views_count": post.get('views', {}).get('count', 0),
+                "can_post_comment": bool(post.get('comments', {}).get('can_post', 0)),
+                "can_like": bool(post.get('likes', {}).get('can_like', 0)),
+                "user_likes": bool(post.get('likes', {}).get('user_likes', 0)),
+                # Сохраняем signer_id
+                "signer_id": post.get('signer_id'),
+                # NEW: Сохраняем post_author_id
+                "post_author_id": post_author_id
+            }
+            system_list_entries.append(entry)
+            
+        # Переписываем только посты, отличающиеся от сохраненных (текст, статистика)
+        changed_entries = crud.filter_changed_posts(db, system_list_entries)
+        if changed_entries:
+            crud.bulk_upsert_posts(db, changed_entries)
+        if system_list_entries:
+            crud.update_list_meta(db, project_id, {
+                "posts_last_updated": timestamp,
+                "posts_count": total_count_vk
+            })
+            
+    except Exception as sync_e:
+        print(f"WARNING: Failed to auto-sync published posts to System Lists: {sync_e}")
+    # -----------------------------
+
+def refresh_published_posts(db: Session, project_id: str, user_token: str) -> list[ScheduledPost]:
+    print(f"SERVICE: Refreshing published posts for project {project_id}...")
+    timestamp = get_rounded_timestamp()
+    try:
+        print(f"SERVICE: Fetching published posts from VK...")
+        deduplicated_items, vk_response = _fetch_vk_posts(db, project_id, user_token)
+        apply_published_posts(db, project_id, deduplicated_items, vk_response, user_token, timestamp)
         return get_published_posts(db, project_id)
     
     except VkApiError as e:
@@ -10,7 +10,7 @@ from services.vk_service import VkApiError
 from services.post_helpers import get_rounded_timestamp
 import models
 import services.automations.reviews.scheduler as contest_scheduler
-from .helpers import _fetch_vk_posts, _apply_tags_to_db_posts
+from .helpers import _fetch_vk_posts, _apply_tags_to_db_posts, _changed_post_ids, _has_changes
 from .published import get_published_posts
 
 def get_scheduled_posts(db: Session, project_id: str) -> list[ScheduledPost]:
@@ -23,6 +23,31 @@ def get_scheduled_posts(db: Session, project_id: str) -> list[ScheduledPost]:
 def get_scheduled_post_count(db: Session, project_id: str) -> int:
     return crud.get_scheduled_post_count_for_project(db, project_id)
 
+def apply_scheduled_posts(db: Session, project_id: str, deduplicated_items: list[dict], timestamp: str):
+    """
+    Сохраняет уже скачанные отложенные посты (wall.get filter=postponed) и применяет теги.
+    """
+    now_ts = datetime.utcnow().timestamp()
+
+    # Фильтруем, оставляя только будущие посты (на всякий случай, хотя фильтр postponed это делает)
+    posts_from_vk = [
+        vk_service.format_vk_post(item, is_published=False) 
+        for item in deduplicated_items 
+        if int(item.get('date', 0)) > now_ts
+    ]
+    print(f"SERVICE: Fetched {len(posts_from_vk)} scheduled posts.")
+    
+    # 1. Сохраняем посты в базу
+    print(f"SERVICE: Saving scheduled posts to DB...")
+    changes = crud.replace_scheduled_posts(db, project_id, posts_from_vk, timestamp)
+    print(f"SERVICE: Scheduled posts diff: +{len(changes['added'])} ~{len(changes['changed'])} -{len(changes['removed'])}.")
+    
+    # 2. Применяем теги только к новым и измененным постам
+    print(f"SERVICE: Applying tags to scheduled posts...")
+    _apply_tags_to_db_posts(db, project_id, models.ScheduledPost, post_ids=_changed_post_ids(changes))
+    
+    crud.update_project_last_update_time(db, project_id, 'scheduled', timestamp, notify=_has_changes(changes))
+
 def refresh_scheduled_posts(db: Session, project_id: str, user_token: str) -> list[ScheduledPost]:
     """
     Обновление отложенных постов.
@@ -39,25 +64,7 @@ def refresh_scheduled_posts(db: Session, project_id: str, user_token: str) -> li
     try:
         print(f"SERVICE: Fetching scheduled posts from VK...")
         deduplicated_items, _ = _fetch_vk_posts(db, project_id, user_token, filter_type='postponed')
-        now_ts = datetime.utcnow().timestamp()
-
-        # Фильтруем, оставляя только будущие посты (на всякий случай, хотя фильтр postponed это делает)
-        posts_from_vk = [
-            vk_service.format_vk_post(item, is_published=False) 
-            for item in deduplicated_items 
-            if int(item.get('date', 0)) > now_ts
-        ]
-        print(f"SERVICE: Fetched {len(posts_from_vk)} scheduled posts.")
-        
-        # 1. Сохраняем посты в базу
-        print(f"SERVICE: Saving scheduled posts to DB...")
-        crud.replace_scheduled_posts(db, project_id, posts_from_vk, timestamp)
-        
-        # 2. Применяем теги к постам уже в базе данных
-        print(f"SERVICE: Applying tags to scheduled posts...")
-        _apply_tags_to_db_posts(db, project_id, models.ScheduledPost)
-        
-        crud.update_project_last_update_time(db, project_id, 'scheduled', timestamp)
+        apply_scheduled_posts(db, project_id, deduplicated_items, timestamp)
         
         print(f"SERVICE: Scheduled posts refresh complete.")
         return get_scheduled_posts(db, project_id)
@@ -111,22 +118,22 @@ def refresh_all_schedule_data(db: Session, project_id: str, user_token: str) ->
         
         # 3. Save Published
         print(f"SERVICE: [4/7] Saving published posts to DB...")
-        crud.replace_published_posts(db, project_id, pub_posts_vk, timestamp)
+        pub_changes = crud.replace_published_posts(db, project_id, pub_posts_vk, timestamp)
         
         # 4. Save Scheduled
         print(f"SERVICE: [5/7] Saving scheduled posts to DB...")
-        crud.replace_scheduled_posts(db, project_id, sch_posts_vk, timestamp)
+        sch_changes = crud.replace_scheduled_posts(db, project_id, sch_posts_vk, timestamp)
         
-        # 5. Tag Published
+        # 5. Tag Published (только новые и измененные)
         print(f"SERVICE: [6/7] Applying tags to published posts...")
-        _apply_tags_to_db_posts(db, project_id, models.Post)
+        _apply_tags_to_db_posts(db, project_id, models.Post, post_ids=_changed_post_ids(pub_changes))
         
         # 6. Tag Scheduled
         print(f"SERVICE: [7/7] Applying tags to scheduled posts...")
-        _apply_tags_to_db_posts(db, project_id, models.ScheduledPost)
+        _apply_tags_to_db_posts(db, project_id, models.ScheduledPost, post_ids=_changed_post_ids(sch_changes))
         
-        crud.update_project_last_update_time(db, project_id, 'published', timestamp)
-        crud.update_project_last_update_time(db, project_id, 'scheduled', timestamp)
+        crud.update_project_last_update_time(db, project_id, 'published', timestamp, notify=_has_changes(pub_changes))
+        crud.update_project_last_update_time(db, project_id, 'scheduled', timestamp, notify=_has_changes(sch_changes))
         
         # --- SYNC WITH SYSTEM LISTS (Published only) ---
         print(f"SERVICE: Syncing with System Lists...")
@@ -171,8 +178,10 @@ def refresh_all_schedule_data(db: Session, project_id: str, user_token: str) ->
                 }
                 system_list_entries.append(entry)
                 
+            changed_entries = crud.filter_changed_posts(db, system_list_entries)
+            if changed_entries:
+                crud.bulk_upsert_posts(db, changed_entries)
             if system_list_entries:
-                crud.bulk_upsert_posts(db, system_list_entries)
                 crud.update_list_meta(db, project_id, {
                     "posts_last_updated": timestamp,
                     "posts_count": total_count_vk
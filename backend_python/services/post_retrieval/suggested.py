@@ -7,6 +7,7 @@ from schemas import SuggestedPost
 from services import vk_service
 from services.vk_api.api_client import call_vk_api as raw_vk_api_call
 from services.post_helpers import get_rounded_timestamp
+from services.token_pool import system_token_pool
 
 def get_suggested_posts(db: Session, project_id: str) -> list[SuggestedPost]:
     posts = crud.get_suggested_posts_by_project_id(db, project_id)
@@ -36,8 +37,7 @@ def _refresh_restricted_posts_broadcast(db: Session, project_id: str, filter_typ
         tokens_to_try.append(env_token)
     
     # Добавляем системные токены
-    system_tokens = crud.get_active_account_tokens(db)
-    tokens_to_try.extend(system_tokens)
+    tokens_to_try.extend(system_token_pool.get_tokens())
     
     # Убираем дубликаты
     unique_tokens = list(set(tokens_to_try))
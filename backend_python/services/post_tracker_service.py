@@ -13,6 +13,7 @@ from sqlalchemy import and_, or_
 from database import SessionLocal, redis_client
 import crud
 import models
+from models_library.types import parse_iso_datetime
 from services import vk_service, post_service, update_tracker, global_variable_service
 # Импортируем сервисы контекста и товаров для получения свежих данных
 import crud.project_context_crud as context_crud
@@ -20,6 +21,7 @@ import crud.market_crud as market_crud
 import services.automations.reviews.service as contest_service
 import services.automations.ai_posts_service as ai_posts_service # NEW
 import services.automations.general.service as general_contest_service # NEW
+from services.publication_wakeup import publication_wakeup
 from config import settings
 from schemas import PublishPostPayload, ScheduledPost as ScheduledPostSchema
 
@@ -106,7 +108,7 @@ def _create_next_cyclic_post(db: Session, post: models.SystemPost):
     # Проверка лимита по дате
     next_date = _calculate_next_occurrence(post)
     if post.recurrence_end_type == 'date' and post.recurrence_end_date:
-        if next_date > post.recurrence_end_date:
+        if parse_iso_datetime(next_date) > parse_iso_datetime(post.recurrence_end_date):
             print(f"  -> Cycle limit reached (date). Next date {next_date} > Limit {post.recurrence_end_date}. Creating next post as INACTIVE.")
             next_is_active = False
 
@@ -145,160 +147,155 @@ def _create_next_cyclic_post(db: Session, post: models.SystemPost):
     )
     db.add(new_cyclic_post)
     print(f"  -> Created next cyclic post {new_cyclic_post.id}")
+    if next_is_active:
+        publication_wakeup.notify(next_date)
 
 
-def _publication_check():
-    """Находит и публикует посты, время которых пришло."""
-    db: Session = SessionLocal()
-    try:
-        now_iso = datetime.now(timezone.utc).isoformat()
+def _process_system_post(db: Session, post: models.SystemPost) -> bool:
+    """
+    Публикует один системный пост (или запускает его автоматизацию).
+    Пост уже заблокирован вызывающим (status='publishing').
+    Возвращает False, если обработка завершилась ошибкой (status='error').
+    """
+    # --- ВЕТВЛЕНИЕ ПО ТИПУ ПОСТА ---
+    
+    # СЦЕНАРИЙ 1: АВТОМАТИЗАЦИЯ КОНКУРСА
+    if post.post_type == 'contest_winner':
+        print(f"  -> Triggering CONTEST AUTOMATION for project {post.project_id}...")
+        try:
+            contest_service.execute_scheduled_contest(db, post.project_id)
+            print(f"  -> Contest automation finished successfully.")
+            
+            _create_next_cyclic_post(db, post)
+            
+            print(f"  -> Deleting trigger post {post.id}.")
+            crud.delete_system_post(db, post.id)
+            update_tracker.add_updated_project(post.project_id)
+            return True
+            
+        except Exception as e:
+            print(f"  -> AUTOMATION ERROR for project {post.project_id}: {e}")
+            post.status = 'error'
+            db.commit()
+            update_tracker.add_updated_project(post.project_id)
+            return False
         
-        # Ищем посты, время которых пришло. Поддерживаем regular, contest_winner и ai_feed
-        # ВАЖНО: Фильтруем только АКТИВНЫЕ посты (is_active == True)
-        posts_to_publish = db.query(models.SystemPost).filter(
-            models.SystemPost.status == 'pending_publication',
-            models.SystemPost.post_type.in_(['regular', 'contest_winner', 'ai_feed', 'general_contest_start', 'general_contest_result']),
-            models.SystemPost.publication_date <= now_iso,
-            models.SystemPost.is_active == True # Игнорируем выключенные автоматизации
-        ).all()
-
-        if not posts_to_publish:
-            return
-
-        print(f"POST_TRACKER: Found {len(posts_to_publish)} system post(s) to process.")
 
-        for post in posts_to_publish:
-            # Атомарно блокируем пост
-            post.status = 'publishing'
-            db.commit()
-            
-            # --- ВЕТВЛЕНИЕ ПО ТИПУ ПОСТА ---
+    # СЦЕНАРИЙ 2: AI FEED POST (Генерация контента на лету)
+    if post.post_type == 'ai_feed':
+        print(f"  -> Triggering AI FEED GENERATION for project {post.project_id}...")
+        try:
+            # Делегируем генерацию и публикацию специализированному сервису
+            # Сервис вернет ID поста в VK
+            vk_post_id = ai_posts_service.generate_and_publish_post(db, post)
             
-            # СЦЕНАРИЙ 1: АВТОМАТИЗАЦИЯ КОНКУРСА
-            if post.post_type == 'contest_winner':
-                print(f"  -> Triggering CONTEST AUTOMATION for project {post.project_id}...")
-                try:
-                    contest_service.execute_scheduled_contest(db, post.project_id)
-                    print(f"  -> Contest automation finished successfully.")
-                    
-                    _create_next_cyclic_post(db, post)
-                    
-                    print(f"  -> Deleting trigger post {post.id}.")
-                    crud.delete_system_post(db, post.id)
-                    update_tracker.add_updated_project(post.project_id)
-                    
-                except Exception as e:
-                    print(f"  -> AUTOMATION ERROR for project {post.project_id}: {e}")
-                    post.status = 'error'
-                    db.commit()
-                    update_tracker.add_updated_project(post.project_id)
-                
-                continue 
+            # Обновляем пост для верификации
+            post.vk_post_id = vk_post_id
+            db.commit()
+            print(f"  -> AI Feed Post published. VK ID: {vk_post_id}. Waiting for verification.")
+            update_tracker.add_updated_project(post.project_id)
+            return True
+        except Exception as e:
+             print(f"  -> AI FEED ERROR for project {post.project_id}: {e}")
+             post.status = 'error'
+             db.commit()
+             update_tracker.add_updated_project(post.project_id)
+             return False
+        
 
-            # СЦЕНАРИЙ 2: AI FEED POST (Генерация контента на лету)
-            if post.post_type == 'ai_feed':
-                print(f"  -> Triggering AI FEED GENERATION for project {post.project_id}...")
-                try:
-                    # Делегируем генерацию и публикацию специализированному сервису
-                    # Сервис вернет ID поста в VK
-                    vk_post_id = ai_posts_service.generate_and_publish_post(db, post)
-                    
-                    # Обновляем пост для верификации
-                    post.vk_post_id = vk_post_id
-                    db.commit()
-                    print(f"  -> AI Feed Post published. VK ID: {vk_post_id}. Waiting for verification.")
-                    update_tracker.add_updated_project(post.project_id)
-                except Exception as e:
-                     print(f"  -> AI FEED ERROR for project {post.project_id}: {e}")
-                     post.status = 'error'
-                     db.commit()
-                     update_tracker.add_updated_project(post.project_id)
-                
-                continue
+    # СЦЕНАРИЙ 4: ИТОГИ УНИВЕРСАЛЬНОГО КОНКУРСА
+    if post.post_type == 'general_contest_result':
+        print(f"  -> Processing GENERAL CONTEST RESULTS for project {post.project_id}...")
+        try:
+            general_contest_service.process_results(db, post)
+            print(f"  -> General contest results processed.")
+            update_tracker.add_updated_project(post.project_id)
+            return True
+        except Exception as e:
+            print(f"  -> GENERAL CONTEST ERROR for project {post.project_id}: {e}")
+            post.status = 'error'
+            db.commit()
+            update_tracker.add_updated_project(post.project_id)
+            return False
 
-            # СЦЕНАРИЙ 4: ИТОГИ УНИВЕРСАЛЬНОГО КОНКУРСА
-            if post.post_type == 'general_contest_result':
-                print(f"  -> Processing GENERAL CONTEST RESULTS for project {post.project_id}...")
-                try:
-                    general_contest_service.process_results(db, post)
-                    print(f"  -> General contest results processed.")
-                    update_tracker.add_updated_project(post.project_id)
-                except Exception as e:
-                    print(f"  -> GENERAL CONTEST ERROR for project {post.project_id}: {e}")
-                    post.status = 'error'
-                    db.commit()
-                    update_tracker.add_updated_project(post.project_id)
-                continue
+    # СЦЕНАРИЙ 3: ОБЫЧНЫЙ РЕГУЛЯРНЫЙ ПОСТ
+    print(f"  -> Publishing REGULAR post {post.id} for project {post.project_id}...")
+    try:
+        # Подстановка глобальных переменных
+        text_to_process = post.text or ""
+        substituted_text = global_variable_service.substitute_global_variables(db, text_to_process, post.project_id)
+        
+        has_attachments = False
+        if post.images and post.images != '[]': has_attachments = True
+        if post.attachments and post.attachments != '[]': has_attachments = True
+        
+        if not substituted_text.strip() and not has_attachments:
+            raise Exception("Cannot publish empty post (no text and no attachments). Check content.")
+
+        post_schema = ScheduledPostSchema(
+            id=post.id,
+            date=post.publication_date,
+            text=substituted_text, 
+            images=json.loads(post.images) if post.images else [],
+            attachments=json.loads(post.attachments) if post.attachments else []
+        )
+        payload = PublishPostPayload(post=post_schema, projectId=post.project_id)
+        
+        vk_post_id = post_service.publish_now(db, payload, settings.vk_user_token, delete_original=False)
+        
+        post.vk_post_id = vk_post_id
+        db.commit()
+
+        # HOOK: Если это старт конкурса
+        if post.post_type == 'general_contest_start':
+             general_contest_service.on_start_post_published(db, post, vk_post_id)
+             # Мы не удаляем системный пост сразу здесь, т.к. "create_next_cyclic_post" потенциально может понадобиться
+             # Но для "general_contest_start" цикличность реализована через сам сервис конкурсов
+             # Поэтому, чтобы избежать дублирования в расписании (Published Post из VK vs System Post),
+             # мы помечаем его как executed/deleted или даем ему статус, который скроет его из выдачи,
+             # если он больше не нужен для повторений.
+             # Если это НЕ циклический, то можно удалить.
+             if not post.is_cyclic:
+                 print(f"  -> Cleaning up non-cyclic general contest start post {post.id}")
+                 crud.delete_system_post(db, post.id)
+             else:
+                print(f"  -> Creating next cyclic post for GENERAL CONTEST {post.id}")
+                _create_next_cyclic_post(db, post) # Создаем следующий до того, как скроем текущий?
+                # Если мы создали следующий, текущий "отработал".
+                # В обычном расписании "отработанные" посты VK сами удаляются из "Отложки" VK.
+                # А системные посты мы должны удалять.
+                crud.delete_system_post(db, post.id)
+
+        print(f"  -> Successfully sent post {post.id} to VK API. Received VK ID: {vk_post_id}.")
+        update_tracker.add_updated_project(post.project_id)
+        return True
 
-            # СЦЕНАРИЙ 3: ОБЫЧНЫЙ РЕГУЛЯРНЫЙ ПОСТ
-            print(f"  -> Publishing REGULAR post {post.id} for project {post.project_id}...")
-            try:
-                # Подстановка глобальных переменных
-                text_to_process = post.text or ""
-                substituted_text = global_variable_service.substitute_global_variables(db, text_to_process, post.project_id)
-                
-                has_attachments = False
-                if post.images and post.images != '[]': has_attachments = True
-                if post.attachments and post.attachments != '[]': has_attachments = True
-                
-                if not substituted_text.strip() and not has_attachments:
-                    raise Exception("Cannot publish empty post (no text and no attachments). Check content.")
-
-                post_schema = ScheduledPostSchema(
-                    id=post.id,
-                    date=post.publication_date,
-                    text=substituted_text, 
-                    images=json.loads(post.images) if post.images else [],
-                    attachments=json.loads(post.attachments) if post.attachments else []
-                )
-                payload = PublishPostPayload(post=post_schema, projectId=post.project_id)
-                
-                vk_post_id = post_service.publish_now(db, payload, settings.vk_user_token, delete_original=False)
-                
-                post.vk_post_id = vk_post_id
-                db.commit()
-
-                # HOOK: Если это старт конкурса
-                if post.post_type == 'general_contest_start':
-                     general_contest_service.on_start_post_published(db, post, vk_post_id)
-                     # Мы не удаляем системный пост сразу здесь, т.к. "create_next_cyclic_post" потенциально может понадобиться
-                     # Но для "general_contest_start" цикличность реализована через сам сервис конкурсов
-                     # Поэтому, чтобы избежать дублирования в расписании (Published Post из VK vs System Post),
-                     # мы помечаем его как executed/deleted или даем ему статус, который скроет его из выдачи,
-                     # если он больше не нужен для повторений.
-                     # Если это НЕ циклический, то можно удалить.
-                     if not post.is_cyclic:
-                         print(f"  -> Cleaning up non-cyclic general contest start post {post.id}")
-                         crud.delete_system_post(db, post.id)
-                     else:
-                        print(f"  -> Creating next cyclic post for GENERAL CONTEST {post.id}")
-                        _create_next_cyclic_post(db, post) # Создаем следующий до того, как скроем текущий?
-                        # Если мы создали следующий, текущий "отработал".
-                        # В обычном расписании "отработанные" посты VK сами удаляются из "Отложки" VK.
-                        # А системные посты мы должны удалять.
-                        crud.delete_system_post(db, post.id)
+    except Exception as e:
+        print(f"  -> ERROR publishing post {post.id}: {e}")
+        post.status = 'error'
+        db.commit()
+        update_tracker.add_updated_project(post.project_id)
+        return False
 
-                print(f"  -> Successfully sent post {post.id} to VK API. Received VK ID: {vk_post_id}.")
-                update_tracker.add_updated_project(post.project_id)
 
-            except Exception as e:
-                print(f"  -> ERROR publishing post {post.id}: {e}")
-                post.status = 'error'
-                db.commit()
-                update_tracker.add_updated_project(post.project_id)
-    
-    finally:
-        db.close()
+def _publication_check():
+    """Находит и публикует посты, время которых пришло (см. services/system_post_publisher.py)."""
+    from services.system_post_publisher import system_post_publisher
+    system_post_publisher.run_once()
 
 
 def _verification_check():
     """Проверяет, были ли опубликованы посты со статусом 'publishing'."""
     db: Session = SessionLocal()
     try:
-        # Проверяем regular и ai_feed
+        # Проверяем regular и ai_feed. Посты под активной арендой еще публикуются
         posts_to_verify = db.query(models.SystemPost).filter(
             models.SystemPost.status == 'publishing',
-            models.SystemPost.post_type.in_(['regular', 'ai_feed'])
+            models.SystemPost.post_type.in_(['regular', 'ai_feed']),
+            or_(
+                models.SystemPost.lease_expires_at.is_(None),
+                models.SystemPost.lease_expires_at < datetime.now(timezone.utc)
+            )
         ).all()
         
         if not posts_to_verify:
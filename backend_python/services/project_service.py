@@ -10,6 +10,7 @@ from database import SessionLocal
 # ИЗМЕНЕНО: Прямые импорты модулей вместо from services import ...
 import services.task_monitor as task_monitor
 import services.post_retrieval_service as post_retrieval_service
+import services.post_retrieval.batch_refresh as batch_refresh
 # Добавляем сервис товаров для массового обновления
 import services.market_service as market_service
 from config import settings
@@ -69,44 +70,45 @@ def refresh_all_projects_task(task_id: str, view_type: str = 'schedule'):
             
         task_monitor.update_task(task_id, "processing", loaded=0, total=total_count, message=f"Найдено {total_count} проектов. Обновляем {target_name}.")
         
-        success_count = 0
-        error_count = 0
-        
-        for i, project in enumerate(projects):
-            current_progress = i + 1
+        def report_progress(i: int, project):
             # ВАЖНО: Добавляем спец. маркер [PID:...] в начало сообщения, чтобы фронтенд мог распарсить ID
             # и повесить лоадер на конкретный проект, а также обновить предыдущий.
-            status_message = f"[PID:{project.id}] Обработка: {project.name}"
-            
             task_monitor.update_task(
                 task_id, 
                 "processing", 
-                loaded=current_progress, 
+                loaded=i + 1, 
                 total=total_count, 
-                message=status_message
+                message=f"[PID:{project.id}] Обработка: {project.name}"
+            )
+        
+        if view_type not in ('suggested', 'products'):
+            # Default: schedule (scheduled + published).
+            # Стены скачиваются пакетами execute по всем проектам сразу, затем запись по проектам.
+            success_count, error_count = batch_refresh.refresh_schedule_batched(
+                db, projects, settings.vk_user_token, on_project=report_progress
             )
+        else:
+            success_count = 0
+            error_count = 0
             
-            try:
-                if view_type == 'suggested':
-                    post_retrieval_service.refresh_suggested_posts(db, project.id, settings.vk_user_token)
-                elif view_type == 'products':
-                    # Для товаров вызываем метод принудительного обновления всего
-                    market_service.refresh_all_market_data(db, project.id, settings.vk_user_token)
-                else:
-                    # Default: schedule (scheduled + published)
-                    # Обновляем отложку
-                    post_retrieval_service.refresh_scheduled_posts(db, project.id, settings.vk_user_token)
-                    # Обновляем опубликованные
-                    post_retrieval_service.refresh_published_posts(db, project.id, settings.vk_user_token)
+            for i, project in enumerate(projects):
+                report_progress(i, project)
                 
-                success_count += 1
-            except Exception as e:
-                print(f"TASK {task_id}: Error refreshing project {project.name}: {e}")
-                error_count += 1
-                # Не прерываем цикл, идем к следующему проекту
-            
-            # Небольшая пауза, чтобы не задушить VK API, если проектов очень много
-            time.sleep(0.5)
+                try:
+                    if view_type == 'suggested':
+                        post_retrieval_service.refresh_suggested_posts(db, project.id, settings.vk_user_token)
+                    else:
+                        # Для товаров вызываем метод принудительного обновления всего
+                        market_service.refresh_all_market_data(db, project.id, settings.vk_user_token)
+                    
+                    success_count += 1
+                except Exception as e:
+                    print(f"TASK {task_id}: Error refreshing project {project.name}: {e}")
+                    error_count += 1
+                    # Не прерываем цикл, идем к следующему проекту
+                
+                # Небольшая пауза, чтобы не задушить VK API, если проектов очень много
+                time.sleep(0.5)
 
         result_msg = f"Завершено. Успешно: {success_count}, Ошибок: {error_count}"
         task_monitor.update_task(task_id, "done", message=result_msg)
@@ -0,0 +1,224 @@
+import heapq
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from sqlalchemy import func
+
+from database import SessionLocal, redis_client
+import models
+from models_library.types import parse_iso_datetime
+from services.system_post_publisher import PUBLISHABLE_POST_TYPES
+
+# ===================================================================
+# ПРОБУЖДЕНИЕ ПУБЛИКАТОРА К ВРЕМЕНИ ПУБЛИКАЦИИ
+# ===================================================================
+# Раньше job_system_post_publisher запускался раз в 50 секунд: посты
+# уходили с опозданием до 50 сек, а БД опрашивалась весь день, даже когда
+# ничего не запланировано.
+#
+# Теперь поток планировщика держит min-heap ближайших моментов запуска
+# и спит до первого из них:
+# - notify(publication_date) - пост сохранен (save_system.py) или создана
+#   следующая итерация циклического поста (_create_next_cyclic_post).
+#   При наличии Redis уведомление рассылается всем процессам (pub/sub).
+# - После каждого запуска из БД (индекс ix_system_posts_due) берется
+#   ближайшее время ожидающего поста. Если есть посты на верификации
+#   (status='publishing') - повторный запуск через VERIFY_INTERVAL.
+# - Готовый пост, который проход не взял (проект занят, пул полон),
+#   проверяется повторно с экспоненциальной задержкой от
+#   BACKLOG_RETRY_SECONDS до BACKLOG_MAX_RETRY_SECONDS, пока во главе
+#   очереди тот же пост. Освободившийся слот пула будит цикл сразу (wake).
+# - Если будить некому, раз в RECONCILE_INTERVAL выполняется сверочный
+#   запуск (посты, созданные в обход notify: конкурсы, AI-ленты и т.п.).
+#
+# Цикл работает только в одном процессе - лидере. Лидерство - аренда
+# LEADER_KEY в Redis (LEADER_TTL), которую лидер продлевает каждые
+# LEADER_RENEW_SECONDS. Остальные процессы только пересылают notify и
+# подхватывают цикл, когда аренда истекает. Без Redis лидер - сам процесс.
+# Сам проход дополнительно защищен Redis-блокировкой (LOCK_KEY в
+# scheduler_service): если она занята, попытка повторяется через
+# LOCK_RETRY_SECONDS.
+# ===================================================================
+
+WAKEUP_CHANNEL = "vk_planner:system_post_wakeup"
+RECONCILE_INTERVAL = 300
+VERIFY_INTERVAL = 60
+LOCK_RETRY_SECONDS = 5
+# Готовые посты, которые проход не взял: первая задержка и ее потолок
+BACKLOG_RETRY_SECONDS = 5
+BACKLOG_MAX_RETRY_SECONDS = 120
+# Пост с датой в прошлом (бэклог цикла) будим с небольшой задержкой:
+# уведомление приходит до коммита транзакции
+PAST_DUE_DELAY = 1
+
+LEADER_KEY = "vk_planner:publication_wakeup_leader"
+LEADER_TTL = 30
+LEADER_RENEW_SECONDS = 10
+
+# Продлевает аренду лидера, только если она все еще наша
+_RENEW_LEADER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class PublicationWakeup:
+    def __init__(self):
+        self._heap: List[float] = []
+        self._cond = threading.Condition()
+        self._run_job: Optional[Callable[[], bool]] = None
+        # Запланированный проход верификации (не больше одного)
+        self._verify_at = 0.0
+        # Ожидающий пост во главе очереди и текущая задержка его повторной проверки
+        self._backlog_head = None
+        self._backlog_delay = BACKLOG_RETRY_SECONDS
+        self._leader_token = uuid.uuid4().hex
+        self._is_leader = not redis_client
+        self._thread = None
+
+    def start(self, run_job: Callable[[], bool]):
+        """run_job() -> False, если запуск пропущен (блокировка у другого процесса)."""
+        if self._thread is not None:
+            return
+        self._run_job = run_job
+        self._thread = threading.Thread(target=self._run, name="publication-wakeup", daemon=True)
+        self._thread.start()
+        if redis_client:
+            threading.Thread(target=self._listen, name="publication-wakeup-listener", daemon=True).start()
+            threading.Thread(target=self._keep_leadership, name="publication-wakeup-leader", daemon=True).start()
+        print("SCHEDULER: Publication wake-up started.")
+
+    def wake(self):
+        """Внеочередной проход в этом процессе (например, освободился слот пула)."""
+        self._push(time.time())
+
+    def notify(self, publication_date):
+        """Пост запланирован на publication_date (ISO-строка или datetime)."""
+        try:
+            when = parse_iso_datetime(publication_date).timestamp()
+        except Exception:
+            return
+        self._push(when)
+        if redis_client:
+            try:
+                redis_client.publish(WAKEUP_CHANNEL, str(when))
+            except Exception as e:
+                print(f"SCHEDULER: Wake-up publish failed: {e}")
+
+    # --- Внутренняя логика ---
+
+    def _push(self, when: float):
+        now = time.time()
+        if when <= now:
+            when = now + PAST_DUE_DELAY
+        with self._cond:
+            if when not in self._heap:
+                heapq.heappush(self._heap, when)
+                self._cond.notify()
+
+    def _wait_for_due(self):
+        """Ждет ближайший момент из heap (или сверочный интервал) и снимает наступившие."""
+        reconcile_at = time.time() + RECONCILE_INTERVAL
+        with self._cond:
+            while True:
+                now = time.time()
+                next_at = self._heap[0] if self._heap else reconcile_at
+                if next_at <= now or reconcile_at <= now:
+                    while self._heap and self._heap[0] <= now:
+                        heapq.heappop(self._heap)
+                    return
+                self._cond.wait(min(next_at, reconcile_at) - now)
+
+    def _wait_for_leadership(self):
+        with self._cond:
+            while not self._is_leader:
+                self._cond.wait()
+
+    def _keep_leadership(self):
+        """Захватывает и продлевает аренду лидера цикла."""
+        while True:
+            try:
+                held = bool(redis_client.eval(_RENEW_LEADER_SCRIPT, 1, LEADER_KEY, self._leader_token, LEADER_TTL))
+                if not held:
+                    held = bool(redis_client.set(LEADER_KEY, self._leader_token, nx=True, ex=LEADER_TTL))
+            except Exception as e:
+                print(f"SCHEDULER: Wake-up leader lease error: {e}")
+                held = False
+
+            with self._cond:
+                changed = held != self._is_leader
+                self._is_leader = held
+                if changed:
+                    self._cond.notify_all()
+            if changed:
+                print(f"SCHEDULER: Publication wake-up {'acquired' if held else 'lost'} leadership.")
+            time.sleep(LEADER_RENEW_SECONDS)
+
+    def _run(self):
+        # Первый запуск лидера сразу: посты, просроченные за время простоя
+        while True:
+            self._wait_for_leadership()
+            try:
+                if not self._run_job():
+                    self._push(time.time() + LOCK_RETRY_SECONDS)
+                self._schedule_from_db()
+            except Exception as e:
+                print(f"SCHEDULER ERROR (Publication wake-up): {e}")
+            self._wait_for_due()
+
+    def _schedule_from_db(self):
+        """Ближайший ожидающий пост и посты на верификации (запросы по индексу)."""
+        db = SessionLocal()
+        try:
+            next_due = db.query(func.min(models.SystemPost.publication_date)).filter(
+                models.SystemPost.status == 'pending_publication',
+                models.SystemPost.post_type.in_(PUBLISHABLE_POST_TYPES),
+                models.SystemPost.is_active == True
+            ).scalar()
+            verifying = db.query(models.SystemPost.id).filter(
+                models.SystemPost.status == 'publishing'
+            ).first()
+        finally:
+            db.close()
+
+        now = time.time()
+        if next_due:
+            when = parse_iso_datetime(next_due).timestamp()
+            if when > now:
+                self._backlog_head = None
+                self._push(when)
+            else:
+                self._push(now + self._backlog_retry_delay(next_due))
+        if verifying and self._verify_at <= now:
+            self._verify_at = now + VERIFY_INTERVAL
+            self._push(self._verify_at)
+
+    def _backlog_retry_delay(self, head) -> float:
+        """Задержка растет, пока во главе очереди остается тот же не взятый пост."""
+        if head == self._backlog_head:
+            self._backlog_delay = min(self._backlog_delay * 2, BACKLOG_MAX_RETRY_SECONDS)
+        else:
+            self._backlog_head = head
+            self._backlog_delay = BACKLOG_RETRY_SECONDS
+        return self._backlog_delay
+
+    def _listen(self):
+        """Уведомления от других процессов."""
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(WAKEUP_CHANNEL)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self._push(float(message['data']))
+            except Exception as e:
+                print(f"SCHEDULER: Wake-up listener error: {e}. Reconnecting...")
+                time.sleep(5)
+
+
+publication_wakeup = PublicationWakeup()
@@ -2,11 +2,14 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import logging
+import uuid
 from datetime import datetime
 
 from database import redis_client
 import services.post_tracker_service as post_tracker
+from services.publication_wakeup import publication_wakeup
 import services.automations.stories_background_service as stories_bg # NEW
+from services.lists.subscribers.reconcile import run_due_reconciles
 
 # Настройка логгера
 logging.basicConfig()
@@ -16,24 +19,36 @@ scheduler = BackgroundScheduler()
 
 # Ключ блокировки в Redis для предотвращения гонки воркеров
 LOCK_KEY = "vk_planner:tracker_lock"
-LOCK_TTL = 55 # Чуть больше интервала запуска (50 сек)
+LOCK_TTL = 55 # Страховка: блокировка снимается сразу после прохода
 
-def job_system_post_publisher():
+# Снимает блокировку, только если она все еще наша (TTL мог истечь)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def job_system_post_publisher() -> bool:
     """
     Задача: Публикация и верификация системных постов.
-    Запускается каждые 50 секунд.
+    Запускается к времени публикации ближайшего поста
+    (services/publication_wakeup.py), иначе - сверочным проходом.
     Использует Redis Lock, чтобы гарантировать выполнение только в одном процессе.
+    Сама публикация идет в пуле воркеров с арендой постов
+    (services/system_post_publisher.py) и не держит блокировку.
+    Возвращает False, если проход пропущен (блокировка у другого процесса).
     """
     is_leader = False
+    token = uuid.uuid4().hex
     
     if redis_client:
         try:
             # Пытаемся захватить лидерство.
             # nx=True: установить только если ключа нет.
             # ex=LOCK_TTL: ключ сам исчезнет через 55 секунд.
-            if redis_client.set(LOCK_KEY, "locked", nx=True, ex=LOCK_TTL):
+            if redis_client.set(LOCK_KEY, token, nx=True, ex=LOCK_TTL):
                 is_leader = True
-                # print(f"SCHEDULER: Acquired lock at {datetime.now()}, running post tracker.")
         except Exception as e:
             print(f"SCHEDULER: Redis lock error: {e}. Skipping cycle.")
     else:
@@ -48,6 +63,16 @@ def job_system_post_publisher():
             post_tracker._verification_check()
         except Exception as e:
             print(f"SCHEDULER ERROR (Post Tracker): {e}")
+        finally:
+            # Отпускаем сразу: следующий пост может быть через секунду,
+            # его пробуждение не должно ждать истечения TTL
+            if redis_client:
+                try:
+                    redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+                except Exception as e:
+                    print(f"SCHEDULER: Redis unlock error: {e}")
+
+    return is_leader
 
 def job_stories_automation():
     """
@@ -76,18 +101,38 @@ def job_stories_automation():
         except Exception as e:
              print(f"SCHEDULER ERROR (Stories BG): {e}")
 
+def job_subscribers_reconcile():
+    """
+    Задача: Сверка списков подписчиков, которые ведутся событиями group_join/group_leave.
+    Запускается каждый час; полный обход делается только для просроченных проектов.
+    """
+    reconcile_lock_key = "vk_planner:subscribers_reconcile_lock"
+    reconcile_ttl = 3590 # ~1 час
+
+    should_run = False
+    if redis_client:
+        try:
+            if redis_client.set(reconcile_lock_key, "locked", nx=True, ex=reconcile_ttl):
+                should_run = True
+        except Exception as e:
+            print(f"SCHEDULER: Reconcile lock error: {e}. Skipping.")
+    else:
+        should_run = True
+
+    if should_run:
+        try:
+            run_due_reconciles()
+        except Exception as e:
+            print(f"SCHEDULER ERROR (Subscribers Reconcile): {e}")
+
 # --- ЗАПУСК ---
 
 def start():
     """Инициализация и запуск планировщика."""
     
-    # Добавляем задачу с интервалом 50 секунд
-    scheduler.add_job(
-        job_system_post_publisher,
-        IntervalTrigger(seconds=50),
-        id='system_post_tracker',
-        replace_existing=True
-    )
+    # Публикация системных постов - по времени ближайшего поста (min-heap),
+    # со сверочным проходом раз в несколько минут
+    publication_wakeup.start(job_system_post_publisher)
 
     # Добавляем задачу автоматизации историй (посты в истории) - каждые 10 минут
     scheduler.add_job(
@@ -97,5 +142,13 @@ def start():
         replace_existing=True
     )
 
+    # Сверка списков подписчиков (дрейф дельт из Callback API) - каждый час
+    scheduler.add_job(
+        job_subscribers_reconcile,
+        IntervalTrigger(hours=1),
+        id='subscribers_reconcile',
+        replace_existing=True
+    )
+
     scheduler.start()
     print("✅ APScheduler started (Post Tracker ONLY mode).")
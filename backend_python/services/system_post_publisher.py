@@ -0,0 +1,375 @@
+import os
+import socket
+import statistics
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from database import SessionLocal, redis_client
+import models
+from models_library.types import parse_iso_datetime
+
+# ===================================================================
+# ПУБЛИКАТОР СИСТЕМНЫХ ПОСТОВ С АРЕНДОЙ СТРОК
+# ===================================================================
+# Раньше _publication_check выбирал все посты, время которых пришло, и
+# обрабатывал их по одному внутри Redis-блокировки на 55 секунд. Одна
+# долгая генерация AI-поста или розыгрыш конкурса задерживали все
+# остальные посты и могли пережить блокировку.
+#
+# Теперь каждый пост захватывается отдельно (аренда строки) атомарным
+# compare-and-set: UPDATE ... WHERE status = 'pending_publication'
+# AND у проекта нет поста под активной арендой AND нет более раннего
+# ожидающего поста. Захват ставит status='publishing', lease_owner и
+# lease_expires_at.
+# - PostgreSQL: захват проекта дополнительно сериализуется транзакционной
+#   advisory-блокировкой по проекту (pg_try_advisory_xact_lock). SKIP LOCKED
+#   по строкам не подходит: пока один процесс захватывает ранний пост,
+#   другой пропустил бы его строку и взял следующий пост того же проекта.
+# - SQLite: записи и так сериализованы на уровне файла БД.
+#
+# Посты обрабатываются пулом из PUBLISHER_WORKERS потоков. Порядок внутри
+# проекта сохраняется: у проекта одновременно обрабатывается не больше
+# одного поста, следующий захватывается после завершения предыдущего.
+# Проект, у которого есть пост под активной арендой (в любом процессе),
+# в захват не попадает.
+#
+# Аренда с истекшим сроком повторно не публикуется: пост мог уже уйти в VK.
+# Такие посты разбирает _verification_check (опубликован / possible_error).
+# Если обработка поста упала с исключением, аренда снимается сразу:
+# пост, не ушедший в VK, получает status='error', ушедший - остается на
+# верификации.
+#
+# get_metrics() - отставание публикации от расписания (publish lag).
+# Публикует тот процесс, который взял блокировку планировщика, поэтому
+# счетчики и выборка задержек при наличии Redis общие для всех процессов.
+# ===================================================================
+
+PUBLISHER_WORKERS = 4
+LEASE_SECONDS = 900
+# Сколько кандидатов смотреть на один свободный слот (несколько постов одного проекта)
+CANDIDATES_PER_SLOT = 5
+LAG_WINDOW = 500
+
+PUBLISHABLE_POST_TYPES = ['regular', 'contest_winner', 'ai_feed', 'general_contest_start', 'general_contest_result']
+
+METRICS_KEY = "vk_planner:system_post_publisher:metrics"
+LAGS_KEY = "vk_planner:system_post_publisher:lags"
+# Пространство ключей advisory-блокировок PostgreSQL для захвата проектов
+ADVISORY_LOCK_CLASS = 7301
+
+
+def _parse_publication_date(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return parse_iso_datetime(value)
+    except Exception:
+        return None
+
+
+class SystemPostPublisher:
+    def __init__(self, workers: int = PUBLISHER_WORKERS):
+        self._workers = workers
+        self._owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active_projects: set = set()
+
+        # Метрики процесса (если Redis не настроен)
+        self._lags: deque = deque(maxlen=LAG_WINDOW)
+        self._published = 0
+        self._failed = 0
+        self._last_published_at: Optional[datetime] = None
+
+    def run_once(self) -> int:
+        """
+        Захватывает готовые к публикации посты (по одному на проект, не больше
+        свободных слотов пула) и отдает их пулу. Не ждет завершения публикации.
+        Возвращает количество захваченных постов.
+        """
+        with self._lock:
+            free_slots = self._workers - len(self._active_projects)
+            busy_projects = set(self._active_projects)
+        if free_slots <= 0:
+            return 0
+
+        db: Session = SessionLocal()
+        try:
+            claimed = self._claim(db, free_slots, exclude_projects=busy_projects)
+        finally:
+            db.close()
+
+        if not claimed:
+            return 0
+
+        print(f"POST_TRACKER: Claimed {len(claimed)} system post(s) to process.")
+        executor = self._ensure_executor()
+        for post_id, project_id in claimed:
+            with self._lock:
+                self._active_projects.add(project_id)
+            executor.submit(self._drain_project, project_id, post_id)
+        return len(claimed)
+
+    def get_metrics(self, db: Session) -> Dict:
+        """Отставание публикации от расписания и текущая очередь."""
+        metrics, lags = self._load_metrics()
+
+        lags.sort()
+        metrics["lag_samples"] = len(lags)
+        metrics["lag_p50_seconds"] = round(statistics.median(lags), 1) if lags else None
+        metrics["lag_p95_seconds"] = round(lags[min(int(len(lags) * 0.95), len(lags) - 1)], 1) if lags else None
+        metrics["lag_max_seconds"] = round(lags[-1], 1) if lags else None
+
+        # Посты под активной арендой - во всех процессах
+        now = datetime.now(timezone.utc)
+        metrics["in_flight_projects"] = db.query(func.count(func.distinct(models.SystemPost.project_id))).filter(
+            models.SystemPost.status == 'publishing',
+            models.SystemPost.lease_expires_at > now
+        ).scalar() or 0
+
+        # Посты, время которых уже пришло, но которые еще никто не взял
+        backlog_count, oldest_due = self._due_query(db, now).with_entities(
+            func.count(models.SystemPost.id), func.min(models.SystemPost.publication_date)
+        ).one()
+        oldest_due_dt = _parse_publication_date(oldest_due) if oldest_due else None
+        metrics["due_backlog"] = backlog_count
+        metrics["oldest_due_lag_seconds"] = round((now - oldest_due_dt).total_seconds(), 1) if oldest_due_dt else None
+        return metrics
+
+    # --- Захват ---
+
+    @staticmethod
+    def _due_query(db: Session, now: datetime):
+        # ВАЖНО: Фильтруем только АКТИВНЫЕ посты (is_active == True)
+        return db.query(models.SystemPost).filter(
+            models.SystemPost.status == 'pending_publication',
+            models.SystemPost.post_type.in_(PUBLISHABLE_POST_TYPES),
+            models.SystemPost.publication_date <= now,
+            models.SystemPost.is_active == True  # Игнорируем выключенные автоматизации
+        )
+
+    def _claim(self, db: Session, limit: int, project_id: Optional[str] = None, exclude_projects: Optional[set] = None) -> List[Tuple[str, str]]:
+        """Захватывает до limit постов (не больше одного на проект). Возвращает [(post_id, project_id)]."""
+        now = datetime.now(timezone.utc)
+        post = models.SystemPost
+        query = self._due_query(db, now).with_entities(post.id, post.project_id)
+
+        if project_id is not None:
+            query = query.filter(post.project_id == project_id)
+        else:
+            # Проекты, пост которых сейчас публикуется (в любом процессе)
+            leased_projects = db.query(post.project_id).filter(
+                post.status == 'publishing',
+                post.lease_expires_at > now
+            )
+            query = query.filter(post.project_id.notin_(leased_projects))
+            if exclude_projects:
+                query = query.filter(post.project_id.notin_(list(exclude_projects)))
+
+        query = query.order_by(post.publication_date, post.id).limit(limit * CANDIDATES_PER_SLOT)
+
+        # Самый ранний пост каждого проекта
+        picked = {}
+        for post_id, post_project_id in query.all():
+            if post_project_id not in picked:
+                picked[post_project_id] = post_id
+            if len(picked) >= limit:
+                break
+
+        is_postgres = db.get_bind().dialect.name == 'postgresql'
+        claimed = []
+        lease_expires_at = now + timedelta(seconds=LEASE_SECONDS)
+        for post_project_id, post_id in picked.items():
+            # Проект захватывает другой процесс - возьмем его посты в следующий проход.
+            # Блокировка держится до commit, после него аренда видна всем
+            if is_postgres and not db.execute(
+                select(func.pg_try_advisory_xact_lock(ADVISORY_LOCK_CLASS, func.hashtext(post_project_id)))
+            ).scalar():
+                continue
+            # Compare-and-set с проверкой порядка проекта в том же UPDATE
+            updated = db.query(post).filter(
+                post.id == post_id,
+                post.status == 'pending_publication',
+                ~self._project_leased(post, now),
+                ~self._earlier_pending(post)
+            ).update({
+                post.status: 'publishing',
+                post.lease_owner: self._owner,
+                post.lease_expires_at: lease_expires_at,
+            }, synchronize_session=False)
+            if updated:
+                claimed.append((post_id, post_project_id))
+        db.commit()
+        return claimed
+
+    @staticmethod
+    def _project_leased(post, now: datetime):
+        """У проекта поста есть пост под активной арендой."""
+        other = aliased(models.SystemPost)
+        return exists().where(
+            other.project_id == post.project_id,
+            other.status == 'publishing',
+            other.lease_expires_at > now
+        )
+
+    @staticmethod
+    def _earlier_pending(post):
+        """У проекта поста есть более ранний ожидающий пост (порядок публикации)."""
+        other = aliased(models.SystemPost)
+        return exists().where(
+            other.project_id == post.project_id,
+            other.id != post.id,
+            other.status == 'pending_publication',
+            other.post_type.in_(PUBLISHABLE_POST_TYPES),
+            other.is_active == True,
+            or_(
+                other.publication_date < post.publication_date,
+                and_(other.publication_date == post.publication_date, other.id < post.id)
+            )
+        )
+
+    # --- Обработка ---
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="system-post-publisher")
+        return self._executor
+
+    def _drain_project(self, project_id: str, post_id: str):
+        """Публикует захваченный пост, затем следующие готовые посты проекта по порядку."""
+        try:
+            while post_id:
+                self._publish_claimed(post_id)
+                db: Session = SessionLocal()
+                try:
+                    claimed = self._claim(db, 1, project_id=project_id)
+                finally:
+                    db.close()
+                post_id = claimed[0][0] if claimed else None
+        except Exception as e:
+            print(f"POST_TRACKER: Publisher error for project {project_id}: {e}")
+        finally:
+            with self._lock:
+                self._active_projects.discard(project_id)
+            # Слот освободился - готовые посты других проектов не ждут
+            # отложенной проверки бэклога. Ленивый импорт: цикл импортирует этот модуль
+            from services.publication_wakeup import publication_wakeup
+            publication_wakeup.wake()
+
+    def _publish_claimed(self, post_id: str):
+        # Ленивый импорт: post_tracker_service импортирует этот модуль
+        import services.post_tracker_service as post_tracker
+
+        db: Session = SessionLocal()
+        try:
+            post = db.query(models.SystemPost).filter(
+                models.SystemPost.id == post_id,
+                models.SystemPost.lease_owner == self._owner
+            ).first()
+            if not post:
+                return
+            scheduled_at = _parse_publication_date(post.publication_date)
+
+            success = post_tracker._process_system_post(db, post)
+
+            finished_at = datetime.now(timezone.utc)
+            self._record(success, (finished_at - scheduled_at).total_seconds() if scheduled_at and success else None, finished_at)
+            self._release_lease(db, post_id)
+        except Exception as e:
+            db.rollback()
+            print(f"  -> ERROR processing system post {post_id}: {e}")
+            self._record(False, None, datetime.now(timezone.utc))
+        finally:
+            db.close()
+            # После успешной обработки аренда уже снята, и это no-op
+            self._abort_lease(post_id)
+
+    def _release_lease(self, db: Session, post_id: str):
+        """Снимает аренду (если пост не удален после публикации)."""
+        db.query(models.SystemPost).filter(
+            models.SystemPost.id == post_id,
+            models.SystemPost.lease_owner == self._owner
+        ).update({
+            models.SystemPost.lease_owner: None,
+            models.SystemPost.lease_expires_at: None,
+        }, synchronize_session=False)
+        db.commit()
+
+    def _abort_lease(self, post_id: str):
+        """
+        Снимает аренду поста, обработка которого упала с исключением, чтобы
+        проект не ждал LEASE_SECONDS. Пост без vk_post_id в VK не ушел -
+        status='error'; ушедший остается 'publishing' для _verification_check.
+        """
+        db: Session = SessionLocal()
+        try:
+            post = models.SystemPost
+            owned = db.query(post).filter(post.id == post_id, post.lease_owner == self._owner)
+            owned.filter(
+                post.status == 'publishing',
+                post.vk_post_id.is_(None)
+            ).update({post.status: 'error'}, synchronize_session=False)
+            owned.update({
+                post.lease_owner: None,
+                post.lease_expires_at: None,
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"  -> ERROR releasing lease of system post {post_id}: {e}")
+        finally:
+            db.close()
+
+    def _record(self, success: bool, lag_seconds: Optional[float], finished_at: datetime):
+        if lag_seconds is not None:
+            print(f"  -> Publish lag: {lag_seconds:.1f}s")
+        if redis_client:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.hincrby(METRICS_KEY, "published" if success else "failed", 1)
+                if success:
+                    pipe.hset(METRICS_KEY, "last_published_at", finished_at.isoformat())
+                    if lag_seconds is not None:
+                        pipe.lpush(LAGS_KEY, max(lag_seconds, 0.0))
+                        pipe.ltrim(LAGS_KEY, 0, LAG_WINDOW - 1)
+                pipe.execute()
+                return
+            except Exception as e:
+                print(f"POST_TRACKER: Redis metrics write failed: {e}")
+        with self._lock:
+            if success:
+                self._published += 1
+                self._last_published_at = finished_at
+                if lag_seconds is not None:
+                    self._lags.append(max(lag_seconds, 0.0))
+            else:
+                self._failed += 1
+
+    def _load_metrics(self) -> Tuple[Dict, List[float]]:
+        """Счетчики и выборка задержек: общие из Redis или этого процесса."""
+        if redis_client:
+            try:
+                counters = redis_client.hgetall(METRICS_KEY) or {}
+                lags = [float(v) for v in redis_client.lrange(LAGS_KEY, 0, -1)]
+                return {
+                    "published": int(counters.get("published", 0)),
+                    "failed": int(counters.get("failed", 0)),
+                    "last_published_at": counters.get("last_published_at"),
+                }, lags
+            except Exception as e:
+                print(f"POST_TRACKER: Redis metrics read failed: {e}")
+        with self._lock:
+            return {
+                "published": self._published,
+                "failed": self._failed,
+                "last_published_at": self._last_published_at.isoformat() if self._last_published_at else None,
+            }, list(self._lags)
+
+
+system_post_publisher = SystemPostPublisher()
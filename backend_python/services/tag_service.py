@@ -5,6 +5,7 @@ from typing import List
 import crud
 from schemas import Tag, TagCreate, TagUpdate
 from . import update_tracker
+from . import tag_matcher
 
 # --- CRUD for Tags ---
 
@@ -14,16 +15,21 @@ def get_tags_for_project(db: Session, project_id: str) -> List[Tag]:
 
 def create_tag(db: Session, tag_data: TagCreate, project_id: str) -> Tag:
     created_tag = crud.create_tag(db, tag_data, project_id)
+    tag_matcher.invalidate(project_id)
     return Tag.model_validate(created_tag, from_attributes=True)
 
 def update_tag(db: Session, tag_id: str, tag_data: TagUpdate) -> Tag:
     updated_tag = crud.update_tag(db, tag_id, tag_data)
     if not updated_tag:
         raise HTTPException(status_code=404, detail="Tag not found")
+    tag_matcher.invalidate(updated_tag.project_id)
     return Tag.model_validate(updated_tag, from_attributes=True)
 
 def delete_tag(db: Session, tag_id: str) -> bool:
-    return crud.delete_tag(db, tag_id)
+    # project_id тега после удаления уже не узнать - сбрасываем кеш целиком
+    deleted = crud.delete_tag(db, tag_id)
+    tag_matcher.invalidate()
+    return deleted
 
 # --- Business Logic ---
 
@@ -46,27 +52,12 @@ def retag_all_posts_for_project(db: Session, project_id: str):
     tags = crud.get_tags_by_project_id(db, project_id)
     
     # 3. Проходим по каждому посту и обновляем теги
-    updated_count = 0
-    for post in all_posts:
-        original_tag_ids = {t.id for t in post.tags}
-        
-        post_text_lower = post.text.lower() if post.text else ""
-        
-        matching_tags = []
-        if post_text_lower:
-            for tag in tags:
-                if tag.keyword and tag.keyword.lower() in post_text_lower:
-                    matching_tags.append(tag)
-        
-        new_tag_ids = {t.id for t in matching_tags}
-
-        if original_tag_ids != new_tag_ids:
-            post.tags = matching_tags
-            updated_count += 1
+    # Явный запрос пользователя - пересчитываем все посты, не полагаясь на tags_hash
+    updated_count = tag_matcher.retag_posts(db, project_id, all_posts, tags, force=True)
             
-    # 4. Сохраняем изменения в БД
+    # 4. Сохраняем изменения в БД (в т.ч. обновленные tags_hash)
+    db.commit()
     if updated_count > 0:
-        db.commit()
         print(f"SERVICE: Retagging complete. Updated {updated_count} posts for project {project_id}.")
     else:
         print("SERVICE: Retagging complete. No changes were necessary.")
@@ -8,6 +8,8 @@ import models
 
 # TTL для задач в секундах (удалять старые завершенные задачи)
 TASK_TTL = 3600 # 1 час
+# Задача без обновлений дольше этого времени считается "зомби" (процесс упал)
+TASK_STALE_SECONDS = 300
 
 def get_active_task_id(project_id: str, list_type: str) -> Optional[str]:
     """Проверяет, есть ли активная задача в БД для данного проекта."""
@@ -17,7 +19,7 @@ def get_active_task_id(project_id: str, list_type: str) -> Optional[str]:
     try:
         # Ищем задачу, которая не завершена (не done и не error)
         # и обновлялась не позднее чем 5 минут назад (защита от зомби)
-        cutoff_time = time.time() - 300 
+        cutoff_time = time.time() - TASK_STALE_SECONDS
         
         task = db.query(models.SystemTask).filter(
             models.SystemTask.project_id == project_id,
@@ -35,8 +37,8 @@ def get_active_task_id(project_id: str, list_type: str) -> Optional[str]:
     finally:
         db.close()
 
-def start_task(task_id: str, project_id: str = None, list_type: str = None):
-    """Создает новую задачу в БД."""
+def start_task(task_id: str, project_id: str = None, list_type: str = None, params: Dict[str, Any] = None):
+    """Создает новую задачу в БД. params - аргументы для возобновления после перезапуска."""
     db = SessionLocal()
     try:
         # Сначала очищаем старые активные задачи этого типа для этого проекта (на всякий случай)
@@ -57,6 +59,7 @@ def start_task(task_id: str, project_id: str = None, list_type: str = None):
             total=0,
             message="Инициализация...",
             error=None,
+            params=json.dumps(params, sort_keys=True) if params is not None else None,
             created_at=now,
             updated_at=now
         )
@@ -102,6 +105,84 @@ def update_task(task_id: str, status: str, loaded: int = 0, total: int = 0, mess
     finally:
         db.close()
 
+def save_checkpoint(task_id: str, checkpoint: Optional[Dict[str, Any]]):
+    """Сохраняет прогресс возобновляемой задачи (None - очистить)."""
+    db = SessionLocal()
+    try:
+        db.query(models.SystemTask).filter(models.SystemTask.id == task_id).update({
+            models.SystemTask.checkpoint: json.dumps(checkpoint) if checkpoint is not None else None,
+            models.SystemTask.updated_at: time.time()
+        }, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        print(f"TASK_MONITOR ERROR (Checkpoint): {e}")
+    finally:
+        db.close()
+
+def get_checkpoint(task_id: str) -> Optional[Dict[str, Any]]:
+    """Последний сохраненный прогресс задачи."""
+    db = SessionLocal()
+    try:
+        row = db.query(models.SystemTask.checkpoint).filter(models.SystemTask.id == task_id).first()
+        return json.loads(row.checkpoint) if row and row.checkpoint else None
+    except Exception as e:
+        print(f"TASK_MONITOR ERROR (Get Checkpoint): {e}")
+        return None
+    finally:
+        db.close()
+
+def get_interrupted_tasks(list_type_prefix: str) -> List[Dict[str, Any]]:
+    """
+    Незавершенные задачи с сохраненными параметрами (прерваны перезапуском процесса).
+    Задачи, обновлявшиеся за последние TASK_STALE_SECONDS, еще выполняются
+    живым воркером и не возвращаются.
+    """
+    db = SessionLocal()
+    try:
+        cutoff_time = time.time() - TASK_STALE_SECONDS
+        tasks = db.query(models.SystemTask).filter(
+            models.SystemTask.list_type.like(f"{list_type_prefix}%"),
+            models.SystemTask.status.notin_(['done', 'error']),
+            models.SystemTask.params.isnot(None),
+            models.SystemTask.updated_at <= cutoff_time
+        ).all()
+        return [{
+            "task_id": task.id,
+            "project_id": task.project_id,
+            "list_type": task.list_type,
+            "params": json.loads(task.params),
+            "updated_at": task.updated_at
+        } for task in tasks]
+    finally:
+        db.close()
+
+def find_resumable_task(project_id: str, list_type: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Прерванная задача с теми же параметрами, которую можно продолжить с чекпоинта."""
+    for task in get_interrupted_tasks(list_type):
+        if task["project_id"] == project_id and task["list_type"] == list_type and task["params"] == params:
+            return task
+    return None
+
+def claim_task(task_id: str, seen_updated_at: float) -> bool:
+    """
+    Атомарно забирает прерванную задачу для возобновления (compare-and-set по updated_at),
+    чтобы ее не подхватили сразу несколько процессов.
+    """
+    db = SessionLocal()
+    try:
+        updated = db.query(models.SystemTask).filter(
+            models.SystemTask.id == task_id,
+            models.SystemTask.updated_at == seen_updated_at
+        ).update({
+            models.SystemTask.updated_at: time.time(),
+            models.SystemTask.status: "pending",
+            models.SystemTask.message: "Возобновление с чекпоинта..."
+        }, synchronize_session=False)
+        db.commit()
+        return updated == 1
+    finally:
+        db.close()
+
 def get_task_status(task_id: str) -> Optional[Dict[str, Any]]:
     """Получает статус задачи из БД."""
     db = SessionLocal()
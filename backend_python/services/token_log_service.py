@@ -3,19 +3,19 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 import crud.token_log_crud as log_crud
-import crud.system_accounts.account_crud as account_crud
 from config import settings
-from database import SessionLocal
+from services.token_pool import system_token_pool
+from services.log_writer import BatchLogWriter
 
-# Кеш токенов для быстрой проверки (token -> account_id)
-_TOKEN_CACHE = {}
+# Фоновая пакетная запись логов (см. services/log_writer.py)
+token_log_writer = BatchLogWriter("token_logs", log_crud.bulk_create_logs)
 
 def log_api_call(token: str, method: str, project_id: str = None, success: bool = True, error_details: str = None):
     """
     Основная функция логирования. Вызывается из api_client.
-    Определяет владельца токена и пишет лог в БД в отдельной сессии.
+    Определяет владельца токена через пул токенов и ставит запись в очередь
+    BatchLogWriter. Запросов к БД на пути вызова нет.
     """
-    db = SessionLocal()
     try:
         account_id = None
         is_env_token = False
@@ -24,19 +24,9 @@ def log_api_call(token: str, method: str, project_id: str = None, success: bool
         if token == settings.vk_user_token:
             is_env_token = True
         
-        # 2. Если не ENV, ищем в системных аккаунтах
+        # 2. Если не ENV, ищем владельца в пуле токенов системных аккаунтов
         if not is_env_token:
-            # Проверяем кеш
-            if token in _TOKEN_CACHE:
-                account_id = _TOKEN_CACHE[token]
-            else:
-                # Ищем в БД
-                accounts = account_crud.get_all_accounts(db)
-                for acc in accounts:
-                    if acc.token == token:
-                        account_id = acc.id
-                        _TOKEN_CACHE[token] = account_id
-                        break
+            account_id = system_token_pool.get_owner_id(token)
         
         log_data = {
             "account_id": account_id,
@@ -49,12 +39,10 @@ def log_api_call(token: str, method: str, project_id: str = None, success: bool
             "timestamp": datetime.now()
         }
         
-        log_crud.create_log(db, log_data)
+        token_log_writer.write(log_data)
         
     except Exception as e:
         print(f"LOGGING ERROR: Failed to write token log: {e}")
-    finally:
-        db.close()
 
 def get_logs(
     db: Session, 
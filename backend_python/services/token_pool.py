@@ -0,0 +1,158 @@
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import SessionLocal, redis_client
+
+# ===================================================================
+# ПУЛ ТОКЕНОВ (PROCESS-WIDE)
+# ===================================================================
+# Раньше каждый вызов VK API открывал сессию БД, читал все активные
+# токены системных аккаунтов и расшифровывал их (Fernet). При синхронизации
+# списков это тысячи одинаковых запросов к БД.
+#
+# Пул загружает и расшифровывает токены один раз и держит их в памяти
+# процесса. Данные обновляются:
+# 1. По TTL (DEFAULT_TTL_SECONDS).
+# 2. Явно через invalidate() - вызывается из CRUD при изменении аккаунтов.
+# 3. Если настроен Redis - по "версии" пула, которую увеличивает invalidate()
+#    в любом воркере. Так изменения токенов видят все инстансы, не дожидаясь TTL.
+# ===================================================================
+
+DEFAULT_TTL_SECONDS = 60
+# Как часто (сек) сверяем версию пула в Redis, чтобы не ходить в Redis на каждый вызов
+VERSION_CHECK_INTERVAL = 5
+
+REDIS_VERSION_KEY_TEMPLATE = "vk_planner:token_pool:{name}:version"
+
+# Запись пула: (owner_id, token, is_active)
+TokenEntry = Tuple[Optional[str], str, bool]
+
+
+class TokenPool:
+    """
+    Кешированный список расшифрованных токенов.
+    loader(db) должен вернуть список кортежей (owner_id, token, is_active).
+    """
+
+    def __init__(self, name: str, loader: Callable, ttl: int = DEFAULT_TTL_SECONDS):
+        self.name = name
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+        self._tokens: List[str] = []
+        self._owners: Dict[str, Optional[str]] = {}
+        self._loaded_at = 0.0
+        self._version: Optional[str] = None
+        self._version_checked_at = 0.0
+
+    # --- Публичный API ---
+
+    def get_tokens(self) -> List[str]:
+        """Возвращает активные токены (уникальные, в порядке из БД)."""
+        self._ensure_fresh()
+        return list(self._tokens)
+
+    def get_owner_id(self, token: str) -> Optional[str]:
+        """Возвращает ID владельца токена (аккаунта/записи) или None."""
+        self._ensure_fresh()
+        return self._owners.get(token)
+
+    def invalidate(self):
+        """Сбрасывает кеш. Следующее обращение перечитает токены из БД."""
+        with self._lock:
+            self._loaded_at = 0.0
+
+        if redis_client:
+            try:
+                redis_client.incr(self._redis_version_key())
+            except Exception as e:
+                print(f"TOKEN_POOL [{self.name}] ERROR (Redis invalidate): {e}")
+
+    # --- Внутренняя логика ---
+
+    def _redis_version_key(self) -> str:
+        return REDIS_VERSION_KEY_TEMPLATE.format(name=self.name)
+
+    def _read_remote_version(self) -> Optional[str]:
+        if not redis_client:
+            return None
+        try:
+            return redis_client.get(self._redis_version_key())
+        except Exception as e:
+            print(f"TOKEN_POOL [{self.name}] ERROR (Redis version): {e}")
+            return None
+
+    def _is_stale(self, now: float) -> bool:
+        if not self._loaded_at or now - self._loaded_at > self._ttl:
+            return True
+
+        if redis_client and now - self._version_checked_at > VERSION_CHECK_INTERVAL:
+            self._version_checked_at = now
+            if self._read_remote_version() != self._version:
+                return True
+
+        return False
+
+    def _ensure_fresh(self):
+        # Решение о перезагрузке принимается один раз: повторный _is_stale под
+        # блокировкой пропустил бы сверку версии (интервал только что обновлен)
+        seen_loaded_at = self._loaded_at
+        if not self._is_stale(time.monotonic()):
+            return
+
+        with self._lock:
+            # Пока ждали блокировку, другой поток мог уже перезагрузить пул
+            if self._loaded_at and self._loaded_at != seen_loaded_at:
+                return
+            self._reload()
+
+    def _reload(self):
+        version = self._read_remote_version()
+
+        db = SessionLocal()
+        try:
+            entries: List[TokenEntry] = self._loader(db)
+        except Exception as e:
+            # Если БД недоступна, продолжаем работать со старым набором токенов
+            print(f"TOKEN_POOL [{self.name}] ERROR: Failed to load tokens: {e}")
+            return
+        finally:
+            db.close()
+
+        tokens: List[str] = []
+        owners: Dict[str, Optional[str]] = {}
+        for owner_id, token, is_active in entries:
+            if not token:
+                continue
+            token = token.strip()
+            if not token:
+                continue
+            owners.setdefault(token, owner_id)
+            if is_active and token not in tokens:
+                tokens.append(token)
+
+        self._tokens = tokens
+        self._owners = owners
+        self._version = version
+        self._loaded_at = time.monotonic()
+        self._version_checked_at = self._loaded_at
+        print(f"TOKEN_POOL [{self.name}]: Loaded {len(tokens)} active tokens.")
+
+
+def _load_system_account_tokens(db) -> List[TokenEntry]:
+    import crud.system_accounts.account_crud as account_crud
+    return account_crud.get_account_token_entries(db)
+
+
+def _load_ai_tokens(db) -> List[TokenEntry]:
+    import crud.ai_token_crud as ai_token_crud
+    return ai_token_crud.get_token_entries(db)
+
+
+# Токены системных аккаунтов VK ("Армия токенов")
+system_token_pool = TokenPool("system_accounts", _load_system_account_tokens)
+
+# API ключи Gemini из таблицы ai_tokens
+ai_token_pool = TokenPool("ai_tokens", _load_ai_tokens)
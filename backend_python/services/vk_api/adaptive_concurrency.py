@@ -0,0 +1,63 @@
+import threading
+from typing import List
+
+from .token_scheduler import token_scheduler
+
+# ===================================================================
+# АДАПТИВНАЯ ПАРАЛЛЕЛЬНОСТЬ ЗАПРОСОВ
+# ===================================================================
+# Фиксированное число потоков либо недогружает пул токенов, либо
+# упирается в ошибку 6 (Too many requests). Ограничитель работает по
+# схеме AIMD, как управление перегрузкой в TCP:
+# - после каждого запроса смотрит, ловили ли токены пула ошибку 6
+#   (token_scheduler.throttle_count);
+# - был троттлинг - лимит одновременных запросов делится пополам;
+# - "лимит" запросов подряд без троттлинга - лимит растет на 1
+#   (до maximum).
+# Сам темп каждого токена по-прежнему держит token_scheduler.
+# ===================================================================
+
+
+class AdaptiveConcurrency:
+    """Контекстный менеджер: `with limiter:` ждет свободный слот под запрос."""
+
+    def __init__(self, tokens: List[str], initial: int, maximum: int, minimum: int = 1, name: str = "VK"):
+        self._tokens = list(tokens)
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self._limit = min(max(initial, self.minimum), self.maximum)
+        self._name = name
+        self._in_flight = 0
+        self._clean_streak = 0
+        self._seen_throttles = token_scheduler.throttle_count(self._tokens)
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def __enter__(self):
+        with self._cond:
+            while self._in_flight >= self._limit:
+                self._cond.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self._in_flight -= 1
+            throttles = token_scheduler.throttle_count(self._tokens)
+            previous = self._limit
+            if throttles > self._seen_throttles:
+                self._limit = max(self.minimum, self._limit // 2)
+                self._clean_streak = 0
+            else:
+                self._clean_streak += 1
+                if self._clean_streak >= self._limit and self._limit < self.maximum:
+                    self._limit += 1
+                    self._clean_streak = 0
+            self._seen_throttles = throttles
+            if self._limit != previous:
+                print(f"{self._name}: concurrency {previous} -> {self._limit} (throttles seen: {throttles})")
+            self._cond.notify_all()
+        return False
@@ -5,6 +5,8 @@ import json
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from typing import Dict, Any, Optional
+from .token_scheduler import token_scheduler
+from .response_cache import vk_response_cache
 
 # Импортируем сервис логирования
 # Используем отложенный импорт внутри функции, чтобы избежать циклических зависимостей,
@@ -15,6 +17,9 @@ VK_API_VERSION = '5.199'
 VK_API_BASE_URL = 'https://api.vk.com/method/'
 MAX_RETRIES = 5
 INITIAL_DELAY = 2 # seconds
+# Максимальное ожидание бюджета токена в планировщике (сек).
+# Защищает от долгой блокировки на токене, ушедшем в длинный кулдаун.
+MAX_BUDGET_WAIT = 10
 
 # --- SESSION MANAGEMENT ---
 # Используем глобальную сессию для переиспользования TCP-соединений (Keep-Alive).
@@ -31,6 +36,14 @@ retries = Retry(
 _session.mount('https://', HTTPAdapter(max_retries=retries))
 
 
+# Error codes that are "permanent" - retrying with the same token/params won't help.
+# Added 901 (Can't send messages) and 902 (Privacy settings) to stop retries immediately.
+# REMOVED 6 (Too many requests) from permanent list explicitly to be safe, though it wasn't there.
+PERMANENT_ERROR_CODES = {
+    5, 7, 9, 15, 27, 100, 113, 200, 210, 211, 212, 213, 214, 219, 901, 902
+}
+
+
 class VkApiError(Exception):
     """Custom exception for VK API errors."""
     def __init__(self, message, code):
@@ -39,29 +52,17 @@ class VkApiError(Exception):
     def __str__(self):
         return f"VK_API_ERROR: {self.args[0]} (Code: {self.code})"
 
-def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] = None) -> Dict[str, Any]:
+class TokenBudgetTimeout(VkApiError):
     """
-    Universal function to call VK API methods with intelligent retry logic.
-    Added optional project_id for better logging context.
+    Бюджет токена не появился за MAX_BUDGET_WAIT - запрос не отправлялся.
+    Код 6, чтобы вызывающий код обработал его как ошибку частоты и взял другой токен.
     """
-    
-    # Отложенный импорт сервиса логирования
-    from services import token_log_service 
-
-    url = f"{VK_API_BASE_URL}{method}"
-    
-    # Формируем payload
-    payload = params.copy()
-    
-    # ВАЖНО: Гарантируем, что если 'v' передан в params, он используется.
-    # Если нет - используем глобальную константу.
-    if 'v' not in payload:
-        payload['v'] = VK_API_VERSION
 
-    # Извлекаем токен для логирования (он может быть не в params, если это public метод, но у нас почти все приватные)
-    token_for_log = params.get('access_token')
-
-    # --- ФОРМИРОВАНИЕ ЧИТАЕМОГО ИМЕНИ ДЛЯ ЛОГОВ ---
+def get_log_method_name(method: str, params: Dict[str, Any]) -> str:
+    """
+    Формирует читаемое имя метода для логов (например, 'wall.get (scheduled)').
+    Общая логика для синхронного и асинхронного клиентов.
+    """
     log_method_name = method
     if method == 'wall.get':
         filter_val = params.get('filter')
@@ -85,15 +86,44 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
             log_method_name = 'execute (reposts)'
         elif 'API.users.get' in code:
             log_method_name = 'execute (users)'
-    # ----------------------------------------------
+    return log_method_name
+
+def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Universal function to call VK API methods with intelligent retry logic.
+    Added optional project_id for better logging context.
+    Идемпотентные чтения из белого списка (response_cache.VK_CACHE_POLICIES)
+    идут через read-through кеш с объединением одинаковых параллельных запросов.
+    """
+    if vk_response_cache.get_policy(method) is not None:
+        return vk_response_cache.get_or_fetch(
+            method, params, lambda: _call_vk_api_uncached(method, params, project_id)
+        )
+    return _call_vk_api_uncached(method, params, project_id)
+
+def _call_vk_api_uncached(method: str, params: Dict[str, Any], project_id: Optional[str] = None) -> Dict[str, Any]:
+    """Непосредственный HTTP вызов метода VK API с ретраями (без кеша)."""
+    
+    # Отложенный импорт сервиса логирования
+    from services import token_log_service 
+
+    url = f"{VK_API_BASE_URL}{method}"
+    
+    # Формируем payload
+    payload = params.copy()
+    
+    # ВАЖНО: Гарантируем, что если 'v' передан в params, он используется.
+    # Если нет - используем глобальную константу.
+    if 'v' not in payload:
+        payload['v'] = VK_API_VERSION
+
+    # Извлекаем токен для логирования (он может быть не в params, если это public метод, но у нас почти все приватные)
+    token_for_log = params.get('access_token')
+
+    # Читаемое имя метода для логов
+    log_method_name = get_log_method_name(method, params)
 
     last_exception = None
-    # Error codes that are "permanent" - retrying with the same token/params won't help.
-    # Added 901 (Can't send messages) and 902 (Privacy settings) to stop retries immediately.
-    # REMOVED 6 (Too many requests) from permanent list explicitly to be safe, though it wasn't there.
-    PERMANENT_ERROR_CODES = {
-        5, 7, 9, 15, 27, 100, 113, 200, 210, 211, 212, 213, 214, 219, 901, 902
-    }
 
     for attempt in range(MAX_RETRIES):
         try:
@@ -105,8 +135,17 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
             # Логируем версию API для отладки
             # print(f"🚀 VK API Call [SENDING] (Attempt {attempt + 1}/{MAX_RETRIES}) -> {method} (v={payload['v']})")
             
+            # Ждем бюджет токена (Token Bucket), вместо того чтобы ловить ошибку 6
+            if not token_scheduler.wait_for_budget(token_for_log, max_wait=MAX_BUDGET_WAIT):
+                # Токен на долгом кулдауне: сверх бюджета не отправляем (будет ошибка 6),
+                # ретраи на этом же токене не помогут - вызывающий код возьмет другой
+                print(f"⚠️ VK token budget not available within {MAX_BUDGET_WAIT}s for method '{method}'.")
+                raise TokenBudgetTimeout("Token budget wait timeout", 6)
+
             # ИСПОЛЬЗУЕМ ГЛОБАЛЬНУЮ СЕССИЮ ВМЕСТО requests.post
+            started_at = time.monotonic()
             response = _session.post(url, data=payload, timeout=30)
+            latency = time.monotonic() - started_at
             
             data = response.json()
 
@@ -117,6 +156,11 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
             if 'error' in data:
                 error_msg = data['error']['error_msg']
                 error_code = data['error']['error_code']
+
+                if error_code == 6:
+                    token_scheduler.report_throttle(token_for_log)
+                else:
+                    token_scheduler.report_error(token_for_log, error_code, latency)
                 
                 # ЛОГИРОВАНИЕ ОШИБКИ
                 if token_for_log:
@@ -130,6 +174,8 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
 
                 raise VkApiError(error_msg, error_code)
             
+            token_scheduler.report_success(token_for_log, latency)
+
             # ЛОГИРОВАНИЕ УСПЕХА
             if token_for_log:
                  token_log_service.log_api_call(
@@ -143,12 +189,15 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
 
         except VkApiError as e:
             last_exception = e
+
+            if isinstance(e, TokenBudgetTimeout):
+                raise e
             
             # СПЕЦИАЛЬНАЯ ОБРАБОТКА ДЛЯ CODE 6 (Too many requests)
+            # Планировщик уже снизил скорость токена и выставил паузу,
+            # следующая попытка сама дождется бюджета в wait_for_budget.
             if e.code == 6:
-                sleep_time = 1.5 * (attempt + 1) # Увеличиваем паузу
-                print(f"⚠️ VK Code 6 (Too many requests). Sleeping {sleep_time}s and retrying...")
-                time.sleep(sleep_time)
+                print(f"⚠️ VK Code 6 (Too many requests). Token throttled by scheduler, retrying...")
                 continue # Принудительно идем на следующий круг цикла ретраев
 
             if e.code in PERMANENT_ERROR_CODES:
@@ -159,6 +208,7 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
             
         except requests.exceptions.RequestException as e:
             last_exception = e
+            token_scheduler.report_error(token_for_log)
             
             # ЛОГИРОВАНИЕ СЕТЕВОЙ ОШИБКИ
             if token_for_log:
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from .api_client import (
+    VK_API_VERSION,
+    VK_API_BASE_URL,
+    MAX_RETRIES,
+    INITIAL_DELAY,
+    MAX_BUDGET_WAIT,
+    PERMANENT_ERROR_CODES,
+    TokenBudgetTimeout,
+    VkApiError,
+    get_log_method_name,
+)
+from .token_scheduler import VK_TOKEN_RPS, token_scheduler
+
+# ===================================================================
+# АСИНХРОННЫЙ КЛИЕНТ VK API
+# ===================================================================
+# Асинхронный аналог api_client.call_vk_api с той же логикой ретраев,
+# постоянных ошибок, логирования и бюджетов токенов.
+#
+# Вместо десятков потоков ThreadPoolExecutor синхронизации могут держать
+# сотни запросов execute "в полете" внутри одного event loop:
+# - Один httpx.AsyncClient на event loop с ограниченным пулом соединений
+#   (HTTP/2, если установлен пакет h2 - запросы мультиплексируются).
+# - Семафор на хост ограничивает число одновременных запросов.
+#
+# Для вызова из синхронного кода (фоновые задачи FastAPI) используйте
+# run_async(...), который корректно закрывает клиент по завершении.
+# ===================================================================
+
+# Лимиты пула соединений
+ASYNC_MAX_CONNECTIONS = 100
+ASYNC_MAX_KEEPALIVE = 20
+# Максимум одновременных запросов к одному хосту (api.vk.com)
+ASYNC_MAX_CONCURRENCY_PER_HOST = 200
+# Сколько корутин одновременно запускает gather_limited по умолчанию
+ASYNC_MAX_IN_FLIGHT = 200
+# Ожидаемая длительность одного execute (сек) - для оценки нужного параллелизма
+ASYNC_EXPECTED_LATENCY = 1.5
+
+REQUEST_TIMEOUT = 30
+
+try:
+    import h2  # noqa: F401 - нужен httpx для HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Клиенты и семафоры привязаны к event loop, поэтому храним их по циклу
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_host_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def _get_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_KEEPALIVE,
+            ),
+            # Повторные попытки установки соединения (аналог Retry в requests)
+            transport=httpx.AsyncHTTPTransport(retries=3, http2=HTTP2_AVAILABLE),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _get_host_semaphore(url: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _host_semaphores.setdefault(loop, {})
+    host = urlparse(url).netloc
+    semaphore = semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY_PER_HOST)
+        semaphores[host] = semaphore
+    return semaphore
+
+
+async def close_async_client():
+    """Закрывает клиент текущего event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    _host_semaphores.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+async def call_vk_api_async(method: str, params: Dict[str, Any], project_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Асинхронный вызов метода VK API с той же логикой, что и call_vk_api.
+    """
+    # Отложенный импорт сервиса логирования
+    from services import token_log_service
+
+    url = f"{VK_API_BASE_URL}{method}"
+
+    payload = params.copy()
+    if 'v' not in payload:
+        payload['v'] = VK_API_VERSION
+
+    token_for_log = params.get('access_token')
+    log_method_name = get_log_method_name(method, params)
+
+    client = _get_client()
+    semaphore = _get_host_semaphore(url)
+    last_exception = None
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            if not await token_scheduler.wait_for_budget_async(token_for_log, max_wait=MAX_BUDGET_WAIT):
+                # Токен на долгом кулдауне: сверх бюджета не отправляем (будет ошибка 6),
+                # ретраи на этом же токене не помогут - вызывающий код возьмет другой
+                print(f"⚠️ [async] VK token budget not available within {MAX_BUDGET_WAIT}s for method '{method}'.")
+                raise TokenBudgetTimeout("Token budget wait timeout", 6)
+
+            async with semaphore:
+                started_at = time.monotonic()
+                response = await client.post(url, data=payload)
+                latency = time.monotonic() - started_at
+
+            response.raise_for_status()
+            data = response.json()
+
+            if 'error' in data:
+                error_msg = data['error']['error_msg']
+                error_code = data['error']['error_code']
+
+                if error_code == 6:
+                    token_scheduler.report_throttle(token_for_log)
+                else:
+                    token_scheduler.report_error(token_for_log, error_code, latency)
+
+                # ЛОГИРОВАНИЕ ОШИБКИ (запись ставится в очередь, без запроса к БД)
+                if token_for_log:
+                    token_log_service.log_api_call(
+                        token=token_for_log,
+                        method=log_method_name,
+                        project_id=project_id,
+                        success=False,
+                        error_details=f"Code {error_code}: {error_msg}"
+                    )
+
+                raise VkApiError(error_msg, error_code)
+
+            token_scheduler.report_success(token_for_log, latency)
+
+            # ЛОГИРОВАНИЕ УСПЕХА
+            if token_for_log:
+                token_log_service.log_api_call(
+                    token=token_for_log,
+                    method=log_method_name,
+                    project_id=project_id,
+                    success=True
+                )
+
+            return data.get('response', {})
+
+        except VkApiError as e:
+            last_exception = e
+
+            if isinstance(e, TokenBudgetTimeout):
+                raise e
+
+            # CODE 6: планировщик уже снизил скорость токена, следующая попытка дождется бюджета
+            if e.code == 6:
+                print(f"⚠️ [async] VK Code 6 (Too many requests). Token throttled by scheduler, retrying...")
+                continue
+
+            if e.code in PERMANENT_ERROR_CODES:
+                print(f"[async] VK API Error {e.code} is permanent. Stopping retries for this token.")
+                raise e
+
+            print(f"[async] VK API call failed on attempt {attempt + 1}/{MAX_RETRIES} for method '{method}'. Error: {e}")
+
+        except (httpx.HTTPError, ValueError) as e:
+            last_exception = e
+            token_scheduler.report_error(token_for_log)
+
+            # ЛОГИРОВАНИЕ СЕТЕВОЙ ОШИБКИ
+            if token_for_log:
+                token_log_service.log_api_call(
+                    token=token_for_log,
+                    method=log_method_name,
+                    project_id=project_id,
+                    success=False,
+                    error_details=f"Network Error: {str(e)}"
+                )
+
+            print(f"[async] Network or JSON Decode error on attempt {attempt + 1}/{MAX_RETRIES} for method '{method}'. Error: {e}")
+
+        if attempt < MAX_RETRIES - 1:
+            delay = INITIAL_DELAY * (2 ** attempt)
+            print(f"[async] Retrying in {delay} seconds...")
+            await asyncio.sleep(delay)
+        else:
+            print(f"[async] All {MAX_RETRIES} retries failed for method '{method}'.")
+            raise last_exception
+
+    raise last_exception or Exception("VK API call failed after all retries.")
+
+
+async def gather_limited(
+    factories: Iterable[Callable[[], Awaitable[Any]]],
+    limit: int = ASYNC_MAX_IN_FLIGHT,
+    on_result: Optional[Callable[[int, Any], None]] = None,
+    keep_results: bool = True,
+) -> List[Any]:
+    """
+    Запускает корутины из фабрик, держа в работе не более limit штук одновременно.
+    Возвращает результаты в исходном порядке; исключения возвращаются как значения
+    (аналог return_exceptions=True), чтобы один упавший чанк не ронял всю пачку.
+    on_result(index, result) вызывается по мере готовности (для прогресса).
+    keep_results=False - результаты не накапливаются (для потоковой обработки
+    в on_result), функция вернет список из None.
+    """
+    factories = list(factories)
+    results: List[Any] = [None] * len(factories)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def _run(index: int, factory: Callable[[], Awaitable[Any]]):
+        async with semaphore:
+            try:
+                results[index] = await factory()
+            except Exception as e:
+                results[index] = e
+        if on_result:
+            on_result(index, results[index])
+        if not keep_results:
+            results[index] = None
+
+    await asyncio.gather(*[_run(i, f) for i, f in enumerate(factories)])
+    return results
+
+
+def in_flight_limit(token_count: int, latency: float = ASYNC_EXPECTED_LATENCY) -> int:
+    """
+    Сколько запросов держать "в полете", чтобы загрузить пул токенов (закон Литтла):
+    токены * VK_TOKEN_RPS * длительность запроса. Больше не нужно - лишние
+    корутины только ждали бы бюджет в планировщике, держа память под результаты.
+    """
+    return max(1, min(ASYNC_MAX_IN_FLIGHT, math.ceil(token_count * VK_TOKEN_RPS * latency)))
+
+
+def run_async(coro: Awaitable[Any]) -> Any:
+    """
+    Запускает корутину из синхронного кода (например, из фоновой задачи)
+    в новом event loop и закрывает HTTP клиент по завершении.
+    """
+    async def _runner():
+        try:
+            return await coro
+        finally:
+            await close_async_client()
+
+    return asyncio.run(_runner())
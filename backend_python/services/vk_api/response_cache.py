@@ -0,0 +1,206 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from database import redis_client
+from .token_scheduler import TOKEN_HEALTH_ERROR_CODES
+
+# ===================================================================
+# КЕШ ОТВЕТОВ VK API ДЛЯ ИДЕМПОТЕНТНЫХ ЧТЕНИЙ
+# ===================================================================
+# Многие пути повторяют одни и те же запросы на чтение: резолв screen_name
+# в ID группы при каждом обновлении, проверка прав администратора при каждой
+# синхронизации взаимодействий, загрузка дерева категорий товаров.
+#
+# call_vk_api пропускает методы из белого списка VK_CACHE_POLICIES через этот
+# слой (read-through):
+# 1. Ответ ищется в кеше (Redis, если настроен, иначе - LRU в памяти процесса).
+# 2. При промахе выполняется ровно один HTTP запрос на ключ (single-flight):
+#    параллельные одинаковые запросы ждут результат первого.
+# 3. Кешируются только успешные ответы. Ожидающим передается успех или
+#    ошибка запроса (неверный параметр, нет доступа) - она повторится с любым
+#    токеном. Ошибки токена (авторизация, лимиты) и сетевые ожидающие не
+#    наследуют: каждый повторяет запрос сам, со своим токеном.
+# ===================================================================
+
+REDIS_KEY_PREFIX = "vk_planner:vk_cache:"
+LOCAL_CACHE_MAX_ENTRIES = 2000
+
+
+class CachePolicy:
+    """
+    ttl - время жизни ответа (сек).
+    token_fields - если в параметре 'fields' есть одно из этих полей, ответ зависит
+    от токена (например, is_admin), и токен включается в ключ кеша.
+    """
+
+    def __init__(self, ttl: int, token_fields: Iterable[str] = ()):
+        self.ttl = ttl
+        self.token_fields = set(token_fields)
+
+    def is_token_dependent(self, params: Dict[str, Any]) -> bool:
+        if not self.token_fields:
+            return False
+        fields = str(params.get('fields', '')).split(',')
+        return any(f.strip() in self.token_fields for f in fields)
+
+
+# Белый список кешируемых методов
+VK_CACHE_POLICIES: Dict[str, CachePolicy] = {
+    # Резолв screen_name -> ID и проверка прав (is_admin/admin_level зависят от токена)
+    'groups.getById': CachePolicy(ttl=900, token_fields=('is_admin', 'admin_level', 'is_member')),
+    'utils.resolveScreenName': CachePolicy(ttl=3600),
+    # Дерево категорий товаров меняется крайне редко
+    'market.getCategories': CachePolicy(ttl=86400),
+}
+
+# Параметры, которые не влияют на ответ и не должны попадать в ключ
+_IGNORED_PARAMS = {'access_token'}
+
+
+def make_cache_key(method: str, params: Dict[str, Any], policy: CachePolicy) -> str:
+    key_params = {k: v for k, v in params.items() if k not in _IGNORED_PARAMS}
+    if policy.is_token_dependent(params):
+        # Сам токен в ключ не кладем - только его хеш
+        token = params.get('access_token') or ''
+        key_params['__token'] = hashlib.sha1(token.encode('utf-8')).hexdigest()
+    raw = json.dumps(key_params, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{method}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+class _LocalLRU:
+    """Ограниченный LRU кеш в памяти процесса с TTL на запись."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+def _is_shared_error(error: BaseException) -> bool:
+    """Ошибка запроса VK (есть код, не связанный с токеном) - одинакова для всех ожидающих."""
+    code = getattr(error, 'code', None)
+    return code is not None and code not in TOKEN_HEALTH_ERROR_CODES
+
+
+class _Flight:
+    """Запрос "в полете": остальные потоки ждут его результата."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class VkResponseCache:
+    def __init__(self):
+        self._local = _LocalLRU(LOCAL_CACHE_MAX_ENTRIES)
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get_policy(self, method: str) -> Optional[CachePolicy]:
+        return VK_CACHE_POLICIES.get(method)
+
+    # --- Хранилище ---
+
+    def _get(self, key: str) -> Any:
+        if redis_client:
+            try:
+                raw = redis_client.get(REDIS_KEY_PREFIX + key)
+                return json.loads(raw) if raw is not None else None
+            except Exception as e:
+                print(f"VK_CACHE ERROR (Redis get): {e}")
+        return self._local.get(key)
+
+    def _set(self, key: str, value: Any, ttl: int):
+        if redis_client:
+            try:
+                redis_client.setex(REDIS_KEY_PREFIX + key, ttl, json.dumps(value, ensure_ascii=False))
+                return
+            except Exception as e:
+                print(f"VK_CACHE ERROR (Redis set): {e}")
+        self._local.set(key, value, ttl)
+
+    # --- Read-through + single-flight ---
+
+    def get_or_fetch(self, method: str, params: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+        policy = self.get_policy(method)
+        if policy is None:
+            return fetch()
+
+        key = make_cache_key(method, params, policy)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is None:
+                return flight.result
+            if _is_shared_error(flight.error):
+                raise flight.error
+            # Токен лидера не справился - запрашиваем сами, своим токеном
+            return fetch()
+
+        try:
+            result = fetch()
+            flight.result = result
+            # Пустые ответы не кешируем - это часто признак временной проблемы
+            if result:
+                self._set(key, result, policy.ttl)
+            return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def invalidate_method(self, method: str):
+        """Сбрасывает все закешированные ответы метода (для принудительных обновлений)."""
+        self._local.delete_prefix(f"{method}:")
+        if redis_client:
+            try:
+                keys = list(redis_client.scan_iter(match=f"{REDIS_KEY_PREFIX}{method}:*", count=500))
+                if keys:
+                    redis_client.delete(*keys)
+            except Exception as e:
+                print(f"VK_CACHE ERROR (Redis invalidate): {e}")
+
+
+vk_response_cache = VkResponseCache()
@@ -1,8 +1,7 @@
 
 from typing import List, Dict, Any, Optional
-from database import SessionLocal
-import crud
 from config import settings
+from services.token_pool import system_token_pool
 # Импортируем низкоуровневый клиент как _raw_call
 from .api_client import call_vk_api as _raw_call_vk_api, VkApiError
 
@@ -21,14 +20,8 @@ def get_candidate_tokens(preferred_token: Optional[str] = None) -> List[str]:
     if settings.vk_user_token:
         tokens.append(settings.vk_user_token)
         
-    db = SessionLocal()
-    try:
-        system_tokens = crud.get_active_account_tokens(db)
-        tokens.extend(system_tokens)
-    except Exception as e:
-        print(f"VK_SERVICE: Error fetching system tokens: {e}")
-    finally:
-        db.close()
+    # Токены берем из пула процесса (без похода в БД и расшифровки на каждый вызов)
+    tokens.extend(system_token_pool.get_tokens())
         
     # Удаляем дубликаты, сохраняя порядок
     seen = set()
@@ -48,15 +41,8 @@ def call_vk_api(method: str, params: Dict[str, Any], project_id: Optional[str] =
     fallback_token_from_env = params.get('access_token')
     last_exception = None
 
-    # 1. Получаем основные токены (Системные аккаунты)
-    db = SessionLocal()
-    primary_system_tokens = []
-    try:
-        primary_system_tokens = crud.get_active_account_tokens(db)
-    except Exception as db_err:
-        print(f"VK_SERVICE: Ошибка получения токенов из БД: {db_err}")
-    finally:
-        db.close()
+    # 1. Получаем основные токены (Системные аккаунты) из пула процесса
+    primary_system_tokens = system_token_pool.get_tokens()
 
     # 2. Пытаемся выполнить запрос с токенами системных аккаунтов
     if primary_system_tokens:
@@ -0,0 +1,248 @@
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional
+
+# ===================================================================
+# ПЛАНИРОВЩИК ТОКЕНОВ ("Армия токенов")
+# ===================================================================
+# VK ограничивает частоту запросов для каждого пользовательского токена
+# (около 3 запросов в секунду, execute считается одним запросом).
+# Раньше воркеры перебирали токены вслепую и "отдыхали" фиксированными
+# паузами, а при ошибке 6 (Too many requests) api_client просто спал.
+#
+# Планировщик решает две задачи:
+# 1. Token Bucket на каждый токен: call_vk_api перед отправкой ждет,
+#    пока у токена появится бюджет. Так мы идем с максимальной безопасной
+#    скоростью и не упираемся в ошибку 6.
+# 2. Health Score: по каждому токену копим скользящие средние задержки,
+#    доли ошибок и троттлинга. Воркеры получают токены в порядке
+#    "самый здоровый и со свободным бюджетом - первым".
+#
+# Состояние хранится в памяти процесса (лимиты VK считаются на токен,
+# а воркеры синхронизаций работают внутри одного процесса).
+# ===================================================================
+
+# Лимит VK для пользовательского токена (запросов в секунду)
+VK_TOKEN_RPS = 3.0
+# Емкость ведра: сколько запросов можно сделать "залпом" после простоя
+VK_TOKEN_BURST = 3.0
+
+# Коэффициент сглаживания для скользящих средних (EWMA)
+HEALTH_ALPHA = 0.2
+# Насколько снижаем скорость токена после ошибки 6 и за сколько секунд восстанавливаем
+THROTTLE_RATE_FACTOR = 0.5
+THROTTLE_RECOVERY_SECONDS = 30.0
+# Пауза для токена после ошибки 6 (сек)
+THROTTLE_COOLDOWN_SECONDS = 1.0
+# Ошибки, после которых токен считается нерабочим (авторизация, бан)
+DEAD_TOKEN_ERROR_CODES = {5, 17, 18}
+DEAD_TOKEN_COOLDOWN_SECONDS = 300.0
+# Ошибки, которые говорят о состоянии токена (авторизация, лимиты, флуд-контроль).
+# Ошибки запроса (15 - нет доступа, 100 - неверный параметр) здоровье не снижают:
+# с другим токеном они повторятся точно так же. Сетевые ошибки (code=None) учитываются.
+TOKEN_HEALTH_ERROR_CODES = {5, 6, 9, 29} | DEAD_TOKEN_ERROR_CODES
+# Токен с оценкой ниже порога уходит в конец перебора
+HEALTHY_SCORE_THRESHOLD = 0.5
+
+
+class _TokenState:
+    """Состояние одного токена: ведро запросов и метрики здоровья."""
+
+    def __init__(self):
+        now = time.monotonic()
+        self.available = VK_TOKEN_BURST
+        self.refilled_at = now
+        self.rate = VK_TOKEN_RPS
+        self.cooldown_until = 0.0
+        self.throttled_at = 0.0
+
+        self.latency_avg = 0.0
+        self.error_rate = 0.0
+        self.throttle_rate = 0.0
+        self.total_calls = 0
+        self.throttle_events = 0
+
+    def refill(self, now: float):
+        # Постепенно возвращаем скорость после троттлинга
+        if self.rate < VK_TOKEN_RPS and self.throttled_at:
+            recovered = (now - self.throttled_at) / THROTTLE_RECOVERY_SECONDS
+            self.rate = min(VK_TOKEN_RPS, VK_TOKEN_RPS * THROTTLE_RATE_FACTOR * (1 + recovered))
+
+        elapsed = now - self.refilled_at
+        if elapsed > 0:
+            self.available = min(VK_TOKEN_BURST, self.available + elapsed * self.rate)
+            self.refilled_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать, пока у токена появится бюджет на 1 запрос."""
+        if now < self.cooldown_until:
+            return self.cooldown_until - now
+        if self.available >= 1:
+            return 0.0
+        return (1 - self.available) / self.rate
+
+    def score(self) -> float:
+        """Чем выше, тем "здоровее" токен."""
+        return (1 - self.error_rate) * (1 - self.throttle_rate) / (1 + self.latency_avg)
+
+
+class TokenScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[str, _TokenState] = {}
+
+    def _state(self, token: str) -> _TokenState:
+        state = self._states.get(token)
+        if state is None:
+            state = _TokenState()
+            self._states[token] = state
+        return state
+
+    # --- Бюджет запросов ---
+
+    def _reserve(self, token: str, deadline: Optional[float]) -> Optional[float]:
+        """
+        Пытается списать 1 запрос из бюджета токена.
+        Возвращает 0, если запрос списан, None - если бюджет не появится
+        до deadline, иначе - сколько секунд подождать.
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(token)
+            state.refill(now)
+            wait = state.wait_time(now)
+            if wait <= 0:
+                state.available -= 1
+                return 0.0
+        if deadline is not None:
+            # Сверх бюджета не отправляем: это вернуло бы ошибку 6
+            if now + wait > deadline:
+                return None
+        # Минимальный шаг, чтобы не крутить цикл вхолостую
+        return max(wait, 0.001)
+
+    def wait_for_budget(self, token: str, max_wait: Optional[float] = None) -> bool:
+        """
+        Блокирует поток, пока у токена не появится бюджет, и списывает 1 запрос.
+        max_wait ограничивает ожидание (для "мертвых" токенов на долгом кулдауне):
+        если бюджет не появится за max_wait, возвращает False без списания,
+        и вызывающий код должен взять другой токен.
+        """
+        if not token:
+            return True
+        deadline = time.monotonic() + max_wait if max_wait is not None else None
+        while True:
+            wait = self._reserve(token, deadline)
+            if wait is None:
+                return False
+            if not wait:
+                return True
+            time.sleep(wait)
+
+    async def wait_for_budget_async(self, token: str, max_wait: Optional[float] = None) -> bool:
+        """То же, что wait_for_budget, но не блокирует event loop (для async_client)."""
+        if not token:
+            return True
+        deadline = time.monotonic() + max_wait if max_wait is not None else None
+        while True:
+            wait = self._reserve(token, deadline)
+            if wait is None:
+                return False
+            if not wait:
+                return True
+            await asyncio.sleep(wait)
+
+    # --- Метрики здоровья ---
+
+    def report_success(self, token: str, latency: float):
+        if not token:
+            return
+        with self._lock:
+            state = self._state(token)
+            state.total_calls += 1
+            state.latency_avg += HEALTH_ALPHA * (latency - state.latency_avg)
+            state.error_rate -= HEALTH_ALPHA * state.error_rate
+            state.throttle_rate -= HEALTH_ALPHA * state.throttle_rate
+
+    def report_error(self, token: str, code: Optional[int] = None, latency: Optional[float] = None):
+        if not token:
+            return
+        with self._lock:
+            state = self._state(token)
+            state.total_calls += 1
+            if latency is not None:
+                state.latency_avg += HEALTH_ALPHA * (latency - state.latency_avg)
+            if code is None or code in TOKEN_HEALTH_ERROR_CODES:
+                state.error_rate += HEALTH_ALPHA * (1 - state.error_rate)
+            if code in DEAD_TOKEN_ERROR_CODES:
+                state.cooldown_until = time.monotonic() + DEAD_TOKEN_COOLDOWN_SECONDS
+
+    def report_throttle(self, token: str):
+        """Ошибка 6: снижаем скорость токена и даем ему короткую паузу."""
+        if not token:
+            return
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(token)
+            state.total_calls += 1
+            state.throttle_rate += HEALTH_ALPHA * (1 - state.throttle_rate)
+            state.throttle_events += 1
+            state.rate = VK_TOKEN_RPS * THROTTLE_RATE_FACTOR
+            state.throttled_at = now
+            state.available = min(state.available, 0.0)
+            state.cooldown_until = max(state.cooldown_until, now + THROTTLE_COOLDOWN_SECONDS)
+
+    def throttle_count(self, tokens: List[str]) -> int:
+        """Сколько раз токены из списка ловили ошибку 6 за время жизни процесса."""
+        with self._lock:
+            return sum(self._states[t].throttle_events for t in set(tokens) if t in self._states)
+
+    # --- Выбор токенов для воркеров ---
+
+    def rotation(self, tokens: List[str], start_index: int = 0) -> List[str]:
+        """
+        Возвращает порядок перебора токенов для воркера.
+        Первыми идут токены со свободным бюджетом, нездоровые (оценка ниже
+        HEALTHY_SCORE_THRESHOLD) - в конец. Внутри групп сохраняется Round-Robin
+        от start_index, чтобы нагрузка распределялась между воркерами: сырая
+        оценка не сравнивается, иначе все воркеры брали бы один "лучший" токен.
+        """
+        if not tokens:
+            return []
+        num_tokens = len(tokens)
+        primary_index = start_index % num_tokens
+        round_robin = tokens[primary_index:] + tokens[:primary_index]
+
+        with self._lock:
+            now = time.monotonic()
+            keys = {}
+            for position, token in enumerate(round_robin):
+                state = self._state(token)
+                state.refill(now)
+                keys[token] = (
+                    state.wait_time(now) > 0,
+                    state.score() < HEALTHY_SCORE_THRESHOLD,
+                    position
+                )
+
+        return sorted(round_robin, key=lambda t: keys[t])
+
+    def get_stats(self) -> List[Dict]:
+        """Снимок метрик по токенам (для отладки и мониторинга)."""
+        with self._lock:
+            return [
+                {
+                    "token": f"...{token[-4:]}",
+                    "score": round(state.score(), 3),
+                    "latency_avg": round(state.latency_avg, 3),
+                    "error_rate": round(state.error_rate, 3),
+                    "throttle_rate": round(state.throttle_rate, 3),
+                    "rate": round(state.rate, 2),
+                    "total_calls": state.total_calls,
+                }
+                for token, state in self._states.items()
+            ]
+
+
+token_scheduler = TokenScheduler()
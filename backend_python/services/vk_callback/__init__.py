@@ -5,9 +5,12 @@
 # Архитектура:
 # - dispatcher.py  - Главный диспетчер, маршрутизирует события к обработчикам
 # - models.py      - Типы данных и Pydantic модели для событий
+# - event_queue.py - Долговечная очередь событий (Redis Stream или локальный SQLite)
+# - ingest.py      - Постановка события в очередь и пул воркеров, вызывающих dispatcher
 # - debounce.py    - Защита от дублирования действий при быстрых последовательных событиях
 # - handlers/      - Папка с обработчиками событий, сгруппированными по типам
 #   - wall.py      - Обработчики wall_post_*, wall_schedule_post_*
+#   - group.py     - Обработчики group_join, group_leave (дельты подписчиков)
 #   - confirmation.py - Обработчик подтверждения сервера
 #   - base.py      - Базовый класс обработчика
 #
@@ -7,12 +7,40 @@
 #
 # Также включает механизм Cooldown для игнорирования событий во время
 # внутренних операций (например, массового удаления постов).
+#
+# Хранилище состояния:
+# - Redis (database.redis_client) — общее для всех воркеров и контейнеров.
+#   Серия событий, попавшая в разные процессы, дает одно действие.
+#   Дедлайны действий лежат в sorted set (score = время выполнения),
+#   просроченные забираются атомарно Lua-скриптом: действие выполнит
+#   ровно один процесс. Cooldown — ключ с TTL.
+# - Память процесса — если Redis не настроен.
+#
+# Выполнение: один поток-планировщик на процесс ждет ближайший дедлайн
+# (вместо threading.Timer на каждое действие), сами действия выполняются
+# в небольшом пуле потоков.
+#
+# Действие выполняется в том процессе, который забрал дедлайн, поэтому
+# действия не передаются замыканием, а регистрируются по типу:
+# register_action('refresh_scheduled', func(group_id)).
 
 import time
 import threading
-from typing import Dict, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Callable, List, Optional, Tuple
 from dataclasses import dataclass
-from datetime import datetime
+
+from database import redis_client
+
+REDIS_PREFIX = "vk_planner:"
+DEADLINES_KEY = f"{REDIS_PREFIX}debounce:deadlines"
+EVENT_COUNTS_KEY = f"{REDIS_PREFIX}debounce:events"
+
+# Сколько ждать перед повторной проверкой Redis: дедлайн мог добавить другой процесс
+REDIS_POLL_INTERVAL = 0.5
+# Сколько просроченных действий забирать за один проход
+POP_BATCH_SIZE = 50
+ACTION_WORKERS = 4
 
 
 # =============================================================================
@@ -23,27 +51,38 @@ _cooldowns: Dict[str, float] = {}  # key = "{group_id}:{event_type}" -> timestam
 _cooldown_lock = threading.Lock()
 
 
+def _cooldown_redis_key(key: str) -> str:
+    return f"{REDIS_PREFIX}cooldown:{key}"
+
+
 def set_event_cooldown(group_id: int, event_type: str, seconds: float = 30.0):
     """
     Установить cooldown для конкретного типа события.
-    
+
     Используется ПЕРЕД началом внутренней операции (например, массового удаления).
     Все callback события этого типа будут игнорироваться до истечения cooldown.
-    
+
     Args:
         group_id: ID группы VK
         event_type: Тип события VK (например, 'wall_schedule_post_delete')
         seconds: Длительность cooldown в секундах
     """
     key = f"{group_id}:{event_type}"
-    with _cooldown_lock:
-        _cooldowns[key] = time.time() + seconds
+    if redis_client:
+        redis_client.set(_cooldown_redis_key(key), "1", px=int(seconds * 1000))
+    else:
+        with _cooldown_lock:
+            _cooldowns[key] = time.time() + seconds
     print(f"COOLDOWN: Set '{event_type}' for group {group_id} ({seconds}s)")
 
 
 def clear_event_cooldown(group_id: int, event_type: str):
     """Снять cooldown раньше времени (после завершения операции)."""
     key = f"{group_id}:{event_type}"
+    if redis_client:
+        if redis_client.delete(_cooldown_redis_key(key)):
+            print(f"COOLDOWN: Cleared '{event_type}' for group {group_id}")
+        return
     with _cooldown_lock:
         if key in _cooldowns:
             del _cooldowns[key]
@@ -53,11 +92,13 @@ def clear_event_cooldown(group_id: int, event_type: str):
 def is_event_on_cooldown(group_id: int, event_type: str) -> bool:
     """
     Проверить, активен ли cooldown для данного типа события.
-    
+
     Returns:
         True если событие должно быть проигнорировано
     """
     key = f"{group_id}:{event_type}"
+    if redis_client:
+        return bool(redis_client.exists(_cooldown_redis_key(key)))
     with _cooldown_lock:
         deadline = _cooldowns.get(key, 0)
         if deadline > time.time():
@@ -71,6 +112,14 @@ def is_event_on_cooldown(group_id: int, event_type: str) -> bool:
 # DEBOUNCE — Накопление быстрых событий
 # =============================================================================
 
+# Действия по типу: func(group_id)
+_actions: Dict[str, Callable[[int], None]] = {}
+
+
+def register_action(action_type: str, func: Callable[[int], None]):
+    """Зарегистрировать функцию действия (вызывается с group_id после debounce)."""
+    _actions[action_type] = func
+
 
 @dataclass
 class PendingAction:
@@ -81,118 +130,217 @@ class PendingAction:
     event_ids: list[str]  # ID событий, которые вызвали это действие
 
 
+class _MemoryStore:
+    """Дедлайны в памяти процесса."""
+
+    def __init__(self):
+        self._pending: Dict[str, PendingAction] = {}  # key = "{group_id}:{action_type}"
+        self._lock = threading.Lock()
+
+    def touch(self, key: str, group_id: int, action_type: str, deadline: float, event_id: Optional[str]) -> bool:
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending:
+                pending.scheduled_at = deadline
+                if event_id:
+                    pending.event_ids.append(event_id)
+                return False
+            self._pending[key] = PendingAction(
+                group_id=group_id,
+                action_type=action_type,
+                scheduled_at=deadline,
+                event_ids=[event_id] if event_id else []
+            )
+            return True
+
+    def pop_due(self, now: float) -> List[Tuple[str, int]]:
+        """Забирает просроченные действия: [(key, количество событий)]."""
+        with self._lock:
+            due = [key for key, pending in self._pending.items() if pending.scheduled_at <= now]
+            return [(key, max(len(self._pending.pop(key).event_ids), 1)) for key in due]
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            return min((p.scheduled_at for p in self._pending.values()), default=None)
+
+    def cancel(self, key: str) -> bool:
+        with self._lock:
+            return self._pending.pop(key, None) is not None
+
+    def has(self, key: str) -> bool:
+        return key in self._pending
+
+
+# Атомарно забирает просроченные ключи и счетчики их событий
+_POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local result = {}
+for _, key in ipairs(due) do
+    redis.call('ZREM', KEYS[1], key)
+    local count = redis.call('HGET', KEYS[2], key)
+    redis.call('HDEL', KEYS[2], key)
+    table.insert(result, key)
+    table.insert(result, count or '1')
+end
+return result
+"""
+
+
+class _RedisStore:
+    """Дедлайны в sorted set Redis (общие для всех процессов)."""
+
+    def __init__(self, client):
+        self._client = client
+        self._pop_due_script = client.register_script(_POP_DUE_SCRIPT)
+
+    def touch(self, key: str, group_id: int, action_type: str, deadline: float, event_id: Optional[str]) -> bool:
+        pipe = self._client.pipeline()
+        pipe.zadd(DEADLINES_KEY, {key: deadline})
+        pipe.hincrby(EVENT_COUNTS_KEY, key, 1)
+        added, _ = pipe.execute()
+        return added == 1
+
+    def pop_due(self, now: float) -> List[Tuple[str, int]]:
+        flat = self._pop_due_script(keys=[DEADLINES_KEY, EVENT_COUNTS_KEY], args=[now, POP_BATCH_SIZE])
+        return [(flat[i], int(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+    def next_deadline(self) -> Optional[float]:
+        first = self._client.zrange(DEADLINES_KEY, 0, 0, withscores=True)
+        return float(first[0][1]) if first else None
+
+    def cancel(self, key: str) -> bool:
+        pipe = self._client.pipeline()
+        pipe.zrem(DEADLINES_KEY, key)
+        pipe.hdel(EVENT_COUNTS_KEY, key)
+        removed, _ = pipe.execute()
+        return removed == 1
+
+    def has(self, key: str) -> bool:
+        return self._client.zscore(DEADLINES_KEY, key) is not None
+
+
 class EventDebouncer:
     """
     Debouncer для событий VK Callback.
-    
+
     Накапливает быстрые последовательные события одного типа и выполняет
     одно действие с задержкой, чтобы избежать дублирования.
     """
-    
-    def __init__(self, delay_seconds: float = 2.0):
+
+    def __init__(self, delay_seconds: float = 2.0, store=None):
         """
         Args:
             delay_seconds: Задержка перед выполнением действия.
                           Если за это время придет еще событие — таймер сбрасывается.
+            store: Хранилище дедлайнов (_RedisStore или _MemoryStore)
         """
         self.delay_seconds = delay_seconds
-        self._pending: Dict[str, PendingAction] = {}  # key = "{group_id}:{action_type}"
-        self._lock = threading.Lock()
-        self._timers: Dict[str, threading.Timer] = {}
-        
+        self._store = store or _MemoryStore()
+        self._poll_interval = REDIS_POLL_INTERVAL if isinstance(self._store, _RedisStore) else None
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._executor = None
+
     def _get_key(self, group_id: int, action_type: str) -> str:
         """Ключ для идентификации действия."""
         return f"{group_id}:{action_type}"
-    
+
     def schedule_action(
-        self, 
-        group_id: int, 
-        action_type: str, 
-        event_id: Optional[str],
-        callback: Callable
+        self,
+        group_id: int,
+        action_type: str,
+        event_id: Optional[str]
     ) -> bool:
         """
         Запланировать действие с debounce.
-        
-        Если такое действие уже запланировано — таймер сбрасывается.
+
+        Если такое действие уже запланировано (в любом процессе) — дедлайн сдвигается.
         Возвращает True, если это новое действие (первое в серии).
-        
+
         Args:
             group_id: ID группы VK
-            action_type: Тип действия (refresh_scheduled, refresh_published, etc.)
+            action_type: Тип действия (см. register_action)
             event_id: ID события VK (для логирования)
-            callback: Функция, которую нужно вызвать
         """
+        if action_type not in _actions:
+            raise ValueError(f"Unknown debounce action '{action_type}'")
+
         key = self._get_key(group_id, action_type)
-        is_new = False
-        
-        with self._lock:
-            # Отменяем предыдущий таймер, если есть
-            if key in self._timers:
-                self._timers[key].cancel()
-                # Добавляем event_id к существующему действию
-                if key in self._pending and event_id:
-                    self._pending[key].event_ids.append(event_id)
-            else:
-                is_new = True
-                # Создаем новое отложенное действие
-                self._pending[key] = PendingAction(
-                    group_id=group_id,
-                    action_type=action_type,
-                    scheduled_at=time.time() + self.delay_seconds,
-                    event_ids=[event_id] if event_id else []
-                )
-            
-            # Создаем новый таймер
-            timer = threading.Timer(
-                self.delay_seconds, 
-                self._execute_action, 
-                args=[key, callback]
-            )
-            self._timers[key] = timer
-            timer.start()
-            
+        is_new = self._store.touch(key, group_id, action_type, time.time() + self.delay_seconds, event_id)
+
+        self._ensure_started()
+        with self._wakeup:
+            self._wakeup.notify()
+
         action_word = "Scheduled new" if is_new else "Rescheduled"
         print(f"DEBOUNCER: {action_word} action '{action_type}' for group {group_id} (delay: {self.delay_seconds}s)")
-        
+
         return is_new
-    
-    def _execute_action(self, key: str, callback: Callable):
-        """Выполнить отложенное действие."""
-        with self._lock:
-            pending = self._pending.pop(key, None)
-            self._timers.pop(key, None)
-        
-        if pending:
-            event_count = len(pending.event_ids)
-            print(f"DEBOUNCER: Executing '{pending.action_type}' for group {pending.group_id} (triggered by {event_count} events)")
-            try:
-                callback()
-            except Exception as e:
-                print(f"DEBOUNCER ERROR: Failed to execute '{pending.action_type}': {e}")
-    
+
     def cancel_action(self, group_id: int, action_type: str) -> bool:
         """Отменить запланированное действие."""
-        key = self._get_key(group_id, action_type)
-        
-        with self._lock:
-            if key in self._timers:
-                self._timers[key].cancel()
-                del self._timers[key]
-                self._pending.pop(key, None)
-                print(f"DEBOUNCER: Cancelled action '{action_type}' for group {group_id}")
-                return True
+        if self._store.cancel(self._get_key(group_id, action_type)):
+            print(f"DEBOUNCER: Cancelled action '{action_type}' for group {group_id}")
+            return True
         return False
-    
+
     def has_pending(self, group_id: int, action_type: str) -> bool:
         """Проверить, есть ли запланированное действие."""
-        key = self._get_key(group_id, action_type)
-        return key in self._pending
+        return self._store.has(self._get_key(group_id, action_type))
+
+    # --- Планировщик ---
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._wakeup:
+            if self._thread is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix="debounce-action")
+            self._thread = threading.Thread(target=self._run, name="debounce-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                for key, event_count in self._store.pop_due(time.time()):
+                    self._executor.submit(self._execute_action, key, event_count)
+                timeout = self._next_wait()
+            except Exception as e:
+                print(f"DEBOUNCER ERROR: Scheduler loop failed: {e}")
+                timeout = 1.0
+            with self._wakeup:
+                self._wakeup.wait(timeout)
+
+    def _next_wait(self) -> Optional[float]:
+        """Сколько спать до ближайшего дедлайна (None - до следующего schedule_action)."""
+        deadline = self._store.next_deadline()
+        wait = None if deadline is None else max(deadline - time.time(), 0)
+        if self._poll_interval is not None:
+            wait = self._poll_interval if wait is None else min(wait, self._poll_interval)
+        return wait
+
+    def _execute_action(self, key: str, event_count: int):
+        """Выполнить отложенное действие."""
+        group_id, action_type = key.split(":", 1)
+        func = _actions.get(action_type)
+        if not func:
+            print(f"DEBOUNCER ERROR: No action registered for '{action_type}'")
+            return
+
+        print(f"DEBOUNCER: Executing '{action_type}' for group {group_id} (triggered by {event_count} events)")
+        try:
+            func(int(group_id))
+        except Exception as e:
+            print(f"DEBOUNCER ERROR: Failed to execute '{action_type}': {e}")
 
 
 # Глобальный экземпляр debouncer'а
 # Задержка 2 секунды — достаточно для накопления связанных событий
-_debouncer = EventDebouncer(delay_seconds=2.0)
+_debouncer = EventDebouncer(
+    delay_seconds=2.0,
+    store=_RedisStore(redis_client) if redis_client else _MemoryStore()
+)
 
 
 def get_debouncer() -> EventDebouncer:
@@ -204,6 +352,7 @@ def get_debouncer() -> EventDebouncer:
 __all__ = [
     'EventDebouncer',
     'get_debouncer',
+    'register_action',
     'set_event_cooldown',
     'clear_event_cooldown',
     'is_event_on_cooldown',
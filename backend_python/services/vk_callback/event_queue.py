@@ -0,0 +1,370 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from config import settings
+from database import redis_client
+
+# ===================================================================
+# ДОЛГОВЕЧНАЯ ОЧЕРЕДЬ СОБЫТИЙ VK CALLBACK
+# ===================================================================
+# Эндпоинт Callback API только кладет событие в очередь и сразу отвечает
+# VK "ok". Обработчики (dispatch_event) выполняет пул воркеров
+# (см. ingest.py).
+#
+# Бэкенды:
+# - RedisStreamQueue - Redis Stream + consumer group. Используется, если
+#   Redis настроен: очередь общая для всех процессов и контейнеров.
+#   Если владелец партиции упал, через LEASE_TIMEOUT_SEC ее берет другой
+#   воркер и забирает неподтвержденные сообщения через XAUTOCLAIM.
+# - SqliteQueue - локальный файл SQLite (settings.callback_queue_path).
+#   Переживает перезапуск процесса; процессы одного хоста делят файл.
+#
+# Дедупликация по event_id: VK повторяет событие с тем же event_id, если
+# не получил ответ вовремя. Повтор в течение DEDUP_TTL_SEC в очередь не
+# попадает (Redis: SET NX с TTL; SQLite: UNIQUE(event_id), обработанные
+# строки хранятся до истечения окна).
+#
+# Порядок: события одного сообщества должны обрабатываться в порядке
+# поступления (вступление -> выход, новый пост -> его редактирование).
+# Очередь делится на партиции по group_id (partition_of), и каждую
+# партицию в любой момент обрабатывает ровно один воркер:
+# - Redis: отдельный стрим на партицию и аренда партиции (SET NX PX),
+#   читать стрим может только ее владелец. Аренда продлевается после
+#   каждого обработанного события (renew); если она потеряна, воркер
+#   бросает пачку без подтверждения - ее дорабатывает новый владелец.
+# - SQLite: выдается только непрерывный префикс партиции, поэтому пока
+#   голова партиции в аренде у воркера (любого процесса), хвост не выдается.
+# Упавшее событие повторяется раньше более поздних событий партиции
+# (через RETRY_DELAY_SEC); после MAX_ATTEMPTS попыток оно отбрасывается
+# с записью в лог.
+# ===================================================================
+
+STREAM_KEY = "vk_planner:callback_events"
+PARTITION_LOCK_KEY = "vk_planner:callback_partition_owner:"
+CONSUMER_GROUP = "callback_workers"
+# Приблизительный предел длины стрима (старые подтвержденные записи обрезаются)
+STREAM_MAXLEN = 100000
+DEDUP_KEY_PREFIX = "vk_planner:callback_event:"
+
+DEDUP_TTL_SEC = 3600
+LEASE_TIMEOUT_SEC = 60
+MAX_ATTEMPTS = 5
+# Пауза перед повтором упавшего события (партиция ждет его, сохраняя порядок)
+RETRY_DELAY_SEC = 5
+# Число партиций = число воркеров; должно совпадать у всех процессов
+PARTITIONS = max(1, settings.callback_workers)
+# Как часто SQLite-очередь удаляет обработанные строки старше окна дедупликации
+PURGE_INTERVAL_SEC = 300
+
+# Продлевает аренду партиции, только если она все еще наша
+_RENEW_PARTITION_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def partition_of(payload: dict) -> int:
+    """Партиция события: все события одного сообщества попадают в одну партицию."""
+    try:
+        return int(payload.get("group_id") or 0) % PARTITIONS
+    except (TypeError, ValueError):
+        return 0
+
+
+class QueuedEvent(NamedTuple):
+    message_id: str
+    payload: dict
+    # Номер попытки обработки (1 - первая выдача)
+    attempt: int
+
+
+class RedisStreamQueue:
+    name = "redis"
+
+    def __init__(self, client):
+        self._client = client
+        self._ready_streams = set()
+        # partition -> monotonic-время, до которого повтор упавшего события отложен
+        self._retry_after = {}
+
+    def enqueue(self, payload: dict) -> bool:
+        """Кладет событие в стрим. False - дубликат по event_id."""
+        event_id = payload.get("event_id")
+        dedup_key = f"{DEDUP_KEY_PREFIX}{event_id}" if event_id else None
+        if dedup_key and not self._client.set(dedup_key, "1", nx=True, ex=DEDUP_TTL_SEC):
+            return False
+        try:
+            self._client.xadd(
+                self._stream(partition_of(payload)),
+                {"payload": json.dumps(payload, ensure_ascii=False)},
+                maxlen=STREAM_MAXLEN,
+                approximate=True
+            )
+        except Exception:
+            # Событие не сохранено - повтор от VK не должен считаться дубликатом
+            if dedup_key:
+                self._client.delete(dedup_key)
+            raise
+        return True
+
+    def claim(self, partition: int, consumer: str, count: int, block_ms: int) -> List[QueuedEvent]:
+        if not self._own_partition(partition, consumer):
+            # Партицию обрабатывает воркер другого процесса
+            time.sleep(block_ms / 1000)
+            return []
+
+        wait = self._retry_after.get(partition, 0) - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, block_ms / 1000))
+            return []
+
+        stream = self._stream(partition)
+        self._ensure_group(stream)
+
+        # Сначала - неподтвержденные сообщения партиции (упавшие, отложенные,
+        # брошенные прежним владельцем): они старше новых и идут первыми
+        reclaimed = self._client.xautoclaim(
+            stream, CONSUMER_GROUP, consumer,
+            min_idle_time=0, start_id="0-0", count=count
+        )
+        entries = reclaimed[1] if reclaimed else []
+        if entries:
+            return [self._to_event(message_id, fields, self._delivery_count(stream, message_id)) for message_id, fields in entries if fields]
+
+        response = self._client.xreadgroup(CONSUMER_GROUP, consumer, {stream: ">"}, count=count, block=block_ms)
+        events = []
+        for _, stream_entries in response or []:
+            events.extend(self._to_event(message_id, fields, 1) for message_id, fields in stream_entries)
+        return events
+
+    def ack(self, partition: int, message_ids: List[str]):
+        if message_ids:
+            self._client.xack(self._stream(partition), CONSUMER_GROUP, *message_ids)
+
+    def release(self, partition: int, message_id: str):
+        # Сообщение остается неподтвержденным, следующий claim партиции
+        # заберет его первым (после паузы)
+        self._retry_after[partition] = time.monotonic() + RETRY_DELAY_SEC
+
+    def defer(self, partition: int, message_id: str):
+        # Отложенное сообщение так же остается неподтвержденным
+        pass
+
+    def renew(self, partition: int, consumer: str, message_ids: List[str]) -> bool:
+        """Продлевает аренду партиции. False - ее уже взял другой воркер."""
+        key = f"{PARTITION_LOCK_KEY}{partition}"
+        return bool(self._client.eval(_RENEW_PARTITION_SCRIPT, 1, key, consumer, LEASE_TIMEOUT_SEC * 1000))
+
+    def release_partition(self, partition: int, consumer: str):
+        """Отпускает аренду партиции при остановке, чтобы ее сразу взял другой процесс."""
+        key = f"{PARTITION_LOCK_KEY}{partition}"
+        owner = self._client.get(key)
+        if isinstance(owner, bytes):
+            owner = owner.decode()
+        if owner == consumer:
+            self._client.delete(key)
+
+    @staticmethod
+    def _stream(partition: int) -> str:
+        return f"{STREAM_KEY}:{partition}"
+
+    def _own_partition(self, partition: int, consumer: str) -> bool:
+        """Берет или продлевает аренду партиции. False - партиция у другого воркера."""
+        key = f"{PARTITION_LOCK_KEY}{partition}"
+        lease_ms = LEASE_TIMEOUT_SEC * 1000
+        if self._client.set(key, consumer, nx=True, px=lease_ms):
+            return True
+        return self.renew(partition, consumer, [])
+
+    def _ensure_group(self, stream: str):
+        if stream in self._ready_streams:
+            return
+        try:
+            self._client.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._ready_streams.add(stream)
+
+    def _delivery_count(self, stream: str, message_id: str) -> int:
+        pending = self._client.xpending_range(stream, CONSUMER_GROUP, min=message_id, max=message_id, count=1)
+        return int(pending[0]["times_delivered"]) if pending else 1
+
+    @staticmethod
+    def _to_event(message_id: str, fields: dict, attempt: int) -> QueuedEvent:
+        return QueuedEvent(message_id, json.loads(fields["payload"]), attempt)
+
+
+class SqliteQueue:
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        # Будит воркеров этого процесса сразу после enqueue, без ожидания опроса
+        self._wakeup = threading.Condition()
+        self._last_purge = 0.0
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS callback_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_id TEXT UNIQUE,
+                    partition_no INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(callback_events)")}
+            if "partition_no" not in columns:
+                conn.execute("ALTER TABLE callback_events ADD COLUMN partition_no INTEGER NOT NULL DEFAULT 0")
+            conn.execute("DROP INDEX IF EXISTS ix_callback_events_ready")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_callback_events_partition ON callback_events (done, partition_no, id)")
+
+    def enqueue(self, payload: dict) -> bool:
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO callback_events (event_id, partition_no, payload, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (payload.get("event_id") or None, partition_of(payload), json.dumps(payload, ensure_ascii=False), now, now)
+            )
+        if cursor.rowcount != 1:
+            return False
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return True
+
+    def claim(self, partition: int, consumer: str, count: int, block_ms: int) -> List[QueuedEvent]:
+        deadline = time.monotonic() + block_ms / 1000
+        while True:
+            events, head_available_at = self._claim_ready(partition, count)
+            if events:
+                return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._purge_expired()
+                return []
+            if head_available_at is not None:
+                # Голова партиции ждет повтора - просыпаемся к ее сроку
+                remaining = min(remaining, max(head_available_at - time.time(), 0.01))
+            with self._wakeup:
+                self._wakeup.wait(remaining)
+
+    def ack(self, partition: int, message_ids: List[str]):
+        if not message_ids:
+            return
+        placeholders = ",".join("?" * len(message_ids))
+        with self._connection() as conn:
+            # Строка остается до конца окна дедупликации (UNIQUE по event_id)
+            conn.execute(f"UPDATE callback_events SET done = 1 WHERE id IN ({placeholders})", [int(i) for i in message_ids])
+
+    def release(self, partition: int, message_id: str):
+        """Возвращает событие в очередь до истечения аренды (с небольшой паузой)."""
+        with self._connection() as conn:
+            conn.execute("UPDATE callback_events SET available_at = ? WHERE id = ?", (time.time() + RETRY_DELAY_SEC, int(message_id)))
+
+    def defer(self, partition: int, message_id: str):
+        """Возвращает событие, которое не обрабатывалось (ждет упавшее событие своего сообщества)."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE callback_events SET available_at = ?, attempts = attempts - 1 WHERE id = ?",
+                (time.time(), int(message_id))
+            )
+
+    def renew(self, partition: int, consumer: str, message_ids: List[str]) -> bool:
+        """Продлевает аренду еще не подтвержденных событий пачки."""
+        if message_ids:
+            placeholders = ",".join("?" * len(message_ids))
+            with self._connection() as conn:
+                conn.execute(
+                    f"UPDATE callback_events SET available_at = ? WHERE done = 0 AND id IN ({placeholders})",
+                    [time.time() + LEASE_TIMEOUT_SEC] + [int(i) for i in message_ids]
+                )
+        return True
+
+    def release_partition(self, partition: int, consumer: str):
+        # Аренда партиции в SQLite - это аренда ее головы, отдельной блокировки нет
+        pass
+
+    def _claim_ready(self, partition: int, count: int) -> Tuple[List[QueuedEvent], Optional[float]]:
+        """Выдает готовый префикс партиции. Второе значение - срок головы партиции, если она в аренде."""
+        now = time.time()
+        conn = self._connection()
+        # BEGIN IMMEDIATE - одна выдача за раз и между процессами
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            head = conn.execute(
+                "SELECT id, payload, attempts, available_at FROM callback_events WHERE done = 0 AND partition_no = ? ORDER BY id LIMIT ?",
+                (partition, count)
+            ).fetchall()
+            # Только непрерывный префикс: событие в аренде (обрабатывается
+            # или ждет повтора) блокирует более поздние события партиции
+            rows = []
+            head_available_at = None
+            for row_id, payload, attempts, available_at in head:
+                if available_at > now:
+                    head_available_at = available_at if not rows else None
+                    break
+                rows.append((row_id, payload, attempts))
+            if rows:
+                placeholders = ",".join("?" * len(rows))
+                conn.execute(
+                    f"UPDATE callback_events SET attempts = attempts + 1, available_at = ? WHERE id IN ({placeholders})",
+                    [now + LEASE_TIMEOUT_SEC] + [row[0] for row in rows]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        events = [QueuedEvent(str(row_id), json.loads(payload), attempts + 1) for row_id, payload, attempts in rows]
+        return events, head_available_at
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL_SEC:
+            return
+        self._last_purge = now
+        with self._connection() as conn:
+            conn.execute("DELETE FROM callback_events WHERE done = 1 AND created_at < ?", (now - DEDUP_TTL_SEC,))
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: транзакциями управляем сами (BEGIN IMMEDIATE),
+            # "with conn" коммитит одиночные запросы
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def consumer_name(index: int) -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+_event_queue = None
+_event_queue_lock = threading.Lock()
+
+
+def get_event_queue():
+    """Очередь событий процесса: Redis Stream, если Redis доступен, иначе SQLite-файл."""
+    global _event_queue
+    if _event_queue is None:
+        with _event_queue_lock:
+            if _event_queue is None:
+                if redis_client:
+                    _event_queue = RedisStreamQueue(redis_client)
+                else:
+                    _event_queue = SqliteQueue(settings.callback_queue_path)
+                print(f"VK CALLBACK QUEUE: Using {_event_queue.name} backend")
+    return _event_queue
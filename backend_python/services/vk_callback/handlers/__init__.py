@@ -3,11 +3,13 @@
 from .base import BaseEventHandler
 from .confirmation import ConfirmationHandler
 from .wall import WALL_HANDLERS
+from .group import GROUP_HANDLERS
 
 # Все доступные обработчики
 ALL_HANDLERS: list[BaseEventHandler] = [
     ConfirmationHandler(),
     *WALL_HANDLERS,
+    *GROUP_HANDLERS,
 ]
 
 __all__ = [
@@ -0,0 +1,106 @@
+# Обработчики событий участников сообщества (group_join, group_leave)
+#
+# Эти события приходят когда:
+# - group_join: Пользователь вступил в сообщество (или подал заявку)
+# - group_leave: Пользователь вышел из сообщества (или был удален)
+#
+# Вместо полного обхода groups.getMembers изменения применяются к списку
+# подписчиков и истории сразу (дельтой). Полный обход остается как
+# периодическая сверка (reconcile) для исправления дрейфа.
+
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from .base import BaseEventHandler
+from ..models import CallbackEvent, HandlerResult
+
+from services.lists.subscribers.delta import apply_member_join, apply_member_leave
+from services.lists.list_sync_utils import get_all_project_tokens
+from services.vk_profile_cache import vk_profile_cache
+from config import settings
+
+
+class GroupJoinHandler(BaseEventHandler):
+    """
+    Обработчик события group_join.
+    
+    Действие: Добавляем пользователя в подписчики и историю вступлений,
+    увеличиваем счетчики в ProjectListMeta.
+    """
+    
+    HANDLES_EVENTS = ["group_join"]
+    
+    def handle(self, db: Session, event: CallbackEvent, project) -> HandlerResult:
+        if not project:
+            return HandlerResult(success=False, message="Project not found")
+        
+        obj = event.object or {}
+        user_id = obj.get("user_id")
+        join_type = obj.get("join_type")
+        
+        if not user_id or user_id < 0:
+            return HandlerResult(success=True, message="No user in event - skipped", action_taken="none")
+        
+        # Заявка в закрытое сообщество - еще не участник
+        if join_type == "request":
+            self._log(f"Join request from user {user_id} - skipped", event)
+            return HandlerResult(success=True, message="Join request - skipped", action_taken="none")
+        
+        profile = self._fetch_profile(db, user_id, project.id, event)
+        changed = apply_member_join(db, project.id, user_id, profile)
+        
+        self._log(f"User {user_id} joined (join_type={join_type}, new={changed})", event)
+        return HandlerResult(
+            success=True,
+            message="Subscriber added" if changed else "Subscriber already in list",
+            action_taken="subscriber_join" if changed else "none",
+            data={"user_id": user_id}
+        )
+    
+    def _fetch_profile(self, db: Session, user_id: int, project_id: str, event: CallbackEvent) -> Optional[dict]:
+        """Профиль пользователя из общего кеша (при промахе - один вызов users.get). Без профиля запись сохранится только с ID."""
+        tokens = get_all_project_tokens(db, settings.vk_user_token)
+        profiles = vk_profile_cache.get_profiles([user_id], tokens[:2], project_id)
+        if not profiles:
+            self._log(f"users.get returned no profile for {user_id}", event)
+            return None
+        return profiles[0]
+
+
+class GroupLeaveHandler(BaseEventHandler):
+    """
+    Обработчик события group_leave.
+    
+    Действие: Переносим пользователя в историю выходов, удаляем из подписчиков,
+    обновляем счетчики в ProjectListMeta.
+    """
+    
+    HANDLES_EVENTS = ["group_leave"]
+    
+    def handle(self, db: Session, event: CallbackEvent, project) -> HandlerResult:
+        if not project:
+            return HandlerResult(success=False, message="Project not found")
+        
+        obj = event.object or {}
+        user_id = obj.get("user_id")
+        is_self = obj.get("self")
+        
+        if not user_id or user_id < 0:
+            return HandlerResult(success=True, message="No user in event - skipped", action_taken="none")
+        
+        changed = apply_member_leave(db, project.id, user_id)
+        
+        self._log(f"User {user_id} left (self={is_self}, removed={changed})", event)
+        return HandlerResult(
+            success=True,
+            message="Subscriber removed" if changed else "Subscriber not in list",
+            action_taken="subscriber_leave" if changed else "none",
+            data={"user_id": user_id}
+        )
+
+
+# Список всех обработчиков участников для регистрации в dispatcher
+GROUP_HANDLERS = [
+    GroupJoinHandler(),
+    GroupLeaveHandler(),
+]
@@ -8,12 +8,46 @@
 from sqlalchemy.orm import Session
 from .base import BaseEventHandler
 from ..models import CallbackEvent, HandlerResult, WallPostObject, SchedulePostObject
-from ..debounce import get_debouncer, is_event_on_cooldown
+from ..debounce import get_debouncer, is_event_on_cooldown, register_action
 
 # Импорты сервисов для обновления данных
 from services.post_retrieval import refresh_scheduled_posts, refresh_published_posts
 from services import update_tracker
 from config import settings
+import crud
+
+
+# Действия после debounce. Выполняются в том процессе, который забрал
+# дедлайн (см. debounce.py), поэтому проект ищется заново по group_id.
+
+def _refresh_published(group_id: int):
+    from database import SessionLocal
+    with SessionLocal() as refresh_db:
+        project = crud.get_project_by_vk_id(refresh_db, group_id)
+        if not project:
+            print(f"[WallPostNewHandler] group={group_id}: Project not found, refresh skipped")
+            return
+        print(f"[WallPostNewHandler] group={group_id}: Refreshing published posts for project '{project.name}'")
+        refresh_published_posts(refresh_db, project.id, settings.vk_user_token)
+        update_tracker.add_updated_project(project.id)
+        print(f"[WallPostNewHandler] group={group_id}: Successfully refreshed published posts")
+
+
+def _refresh_scheduled(group_id: int):
+    from database import SessionLocal
+    with SessionLocal() as refresh_db:
+        project = crud.get_project_by_vk_id(refresh_db, group_id)
+        if not project:
+            print(f"[WallScheduleHandler] group={group_id}: Project not found, refresh skipped")
+            return
+        print(f"[WallScheduleHandler] group={group_id}: Refreshing scheduled posts for project '{project.name}'")
+        refresh_scheduled_posts(refresh_db, project.id, settings.vk_user_token)
+        update_tracker.add_updated_project(project.id)
+        print(f"[WallScheduleHandler] group={group_id}: Successfully refreshed scheduled posts")
+
+
+register_action("refresh_published", _refresh_published)
+register_action("refresh_scheduled", _refresh_scheduled)
 
 
 class WallPostNewHandler(BaseEventHandler):
@@ -55,25 +89,11 @@ class WallPostNewHandler(BaseEventHandler):
         # Используем debounce для избежания дублирования
         debouncer = get_debouncer()
         
-        def do_refresh():
-            """Функция обновления, вызываемая после debounce."""
-            try:
-                # Создаем новую сессию для отложенного выполнения
-                from database import SessionLocal
-                with SessionLocal() as refresh_db:
-                    self._log(f"Refreshing published posts for project '{project.name}'", event)
-                    refresh_published_posts(refresh_db, project.id, settings.vk_user_token)
-                    update_tracker.add_updated_project(project.id)
-                    self._log(f"Successfully refreshed published posts", event)
-            except Exception as e:
-                self._log(f"ERROR refreshing published posts: {e}", event)
-        
         # Планируем обновление с debounce
         is_new = debouncer.schedule_action(
             group_id=event.group_id,
             action_type="refresh_published",
-            event_id=event.event_id,
-            callback=do_refresh
+            event_id=event.event_id
         )
         
         return HandlerResult(
@@ -110,24 +130,11 @@ class WallSchedulePostNewHandler(BaseEventHandler):
         # Используем debounce — при редактировании VK шлет delete+new подряд
         debouncer = get_debouncer()
         
-        def do_refresh():
-            """Функция обновления, вызываемая после debounce."""
-            try:
-                from database import SessionLocal
-                with SessionLocal() as refresh_db:
-                    self._log(f"Refreshing scheduled posts for project '{project.name}'", event)
-                    refresh_scheduled_posts(refresh_db, project.id, settings.vk_user_token)
-                    update_tracker.add_updated_project(project.id)
-                    self._log(f"Successfully refreshed scheduled posts", event)
-            except Exception as e:
-                self._log(f"ERROR refreshing scheduled posts: {e}", event)
-        
         # Планируем обновление с debounce
         is_new = debouncer.schedule_action(
             group_id=event.group_id,
             action_type="refresh_scheduled",
-            event_id=event.event_id,
-            callback=do_refresh
+            event_id=event.event_id
         )
         
         return HandlerResult(
@@ -178,24 +185,11 @@ class WallSchedulePostDeleteHandler(BaseEventHandler):
         # Также при публикации шлет wall_post_new + wall_schedule_post_delete
         debouncer = get_debouncer()
         
-        def do_refresh():
-            """Функция обновления, вызываемая после debounce."""
-            try:
-                from database import SessionLocal
-                with SessionLocal() as refresh_db:
-                    self._log(f"Refreshing scheduled posts for project '{project.name}'", event)
-                    refresh_scheduled_posts(refresh_db, project.id, settings.vk_user_token)
-                    update_tracker.add_updated_project(project.id)
-                    self._log(f"Successfully refreshed scheduled posts", event)
-            except Exception as e:
-                self._log(f"ERROR refreshing scheduled posts: {e}", event)
-        
         # Планируем обновление с debounce
         is_new = debouncer.schedule_action(
             group_id=event.group_id,
             action_type="refresh_scheduled",
-            event_id=event.event_id,
-            callback=do_refresh
+            event_id=event.event_id
         )
         
         return HandlerResult(
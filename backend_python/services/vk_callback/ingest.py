@@ -0,0 +1,175 @@
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from database import SessionLocal
+import crud.callback_log_crud as callback_log_crud
+from services.log_writer import BatchLogWriter
+from .dispatcher import dispatch_event
+from .event_queue import MAX_ATTEMPTS, PARTITIONS, QueuedEvent, consumer_name, get_event_queue
+
+# ===================================================================
+# ПРИЕМ И ФОНОВАЯ ОБРАБОТКА СОБЫТИЙ VK CALLBACK
+# ===================================================================
+# ingest_event(body) - путь запроса: ставит запись лога в BatchLogWriter
+# и кладет событие в очередь (event_queue.py). Обработчиков и запросов
+# к основной БД на этом пути нет, VK получает "ok" сразу.
+#
+# CallbackWorkerPool - потоки, которые забирают события пачками по
+# CLAIM_BATCH_SIZE и передают их в dispatch_event (одна сессия БД на
+# пачку). Событие подтверждается только после обработки, поэтому при
+# падении процесса оно будет обработано повторно.
+#
+# Воркер обслуживает одну партицию очереди (события сообществ с
+# group_id % PARTITIONS == index), поэтому события одного сообщества
+# обрабатываются последовательно, в порядке поступления. Если событие
+# упало, более поздние события того же сообщества из пачки не
+# обрабатываются и возвращаются в очередь следом за ним.
+#
+# Подтверждение сервера (confirmation) в очередь не ставится: VK ждет
+# код в ответе на этот же запрос.
+# ===================================================================
+
+CLAIM_BATCH_SIZE = 20
+# Должно быть меньше socket_timeout клиента Redis (database.py)
+CLAIM_BLOCK_MS = 2000
+
+# Фоновая пакетная запись логов Callback API (см. services/log_writer.py)
+callback_log_writer = BatchLogWriter("vk_callback_logs", callback_log_crud.bulk_create_logs)
+
+
+def log_event(body: dict):
+    """Ставит запись лога Callback API в очередь BatchLogWriter."""
+    callback_log_writer.write({
+        "type": str(body.get("type")),
+        "group_id": int(body.get("group_id")),
+        "payload": json.dumps(body, ensure_ascii=False),
+        "timestamp": datetime.now(timezone.utc)
+    })
+
+
+def ingest_event(body: dict) -> bool:
+    """
+    Логирует событие и ставит его в очередь. Возвращает False для повтора
+    (событие с тем же event_id уже принято).
+    Если очередь недоступна, событие обрабатывается сразу, как раньше.
+    """
+    event_type = str(body.get("type"))
+    log_event(body)
+
+    try:
+        accepted = get_event_queue().enqueue(body)
+    except Exception as e:
+        print(f"VK CALLBACK QUEUE ERROR: enqueue failed ({e}), processing '{event_type}' inline")
+        _dispatch_batch([QueuedEvent("inline", body, 1)])
+        return True
+
+    if not accepted:
+        print(f"VK CALLBACK QUEUE: Duplicate event {body.get('event_id')} ('{event_type}') skipped")
+    return accepted
+
+
+def _dispatch_batch(
+    events: List[QueuedEvent],
+    renew_lease: Optional[Callable[[], bool]] = None
+) -> Tuple[List[QueuedEvent], List[QueuedEvent], bool]:
+    """
+    Выполняет обработчики по порядку. Возвращает (упавшие события, отложенные,
+    потеряна ли аренда): после падения события остальные события того же
+    сообщества не выполняются. renew_lease() вызывается после каждого
+    обработанного события; если он вернул False, пачка прерывается.
+    """
+    failed = []
+    deferred = []
+    blocked_groups = set()
+    db = SessionLocal()
+    try:
+        for event in events:
+            payload = event.payload
+            group_id = payload.get("group_id")
+            if group_id in blocked_groups:
+                deferred.append(event)
+                continue
+            try:
+                result, _ = dispatch_event(db, payload.get("type"), int(payload.get("group_id")), payload)
+                if result:
+                    print(f"Event '{payload.get('type')}' processed: {result.message} (action: {result.action_taken})")
+            except Exception as e:
+                print(f"VK CALLBACK WORKER ERROR: Event {payload.get('event_id')} ('{payload.get('type')}') "
+                      f"failed on attempt {event.attempt}: {e}")
+                db.rollback()
+                failed.append(event)
+                blocked_groups.add(group_id)
+            if renew_lease and not renew_lease():
+                return failed, deferred, True
+    finally:
+        db.close()
+    return failed, deferred, False
+
+
+class CallbackWorkerPool:
+    def __init__(self, workers: int = PARTITIONS):
+        # Один воркер на партицию очереди
+        self._workers = workers
+        self._threads: List[threading.Thread] = []
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopped.clear()
+        for index in range(self._workers):
+            thread = threading.Thread(target=self._run, args=(index, consumer_name(index)), name=f"vk-callback-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"VK CALLBACK QUEUE: Started {self._workers} workers")
+
+    def stop(self, timeout: float = 10):
+        """Останавливает воркеров (текущие пачки дорабатываются) и дописывает логи."""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        callback_log_writer.shutdown()
+
+    def _run(self, partition: int, consumer: str):
+        event_queue = get_event_queue()
+        while not self._stopped.is_set():
+            try:
+                events = event_queue.claim(partition, consumer, CLAIM_BATCH_SIZE, CLAIM_BLOCK_MS)
+                if events:
+                    self._process(event_queue, consumer, partition, events)
+            except Exception as e:
+                print(f"VK CALLBACK WORKER ERROR [{consumer}]: {e}")
+                self._stopped.wait(1)
+        try:
+            event_queue.release_partition(partition, consumer)
+        except Exception as e:
+            print(f"VK CALLBACK WORKER ERROR [{consumer}] (release partition): {e}")
+
+    def _process(self, event_queue, consumer: str, partition: int, events: List[QueuedEvent]):
+        message_ids = [event.message_id for event in events]
+        failed, deferred, lease_lost = _dispatch_batch(
+            events, lambda: event_queue.renew(partition, consumer, message_ids)
+        )
+        if lease_lost:
+            # Партицию взял другой воркер: он заберет неподтвержденные события
+            # и обработает их сам, подтверждать их здесь нельзя
+            print(f"VK CALLBACK QUEUE [{consumer}]: Lost partition {partition} lease, batch left to the new owner")
+            return
+        pending_ids = {event.message_id for event in failed + deferred}
+
+        done_ids = [event.message_id for event in events if event.message_id not in pending_ids]
+        for event in failed:
+            if event.attempt >= MAX_ATTEMPTS:
+                print(f"VK CALLBACK QUEUE: Dropping event {event.payload.get('event_id')} after {event.attempt} attempts")
+                done_ids.append(event.message_id)
+            else:
+                event_queue.release(partition, event.message_id)
+        for event in deferred:
+            event_queue.defer(partition, event.message_id)
+        event_queue.ack(partition, done_ids)
+
+
+callback_worker_pool = CallbackWorkerPool()
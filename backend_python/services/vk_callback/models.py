@@ -25,6 +25,10 @@ class EventType(str, Enum):
     # События предложенных постов
     WALL_POST_SUGGEST = "wall_post_suggest"  # Предложен пост (suggest)
     
+    # Участники сообщества (дельты списка подписчиков)
+    GROUP_JOIN = "group_join"  # Пользователь вступил
+    GROUP_LEAVE = "group_leave"  # Пользователь вышел или удален
+    
     # Сообщения (для будущего расширения)
     MESSAGE_NEW = "message_new"
     
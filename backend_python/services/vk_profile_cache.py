@@ -0,0 +1,164 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import crud
+from database import SessionLocal, redis_client
+from services.lists.list_sync_utils import fetch_users_smart_parallel
+
+# ===================================================================
+# ОБЩИЙ КЕШ ПРОФИЛЕЙ VK (users.get)
+# ===================================================================
+# Одних и тех же людей догружают многие пути: взаимодействия, детали
+# подписчиков и истории, авторы постов, конкурсы отзывов, общие конкурсы,
+# вступления из Callback API. Раньше каждый заново скачивал профили,
+# которые соседняя синхронизация получила несколько минут назад.
+#
+# get_profiles(vk_ids, tokens, ...) - пакетный поиск:
+# 1. Redis (если настроен) - быстрый фронт, ключ на пользователя.
+# 2. Таблица vk_user_profiles - профили с fetched_at не старше max_age.
+# 3. В VK (fetch_users_smart_parallel) уходят только отсутствующие
+#    и устаревшие ID; результат пишется в таблицу и в Redis.
+#
+# Профиль всегда запрашивается с полным набором PROFILE_FIELDS, поэтому
+# запись из кеша подходит любому потребителю.
+# ===================================================================
+
+# Объединение полей всех путей догрузки
+PROFILE_FIELDS = "sex,bdate,city,country,photo_100,domain,has_mobile,last_seen,is_closed,can_access_closed,screen_name"
+
+# Окно свежести по умолчанию (сек). last_seen используется в статистике
+# онлайна, поэтому окно - час, а не сутки.
+PROFILE_MAX_AGE = 3600
+
+REDIS_KEY_PREFIX = "vk_planner:vk_profile:"
+REDIS_BATCH_SIZE = 1000
+
+
+class VkProfileCache:
+
+    # --- Redis фронт ---
+
+    def _get_redis(self, vk_ids: List[int], min_fetched_ts: float) -> Dict[int, Dict]:
+        if not redis_client:
+            return {}
+        found = {}
+        try:
+            for i in range(0, len(vk_ids), REDIS_BATCH_SIZE):
+                chunk = vk_ids[i:i + REDIS_BATCH_SIZE]
+                values = redis_client.mget([f"{REDIS_KEY_PREFIX}{vk_id}" for vk_id in chunk])
+                for vk_id, raw in zip(chunk, values):
+                    if raw is None:
+                        continue
+                    item = json.loads(raw)
+                    if item.get("fetched_at", 0) >= min_fetched_ts:
+                        found[vk_id] = item["profile"]
+        except Exception as e:
+            print(f"PROFILE_CACHE ERROR (Redis get): {e}")
+        return found
+
+    def _set_redis(self, profiles: Dict[int, Dict], fetched_ts: float):
+        """Ключ живет до конца окна свежести по умолчанию."""
+        if not redis_client or not profiles:
+            return
+        ttl = int(PROFILE_MAX_AGE - (time.time() - fetched_ts))
+        if ttl <= 0:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for vk_id, profile in profiles.items():
+                value = json.dumps({"profile": profile, "fetched_at": fetched_ts}, ensure_ascii=False)
+                pipe.setex(f"{REDIS_KEY_PREFIX}{vk_id}", ttl, value)
+            pipe.execute()
+        except Exception as e:
+            print(f"PROFILE_CACHE ERROR (Redis set): {e}")
+
+    # --- Таблица ---
+
+    def _get_db(self, vk_ids: List[int], min_fetched_at: datetime) -> Dict[int, Dict]:
+        db = SessionLocal()
+        try:
+            rows = crud.get_fresh_vk_profiles(db, vk_ids, min_fetched_at)
+        except Exception as e:
+            print(f"PROFILE_CACHE ERROR (DB get): {e}")
+            return {}
+        finally:
+            db.close()
+
+        # Прогреваем Redis найденными записями, сохраняя их возраст
+        by_fetched_at: Dict[float, Dict[int, Dict]] = {}
+        for vk_id, (profile, fetched_at) in rows.items():
+            if fetched_at.tzinfo is None:
+                # SQLite возвращает время без зоны, пишем всегда UTC
+                fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+            by_fetched_at.setdefault(fetched_at.timestamp(), {})[vk_id] = profile
+        for fetched_ts, profiles in by_fetched_at.items():
+            self._set_redis(profiles, fetched_ts)
+        return {vk_id: profile for vk_id, (profile, _) in rows.items()}
+
+    def store(self, profiles: Iterable[Dict], fetched_at: Optional[datetime] = None):
+        """Сохраняет профили, полученные с полным набором PROFILE_FIELDS."""
+        profiles = {p['id']: p for p in profiles if p.get('id')}
+        if not profiles:
+            return
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            crud.upsert_vk_profiles(db, profiles.values(), fetched_at)
+        except Exception as e:
+            print(f"PROFILE_CACHE ERROR (DB set): {e}")
+        finally:
+            db.close()
+        self._set_redis(profiles, fetched_at.timestamp())
+
+    # --- Пакетный поиск ---
+
+    def get_profiles(
+        self,
+        vk_ids: Iterable[int],
+        tokens: List[str],
+        project_id: Optional[str] = None,
+        progress_callback=None,
+        max_age: int = PROFILE_MAX_AGE
+    ) -> List[Dict]:
+        """
+        Профили users.get для vk_ids (в порядке первого появления ID).
+        В VK запрашиваются только ID без свежей записи в кеше.
+        Пользователи, которых VK не вернул, в результат не попадают.
+        """
+        unique_ids = list(dict.fromkeys(int(vk_id) for vk_id in vk_ids if vk_id))
+        total = len(unique_ids)
+        if total == 0:
+            return []
+
+        now = datetime.now(timezone.utc)
+        min_fetched_at = now - timedelta(seconds=max_age)
+
+        found = self._get_redis(unique_ids, min_fetched_at.timestamp())
+        missing = [vk_id for vk_id in unique_ids if vk_id not in found]
+        if missing:
+            found.update(self._get_db(missing, min_fetched_at))
+
+        to_fetch = [vk_id for vk_id in unique_ids if vk_id not in found]
+        cached_count = total - len(to_fetch)
+        print(f"PROFILE_CACHE: {total} users, {cached_count} from cache, {len(to_fetch)} to fetch from VK.")
+
+        if progress_callback and cached_count:
+            progress_callback(cached_count, total)
+
+        if to_fetch and tokens:
+            on_progress = None
+            if progress_callback:
+                def on_progress(loaded, _total):
+                    progress_callback(cached_count + loaded, total)
+
+            fetched = fetch_users_smart_parallel(to_fetch, tokens, PROFILE_FIELDS, project_id, on_progress)
+            fetched_map = {p['id']: p for p in fetched if p.get('id')}
+            self.store(fetched_map.values(), now)
+            found.update(fetched_map)
+
+        return [found[vk_id] for vk_id in unique_ids if vk_id in found]
+
+
+vk_profile_cache = VkProfileCache()
@@ -1,9 +1,170 @@
 from PIL import Image, ImageFilter, ImageDraw, ImageOps, ImageFont
 import io
 import os
-import requests
+from functools import lru_cache
 import emoji # Installed via pip install emoji
 
+# ===================================================================
+# КЭШИ РЕНДЕРА ИСТОРИЙ
+# ===================================================================
+# Шрифты загружаются с диска один раз на процесс (get_story_fonts),
+# глифы эмодзи рендерятся один раз и дальше вставляются готовой картинкой
+# (_emoji_glyph). Размытый фон считается на уменьшенной копии: Gaussian
+# blur радиуса 40 на 1080x1920 заменяется blur радиуса 40/BG_BLUR_DOWNSCALE
+# на картинке в BG_BLUR_DOWNSCALE раз меньше с последующим увеличением -
+# визуально то же самое, в десятки раз дешевле.
+# ===================================================================
+
+STORY_WIDTH = 1080
+STORY_HEIGHT = 1920
+BG_BLUR_RADIUS = 40
+BG_BLUR_DOWNSCALE = 8
+EMOJI_GLYPH_CACHE_SIZE = 2048
+
+
+def _resolve_font_paths() -> tuple[str, str, str | None]:
+    """(regular, bold, emoji) font paths for the current environment."""
+    import platform
+
+    # Determine paths based on environment
+    # In Docker (Linux), we will copy fonts to /app/assets/fonts/
+    base_dir = os.path.dirname(os.path.abspath(__file__)) # utils/
+    project_root = os.path.dirname(base_dir) # backend_python/
+
+    # Check local assets folder first (Docker scenario)
+    local_font_reg = os.path.join(project_root, "assets", "fonts", "arial.ttf")
+    local_font_bold = os.path.join(project_root, "assets", "fonts", "arialbd.ttf")
+    local_font_emoji = os.path.join(project_root, "assets", "fonts", "seguiemj.ttf")
+
+    if os.path.exists(local_font_reg):
+        return local_font_reg, local_font_bold, local_font_emoji if os.path.exists(local_font_emoji) else None
+
+    if platform.system() == "Windows":
+        # Use Segoe UI (Standard) for better Cyrillic support and cleaner look
+        # seguiemj.ttf (Emoji) breaks Cyrillic if used as main font.
+        font_path = "C:/Windows/Fonts/segoeui.ttf"
+        font_path_bold = "C:/Windows/Fonts/segoeuib.ttf"
+        # Fallback to Arial if Segoe not found
+        if not os.path.exists(font_path):
+            font_path = "C:/Windows/Fonts/arial.ttf"
+            font_path_bold = "C:/Windows/Fonts/arialbd.ttf"
+        return font_path, font_path_bold, "C:/Windows/Fonts/seguiemj.ttf"
+
+    return "arial.ttf", "arialbd.ttf", None
+
+
+@lru_cache(maxsize=1)
+def get_story_fonts():
+    """(font_bold, font_reg, font_emoji, button_font), loaded once per process."""
+    font_path, font_path_bold, font_path_emoji = _resolve_font_paths()
+    try:
+        # Try a standard font if available, else default
+        font_bold = ImageFont.truetype(font_path_bold, 36)
+        font_reg = ImageFont.truetype(font_path, 32)
+        font_emoji = font_reg
+        if font_path_emoji:
+            # Emoji font is used exclusively for emojis
+            try:
+                font_emoji = ImageFont.truetype(font_path_emoji, 32)
+            except Exception:
+                font_emoji = font_reg
+        button_font = ImageFont.truetype(font_path_bold, 24)
+    except Exception:
+        # If exact path fails, try just name
+        try:
+            font_bold = ImageFont.truetype("arialbd.ttf", 36)
+            font_reg = ImageFont.truetype("arial.ttf", 32)
+            button_font = ImageFont.truetype("arialbd.ttf", 24)
+        except Exception:
+            font_bold = ImageFont.load_default()
+            font_reg = ImageFont.load_default()
+            button_font = ImageFont.load_default()
+        font_emoji = font_reg
+    return font_bold, font_reg, font_emoji, button_font
+
+
+def _text_length(font, text: str) -> float:
+    try:
+        # Try getlength (Pillow 9.2+)
+        return font.getlength(text)
+    except Exception:
+        return font.getsize(text)[0]
+
+
+@lru_cache(maxsize=EMOJI_GLYPH_CACHE_SIZE)
+def _emoji_glyph(char: str) -> tuple[Image.Image, float]:
+    """Pre-rendered emoji (RGBA tile drawn at the text origin) and its advance width."""
+    _, _, font_emoji, _ = get_story_fonts()
+    advance = _text_length(font_emoji, char)
+    left, top, right, bottom = font_emoji.getbbox(char)
+    tile = Image.new("RGBA", (max(int(right), 1), max(int(bottom), 1)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(tile)
+    # Try to use embedded color if possible (Pillow 10+) for Color Emojis
+    try:
+        draw.text((0, 0), char, font=font_emoji, fill=(255, 255, 255), embedded_color=True)
+    except TypeError:
+        # Fallback for older Pillow
+        draw.text((0, 0), char, font=font_emoji, fill=(255, 255, 255))
+    return tile, advance
+
+
+def _draw_mixed_line(card_img: Image.Image, draw_obj, xy, line_text: str, f_text, fill_color):
+    """Draws a text line with emojis (emoji glyphs come from the cache)."""
+    cursor_x, cursor_y = xy
+    last_idx = 0
+    for entry in emoji.emoji_list(line_text):
+        start = entry['match_start']
+        end = entry['match_end']
+
+        # Draw text segment before emoji
+        if start > last_idx:
+            segment = line_text[last_idx:start]
+            draw_obj.text((cursor_x, cursor_y), segment, font=f_text, fill=fill_color)
+            cursor_x += _text_length(f_text, segment)
+
+        tile, advance = _emoji_glyph(entry['emoji'])
+        card_img.alpha_composite(tile, (int(cursor_x), int(cursor_y)))
+        cursor_x += advance
+        last_idx = end
+
+    # Draw remaining text
+    if last_idx < len(line_text):
+        draw_obj.text((cursor_x, cursor_y), line_text[last_idx:], font=f_text, fill=fill_color)
+
+
+def _blurred_background(source: Image.Image | None, target_width: int, target_height: int) -> Image.Image:
+    """Center-cropped 9:16 background: downscale, blur, upscale."""
+    if source is None:
+        # Fallback background
+        return Image.new('RGB', (target_width, target_height), (30, 30, 35))
+
+    img_ratio = source.width / source.height
+    target_ratio = target_width / target_height
+    if img_ratio > target_ratio:
+        new_width = int(source.height * target_ratio)
+        offset = (source.width - new_width) // 2
+        box = (offset, 0, offset + new_width, source.height)
+    else:
+        new_height = int(source.width / target_ratio)
+        offset = (source.height - new_height) // 2
+        box = (0, offset, source.width, offset + new_height)
+
+    small_size = (max(target_width // BG_BLUR_DOWNSCALE, 1), max(target_height // BG_BLUR_DOWNSCALE, 1))
+    small = source.resize(small_size, Image.Resampling.BOX, box=box)
+    small = small.filter(ImageFilter.GaussianBlur(radius=BG_BLUR_RADIUS / BG_BLUR_DOWNSCALE))
+    return small.resize((target_width, target_height), Image.Resampling.BILINEAR)
+
+
+def _open_rgb(data: bytes | None) -> Image.Image | None:
+    if not data:
+        return None
+    try:
+        image = Image.open(io.BytesIO(data))
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    except Exception:
+        return None
+
+
 def create_story_image(
     post_image_bytes: bytes | None,
     group_name: str = None,
@@ -16,136 +177,28 @@ def create_story_image(
     """
     try:
         # Target size for Stories (HD 9:16)
-        target_width = 1080
-        target_height = 1920
+        target_width = STORY_WIDTH
+        target_height = STORY_HEIGHT
         
         # --- 1. Background (Blurred & Zoomed) ---
         # If we have a post image, use it for background.
         # If not, use group avatar.
-        # If neither, use a default abstract gradient or dark color.
-        
-        bg_source = None
-        if post_image_bytes:
-             try:
-                bg_source = Image.open(io.BytesIO(post_image_bytes))
-             except: pass
-        
-        if not bg_source and group_photo_bytes:
-             try:
-                bg_source = Image.open(io.BytesIO(group_photo_bytes))
-             except: pass
-             
-        if bg_source:
-            if bg_source.mode != 'RGB':
-                bg_source = bg_source.convert('RGB')
-        
-            img_ratio = bg_source.width / bg_source.height
-            target_ratio = target_width / target_height
-            
-            bg_transform = bg_source.copy()
-            
-            if img_ratio > target_ratio:
-                new_width = int(bg_transform.height * target_ratio)
-                offset = (bg_transform.width - new_width) // 2
-                bg_transform = bg_transform.crop((offset, 0, offset + new_width, bg_transform.height))
-            else:
-                new_height = int(bg_transform.width / target_ratio)
-                offset = (bg_transform.height - new_height) // 2
-                bg_transform = bg_transform.crop((0, offset, bg_transform.width, offset + new_height))
-                
-            bg_transform = bg_transform.resize((target_width, target_height), Image.Resampling.LANCZOS)
-            bg_transform = bg_transform.filter(ImageFilter.GaussianBlur(radius=40))
-        else:
-            # Fallback background
-            bg_transform = Image.new('RGB', (target_width, target_height), (30, 30, 35))
+        # If neither, use a dark color.
+        # The post image is decoded once and reused for the card.
+        original = _open_rgb(post_image_bytes)
+        bg_source = original if original is not None else _open_rgb(group_photo_bytes)
+        bg_transform = _blurred_background(bg_source, target_width, target_height)
 
         # Darken background
         overlay = Image.new('RGBA', bg_transform.size, (0, 0, 0, 120))
         bg_transform.paste(overlay, (0, 0), overlay)
 
         # --- Constants & Config ---
-        # Re-load original for card content if available
-        original = None
-        if post_image_bytes:
-            try:
-                original = Image.open(io.BytesIO(post_image_bytes))
-                if original.mode != 'RGB':
-                    original = original.convert('RGB')
-            except:
-                original = None
-
         CARD_WIDTH = 840  # margins side 120
         PADDING = 40
         HEADER_HEIGHT = 80 # Avatar 60px
         
-        # Default font (fallback) - on server usually only minimal fonts exist.
-        # We try to use a default or load one if available.
-        # Attempt to load fonts manually from system paths if on Windows
-        import platform
-        
-        # Determine paths based on environment
-        # In Docker (Linux), we will copy fonts to /app/assets/fonts/
-        base_dir = os.path.dirname(os.path.abspath(__file__)) # utils/
-        project_root = os.path.dirname(base_dir) # backend_python/
-        
-        # Check local assets folder first (Docker scenario)
-        local_font_reg = os.path.join(project_root, "assets", "fonts", "arial.ttf")
-        local_font_bold = os.path.join(project_root, "assets", "fonts", "arialbd.ttf")
-        local_font_emoji = os.path.join(project_root, "assets", "fonts", "seguiemj.ttf")
-
-        font_path = "arial.ttf"
-        font_path_bold = "arialbd.ttf"
-        
-        if os.path.exists(local_font_reg):
-             font_path = local_font_reg
-             font_path_bold = local_font_bold
-        elif platform.system() == "Windows":
-             # Use Segoe UI (Standard) for better Cyrillic support and cleaner look
-             # seguiemj.ttf (Emoji) breaks Cyrillic if used as main font.
-             font_path = "C:/Windows/Fonts/segoeui.ttf"
-             font_path_bold = "C:/Windows/Fonts/segoeuib.ttf"
-             
-             # Fallback to Arial if Segoe not found
-             if not os.path.exists(font_path):
-                 font_path = "C:/Windows/Fonts/arial.ttf"
-                 font_path_bold = "C:/Windows/Fonts/arialbd.ttf"
-
-        try:
-             # Try a standard font if available, else default
-             font_bold = ImageFont.truetype(font_path_bold, 36)
-             
-             try:
-                # Prioritize Emoji font
-                # Check for local emoji font first
-                if os.path.exists(local_font_emoji):
-                    font_reg = ImageFont.truetype(font_path, 32)
-                    font_emoji = ImageFont.truetype(local_font_emoji, 32)
-                elif platform.system() == "Windows":
-                    # We load Standard Segoe UI for text
-                    font_reg = ImageFont.truetype(font_path, 32)
-                    # And Segoe UI Emoji exclusively for emojis
-                    try:
-                        font_emoji = ImageFont.truetype("C:/Windows/Fonts/seguiemj.ttf", 32)
-                    except:
-                        font_emoji = font_reg
-                else:
-                    font_reg = ImageFont.truetype(font_path, 32)
-                    font_emoji = font_reg
-             except:
-                font_reg = ImageFont.truetype(font_path, 32)
-                font_emoji = font_reg
-
-             button_font = ImageFont.truetype(font_path_bold, 24)
-        except:
-             # If exact path fails, try just name
-             try:
-                font_bold = ImageFont.truetype("arialbd.ttf", 36)
-                font_reg  = ImageFont.truetype("arial.ttf", 32)
-                button_font = ImageFont.truetype("arialbd.ttf", 24)
-             except:
-                font_bold = ImageFont.load_default()
-                font_reg = ImageFont.load_default()
-                button_font = ImageFont.load_default()
+        font_bold, font_reg, font_emoji, button_font = get_story_fonts()
 
         # --- 2. Measure Content ---
         # Prepare text with word wrap and newline support
@@ -242,21 +295,14 @@ def create_story_image(
         name_text = group_name or "Сообщество"
         available_width = CARD_WIDTH - text_x - PADDING
         
-        current_width = 0
-        try:
-            current_width = font_bold.getlength(name_text)
-        except:
-            current_width = font_bold.getsize(name_text)[0]
+        current_width = _text_length(font_bold, name_text)
             
         if current_width > available_width:
              # Binary search or simple loop to truncate
              # Loop backwards is safer for correct cutting
              for i in range(len(name_text), 0, -1):
                  candidate = name_text[:i] + "..."
-                 try:
-                    cand_w = font_bold.getlength(candidate)
-                 except:
-                    cand_w = font_bold.getsize(candidate)[0]
+                 cand_w = _text_length(font_bold, candidate)
                  
                  if cand_w <= available_width:
                      name_text = candidate
@@ -270,56 +316,12 @@ def create_story_image(
         # --- 4. Post Text ---
         if text_lines:
             
-            # Helper to draw mixed text/emoji line
-            def draw_mixed_line(draw_obj, xy, line_text, f_text, f_emoji, fill_color):
-                cursor_x, cursor_y = xy
-                
-                # Analyze emojis
-                emoji_entries = emoji.emoji_list(line_text)
-                
-                last_idx = 0
-                for entry in emoji_entries:
-                    start = entry['match_start']
-                    end = entry['match_end']
-                    char = entry['emoji']
-                    
-                    # Draw text segment before emoji
-                    if start > last_idx:
-                        segment = line_text[last_idx:start]
-                        draw_obj.text((cursor_x, cursor_y), segment, font=f_text, fill=fill_color)
-                        # Advance cursor
-                        try:
-                            # Try getlength (Pillow 9.2+)
-                            cursor_x += f_text.getlength(segment)
-                        except:
-                            cursor_x += f_text.getsize(segment)[0]
-                    
-                    # Draw Emoji
-                    # Try to use embedded color if possible (Pillow 10+) for Color Emojis
-                    try:
-                        draw_obj.text((cursor_x, cursor_y), char, font=f_emoji, fill=fill_color, embedded_color=True)
-                    except TypeError:
-                         # Fallback for older Pillow
-                        draw_obj.text((cursor_x, cursor_y), char, font=f_emoji, fill=fill_color)
-                    
-                    try:
-                        cursor_x += f_emoji.getlength(char)
-                    except:
-                        cursor_x += f_emoji.getsize(char)[0]
-                        
-                    last_idx = end
-                
-                # Draw remaining text
-                if last_idx < len(line_text):
-                     segment = line_text[last_idx:]
-                     draw_obj.text((cursor_x, cursor_y), segment, font=f_text, fill=fill_color)
-            
             # Render loop
             for line in text_lines:
                 # Use mixed drawer if emojis present, else simple text
                 if emoji.emoji_count(line) > 0:
                     try:
-                         draw_mixed_line(draw_card, (PADDING, cursor_y), line, font_reg, font_emoji, (255,255,255))
+                         _draw_mixed_line(card_img, draw_card, (PADDING, cursor_y), line, font_reg, (255,255,255))
                     except Exception as e:
                          print(f"Mixed render error: {e}")
                          draw_card.text((PADDING, cursor_y), line, fill=(255,255,255), font=font_reg)
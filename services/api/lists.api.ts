@@ -41,6 +41,15 @@ export interface MailingStats {
     active_allowed_count: number;
 }
 
+export interface InteractionStats {
+    total_interactions: number;
+    engaged_users: number;
+    engaged_posts: number;
+    avg_per_user: number;
+    top_engagers: { vk_user_id: number; first_name?: string; last_name?: string; photo_url?: string; count: number }[];
+    top_posts: { vk_post_id: number; vk_link?: string; count: number }[];
+}
+
 export interface ListStats {
     total_users: number;
     banned_count: number;
@@ -87,6 +96,7 @@ export interface ListStats {
 
     post_stats?: PostStats;
     mailing_stats?: MailingStats;
+    interaction_stats?: InteractionStats | null;
 }
 
 export interface RefreshProgress {